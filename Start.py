@@ -136,12 +136,16 @@ def _migrate_database_files_early():
     
     return True
 
+# 分片工作进程由主进程启动，启动前检查已由主进程完成
+_IS_SHARD_WORKER = '--shard-worker' in sys.argv
+
 # 在导入 db_manager 之前先执行数据库迁移
-try:
-    _migrate_database_files_early()
-except Exception as e:
-    print(f"{_WARN} 数据库迁移检查失败: {e}")
-    # 继续启动，因为可能是首次运行
+if not _IS_SHARD_WORKER:
+    try:
+        _migrate_database_files_early()
+    except Exception as e:
+        print(f"{_WARN} 数据库迁移检查失败: {e}")
+        # 继续启动，因为可能是首次运行
 
 # ==================== 检查并安装Playwright浏览器 ====================
 def _check_and_install_playwright():
@@ -413,19 +417,47 @@ def _check_and_install_playwright():
     return playwright_installed
 
 # 检查并安装Playwright浏览器
-try:
-    _check_and_install_playwright()
-except Exception as e:
-    print(f"{_WARN} Playwright浏览器检查失败: {e}")
-    print("   程序将继续启动，但Playwright功能可能不可用")
-    # 继续启动，不影响主程序运行
+if not _IS_SHARD_WORKER:
+    try:
+        _check_and_install_playwright()
+    except Exception as e:
+        print(f"{_WARN} Playwright浏览器检查失败: {e}")
+        print("   程序将继续启动，但Playwright功能可能不可用")
+        # 继续启动，不影响主程序运行
 
 # ==================== 现在可以安全地导入其他模块 ====================
+import time
+from contextlib import contextmanager
+
+# 启动时各重量级模块的导入耗时（毫秒），logger 初始化后输出报告
+_import_timings = []
+
+
+@contextmanager
+def _timed_import(name: str):
+    """记录一组导入语句的耗时（只统计首次导入，已被前面模块带入的部分不重复计算）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _import_timings.append((name, (time.perf_counter() - start) * 1000))
+
+
+def _log_import_report():
+    """输出启动导入耗时报告"""
+    total = sum(ms for _, ms in _import_timings)
+    logger.info(f"启动导入耗时: 共 {total:.0f}ms")
+    for name, ms in sorted(_import_timings, key=lambda item: item[1], reverse=True):
+        logger.info(f"  - {name}: {ms:.0f}ms")
+
+
 import asyncio
 import threading
-import uvicorn
+with _timed_import('uvicorn'):
+    import uvicorn
 from urllib.parse import urlparse
-from loguru import logger
+with _timed_import('loguru'):
+    from loguru import logger
 
 # 修复Linux环境下的asyncio子进程问题
 if sys.platform.startswith('linux'):
@@ -436,10 +468,15 @@ if sys.platform.startswith('linux'):
     except Exception as e:
         logger.debug(f"设置事件循环策略失败: {e}")
 
-from config import AUTO_REPLY, COOKIES_LIST
-import cookie_manager as cm
-from db_manager import db_manager
-from file_log_collector import setup_file_logging
+with _timed_import('config'):
+    from config import AUTO_REPLY, COOKIES_LIST
+with _timed_import('db_manager'):
+    from db_manager import db_manager
+with _timed_import('cookie_manager'):
+    import cookie_manager as cm
+with _timed_import('file_log_collector'):
+    from file_log_collector import setup_file_logging
+from utils import sharding
 
 
 def _start_api_server():
@@ -486,6 +523,20 @@ def _start_api_server():
 
 
 
+def _route_cache_invalidation(router):
+    """分片模式下，把 API 进程中的关键词/过滤规则/发货规则/通知渠道缓存失效和日志采样配置同步到分片进程"""
+    from utils.keyword_matcher import keyword_matcher_cache
+    from utils.message_filter import message_filter_cache
+    from utils.delivery_rule_matcher import delivery_rule_cache
+    from utils.log_control import log_sampler
+    from utils.notification_service import notification_service
+    keyword_matcher_cache.add_listener(lambda cookie_id: router.notify_invalidate('keyword', cookie_id))
+    message_filter_cache.add_listener(lambda: router.notify_invalidate('message_filter'))
+    delivery_rule_cache.add_listener(lambda: router.notify_invalidate('delivery_rule'))
+    log_sampler.add_listener(lambda: router.notify_invalidate('log_sampling'))
+    notification_service.add_listener(lambda: router.notify_invalidate('notification'))
+
+
 def load_keywords_file(path: str):
     """从文件读取关键字 -> [(keyword, reply)]"""
     kw_list = []
@@ -516,18 +567,41 @@ async def main():
     print("初始化文件日志收集器...")
     setup_file_logging()
     logger.info("文件日志收集器已启动，开始收集实时日志")
+    _log_import_report()
+
+    # 加载热路径日志采样配置
+    from utils.log_control import log_sampler
+    log_sampler.load()
 
     loop = asyncio.get_running_loop()
 
+    # 启动事件循环阻塞监控（所有账号共用此循环）
+    if os.getenv('LOOP_WATCHDOG_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+        from utils.loop_watchdog import loop_watchdog
+        loop_watchdog.start(loop)
+
     # 创建 CookieManager 并在全局暴露
     print("创建 CookieManager...")
-    cm.manager = cm.CookieManager(loop)
+    sharded = sharding.sharding_enabled()
+    if sharded:
+        # 多进程分片：账号任务由分片工作进程运行，本进程只负责 API 和全局任务
+        sharding.router = sharding.ShardRouter(sharding.SHARD_WORKERS)
+        sharding.supervisor = sharding.ShardSupervisor(sharding.SHARD_WORKERS)
+        sharding.supervisor.start()
+        cm.manager = sharding.RoutedCookieManager(loop, sharding.router)
+        _route_cache_invalidation(sharding.router)
+        from utils.scheduler.global_runner import global_task_runner
+        global_task_runner.set_task_codes(
+            set(global_task_runner.get_stats()) - set(sharding.SHARD_LOOP_TASKS)
+        )
+    else:
+        cm.manager = cm.CookieManager(loop)
     manager = cm.manager
     print("CookieManager 创建完成")
 
     # 1) 从数据库加载的 Cookie 已经在 CookieManager 初始化时完成
-    # 为每个启用的 Cookie 启动任务
-    for cid, val in manager.cookies.items():
+    # 为每个启用的 Cookie 启动任务（分片模式下由各分片进程自行启动）
+    for cid, val in ({} if sharded else manager.cookies).items():
         # 检查账号是否启用
         if not manager.get_cookie_status(cid):
             logger.info(f"跳过禁用的 Cookie: {cid}")
@@ -560,13 +634,20 @@ async def main():
         
         kw_file = entry.get('keywords_file')
         kw_list = load_keywords_file(kw_file) if kw_file else None
-        manager.add_cookie(cid, val, kw_list)
+        if sharded:
+            # 转发到分片需要等待其启动，放到线程中避免阻塞事件循环
+            await asyncio.to_thread(manager.add_cookie, cid, val, kw_list)
+        else:
+            manager.add_cookie(cid, val, kw_list)
         logger.info(f"从配置文件加载 Cookie: {cid}")
 
     # 3) 若老环境变量仍提供单账号 Cookie，则作为 default 账号
     env_cookie = os.getenv('COOKIES_STR')
     if env_cookie and 'default' not in manager.list_cookies():
-        manager.add_cookie('default', env_cookie)
+        if sharded:
+            await asyncio.to_thread(manager.add_cookie, 'default', env_cookie)
+        else:
+            manager.add_cookie('default', env_cookie)
         logger.info("从环境变量加载 default Cookie")
 
     # 启动 API 服务线程
@@ -587,16 +668,20 @@ async def main():
 
 
 if __name__ == '__main__':
+    # 分片工作进程只运行分配给自己的账号，不启动 API 服务
+    _worker_args = sharding.parse_worker_args()
+    _entry = sharding.shard_worker_main(*_worker_args) if _worker_args else main()
+
     # 避免使用被monkey patch的asyncio.run()
     # 使用原生的事件循环管理方式
     try:
         loop = asyncio.get_event_loop()
         if loop.is_running():
             # 如果事件循环已经在运行，创建任务
-            asyncio.create_task(main())
+            asyncio.create_task(_entry)
         else:
             # 正常启动事件循环
-            loop.run_until_complete(main())
+            loop.run_until_complete(_entry)
     except RuntimeError:
         # 如果没有事件循环，创建一个新的
-        asyncio.run(main()) 
\ No newline at end of file
+        asyncio.run(_entry) 
\ No newline at end of file
@@ -10,7 +10,7 @@ from loguru import logger
 import websockets
 from contextlib import asynccontextmanager
 from utils.xianyu_utils import (
-    decrypt, generate_mid, generate_uuid, trans_cookies,
+    decrypt_to_obj, generate_mid, generate_uuid, trans_cookies,
     generate_device_id, generate_sign
 )
 from config import (
@@ -23,6 +23,9 @@ import sys
 import aiohttp
 from collections import defaultdict
 from db_manager import db_manager
+from utils.log_control import hot_log
+from utils.send_bus import send_bus
+from utils.loop_watchdog import bind_cookie_id
 
 # 滑块验证：使用 utils/captcha/ 编排器（真实鼠标 + CDP + DrissionPage 三级链路）
 # 密码登录仍使用 utils/xianyu_slider_stealth.py（独立功能，不涉及滑块编排）
@@ -169,9 +172,6 @@ class XianyuLive:
     # 记录订单详情锁的使用时间
     _order_detail_lock_times = {}
 
-    # Playwright 并发信号量，防止多个账号同时启动浏览器导致内存耗尽
-    _playwright_semaphore = asyncio.Semaphore(1)
-
     @classmethod
     def _get_order_lock(cls, lock_key: str) -> asyncio.Lock:
         """安全获取订单锁，使用时才创建"""
@@ -624,18 +624,6 @@ class XianyuLive:
             current_time = time.time()
             cleaned_total = 0
             
-            # 清理过期的通知记录（保留30分钟内的，从1小时优化）
-            max_notification_age = 1800  # 30分钟（从3600优化）
-            expired_notifications = [
-                key for key, last_time in self.last_notification_time.items()
-                if current_time - last_time > max_notification_age
-            ]
-            for key in expired_notifications:
-                del self.last_notification_time[key]
-            if expired_notifications:
-                cleaned_total += len(expired_notifications)
-                logger.warning(f"【{self.cookie_id}】清理了 {len(expired_notifications)} 个过期通知记录")
-            
             # 清理过期的发货记录（保留30分钟内的）
             max_delivery_age = 1800  # 30分钟
             expired_deliveries = [
@@ -686,122 +674,11 @@ class XianyuLive:
             # 只有实际清理了内容才记录总数日志
             if cleaned_total > 0:
                 logger.info(f"【{self.cookie_id}】实例缓存清理完成，共清理 {cleaned_total} 条记录")
-                logger.warning(f"【{self.cookie_id}】当前缓存数量 - 通知: {len(self.last_notification_time)}, 发货: {len(self.last_delivery_time)}, 确认: {len(self.confirmed_orders)}")
+                logger.warning(f"【{self.cookie_id}】当前缓存数量 - 发货: {len(self.last_delivery_time)}, 确认: {len(self.confirmed_orders)}")
         
         except Exception as e:
             logger.error(f"【{self.cookie_id}】清理实例缓存时出错: {self._safe_str(e)}")
     
-    async def _cleanup_playwright_cache(self):
-        """清理Playwright浏览器临时文件和缓存（Docker环境专用）"""
-        try:
-            import shutil
-            import glob
-            
-            # 定义需要清理的临时目录路径
-            temp_paths = [
-                '/tmp/playwright-*',  # Playwright临时会话
-                '/tmp/chromium-*',    # Chromium临时文件
-                '/ms-playwright/chromium-*/Default/Cache',  # 浏览器缓存
-                '/ms-playwright/chromium-*/Default/Code Cache',  # 代码缓存
-                '/ms-playwright/chromium-*/Default/GPUCache',  # GPU缓存
-            ]
-            
-            total_cleaned = 0
-            total_size_mb = 0
-            
-            for pattern in temp_paths:
-                try:
-                    matching_paths = glob.glob(pattern)
-                    for path in matching_paths:
-                        try:
-                            if os.path.exists(path):
-                                # 计算大小
-                                if os.path.isdir(path):
-                                    size = sum(
-                                        os.path.getsize(os.path.join(dirpath, filename))
-                                        for dirpath, _, filenames in os.walk(path)
-                                        for filename in filenames
-                                    )
-                                    shutil.rmtree(path, ignore_errors=True)
-                                else:
-                                    size = os.path.getsize(path)
-                                    os.remove(path)
-                                
-                                total_size_mb += size / (1024 * 1024)
-                                total_cleaned += 1
-                        except Exception as e:
-                            logger.warning(f"清理路径 {path} 时出错: {e}")
-                except Exception as e:
-                    logger.warning(f"匹配路径 {pattern} 时出错: {e}")
-            
-            if total_cleaned > 0:
-                logger.info(f"【{self.cookie_id}】Playwright缓存清理完成: 删除了 {total_cleaned} 个文件/目录，释放 {total_size_mb:.2f} MB")
-            else:
-                logger.warning(f"【{self.cookie_id}】Playwright缓存清理: 没有需要清理的临时文件")
-                
-        except Exception as e:
-            logger.warning(f"【{self.cookie_id}】清理Playwright缓存时出错: {self._safe_str(e)}")
-
-    async def _cleanup_old_logs(self, retention_days: int = 7):
-        """清理过期的日志文件
-        
-        Args:
-            retention_days: 保留的天数，默认7天
-            
-        Returns:
-            清理的文件数量
-        """
-        try:
-            import glob
-            from datetime import datetime, timedelta
-            
-            logs_dir = "logs"
-            if not os.path.exists(logs_dir):
-                logger.warning(f"【{self.cookie_id}】日志目录不存在: {logs_dir}")
-                return 0
-            
-            # 计算过期时间点
-            cutoff_time = datetime.now() - timedelta(days=retention_days)
-            
-            # 查找所有日志文件（包括.log和.log.zip）
-            log_patterns = [
-                os.path.join(logs_dir, "xianyu_*.log"),
-                os.path.join(logs_dir, "xianyu_*.log.zip"),
-                os.path.join(logs_dir, "app_*.log"),
-                os.path.join(logs_dir, "app_*.log.zip"),
-            ]
-            
-            total_cleaned = 0
-            total_size_mb = 0
-            
-            for pattern in log_patterns:
-                log_files = glob.glob(pattern)
-                for log_file in log_files:
-                    try:
-                        # 获取文件修改时间
-                        file_mtime = datetime.fromtimestamp(os.path.getmtime(log_file))
-                        
-                        # 如果文件早于保留期限，则删除
-                        if file_mtime < cutoff_time:
-                            file_size = os.path.getsize(log_file)
-                            os.remove(log_file)
-                            total_size_mb += file_size / (1024 * 1024)
-                            total_cleaned += 1
-                            logger.debug(f"【{self.cookie_id}】删除过期日志文件: {log_file} (修改时间: {file_mtime})")
-                    except Exception as e:
-                        logger.warning(f"【{self.cookie_id}】删除日志文件失败 {log_file}: {self._safe_str(e)}")
-            
-            if total_cleaned > 0:
-                logger.info(f"【{self.cookie_id}】日志清理完成: 删除了 {total_cleaned} 个日志文件，释放 {total_size_mb:.2f} MB (保留 {retention_days} 天内的日志)")
-            else:
-                logger.debug(f"【{self.cookie_id}】日志清理: 没有需要清理的过期日志文件 (保留 {retention_days} 天)")
-            
-            return total_cleaned
-            
-        except Exception as e:
-            logger.error(f"【{self.cookie_id}】清理日志文件时出错: {self._safe_str(e)}")
-            return 0
-
     def __init__(self, cookies_str=None, cookie_id: str = "default", user_id: int = None):
         """初始化闲鱼直播类"""
         logger.info(f"【{cookie_id}】开始初始化XianyuLive...")
@@ -847,10 +724,8 @@ class XianyuLive:
         self.connection_restart_flag = False  # 连接重启标志
 
         # 通知防重复机制
-        self.last_notification_time = {}  # 记录每种通知类型的最后发送时间
         self.notification_cooldown = 300  # 5分钟内不重复发送相同类型的通知
         self.token_refresh_notification_cooldown = 18000  # Token刷新异常通知冷却时间：3小时
-        self.notification_lock = asyncio.Lock()  # 通知防重复机制的异步锁
 
         # 自动发货防重复机制
         self.last_delivery_time = {}  # 记录每个商品的最后发货时间
@@ -941,6 +816,11 @@ class XianyuLive:
             # 使用同步方式注册，避免在__init__中使用async
             XianyuLive._instances[self.cookie_id] = self
             logger.warning(f"【{self.cookie_id}】实例已注册到全局字典")
+            # 外发消息队列由本实例所在事件循环消费（API线程通过 send_bus 发送）
+            try:
+                send_bus.register(self.cookie_id, self, asyncio.get_running_loop())
+            except RuntimeError:
+                logger.debug(f"【{self.cookie_id}】不在事件循环中创建，跳过注册发送队列")
         except Exception as e:
             logger.error(f"【{self.cookie_id}】注册实例失败: {self._safe_str(e)}")
 
@@ -950,6 +830,7 @@ class XianyuLive:
             if self.cookie_id in XianyuLive._instances:
                 del XianyuLive._instances[self.cookie_id]
                 logger.warning(f"【{self.cookie_id}】实例已从全局字典中注销")
+            send_bus.unregister(self.cookie_id, self)
         except Exception as e:
             logger.error(f"【{self.cookie_id}】注销实例失败: {self._safe_str(e)}")
 
@@ -2982,155 +2863,55 @@ class XianyuLive:
             raise
 
     async def _fetch_item_detail_from_browser(self, item_id: str) -> str:
-        """使用浏览器获取商品详情"""
-        playwright = None
-        browser = None
-        # 获取并发信号量
-        await XianyuLive._playwright_semaphore.acquire()
-        try:
-            from playwright.async_api import async_playwright
+        """使用浏览器获取商品详情（从浏览器池租用页面）"""
+        from utils.browser_pool import get_browser_pool
 
+        try:
             logger.info(f"开始使用浏览器获取商品详情: {item_id}")
 
-            playwright = await async_playwright().start()
-
-            # 启动浏览器（参照order_detail_fetcher的配置）
-            browser_args = [
-                '--js-flags=--max-old-space-size=128',
-                '--renderer-process-limit=1',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            )
-
-            # 设置Cookie
-            cookies = []
-            for cookie_pair in self.cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
+            async with get_browser_pool().lease(self.cookie_id, self.cookies_str, memory_limit=True) as lease:
+                page = lease.page
 
-            await context.add_cookies(cookies)
-            logger.warning(f"已设置 {len(cookies)} 个Cookie")
+                # 构造商品详情页面URL
+                item_url = f"https://www.goofish.com/item?id={item_id}"
+                logger.info(f"访问商品页面: {item_url}")
 
-            # 创建页面
-            page = await context.new_page()
+                # 访问页面
+                await page.goto(item_url, wait_until='networkidle', timeout=30000)
 
-            # 构造商品详情页面URL
-            item_url = f"https://www.goofish.com/item?id={item_id}"
-            logger.info(f"访问商品页面: {item_url}")
+                # 等待页面完全加载
+                await asyncio.sleep(3)
 
-            # 访问页面
-            await page.goto(item_url, wait_until='networkidle', timeout=30000)
-
-            # 等待页面完全加载
-            await asyncio.sleep(3)
-
-            # 获取商品详情内容
-            detail_text = ""
-            try:
-                # 等待目标元素出现
-                await page.wait_for_selector('.desc--GaIUKUQY', timeout=10000)
-
-                # 获取商品详情文本
-                detail_element = await page.query_selector('.desc--GaIUKUQY')
-                if detail_element:
-                    detail_text = await detail_element.inner_text()
-                    logger.info(f"成功获取商品详情: {item_id}, 长度: {len(detail_text)}")
-                    return detail_text.strip()
-                else:
-                    logger.warning(f"未找到商品详情元素: {item_id}")
+                # 获取商品详情内容
+                detail_text = ""
+                try:
+                    # 等待目标元素出现
+                    await page.wait_for_selector('.desc--GaIUKUQY', timeout=10000)
+
+                    # 获取商品详情文本
+                    detail_element = await page.query_selector('.desc--GaIUKUQY')
+                    if detail_element:
+                        detail_text = await detail_element.inner_text()
+                        logger.info(f"成功获取商品详情: {item_id}, 长度: {len(detail_text)}")
+                        return detail_text.strip()
+                    else:
+                        logger.warning(f"未找到商品详情元素: {item_id}")
 
-            except Exception as e:
-                logger.warning(f"获取商品详情元素失败: {item_id}, 错误: {self._safe_str(e)}")
+                except Exception as e:
+                    logger.warning(f"获取商品详情元素失败: {item_id}, 错误: {self._safe_str(e)}")
 
-            return ""
+                return ""
 
         except Exception as e:
             logger.error(f"浏览器获取商品详情异常: {item_id}, 错误: {self._safe_str(e)}")
             return ""
-        finally:
-            # 确保资源被正确清理（增加进程强杀兜底）
-            try:
-                if browser:
-                    try:
-                        await asyncio.wait_for(browser.close(), timeout=5.0)
-                        logger.warning(f"Browser已关闭: {item_id}")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"关闭browser超时，强制杀死进程: {item_id}")
-                        XianyuLive._kill_browser_process(browser)
-                    except Exception as e:
-                        logger.warning(f"关闭browser时出错: {self._safe_str(e)}")
-                        XianyuLive._kill_browser_process(browser)
-            except Exception as e:
-                logger.warning(f"清理browser资源时出错: {self._safe_str(e)}")
-            
-            try:
-                if playwright:
-                    try:
-                        await asyncio.wait_for(playwright.stop(), timeout=5.0)
-                        logger.warning(f"Playwright已停止: {item_id}")
-                    except (asyncio.TimeoutError, Exception) as e:
-                        logger.warning(f"停止playwright时出错或超时: {self._safe_str(e)}")
-            except Exception as e:
-                logger.warning(f"清理playwright资源时出错: {self._safe_str(e)}")
-            finally:
-                XianyuLive._playwright_semaphore.release()
 
 
     async def save_items_list_to_db(self, items_list):
         """批量保存商品列表信息到数据库（并发安全）
 
+        与已有商品比对后一次性写入，只有新商品和仍缺少详情的商品才会获取详情。
+
         Args:
             items_list: 从get_item_list_info获取的商品列表
         """
@@ -3139,7 +2920,7 @@ class XianyuLive:
 
             # 准备批量数据
             batch_data = []
-            items_need_detail = []  # 需要获取详情的商品列表
+            titles = {}
 
             for item in items_list:
                 item_id = item.get('id')
@@ -3162,12 +2943,7 @@ class XianyuLive:
                     'card_type': item.get('card_type', 0)
                 }
 
-                # 检查数据库中是否已有详情
-                existing_item = db_manager.get_item_info(self.cookie_id, item_id)
-                has_detail = existing_item and existing_item.get('item_detail') and existing_item['item_detail'].strip()
-
                 batch_data.append({
-                    'cookie_id': self.cookie_id,
                     'item_id': item_id,
                     'item_title': item.get('title', ''),
                     'item_description': '',  # 暂时为空
@@ -3175,23 +2951,21 @@ class XianyuLive:
                     'item_price': item.get('price_text', ''),
                     'item_detail': json.dumps(item_detail, ensure_ascii=False)
                 })
-
-                # 如果没有详情，添加到需要获取详情的列表
-                if not has_detail:
-                    items_need_detail.append({
-                        'item_id': item_id,
-                        'item_title': item.get('title', '')
-                    })
+                titles[item_id] = item.get('title', '')
 
             if not batch_data:
                 logger.info("没有有效的商品数据需要保存")
                 return 0
 
-            # 使用批量保存方法（并发安全）
-            saved_count = db_manager.batch_save_item_basic_info(batch_data)
-            logger.info(f"批量保存商品信息完成: {saved_count}/{len(batch_data)} 个商品")
+            # 一次查询比对 + 一个事务批量写入（在数据库写线程中执行）
+            sync_result = await db_manager.sync_item_basic_info_async(self.cookie_id, batch_data)
+            saved_count = sync_result['saved']
+            logger.info(f"批量保存商品信息完成: {saved_count}/{len(batch_data)} 个商品，"
+                        f"新增 {len(sync_result['new'])}，补全 {len(sync_result['changed'])}")
 
-            # 异步获取缺失的商品详情
+            # 异步获取缺失的商品详情（只包含新商品和仍缺少详情的商品）
+            items_need_detail = [{'item_id': item_id, 'item_title': titles.get(item_id, '')}
+                                 for item_id in sync_result['need_detail']]
             if items_need_detail:
                 from config import config
                 auto_fetch_config = config.get('ITEM_DETAIL', {}).get('auto_fetch', {})
@@ -3510,7 +3284,7 @@ class XianyuLive:
                     logger.warning(f"【{self.cookie_id}】商品ID {item_id} 没有配置指定回复，使用默认回复")
 
             # 2. 获取当前账号的默认回复设置
-            default_reply_settings = db_manager.get_default_reply(self.cookie_id)
+            default_reply_settings = await db_manager.get_default_reply_async(self.cookie_id)
 
             if not default_reply_settings or not default_reply_settings.get('enabled', False):
                 logger.warning(f"账号 {self.cookie_id} 未启用默认回复")
@@ -3564,88 +3338,56 @@ class XianyuLive:
     async def get_keyword_reply(self, send_user_name: str, send_user_id: str, send_message: str, item_id: str = None) -> str:
         """获取关键词匹配回复（支持商品ID优先匹配和图片类型）"""
         try:
-            from db_manager import db_manager
+            from utils.keyword_matcher import keyword_matcher_cache
 
-            # 获取当前账号的关键词列表（包含类型信息）
-            keywords = db_manager.get_keywords_with_type(self.cookie_id)
+            # 获取当前账号编译后的关键词匹配器（关键词变更时才重新编译）
+            matcher = await keyword_matcher_cache.get(self.cookie_id)
 
-            if not keywords:
+            if not matcher.keywords:
                 logger.warning(f"账号 {self.cookie_id} 没有配置关键词")
                 return None
 
-            # 1. 如果有商品ID，优先匹配该商品ID对应的关键词
-            if item_id:
-                for keyword_data in keywords:
-                    keyword = keyword_data['keyword']
-                    reply = keyword_data['reply']
-                    keyword_item_id = keyword_data['item_id']
-                    keyword_type = keyword_data.get('type', 'text')
-                    image_url = keyword_data.get('image_url')
-
-                    if keyword_item_id == item_id and keyword.lower() in send_message.lower():
-                        logger.info(f"商品ID关键词匹配成功: 商品{item_id} '{keyword}' (类型: {keyword_type})")
-
-                        # 根据关键词类型处理
-                        if keyword_type == 'image' and image_url:
-                            # 图片类型关键词，发送图片
-                            return await self._handle_image_keyword(keyword, image_url, send_user_name, send_user_id, send_message)
-                        else:
-                            # 文本类型关键词，检查回复内容是否为空
-                            if not reply or (reply and reply.strip() == ''):
-                                logger.info(f"商品ID关键词 '{keyword}' 回复内容为空，不进行回复")
-                                return "EMPTY_REPLY"  # 返回特殊标记表示匹配到但不回复
+            # 商品ID关键词优先，其次通用关键词；同一范围内取排在最前的关键词
+            match = matcher.match(send_message, item_id)
+            if match is None:
+                logger.warning(f"未找到匹配的关键词: {send_message}")
+                return None
 
-                            # 进行变量替换
-                            try:
-                                formatted_reply = reply.format(
-                                    send_user_name=send_user_name,
-                                    send_user_id=send_user_id,
-                                    send_message=send_message
-                                )
-                                logger.info(f"商品ID文本关键词回复: {formatted_reply}")
-                                return formatted_reply
-                            except Exception as format_error:
-                                logger.error(f"关键词回复变量替换失败: {self._safe_str(format_error)}")
-                                # 如果变量替换失败，返回原始内容
-                                return reply
-
-            # 2. 如果商品ID匹配失败或没有商品ID，匹配没有商品ID的通用关键词
-            for keyword_data in keywords:
-                keyword = keyword_data['keyword']
-                reply = keyword_data['reply']
-                keyword_item_id = keyword_data['item_id']
-                keyword_type = keyword_data.get('type', 'text')
-                image_url = keyword_data.get('image_url')
-
-                if not keyword_item_id and keyword.lower() in send_message.lower():
-                    logger.info(f"通用关键词匹配成功: '{keyword}' (类型: {keyword_type})")
-
-                    # 根据关键词类型处理
-                    if keyword_type == 'image' and image_url:
-                        # 图片类型关键词，发送图片
-                        return await self._handle_image_keyword(keyword, image_url, send_user_name, send_user_id, send_message)
-                    else:
-                        # 文本类型关键词，检查回复内容是否为空
-                        if not reply or (reply and reply.strip() == ''):
-                            logger.info(f"通用关键词 '{keyword}' 回复内容为空，不进行回复")
-                            return "EMPTY_REPLY"  # 返回特殊标记表示匹配到但不回复
+            keyword_data, is_item_match = match
+            keyword = keyword_data['keyword']
+            reply = keyword_data['reply']
+            keyword_type = keyword_data.get('type', 'text')
+            image_url = keyword_data.get('image_url')
+            scope = "商品ID" if is_item_match else "通用"
 
-                        # 进行变量替换
-                        try:
-                            formatted_reply = reply.format(
-                                send_user_name=send_user_name,
-                                send_user_id=send_user_id,
-                                send_message=send_message
-                            )
-                            logger.info(f"通用文本关键词回复: {formatted_reply}")
-                            return formatted_reply
-                        except Exception as format_error:
-                            logger.error(f"关键词回复变量替换失败: {self._safe_str(format_error)}")
-                            # 如果变量替换失败，返回原始内容
-                            return reply
-
-            logger.warning(f"未找到匹配的关键词: {send_message}")
-            return None
+            if is_item_match:
+                logger.info(f"商品ID关键词匹配成功: 商品{item_id} '{keyword}' (类型: {keyword_type})")
+            else:
+                logger.info(f"通用关键词匹配成功: '{keyword}' (类型: {keyword_type})")
+
+            # 根据关键词类型处理
+            if keyword_type == 'image' and image_url:
+                # 图片类型关键词，发送图片
+                return await self._handle_image_keyword(keyword, image_url, send_user_name, send_user_id, send_message)
+
+            # 文本类型关键词，检查回复内容是否为空
+            if not reply or (reply and reply.strip() == ''):
+                logger.info(f"{scope}关键词 '{keyword}' 回复内容为空，不进行回复")
+                return "EMPTY_REPLY"  # 返回特殊标记表示匹配到但不回复
+
+            # 进行变量替换
+            try:
+                formatted_reply = reply.format(
+                    send_user_name=send_user_name,
+                    send_user_id=send_user_id,
+                    send_message=send_message
+                )
+                logger.info(f"{scope}文本关键词回复: {formatted_reply}")
+                return formatted_reply
+            except Exception as format_error:
+                logger.error(f"关键词回复变量替换失败: {self._safe_str(format_error)}")
+                # 如果变量替换失败，返回原始内容
+                return reply
 
         except Exception as e:
             logger.error(f"获取关键词回复失败: {self._safe_str(e)}")
@@ -3666,21 +3408,18 @@ class XianyuLive:
                 if os.path.exists(local_image_path):
                     logger.info(f"准备上传本地图片到闲鱼CDN: {local_image_path}")
 
-                    # 使用图片上传器上传到闲鱼CDN
-                    from utils.image_uploader import ImageUploader
-                    uploader = ImageUploader(self.cookies_str)
-
-                    async with uploader:
-                        cdn_url = await uploader.upload_image(local_image_path)
-                        if cdn_url:
-                            logger.info(f"图片上传成功，CDN URL: {cdn_url}")
-                            # 更新数据库中的图片URL为CDN URL
-                            await self._update_keyword_image_url(keyword, cdn_url)
-                            image_url = cdn_url
-                        else:
-                            logger.error(f"图片上传失败: {local_image_path}")
-                            logger.error(f"❌ Cookie可能已失效！请检查配置并更新Cookie")
-                            return f"抱歉，图片发送失败（Cookie可能已失效，请检查日志）"
+                    # 上传到闲鱼CDN（同一图片只上传一次）
+                    uploaded = await self._upload_local_image(local_image_path)
+                    if uploaded:
+                        cdn_url = uploaded['url']
+                        logger.info(f"图片上传成功，CDN URL: {cdn_url}")
+                        # 更新数据库中的图片URL为CDN URL
+                        await self._update_keyword_image_url(keyword, cdn_url)
+                        image_url = cdn_url
+                    else:
+                        logger.error(f"图片上传失败: {local_image_path}")
+                        logger.error(f"❌ Cookie可能已失效！请检查配置并更新Cookie")
+                        return f"抱歉，图片发送失败（Cookie可能已失效，请检查日志）"
                 else:
                     logger.error(f"本地图片文件不存在: {local_image_path}")
                     return f"抱歉，图片文件不存在。"
@@ -3725,7 +3464,7 @@ class XianyuLive:
         return False
 
     async def _get_image_size_from_url(self, image_url: str) -> tuple:
-        """从URL获取图片尺寸
+        """从URL获取图片尺寸（先查缓存，否则只下载到能解析出尺寸的文件头）
         
         Args:
             image_url: 图片URL
@@ -3733,42 +3472,39 @@ class XianyuLive:
         Returns:
             (width, height) 元组，失败返回 (None, None)
         """
-        import aiohttp
-        from io import BytesIO
-        
+        from utils.image_cache import image_cache
+
         try:
             logger.info(f"【{self.cookie_id}】开始从URL获取图片尺寸: {image_url[:80]}...")
-            
-            # 不接受AVIF格式（PIL默认不支持），让CDN返回WEBP/JPEG等格式
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'image/jpeg,image/png,image/gif,image/webp,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://www.goofish.com/',
-            }
-            
             async with self._get_shared_session() as session:
-                async with session.get(image_url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status == 200:
-                        image_data = await response.read()
-                        from PIL import Image
-                        with Image.open(BytesIO(image_data)) as img:
-                            width, height = img.size
-                            logger.info(f"【{self.cookie_id}】解析图片尺寸成功: {width}x{height}")
-                            return (width, height)
-                    else:
-                        logger.warning(f"【{self.cookie_id}】下载图片失败，HTTP状态码: {response.status}")
+                width, height = await image_cache.get_remote_size(image_url, session)
+            if width and height:
+                logger.info(f"【{self.cookie_id}】解析图片尺寸成功: {width}x{height}")
+                return (width, height)
         except Exception as e:
             logger.warning(f"【{self.cookie_id}】从URL获取图片尺寸失败: {e}")
         
         return (None, None)
 
+    async def _upload_local_image(self, local_image_path: str) -> dict:
+        """上传本地图片到闲鱼CDN（按图片内容缓存，同一图片只上传一次）
+
+        Returns:
+            {'url', 'width', 'height'}，上传失败返回 None
+        """
+        from utils.image_cache import image_cache
+
+        async with self._get_shared_session() as session:
+            return await image_cache.upload_local_image(local_image_path, self.cookies_str, session=session)
+
     async def _update_keyword_image_url(self, keyword: str, new_image_url: str):
         """更新关键词的图片URL"""
         try:
             from db_manager import db_manager
             success = db_manager.update_keyword_image_url(self.cookie_id, keyword, new_image_url)
             if success:
+                from utils.keyword_matcher import keyword_matcher_cache
+                keyword_matcher_cache.invalidate(self.cookie_id)
                 logger.info(f"图片URL已更新: {keyword} -> {new_image_url}")
             else:
                 logger.warning(f"图片URL更新失败: {keyword}")
@@ -3839,7 +3575,7 @@ class XianyuLive:
 
             # 生成AI回复
             # 由于外部已实现防抖机制，跳过内部等待（skip_wait=True）
-            reply = ai_reply_engine.generate_reply(
+            reply = await ai_reply_engine.generate_reply(
                 message=send_message,
                 item_info=item_info,
                 chat_id=chat_id,
@@ -3873,11 +3609,9 @@ class XianyuLive:
             return 0.0
 
     async def send_notification(self, send_user_name: str, send_user_id: str, send_message: str, item_id: str = None, chat_id: str = None):
-        """发送消息通知"""
+        """发送消息通知（只做去重判断并提交到通知服务，由后台并发发送到各渠道）"""
         try:
-            from db_manager import db_manager
-            import aiohttp
-            import hashlib
+            from utils.notification_service import notification_service
 
             # 过滤系统默认消息，不发送通知
             system_messages = [
@@ -3889,44 +3623,14 @@ class XianyuLive:
                 logger.warning(f"📱 系统消息不发送通知: {send_message}")
                 return
 
-            # 生成通知的唯一标识（基于消息内容、chat_id、send_user_id）
-            # 用于防重复发送
-            notification_key = f"{chat_id or 'unknown'}_{send_user_id}_{send_message}"
-            notification_hash = hashlib.md5(notification_key.encode('utf-8')).hexdigest()
-            
-            # 使用异步锁保护防重复检查，确保并发安全
-            async with self.notification_lock:
-                # 检查是否在冷却时间内已发送过相同的通知
-                current_time = time.time()
-                if notification_hash in self.last_notification_time:
-                    time_since_last = current_time - self.last_notification_time[notification_hash]
-                    if time_since_last < self.notification_cooldown:
-                        remaining_seconds = int(self.notification_cooldown - time_since_last)
-                        logger.warning(f"📱 通知在冷却期内（剩余 {remaining_seconds} 秒），跳过重复发送 - 账号: {self.cookie_id}, 买家: {send_user_name}, 消息: {send_message[:30]}...")
-                        return
-                
-                # 更新通知发送时间
-                self.last_notification_time[notification_hash] = current_time
-                
-                # 清理过期的通知记录（超过1小时的记录）
-                expired_keys = [
-                    key for key, timestamp in self.last_notification_time.items()
-                    if current_time - timestamp > 3600  # 1小时
-                ]
-                for key in expired_keys:
-                    del self.last_notification_time[key]
-
-            logger.info(f"📱 开始发送消息通知 - 账号: {self.cookie_id}, 买家: {send_user_name}")
-
-            # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
-
-            if not notifications:
-                logger.warning(f"📱 账号 {self.cookie_id} 未配置消息通知，跳过通知发送")
+            # 基于消息内容、chat_id、send_user_id 防重复发送
+            notification_key = notification_service.message_key(
+                self.cookie_id, chat_id or 'unknown', send_user_id, send_message)
+            remaining_seconds = notification_service.check_cooldown(notification_key, self.notification_cooldown)
+            if remaining_seconds:
+                logger.warning(f"📱 通知在冷却期内（剩余 {int(remaining_seconds)} 秒），跳过重复发送 - 账号: {self.cookie_id}, 买家: {send_user_name}, 消息: {send_message[:30]}...")
                 return
 
-            logger.info(f"📱 找到 {len(notifications)} 个通知渠道配置")
-
             # 构建通知消息
             notification_msg = f"🚨 接收消息通知\n\n" \
                              f"账号: {self.cookie_id}\n" \
@@ -3936,768 +3640,113 @@ class XianyuLive:
                              f"消息内容: {send_message}\n" \
                              f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
 
-            # 发送通知到各个渠道
-            for i, notification in enumerate(notifications, 1):
-                logger.info(f"📱 处理第 {i} 个通知渠道: {notification.get('channel_name', 'Unknown')}")
-
-                if not notification.get('enabled', True):
-                    logger.warning(f"📱 通知渠道 {notification.get('channel_name')} 已禁用，跳过")
-                    continue
-
-                channel_type = notification.get('channel_type')
-                channel_config = notification.get('channel_config')
-
-                logger.info(f"📱 渠道类型: {channel_type}, 配置: {channel_config}")
-
-                try:
-                    # 解析配置数据
-                    config_data = self._parse_notification_config(channel_config)
-                    logger.info(f"📱 解析后的配置数据: {config_data}")
-
-                    match channel_type:
-                        case 'ding_talk' | 'dingtalk':
-                            logger.info(f"📱 开始发送钉钉通知...")
-                            await self._send_dingtalk_notification(config_data, notification_msg)
-                        case 'feishu' | 'lark':
-                            logger.info(f"📱 开始发送飞书通知...")
-                            await self._send_feishu_notification(config_data, notification_msg)
-                        case 'bark':
-                            logger.info(f"📱 开始发送Bark通知...")
-                            await self._send_bark_notification(config_data, notification_msg)
-                        case 'email':
-                            logger.info(f"📱 开始发送邮件通知...")
-                            await self._send_email_notification(config_data, notification_msg)
-                        case 'webhook':
-                            logger.info(f"📱 开始发送Webhook通知...")
-                            await self._send_webhook_notification(config_data, notification_msg)
-                        case 'wechat':
-                            logger.info(f"📱 开始发送微信通知...")
-                            await self._send_wechat_notification(config_data, notification_msg)
-                        case 'telegram':
-                            logger.info(f"📱 开始发送Telegram通知...")
-                            await self._send_telegram_notification(config_data, notification_msg)
-                        case _:
-                            logger.warning(f"📱 不支持的通知渠道类型: {channel_type}")
-
-                except Exception as notify_error:
-                    logger.error(f"📱 发送通知失败 ({notification.get('channel_name', 'Unknown')}): {self._safe_str(notify_error)}")
-                    import traceback
-                    logger.error(f"📱 详细错误信息: {traceback.format_exc()}")
+            notification_service.enqueue(self.cookie_id, notification_msg, title="消息通知")
 
         except Exception as e:
             logger.error(f"📱 处理消息通知失败: {self._safe_str(e)}")
-            import traceback
-            logger.error(f"📱 详细错误信息: {traceback.format_exc()}")
-
-    def _parse_notification_config(self, config: str) -> dict:
-        """解析通知配置数据"""
-        try:
-            import json
-            # 尝试解析JSON格式的配置
-            return json.loads(config)
-        except (json.JSONDecodeError, TypeError):
-            # 兼容旧格式（直接字符串）
-            return {"config": config}
-
 
-    async def _send_qq_notification(self, config_data: dict, message: str):
-        """
-        发送QQ通知（安全修复：仅支持本地服务）
-        
-        支持的本地服务类型：
-        - go-cqhttp: http://127.0.0.1:5700
-        - NapCat: http://127.0.0.1:3000
-        - Webhook: 任意自定义URL
+    async def send_token_refresh_notification(self, error_message: str, notification_type: str = "token_refresh", chat_id: str = None, attachment_path: str = None, verification_url: str = None):
+        """发送Token刷新异常通知（带防重复机制，支持附件）
         
-        配置格式：
-        {
-            "type": "go-cqhttp" | "napcat" | "webhook",
-            "api_url": "http://127.0.0.1:5700",
-            "qq_number": "目标QQ号",
-            "webhook_url": "可选，用于webhook类型"
-        }
+        Args:
+            error_message: 错误消息
+            notification_type: 通知类型
+            chat_id: 聊天ID（可选）
+            attachment_path: 附件路径（可选，用于发送截图）
         """
         try:
-            import aiohttp
-
-            logger.info(f"📱 QQ通知 - 开始处理配置数据")
-
-            # 获取通知类型和配置
-            notification_type = config_data.get('type', 'local')
-            api_url = config_data.get('api_url', '')
-            qq_number = config_data.get('qq_number') or config_data.get('config', '')
-            qq_number = qq_number.strip() if qq_number else ''
-
-            # 安全修复：拒绝外部服务器
-            if api_url and 'zhinianblog' in api_url.lower():
-                logger.warning("=" * 60)
-                logger.warning("⚠️ 外部QQ通知服务已禁用（安全修复）")
-                logger.warning("请配置本地QQ通知服务：")
-                logger.warning("  - go-cqhttp: https://docs.go-cqhttp.org/")
-                logger.warning("  - NapCat: https://napneko.github.io/")
-                logger.warning("=" * 60)
+            # 检查是否是正常的令牌过期，这种情况不需要发送通知
+            if self._is_normal_token_expiry(error_message):
+                logger.warning(f"检测到正常的令牌过期，跳过通知: {error_message}")
                 return
 
-            if not qq_number and notification_type != 'webhook':
-                logger.warning("📱 QQ通知 - QQ号码配置为空，无法发送通知")
-                return
+            from utils.notification_service import notification_service
 
-            # 默认本地API地址
-            if not api_url:
-                if notification_type == 'go-cqhttp':
-                    api_url = "http://127.0.0.1:5700"
-                elif notification_type == 'napcat':
-                    api_url = "http://127.0.0.1:3000"
-                else:
-                    logger.warning("📱 QQ通知 - 未配置API地址，请在通知渠道设置中配置")
-                    logger.warning("📱 支持：go-cqhttp (端口5700)、NapCat (端口3000)")
-                    return
+            # 为Token刷新异常通知使用特殊的3小时冷却时间
+            # 基于错误消息内容判断是否为Token相关异常
+            if self._is_token_related_error(error_message):
+                cooldown_time = self.token_refresh_notification_cooldown
+                cooldown_desc = "3小时"
+            else:
+                cooldown_time = self.notification_cooldown
+                cooldown_desc = f"{self.notification_cooldown // 60}分钟"
 
-            async with self._get_shared_session() as session:
-                if notification_type in ['go-cqhttp', 'napcat']:
-                    # OneBot协议（go-cqhttp / NapCat）
-                    endpoint = f"{api_url}/send_private_msg"
-                    payload = {
-                        "user_id": int(qq_number),
-                        "message": message
-                    }
-                    async with session.post(endpoint, json=payload, timeout=10) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            if result.get('status') == 'ok':
-                                logger.info(f"📱 QQ通知发送成功: {qq_number}")
-                            else:
-                                logger.warning(f"📱 QQ通知发送失败: {result}")
-                        else:
-                            logger.warning(f"📱 QQ通知发送失败: HTTP {response.status}")
-
-                elif notification_type == 'webhook':
-                    # 通用Webhook
-                    webhook_url = config_data.get('webhook_url') or api_url
-                    payload = {
-                        "qq": qq_number,
-                        "message": message
-                    }
-                    async with session.post(webhook_url, json=payload, timeout=10) as response:
-                        if response.status in [200, 201, 204]:
-                            logger.info(f"📱 Webhook通知发送成功")
-                        else:
-                            logger.warning(f"📱 Webhook通知发送失败: HTTP {response.status}")
+            # 检查是否在冷却期内（同一账号同一通知类型）；只有发送成功才进入冷却期
+            cooldown_key = f"{self.cookie_id}:{notification_type}"
+            remaining_time = notification_service.reserve_cooldown(cooldown_key)
+            if remaining_time:
+                remaining_hours = int(remaining_time // 3600)
+                remaining_minutes = int((remaining_time % 3600) // 60)
+                remaining_seconds = int(remaining_time % 60)
 
+                if remaining_hours > 0:
+                    time_desc = f"{remaining_hours}小时{remaining_minutes}分钟"
+                elif remaining_minutes > 0:
+                    time_desc = f"{remaining_minutes}分钟{remaining_seconds}秒"
                 else:
-                    logger.warning(f"📱 不支持的通知类型: {notification_type}")
-                    logger.warning("📱 支持的类型: go-cqhttp, napcat, webhook")
-
-        except Exception as e:
-            logger.error(f"📱 发送QQ通知异常: {self._safe_str(e)}")
-            import traceback
-            logger.error(f"📱 QQ通知异常详情: {traceback.format_exc()}")
+                    time_desc = f"{remaining_seconds}秒"
 
-    async def _send_dingtalk_notification(self, config_data: dict, message: str):
-        """发送钉钉通知"""
-        try:
-            import aiohttp
-            import json
-            import hmac
-            import hashlib
-            import base64
-            import time
-
-            # 解析配置
-            webhook_url = config_data.get('webhook_url') or config_data.get('config', '')
-            secret = config_data.get('secret', '')
-
-            webhook_url = webhook_url.strip() if webhook_url else ''
-            if not webhook_url:
-                logger.warning("钉钉通知配置为空")
+                logger.warning(f"Token刷新通知在冷却期内，跳过发送: {notification_type} (还需等待 {time_desc})")
                 return
 
-            # 如果有加签密钥，生成签名
-            if secret:
-                timestamp = str(round(time.time() * 1000))
-                secret_enc = secret.encode('utf-8')
-                string_to_sign = f'{timestamp}\n{secret}'
-                string_to_sign_enc = string_to_sign.encode('utf-8')
-                hmac_code = hmac.new(secret_enc, string_to_sign_enc, digestmod=hashlib.sha256).digest()
-                sign = base64.b64encode(hmac_code).decode('utf-8')
-                webhook_url += f'&timestamp={timestamp}&sign={sign}'
+            # 构造通知消息
+            # 判断异常信息中是否包含"滑块验证成功"
+            if "滑块验证成功" in error_message:
+                notification_msg = f"{error_message}\n\n" \
+                                  f"账号: {self.cookie_id}\n" \
+                                  f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            elif verification_url:
+                # 如果有验证链接，添加到消息中
+                notification_msg = f"{error_message}\n\n" \
+                                  f"账号: {self.cookie_id}\n" \
+                                  f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n" \
+                                  f"验证链接: {verification_url}\n"
+            else:
+                notification_msg = f"Token刷新异常\n\n" \
+                                  f"账号ID: {self.cookie_id}\n" \
+                                  f"异常时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n" \
+                                  f"异常信息: {error_message}\n\n" \
+                                  f"请检查账号Cookie是否过期，如有需要请及时更新Cookie配置。\n"
 
-            data = {
-                "msgtype": "markdown",
-                "markdown": {
-                    "title": "闲鱼自动回复通知",
-                    "text": message
-                }
-            }
+            def _on_done(delivered: bool):
+                notification_service.finish_cooldown(cooldown_key, cooldown_time, delivered)
+                if delivered:
+                    next_send_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() + cooldown_time))
+                    logger.info(f"Token刷新通知已发送: {self.cookie_id}，下次可发送时间: {next_send_time_str} (冷却时间: {cooldown_desc})")
 
-            async with self._get_shared_session() as session:
-                async with session.post(webhook_url, json=data, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info(f"钉钉通知发送成功")
-                    else:
-                        logger.warning(f"钉钉通知发送失败: {response.status}")
+            # 邮件渠道支持附件
+            notification_service.enqueue(self.cookie_id, notification_msg, title="Token刷新异常通知",
+                                         attachment_path=attachment_path, on_done=_on_done)
+            logger.info(f"Token刷新通知已提交: {self.cookie_id}")
 
         except Exception as e:
-            logger.error(f"发送钉钉通知异常: {self._safe_str(e)}")
-
-    async def _send_feishu_notification(self, config_data: dict, message: str):
-        """发送飞书通知"""
-        try:
-            import aiohttp
-            import json
-            import hmac
-            import hashlib
-            import base64
-
-            logger.info(f"📱 飞书通知 - 开始处理配置数据: {config_data}")
-
-            # 解析配置
-            webhook_url = config_data.get('webhook_url', '')
-            secret = config_data.get('secret', '')
-
-            logger.info(f"📱 飞书通知 - Webhook URL: {webhook_url[:50]}...")
-            logger.info(f"📱 飞书通知 - 是否有签名密钥: {'是' if secret else '否'}")
-
-            if not webhook_url:
-                logger.warning("📱 飞书通知 - Webhook URL配置为空，无法发送通知")
-                return
-
-            # 如果有加签密钥，生成签名
-            timestamp = str(int(time.time()))
-            sign = ""
-
-            if secret:
-                string_to_sign = f'{timestamp}\n{secret}'
-                hmac_code = hmac.new(
-                    string_to_sign.encode('utf-8'),
-                    ''.encode('utf-8'),
-                    digestmod=hashlib.sha256
-                ).digest()
-                sign = base64.b64encode(hmac_code).decode('utf-8')
-                logger.info(f"📱 飞书通知 - 已生成签名")
-
-            # 构建请求数据
-            data = {
-                "msg_type": "text",
-                "content": {
-                    "text": message
-                },
-                "timestamp": timestamp
-            }
-
-            # 如果有签名，添加到请求数据中
-            if sign:
-                data["sign"] = sign
-
-            logger.info(f"📱 飞书通知 - 请求数据构建完成")
+            logger.error(f"处理Token刷新通知失败: {self._safe_str(e)}")
 
-            # 发送POST请求
-            async with self._get_shared_session() as session:
-                async with session.post(webhook_url, json=data, timeout=10) as response:
-                    response_text = await response.text()
-                    logger.info(f"📱 飞书通知 - 响应状态: {response.status}")
-                    logger.info(f"📱 飞书通知 - 响应内容: {response_text}")
+    def _is_normal_token_expiry(self, error_message: str) -> bool:
+        """检查是否是正常的令牌过期或其他不需要通知的情况"""
+        # 不需要发送通知的关键词
+        no_notification_keywords = [
+            # 正常的令牌过期
+            'FAIL_SYS_TOKEN_EXOIRED::令牌过期',
+            'FAIL_SYS_TOKEN_EXPIRED::令牌过期',
+            'FAIL_SYS_TOKEN_EXOIRED',
+            'FAIL_SYS_TOKEN_EXPIRED',
+            '令牌过期',
+            # Session过期（正常情况）
+            'FAIL_SYS_SESSION_EXPIRED::Session过期',
+            'FAIL_SYS_SESSION_EXPIRED',
+            'Session过期',
+            # Token定时刷新失败（会自动重试）
+            'Token定时刷新失败，将自动重试',
+            'Token定时刷新失败'
+        ]
 
-                    if response.status == 200:
-                        try:
-                            response_json = json.loads(response_text)
-                            if response_json.get('code') == 0:
-                                logger.info(f"📱 飞书通知发送成功")
-                            else:
-                                logger.warning(f"📱 飞书通知发送失败: {response_json.get('msg', '未知错误')}")
-                        except json.JSONDecodeError:
-                            logger.info(f"📱 飞书通知发送成功（响应格式异常）")
-                    else:
-                        logger.warning(f"📱 飞书通知发送失败: HTTP {response.status}, 响应: {response_text}")
+        # 检查错误消息是否包含不需要通知的关键词
+        for keyword in no_notification_keywords:
+            if keyword in error_message:
+                return True
 
-        except Exception as e:
-            logger.error(f"📱 发送飞书通知异常: {self._safe_str(e)}")
-            import traceback
-            logger.error(f"📱 飞书通知异常详情: {traceback.format_exc()}")
-
-    async def _send_bark_notification(self, config_data: dict, message: str):
-        """发送Bark通知"""
-        try:
-            import aiohttp
-            import json
-            from urllib.parse import quote
-
-            logger.info(f"📱 Bark通知 - 开始处理配置数据: {config_data}")
-
-            # 解析配置
-            server_url = config_data.get('server_url', 'https://api.day.app').rstrip('/')
-            device_key = config_data.get('device_key', '')
-            title = config_data.get('title', '闲鱼自动回复通知')
-            sound = config_data.get('sound', 'default')
-            icon = config_data.get('icon', '')
-            group = config_data.get('group', 'xianyu')
-            url = config_data.get('url', '')
-
-            logger.info(f"📱 Bark通知 - 服务器: {server_url}")
-            logger.info(f"📱 Bark通知 - 设备密钥: {device_key[:10]}..." if device_key else "📱 Bark通知 - 设备密钥: 未设置")
-            logger.info(f"📱 Bark通知 - 标题: {title}")
-
-            if not device_key:
-                logger.warning("📱 Bark通知 - 设备密钥配置为空，无法发送通知")
-                return
-
-            # 构建请求URL和数据
-            # Bark支持两种方式：URL路径方式和POST JSON方式
-            # 这里使用POST JSON方式，更灵活且支持更多参数
-
-            api_url = f"{server_url}/push"
-
-            # 构建请求数据
-            data = {
-                "device_key": device_key,
-                "title": title,
-                "body": message,
-                "sound": sound,
-                "group": group
-            }
-
-            # 可选参数
-            if icon:
-                data["icon"] = icon
-            if url:
-                data["url"] = url
-
-            logger.info(f"📱 Bark通知 - API地址: {api_url}")
-            logger.info(f"📱 Bark通知 - 请求数据构建完成")
-
-            # 发送POST请求
-            async with self._get_shared_session() as session:
-                async with session.post(api_url, json=data, timeout=10) as response:
-                    response_text = await response.text()
-                    logger.info(f"📱 Bark通知 - 响应状态: {response.status}")
-                    logger.info(f"📱 Bark通知 - 响应内容: {response_text}")
-
-                    if response.status == 200:
-                        try:
-                            response_json = json.loads(response_text)
-                            if response_json.get('code') == 200:
-                                logger.info(f"📱 Bark通知发送成功")
-                            else:
-                                logger.warning(f"📱 Bark通知发送失败: {response_json.get('message', '未知错误')}")
-                        except json.JSONDecodeError:
-                            # 某些Bark服务器可能返回纯文本
-                            if 'success' in response_text.lower() or 'ok' in response_text.lower():
-                                logger.info(f"📱 Bark通知发送成功")
-                            else:
-                                logger.warning(f"📱 Bark通知响应格式异常: {response_text}")
-                    else:
-                        logger.warning(f"📱 Bark通知发送失败: HTTP {response.status}, 响应: {response_text}")
-
-        except Exception as e:
-            logger.error(f"📱 发送Bark通知异常: {self._safe_str(e)}")
-            import traceback
-            logger.error(f"📱 Bark通知异常详情: {traceback.format_exc()}")
-
-    async def _send_email_notification(self, config_data: dict, message: str, attachment_path: str = None):
-        """发送邮件通知（支持附件）
-        
-        Args:
-            config_data: 邮件配置
-            message: 邮件正文
-            attachment_path: 附件文件路径（可选）
-        """
-        try:
-            import smtplib
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.image import MIMEImage
-            import os
-
-            # 解析配置
-            smtp_server = config_data.get('smtp_server', '')
-            smtp_port = int(config_data.get('smtp_port', 587))
-            email_user = config_data.get('email_user', '')
-            email_password = config_data.get('email_password', '')
-            recipient_email = config_data.get('recipient_email', '')
-            smtp_use_tls = config_data.get('smtp_use_tls', smtp_port == 587)  # 修复：添加变量定义
-
-            if not all([smtp_server, email_user, email_password, recipient_email]):
-                logger.warning("邮件通知配置不完整")
-                return
-
-            # 创建邮件
-            msg = MIMEMultipart()
-            msg['From'] = email_user
-            msg['To'] = recipient_email
-            msg['Subject'] = "闲鱼自动回复通知"
-
-            # 添加邮件正文
-            msg.attach(MIMEText(message, 'plain', 'utf-8'))
-
-            # 添加附件（如果有）
-            if attachment_path and os.path.exists(attachment_path):
-                try:
-                    with open(attachment_path, 'rb') as f:
-                        img_data = f.read()
-                    
-                    # 根据文件扩展名判断MIME类型
-                    filename = os.path.basename(attachment_path)
-                    if attachment_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                        img = MIMEImage(img_data)
-                        img.add_header('Content-Disposition', 'attachment', filename=filename)
-                        msg.attach(img)
-                        logger.info(f"已添加图片附件: {filename}")
-                    else:
-                        from email.mime.application import MIMEApplication
-                        attach = MIMEApplication(img_data)
-                        attach.add_header('Content-Disposition', 'attachment', filename=filename)
-                        msg.attach(attach)
-                        logger.info(f"已添加附件: {filename}")
-                except Exception as attach_error:
-                    logger.error(f"添加邮件附件失败: {self._safe_str(attach_error)}")
-
-            # 发送邮件
-            server = None
-            try:
-                if smtp_port == 465:
-                    # 使用SSL连接（端口465）
-                    server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=30)
-                else:
-                    # 使用普通连接，然后升级到TLS（端口587）
-                    server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
-                    if smtp_use_tls:
-                        server.starttls()
-                
-                # 尝试登录
-                try:
-                    server.login(email_user, email_password)
-                except smtplib.SMTPAuthenticationError as auth_error:
-                    error_code = auth_error.smtp_code if hasattr(auth_error, 'smtp_code') else None
-                    error_msg = str(auth_error)
-                    
-                    # 提供详细的错误提示
-                    logger.error(f"邮件SMTP认证失败 (错误码: {error_code})")
-                    logger.error(f"邮箱地址: {email_user}")
-                    logger.error(f"SMTP服务器: {smtp_server}:{smtp_port}")
-                    logger.error(f"错误详情: {error_msg}")
-                    
-                    # 根据常见错误提供解决建议
-                    suggestions = []
-                    if 'qq.com' in email_user.lower() or 'qq' in smtp_server.lower():
-                        suggestions.append("QQ邮箱需要使用授权码而不是登录密码")
-                        suggestions.append("请到QQ邮箱设置 -> 账户 -> 开启SMTP服务 -> 生成授权码")
-                    elif 'gmail.com' in email_user.lower() or 'gmail' in smtp_server.lower():
-                        suggestions.append("Gmail需要使用应用专用密码")
-                        suggestions.append("请到Google账户 -> 安全性 -> 两步验证 -> 应用专用密码")
-                        suggestions.append("或启用'允许不够安全的应用访问'（不推荐）")
-                    elif '163.com' in email_user.lower() or '126.com' in email_user.lower() or 'yeah.net' in email_user.lower():
-                        suggestions.append("网易邮箱需要使用授权码")
-                        suggestions.append("请到邮箱设置 -> POP3/SMTP/IMAP -> 开启SMTP服务 -> 生成授权码")
-                    else:
-                        suggestions.append("请检查邮箱密码/授权码是否正确")
-                        suggestions.append("某些邮箱服务商需要使用授权码而不是登录密码")
-                        suggestions.append("请查看邮箱服务商的SMTP设置说明")
-                    
-                    if suggestions:
-                        logger.error("解决建议:")
-                        for i, suggestion in enumerate(suggestions, 1):
-                            logger.error(f"  {i}. {suggestion}")
-                    
-                    raise  # 重新抛出异常
-                
-                server.send_message(msg)
-                logger.info(f"邮件通知发送成功: {recipient_email}")
-
-            finally:
-                # 确保关闭连接
-                if server:
-                    try:
-                        server.quit()
-                    except:
-                        try:
-                            server.close()
-                        except:
-                            pass
-
-        except smtplib.SMTPAuthenticationError:
-            # 认证错误已在上面处理，这里不再重复记录
-            pass
-        except smtplib.SMTPException as smtp_error:
-            logger.error(f"SMTP协议错误: {self._safe_str(smtp_error)}")
-            logger.error(f"SMTP服务器: {smtp_server}:{smtp_port}")
-            logger.error(f"请检查SMTP服务器地址和端口配置是否正确")
-        except Exception as e:
-            logger.error(f"发送邮件通知异常: {self._safe_str(e)}")
-            import traceback
-            logger.error(f"邮件发送详细错误: {traceback.format_exc()}")
-
-    async def _send_webhook_notification(self, config_data: dict, message: str):
-        """发送Webhook通知"""
-        try:
-            import aiohttp
-            import json
-
-            # 解析配置
-            webhook_url = config_data.get('webhook_url', '')
-            http_method = config_data.get('http_method', 'POST').upper()
-            headers_str = config_data.get('headers', '{}')
-
-            if not webhook_url:
-                logger.warning("Webhook通知配置为空")
-                return
-
-            # 解析自定义请求头
-            try:
-                custom_headers = json.loads(headers_str) if headers_str else {}
-            except json.JSONDecodeError:
-                custom_headers = {}
-
-            # 设置默认请求头
-            headers = {'Content-Type': 'application/json'}
-            headers.update(custom_headers)
-
-            # 构建请求数据
-            data = {
-                'message': message,
-                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'source': 'xianyu-auto-reply'
-            }
-
-            async with self._get_shared_session() as session:
-                if http_method == 'POST':
-                    async with session.post(webhook_url, json=data, headers=headers, timeout=10) as response:
-                        if response.status == 200:
-                            logger.info(f"Webhook通知发送成功")
-                        else:
-                            logger.warning(f"Webhook通知发送失败: {response.status}")
-                elif http_method == 'PUT':
-                    async with session.put(webhook_url, json=data, headers=headers, timeout=10) as response:
-                        if response.status == 200:
-                            logger.info(f"Webhook通知发送成功")
-                        else:
-                            logger.warning(f"Webhook通知发送失败: {response.status}")
-                else:
-                    logger.warning(f"不支持的HTTP方法: {http_method}")
-
-        except Exception as e:
-            logger.error(f"发送Webhook通知异常: {self._safe_str(e)}")
-
-    async def _send_wechat_notification(self, config_data: dict, message: str):
-        """发送微信通知"""
-        try:
-            import aiohttp
-            import json
-
-            # 解析配置
-            webhook_url = config_data.get('webhook_url', '')
-
-            if not webhook_url:
-                logger.warning("微信通知配置为空")
-                return
-
-            data = {
-                "msgtype": "text",
-                "text": {
-                    "content": message
-                }
-            }
-
-            async with self._get_shared_session() as session:
-                async with session.post(webhook_url, json=data, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info(f"微信通知发送成功")
-                    else:
-                        logger.warning(f"微信通知发送失败: {response.status}")
-
-        except Exception as e:
-            logger.error(f"发送微信通知异常: {self._safe_str(e)}")
-
-    async def _send_telegram_notification(self, config_data: dict, message: str):
-        """发送Telegram通知"""
-        try:
-            import aiohttp
-
-            # 解析配置
-            bot_token = config_data.get('bot_token', '')
-            chat_id = config_data.get('chat_id', '')
-
-            if not all([bot_token, chat_id]):
-                logger.warning("Telegram通知配置不完整")
-                return
-
-            # 构建API URL
-            api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
-            data = {
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-
-            async with self._get_shared_session() as session:
-                async with session.post(api_url, json=data, timeout=10) as response:
-                    if response.status == 200:
-                        logger.info(f"Telegram通知发送成功")
-                    else:
-                        logger.warning(f"Telegram通知发送失败: {response.status}")
-
-        except Exception as e:
-            logger.error(f"发送Telegram通知异常: {self._safe_str(e)}")
-
-    async def send_token_refresh_notification(self, error_message: str, notification_type: str = "token_refresh", chat_id: str = None, attachment_path: str = None, verification_url: str = None):
-        """发送Token刷新异常通知（带防重复机制，支持附件）
-        
-        Args:
-            error_message: 错误消息
-            notification_type: 通知类型
-            chat_id: 聊天ID（可选）
-            attachment_path: 附件路径（可选，用于发送截图）
-        """
-        try:
-            # 检查是否是正常的令牌过期，这种情况不需要发送通知
-            if self._is_normal_token_expiry(error_message):
-                logger.warning(f"检测到正常的令牌过期，跳过通知: {error_message}")
-                return
-
-            # 检查是否在冷却期内
-            current_time = time.time()
-            last_time = self.last_notification_time.get(notification_type, 0)
-
-            # 为Token刷新异常通知使用特殊的3小时冷却时间
-            # 基于错误消息内容判断是否为Token相关异常
-            if self._is_token_related_error(error_message):
-                cooldown_time = self.token_refresh_notification_cooldown
-                cooldown_desc = "3小时"
-            else:
-                cooldown_time = self.notification_cooldown
-                cooldown_desc = f"{self.notification_cooldown // 60}分钟"
-
-            if current_time - last_time < cooldown_time:
-                remaining_time = cooldown_time - (current_time - last_time)
-                remaining_hours = int(remaining_time // 3600)
-                remaining_minutes = int((remaining_time % 3600) // 60)
-                remaining_seconds = int(remaining_time % 60)
-
-                if remaining_hours > 0:
-                    time_desc = f"{remaining_hours}小时{remaining_minutes}分钟"
-                elif remaining_minutes > 0:
-                    time_desc = f"{remaining_minutes}分钟{remaining_seconds}秒"
-                else:
-                    time_desc = f"{remaining_seconds}秒"
-
-                logger.warning(f"Token刷新通知在冷却期内，跳过发送: {notification_type} (还需等待 {time_desc})")
-                return
-
-            from db_manager import db_manager
-
-            # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
-
-            if not notifications:
-                logger.warning("未配置消息通知，跳过Token刷新通知")
-                return
-
-            # 构造通知消息
-            # 判断异常信息中是否包含"滑块验证成功"
-            if "滑块验证成功" in error_message:
-                notification_msg = f"{error_message}\n\n" \
-                                  f"账号: {self.cookie_id}\n" \
-                                  f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            elif verification_url:
-                # 如果有验证链接，添加到消息中
-                notification_msg = f"{error_message}\n\n" \
-                                  f"账号: {self.cookie_id}\n" \
-                                  f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n" \
-                                  f"验证链接: {verification_url}\n"
-            else:
-                notification_msg = f"Token刷新异常\n\n" \
-                                  f"账号ID: {self.cookie_id}\n" \
-                                  f"异常时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n" \
-                                  f"异常信息: {error_message}\n\n" \
-                                  f"请检查账号Cookie是否过期，如有需要请及时更新Cookie配置。\n"
-
-            logger.info(f"准备发送Token刷新异常通知: {self.cookie_id}")
-
-            # 发送通知到各个渠道
-            notification_sent = False
-            for notification in notifications:
-                if not notification.get('enabled', True):
-                    continue
-
-                channel_type = notification.get('channel_type')
-                channel_config = notification.get('channel_config')
-
-                try:
-                    # 解析配置数据
-                    config_data = self._parse_notification_config(channel_config)
-
-                    match channel_type:
-                        case 'ding_talk' | 'dingtalk':
-                            await self._send_dingtalk_notification(config_data, notification_msg)
-                            notification_sent = True
-                        case 'feishu' | 'lark':
-                            await self._send_feishu_notification(config_data, notification_msg)
-                            notification_sent = True
-                        case 'bark':
-                            await self._send_bark_notification(config_data, notification_msg)
-                            notification_sent = True
-                        case 'email':
-                            # 邮件支持附件
-                            await self._send_email_notification(config_data, notification_msg, attachment_path)
-                            notification_sent = True
-                        case 'webhook':
-                            await self._send_webhook_notification(config_data, notification_msg)
-                            notification_sent = True
-                        case 'wechat':
-                            await self._send_wechat_notification(config_data, notification_msg)
-                            notification_sent = True
-                        case 'telegram':
-                            await self._send_telegram_notification(config_data, notification_msg)
-                            notification_sent = True
-                        case _:
-                            logger.warning(f"不支持的通知渠道类型: {channel_type}")
-
-                except Exception as notify_error:
-                    logger.error(f"发送Token刷新通知失败 ({notification.get('channel_name', 'Unknown')}): {self._safe_str(notify_error)}")
-
-            # 如果成功发送了通知，更新最后发送时间
-            if notification_sent:
-                self.last_notification_time[notification_type] = current_time
-
-                # 根据错误消息内容使用不同的冷却时间
-                if self._is_token_related_error(error_message):
-                    next_send_time = current_time + self.token_refresh_notification_cooldown
-                    cooldown_desc = "3小时"
-                else:
-                    next_send_time = current_time + self.notification_cooldown
-                    cooldown_desc = f"{self.notification_cooldown // 60}分钟"
-
-                next_send_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_send_time))
-                logger.info(f"Token刷新通知已发送，下次可发送时间: {next_send_time_str} (冷却时间: {cooldown_desc})")
-
-        except Exception as e:
-            logger.error(f"处理Token刷新通知失败: {self._safe_str(e)}")
-
-    def _is_normal_token_expiry(self, error_message: str) -> bool:
-        """检查是否是正常的令牌过期或其他不需要通知的情况"""
-        # 不需要发送通知的关键词
-        no_notification_keywords = [
-            # 正常的令牌过期
-            'FAIL_SYS_TOKEN_EXOIRED::令牌过期',
-            'FAIL_SYS_TOKEN_EXPIRED::令牌过期',
-            'FAIL_SYS_TOKEN_EXOIRED',
-            'FAIL_SYS_TOKEN_EXPIRED',
-            '令牌过期',
-            # Session过期（正常情况）
-            'FAIL_SYS_SESSION_EXPIRED::Session过期',
-            'FAIL_SYS_SESSION_EXPIRED',
-            'Session过期',
-            # Token定时刷新失败（会自动重试）
-            'Token定时刷新失败，将自动重试',
-            'Token定时刷新失败'
-        ]
-
-        # 检查错误消息是否包含不需要通知的关键词
-        for keyword in no_notification_keywords:
-            if keyword in error_message:
-                return True
-
-        return False
+        return False
 
     def _is_token_related_error(self, error_message: str) -> bool:
         """检查是否是Token相关的错误，需要使用3小时冷却时间"""
@@ -4746,16 +3795,9 @@ class XianyuLive:
         return False
 
     async def send_delivery_failure_notification(self, send_user_name: str, send_user_id: str, item_id: str, error_message: str, chat_id: str = None):
-        """发送自动发货失败通知"""
+        """发送自动发货通知（提交到通知服务）"""
         try:
-            from db_manager import db_manager
-
-            # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
-
-            if not notifications:
-                logger.warning("未配置消息通知，跳过自动发货通知")
-                return
+            from utils.notification_service import notification_service
 
             # 构造通知消息
             notification_message = f"🚨 自动发货通知\n\n" \
@@ -4767,43 +3809,7 @@ class XianyuLive:
                                  f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n" \
                                  f"请及时处理！"
 
-            # 发送通知到所有已启用的通知渠道
-            for notification in notifications:
-                if notification.get('enabled', False):
-                    channel_type = notification.get('channel_type', 'qq')
-                    channel_config = notification.get('channel_config', '')
-
-                    try:
-                        # 解析配置数据
-                        config_data = self._parse_notification_config(channel_config)
-
-                        match channel_type:
-                            case 'ding_talk' | 'dingtalk':
-                                await self._send_dingtalk_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到钉钉")
-                            case 'email':
-                                await self._send_email_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到邮箱")
-                            case 'webhook':
-                                await self._send_webhook_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到Webhook")
-                            case 'wechat':
-                                await self._send_wechat_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到微信")
-                            case 'telegram':
-                                await self._send_telegram_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到Telegram")
-                            case 'bark':
-                                await self._send_bark_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到Bark")
-                            case 'feishu' | 'lark':
-                                await self._send_feishu_notification(config_data, notification_message)
-                                logger.info(f"已发送自动发货通知到飞书")
-                            case _:
-                                logger.warning(f"不支持的通知渠道类型: {channel_type}")
-
-                    except Exception as notify_error:
-                        logger.error(f"发送自动发货通知失败: {self._safe_str(notify_error)}")
+            notification_service.enqueue(self.cookie_id, notification_message, title="自动发货通知")
 
         except Exception as e:
             logger.error(f"发送自动发货通知异常: {self._safe_str(e)}")
@@ -5099,7 +4105,7 @@ class XianyuLive:
                     if not headless_mode:
                         logger.info(f"【{self.cookie_id}】🖥️ 启用有头模式进行调试")
 
-                    browser_result = await fetch_order_detail_simple(order_id, cookie_string, headless=headless_mode)
+                    browser_result = await fetch_order_detail_simple(order_id, cookie_string, headless=headless_mode, cookie_id=self.cookie_id)
 
                     if browser_result:
                         logger.info(f"【{self.cookie_id}】订单详情浏览器获取成功: {order_id}")
@@ -5319,13 +4325,13 @@ class XianyuLive:
             # 回退：关键词匹配（关联表无结果时）
             if not delivery_rules:
                 logger.info(f"关联表无匹配，回退到关键词匹配: {search_text[:50]}...")
+                from utils.delivery_rule_matcher import delivery_rule_cache
 
                 if is_multi_spec:
                     # 多规格商品：只匹配多规格发货规则
                     if spec_name and spec_value:
                         logger.info(f"多规格商品，尝试匹配多规格发货规则: {search_text[:50]}... [{spec_name}:{spec_value}], user_id={user_id}")
-                        delivery_rules = db_manager.get_delivery_rules_by_keyword_and_spec(search_text, spec_name, spec_value, user_id=user_id)
-                        delivery_rules = [r for r in delivery_rules if r.get('is_multi_spec')]
+                        delivery_rules = await delivery_rule_cache.match(search_text, spec_name, spec_value, user_id=user_id)
 
                         if delivery_rules:
                             logger.info(f"✅ 找到匹配的多规格发货规则: {len(delivery_rules)}个")
@@ -5338,8 +4344,7 @@ class XianyuLive:
                 else:
                     # 非多规格商品：只匹配非多规格发货规则
                     logger.info(f"非多规格商品，尝试匹配普通发货规则: {search_text[:50]}..., user_id={user_id}")
-                    delivery_rules = db_manager.get_delivery_rules_by_keyword(search_text, user_id=user_id)
-                    delivery_rules = [r for r in delivery_rules if not r.get('is_multi_spec')]
+                    delivery_rules = await delivery_rule_cache.match(search_text, user_id=user_id)
 
                     if delivery_rules:
                         logger.info(f"✅ 找到匹配的普通发货规则: {len(delivery_rules)}个")
@@ -5466,8 +4471,8 @@ class XianyuLive:
                     delivery_content = rule['text_content']
 
                 elif rule['card_type'] == 'data':
-                    # 批量数据类型：获取并消费第一条数据
-                    delivery_content = db_manager.consume_batch_data(rule['card_id'])
+                    # 批量数据类型：原子领取下一条卡密并记录订单号
+                    delivery_content = await db_manager.claim_card_stock_async(rule['card_id'], order_id)
 
                 elif rule['card_type'] == 'image':
                     # 图片类型：返回图片发送标记，包含卡券ID
@@ -6023,7 +5028,7 @@ class XianyuLive:
         try:
             await asyncio.wait_for(ws.send(json.dumps(msg)), timeout=2.0)
             self.last_heartbeat_time = time.time()
-            logger.warning(f"【{self.cookie_id}】心跳包已发送")
+            hot_log("heartbeat", self.cookie_id, "WARNING", "【{}】心跳包已发送", self.cookie_id)
         except asyncio.TimeoutError:
             raise ConnectionError("心跳发送超时，WebSocket可能已断开")
         except asyncio.CancelledError:
@@ -6092,14 +5097,14 @@ class XianyuLive:
                 if has_body or has_sid:
                     return False  # 这是注册响应，不是心跳
                 self.last_heartbeat_response = time.time()
-                logger.warning("心跳响应正常")
+                hot_log("heartbeat", self.cookie_id, "WARNING", "【{}】心跳响应正常", self.cookie_id)
                 return True
         except Exception as e:
             logger.error(f"处理心跳响应出错: {self._safe_str(e)}")
         return False
 
     async def pause_cleanup_loop(self):
-        """定期清理过期的暂停记录、锁和缓存"""
+        """定期清理本实例的过期锁和缓存"""
         try:
             while True:
                 try:
@@ -6109,84 +5114,16 @@ class XianyuLive:
                         logger.info(f"【{self.cookie_id}】账号已禁用，停止清理循环")
                         break
 
-                    # 清理过期的暂停记录
-                    pause_manager.cleanup_expired_pauses()
-                    await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
-
                     # 清理过期的锁（每5分钟清理一次，保留2小时内的锁，防止内存泄漏）
                     self.cleanup_expired_locks(max_age_hours=2)
                     await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
 
-                    # 清理过期的商品详情缓存
-                    try:
-                        cleaned_count = await self._cleanup_item_cache()
-                        if cleaned_count > 0:
-                            logger.info(f"【{self.cookie_id}】清理了 {cleaned_count} 个过期的商品详情缓存")
-                    except asyncio.CancelledError:
-                        raise
-                    except Exception as cache_clean_e:
-                        logger.warning(f"【{self.cookie_id}】清理商品详情缓存时出错: {cache_clean_e}")
-
                     # 清理过期的通知、发货和订单确认记录（防止内存泄漏）
                     self._cleanup_instance_caches()
                     await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
 
-                    # 清理QR登录过期会话（每5分钟检查一次）
-                    try:
-                        from utils.qr_login import qr_login_manager
-                        qr_login_manager.cleanup_expired_sessions()
-                        await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
-                    except asyncio.CancelledError:
-                        raise
-                    except Exception as qr_clean_e:
-                        logger.warning(f"【{self.cookie_id}】清理QR登录会话时出错: {qr_clean_e}")
-                    
-                    # 清理Playwright浏览器临时文件和缓存（每5分钟检查一次）
-                    try:
-                        await self._cleanup_playwright_cache()
-                    except asyncio.CancelledError:
-                        raise
-                    except Exception as pw_clean_e:
-                        logger.warning(f"【{self.cookie_id}】清理Playwright缓存时出错: {pw_clean_e}")
-                    
-                    # 清理过期的日志文件（每5分钟检查一次，保留7天）
-                    try:
-                        cleaned_logs = await self._cleanup_old_logs(retention_days=7)
-                        await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
-                    except asyncio.CancelledError:
-                        raise
-                    except Exception as log_clean_e:
-                        logger.warning(f"【{self.cookie_id}】清理日志文件时出错: {log_clean_e}")
-                    
-                    # 清理数据库历史数据（每天一次，保留90天数据）
-                    # 为避免所有实例同时执行，只让第一个实例执行
-                    try:
-                        if hasattr(self.__class__, '_last_db_cleanup_time'):
-                            last_cleanup = self.__class__._last_db_cleanup_time
-                        else:
-                            self.__class__._last_db_cleanup_time = 0
-                            last_cleanup = 0
-                        
-                        current_time = time.time()
-                        # 每24小时清理一次
-                        if current_time - last_cleanup > 86400:
-                            logger.info(f"【{self.cookie_id}】开始执行数据库历史数据清理...")
-                            # 数据库清理可能很耗时，使用线程池执行，避免阻塞事件循环
-                            # 这样即使清理操作很慢，也能响应取消信号
-                            try:
-                                stats = await asyncio.to_thread(db_manager.cleanup_old_data, days=90)
-                                if 'error' not in stats:
-                                    logger.info(f"【{self.cookie_id}】数据库清理完成: {stats}")
-                                    self.__class__._last_db_cleanup_time = current_time
-                                else:
-                                    logger.error(f"【{self.cookie_id}】数据库清理失败: {stats['error']}")
-                            except asyncio.CancelledError:
-                                logger.warning(f"【{self.cookie_id}】数据库清理被取消")
-                                raise
-                    except asyncio.CancelledError:
-                        raise  # 重新抛出取消信号
-                    except Exception as db_clean_e:
-                        logger.error(f"【{self.cookie_id}】清理数据库历史数据时出错: {db_clean_e}")
+                    # 暂停记录、商品详情缓存、QR会话、Playwright缓存、日志文件和数据库历史数据
+                    # 属于进程级清理，由全局任务运行器统一执行（见 utils/scheduler/global_runner.py）
 
                     # 清理间隔从DB读取（默认300秒）
                     _cleanup_interval = self._get_task_interval('cleanup', 300)
@@ -6351,229 +5288,97 @@ class XianyuLive:
 
 
 
-    def enable_cookie_refresh(self, enabled: bool = True):
-        """启用或禁用Cookie刷新功能"""
-        self.cookie_refresh_enabled = enabled
-        status = "启用" if enabled else "禁用"
-        logger.info(f"【{self.cookie_id}】Cookie刷新功能已{status}")
-
-
-    async def refresh_cookies_from_qr_login(self, qr_cookies_str: str, cookie_id: str = None, user_id: int = None):
-        """使用扫码登录获取的cookie访问指定界面获取真实cookie并存入数据库
-
-        Args:
-            qr_cookies_str: 扫码登录获取的cookie字符串
-            cookie_id: 可选的cookie ID，如果不提供则使用当前实例的cookie_id
-            user_id: 可选的用户ID，如果不提供则使用当前实例的user_id
-
-        Returns:
-            bool: 成功返回True，失败返回False
-        """
-        playwright = None
-        browser = None
-        target_cookie_id = cookie_id or self.cookie_id
-        target_user_id = user_id or self.user_id
-
-        # 获取并发信号量
-        await XianyuLive._playwright_semaphore.acquire()
-        try:
-            import asyncio
-            from playwright.async_api import async_playwright
-            from utils.xianyu_utils import trans_cookies
-
-            logger.info(f"【{target_cookie_id}】开始使用扫码登录cookie获取真实cookie...")
-            logger.info(f"【{target_cookie_id}】扫码cookie长度: {len(qr_cookies_str)}")
-
-            # 解析扫码登录的cookie
-            qr_cookies_dict = trans_cookies(qr_cookies_str)
-            logger.info(f"【{target_cookie_id}】扫码cookie字段数: {len(qr_cookies_dict)}")
-
-            # Docker环境下修复asyncio子进程问题
-            is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
-
-            if is_docker:
-                logger.warning(f"【{target_cookie_id}】检测到Docker环境，应用asyncio修复")
-
-                # 创建一个完整的虚拟子进程监视器
-                class DummyChildWatcher:
-                    def __enter__(self):
-                        return self
-                    def __exit__(self, *args):
-                        pass
-                    def is_active(self):
-                        return True
-                    def add_child_handler(self, *args, **kwargs):
-                        pass
-                    def remove_child_handler(self, *args, **kwargs):
-                        pass
-                    def attach_loop(self, *args, **kwargs):
-                        pass
-                    def close(self):
-                        pass
-                    def __del__(self):
-                        pass
-
-                # 创建自定义事件循环策略
-                class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
-                    def get_child_watcher(self):
-                        return DummyChildWatcher()
-
-                # 临时设置策略
-                old_policy = asyncio.get_event_loop_policy()
-                asyncio.set_event_loop_policy(DockerEventLoopPolicy())
-
-                try:
-                    # 添加超时机制，避免无限等待
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                    logger.warning(f"【{target_cookie_id}】Docker环境下Playwright启动成功")
-                except asyncio.TimeoutError:
-                    logger.error(f"【{target_cookie_id}】Docker环境下Playwright启动超时")
-                    return False
-                finally:
-                    # 恢复原策略
-                    asyncio.set_event_loop_policy(old_policy)
-            else:
-                # 非Docker环境，正常启动（也添加超时保护）
-                try:
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                except asyncio.TimeoutError:
-                    logger.error(f"【{target_cookie_id}】Playwright启动超时")
-                    return False
+    def enable_cookie_refresh(self, enabled: bool = True):
+        """启用或禁用Cookie刷新功能"""
+        self.cookie_refresh_enabled = enabled
+        status = "启用" if enabled else "禁用"
+        logger.info(f"【{self.cookie_id}】Cookie刷新功能已{status}")
 
-            # 启动浏览器（参照商品搜索的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
 
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            # 使用无头浏览器
-            browser = await playwright.chromium.launch(
-                headless=True,  # 改回无头模式
-                args=browser_args
-            )
+    async def refresh_cookies_from_qr_login(self, qr_cookies_str: str, cookie_id: str = None, user_id: int = None):
+        """使用扫码登录获取的cookie访问指定界面获取真实cookie并存入数据库
 
-            # 创建浏览器上下文
-            context_options = {
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            }
+        Args:
+            qr_cookies_str: 扫码登录获取的cookie字符串
+            cookie_id: 可选的cookie ID，如果不提供则使用当前实例的cookie_id
+            user_id: 可选的用户ID，如果不提供则使用当前实例的user_id
 
-            # 使用标准窗口大小
-            context_options['viewport'] = {'width': 1920, 'height': 1080}
+        Returns:
+            bool: 成功返回True，失败返回False
+        """
+        target_cookie_id = cookie_id or self.cookie_id
+        target_user_id = user_id or self.user_id
 
-            context = await browser.new_context(**context_options)
+        try:
+            from utils.browser_pool import get_browser_pool, cookies_for_context
+            from utils.xianyu_utils import trans_cookies
 
-            # 设置扫码登录获取的Cookie
-            cookies = []
-            for cookie_pair in qr_cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
+            logger.info(f"【{target_cookie_id}】开始使用扫码登录cookie获取真实cookie...")
+            logger.info(f"【{target_cookie_id}】扫码cookie长度: {len(qr_cookies_str)}")
 
-            await context.add_cookies(cookies)
-            logger.info(f"【{target_cookie_id}】已设置 {len(cookies)} 个扫码Cookie到浏览器")
+            # 解析扫码登录的cookie
+            qr_cookies_dict = trans_cookies(qr_cookies_str)
+            logger.info(f"【{target_cookie_id}】扫码cookie字段数: {len(qr_cookies_dict)}")
 
-            # 打印设置的扫码Cookie详情
-            logger.info(f"【{target_cookie_id}】=== 设置到浏览器的扫码Cookie ===")
-            for i, cookie in enumerate(cookies, 1):
-                logger.info(f"【{target_cookie_id}】{i:2d}. {cookie['name']}: {cookie['value'][:50]}{'...' if len(cookie['value']) > 50 else ''}")
+            # 从浏览器池租用页面（独立上下文，已设置扫码Cookie）
+            async with get_browser_pool().lease(target_cookie_id, qr_cookies_str, headless=True) as lease:
+                context, page = lease.context, lease.page
+                cookies = cookies_for_context(qr_cookies_str)
+                logger.info(f"【{target_cookie_id}】已租用浏览器页面（等待 {lease.wait_ms:.0f}ms），已设置 {len(cookies)} 个扫码Cookie")
 
-            # 创建页面
-            page = await context.new_page()
+                # 打印设置的扫码Cookie详情
+                logger.info(f"【{target_cookie_id}】=== 设置到浏览器的扫码Cookie ===")
+                for i, cookie in enumerate(cookies, 1):
+                    logger.info(f"【{target_cookie_id}】{i:2d}. {cookie['name']}: {cookie['value'][:50]}{'...' if len(cookie['value']) > 50 else ''}")
 
-            # 等待页面准备
-            await asyncio.sleep(0.1)
+                # 等待页面准备
+                await asyncio.sleep(0.1)
 
-            # 访问指定页面获取真实cookie
-            target_url = "https://www.goofish.com/im"
-            logger.info(f"【{target_cookie_id}】访问页面获取真实cookie: {target_url}")
+                # 访问指定页面获取真实cookie
+                target_url = "https://www.goofish.com/im"
+                logger.info(f"【{target_cookie_id}】访问页面获取真实cookie: {target_url}")
 
-            # 使用更灵活的页面访问策略
-            try:
-                # 首先尝试较短超时
-                await page.goto(target_url, wait_until='domcontentloaded', timeout=15000)
-                logger.info(f"【{target_cookie_id}】页面访问成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{target_cookie_id}】页面访问超时，尝试降级策略...")
-                    try:
-                        # 降级策略：只等待基本加载
-                        await page.goto(target_url, wait_until='load', timeout=20000)
-                        logger.info(f"【{target_cookie_id}】页面访问成功（降级策略）")
-                    except Exception as e2:
-                        logger.warning(f"【{target_cookie_id}】降级策略也失败，尝试最基本访问...")
-                        # 最后尝试：不等待任何加载完成
-                        await page.goto(target_url, timeout=25000)
-                        logger.info(f"【{target_cookie_id}】页面访问成功（最基本策略）")
-                else:
-                    raise e
+                # 使用更灵活的页面访问策略
+                try:
+                    # 首先尝试较短超时
+                    await page.goto(target_url, wait_until='domcontentloaded', timeout=15000)
+                    logger.info(f"【{target_cookie_id}】页面访问成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{target_cookie_id}】页面访问超时，尝试降级策略...")
+                        try:
+                            # 降级策略：只等待基本加载
+                            await page.goto(target_url, wait_until='load', timeout=20000)
+                            logger.info(f"【{target_cookie_id}】页面访问成功（降级策略）")
+                        except Exception as e2:
+                            logger.warning(f"【{target_cookie_id}】降级策略也失败，尝试最基本访问...")
+                            # 最后尝试：不等待任何加载完成
+                            await page.goto(target_url, timeout=25000)
+                            logger.info(f"【{target_cookie_id}】页面访问成功（最基本策略）")
+                    else:
+                        raise e
 
-            # 等待页面完全加载并获取真实cookie
-            logger.info(f"【{target_cookie_id}】页面加载完成，等待获取真实cookie...")
-            await asyncio.sleep(2)
+                # 等待页面完全加载并获取真实cookie
+                logger.info(f"【{target_cookie_id}】页面加载完成，等待获取真实cookie...")
+                await asyncio.sleep(2)
 
-            # 执行一次刷新以确保获取最新的cookie
-            logger.info(f"【{target_cookie_id}】执行页面刷新获取最新cookie...")
-            try:
-                await page.reload(wait_until='domcontentloaded', timeout=12000)
-                logger.info(f"【{target_cookie_id}】页面刷新成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{target_cookie_id}】页面刷新超时，使用降级策略...")
-                    await page.reload(wait_until='load', timeout=15000)
-                    logger.info(f"【{target_cookie_id}】页面刷新成功（降级策略）")
-                else:
-                    raise e
-            await asyncio.sleep(1)
+                # 执行一次刷新以确保获取最新的cookie
+                logger.info(f"【{target_cookie_id}】执行页面刷新获取最新cookie...")
+                try:
+                    await page.reload(wait_until='domcontentloaded', timeout=12000)
+                    logger.info(f"【{target_cookie_id}】页面刷新成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{target_cookie_id}】页面刷新超时，使用降级策略...")
+                        await page.reload(wait_until='load', timeout=15000)
+                        logger.info(f"【{target_cookie_id}】页面刷新成功（降级策略）")
+                    else:
+                        raise e
+                await asyncio.sleep(1)
 
-            # 获取更新后的真实Cookie
-            logger.info(f"【{target_cookie_id}】获取真实Cookie...")
-            updated_cookies = await context.cookies()
+                # 获取更新后的真实Cookie
+                logger.info(f"【{target_cookie_id}】获取真实Cookie...")
+                updated_cookies = await context.cookies()
 
             # 构造新的Cookie字典
             real_cookies_dict = {}
@@ -6711,35 +5516,6 @@ class XianyuLive:
         except Exception as e:
             logger.error(f"【{target_cookie_id}】使用扫码cookie获取真实cookie失败: {self._safe_str(e)}")
             return False
-        finally:
-            # 确保资源清理（增加进程强杀兜底）
-            try:
-                # 先关闭浏览器，再关闭Playwright（顺序很重要）
-                if browser:
-                    try:
-                        await asyncio.wait_for(browser.close(), timeout=5.0)
-                        logger.warning(f"【{target_cookie_id}】浏览器关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{target_cookie_id}】浏览器关闭超时（5秒），强制杀死进程")
-                        XianyuLive._kill_browser_process(browser)
-                    except Exception as e:
-                        logger.warning(f"【{target_cookie_id}】关闭浏览器时出错: {self._safe_str(e)}")
-                        XianyuLive._kill_browser_process(browser)
-                
-                # Playwright关闭：使用更短的超时，超时后立即放弃
-                if playwright:
-                    try:
-                        logger.warning(f"【{target_cookie_id}】正在关闭Playwright...")
-                        await asyncio.wait_for(playwright.stop(), timeout=2.0)
-                        logger.warning(f"【{target_cookie_id}】Playwright关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{target_cookie_id}】Playwright关闭超时（2秒），进程可能仍在运行")
-                    except Exception as e:
-                        logger.warning(f"【{target_cookie_id}】关闭Playwright时出错: {self._safe_str(e)}")
-            except Exception as cleanup_e:
-                logger.warning(f"【{target_cookie_id}】清理浏览器资源时出错: {self._safe_str(cleanup_e)}")
-            finally:
-                XianyuLive._playwright_semaphore.release()
 
     async def _refresh_cookies_via_browser_page(self, current_cookies_str: str):
         """使用当前cookie访问指定页面获取真实cookie并更新
@@ -6753,14 +5529,8 @@ class XianyuLive:
         Returns:
             bool: 成功返回True，失败返回False
         """
-        playwright = None
-        browser = None
-
-        # 获取并发信号量
-        await XianyuLive._playwright_semaphore.acquire()
         try:
-            import asyncio
-            from playwright.async_api import async_playwright
+            from utils.browser_pool import get_browser_pool, cookies_for_context
             from utils.xianyu_utils import trans_cookies
 
             logger.info(f"【{self.cookie_id}】开始使用当前cookie访问指定页面获取真实cookie...")
@@ -6770,188 +5540,60 @@ class XianyuLive:
             current_cookies_dict = trans_cookies(current_cookies_str)
             logger.info(f"【{self.cookie_id}】当前cookie字段数: {len(current_cookies_dict)}")
 
-            # Docker环境下修复asyncio子进程问题
-            is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
-
-            if is_docker:
-                logger.warning(f"【{self.cookie_id}】检测到Docker环境，应用asyncio修复")
-
-                # 创建一个完整的虚拟子进程监视器
-                class DummyChildWatcher:
-                    def __enter__(self):
-                        return self
-                    def __exit__(self, *args):
-                        pass
-                    def is_active(self):
-                        return True
-                    def add_child_handler(self, *args, **kwargs):
-                        pass
-                    def remove_child_handler(self, *args, **kwargs):
-                        pass
-                    def attach_loop(self, *args, **kwargs):
-                        pass
-                    def close(self):
-                        pass
-                    def __del__(self):
-                        pass
+            # 从浏览器池租用页面（独立上下文，已设置当前Cookie）
+            async with get_browser_pool().lease(self.cookie_id, current_cookies_str, headless=True, memory_limit=True) as lease:
+                context, page = lease.context, lease.page
+                cookies = cookies_for_context(current_cookies_str)
+                logger.info(f"【{self.cookie_id}】已租用浏览器页面（等待 {lease.wait_ms:.0f}ms），已设置 {len(cookies)} 个当前Cookie")
 
-                # 创建自定义事件循环策略
-                class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
-                    def get_child_watcher(self):
-                        return DummyChildWatcher()
+                # 等待页面准备
+                await asyncio.sleep(0.1)
 
-                # 临时设置策略
-                old_policy = asyncio.get_event_loop_policy()
-                asyncio.set_event_loop_policy(DockerEventLoopPolicy())
+                # 访问指定页面获取真实cookie
+                target_url = "https://www.goofish.com/im"
+                logger.info(f"【{self.cookie_id}】访问页面获取真实cookie: {target_url}")
 
+                # 使用更灵活的页面访问策略
                 try:
-                    # 添加超时机制，避免无限等待
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                    logger.warning(f"【{self.cookie_id}】Docker环境下Playwright启动成功")
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Docker环境下Playwright启动超时")
-                    return False
-                finally:
-                    # 恢复原策略
-                    asyncio.set_event_loop_policy(old_policy)
-            else:
-                # 非Docker环境，正常启动（也添加超时保护）
-                try:
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Playwright启动超时")
-                    return False
-
-            # 启动浏览器（参照商品搜索的配置）
-            browser_args = [
-                '--js-flags=--max-old-space-size=128',
-                '--renderer-process-limit=1',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            # 使用无头浏览器
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context_options = {
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            }
-
-            # 使用标准窗口大小
-            context_options['viewport'] = {'width': 1920, 'height': 1080}
-
-            context = await browser.new_context(**context_options)
-
-            # 设置当前的Cookie
-            cookies = []
-            for cookie_pair in current_cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
-            logger.info(f"【{self.cookie_id}】已设置 {len(cookies)} 个当前Cookie到浏览器")
-
-            # 创建页面
-            page = await context.new_page()
-
-            # 等待页面准备
-            await asyncio.sleep(0.1)
-
-            # 访问指定页面获取真实cookie
-            target_url = "https://www.goofish.com/im"
-            logger.info(f"【{self.cookie_id}】访问页面获取真实cookie: {target_url}")
-
-            # 使用更灵活的页面访问策略
-            try:
-                # 首先尝试较短超时
-                await page.goto(target_url, wait_until='domcontentloaded', timeout=15000)
-                logger.info(f"【{self.cookie_id}】页面访问成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{self.cookie_id}】页面访问超时，尝试降级策略...")
-                    try:
-                        # 降级策略：只等待基本加载
-                        await page.goto(target_url, wait_until='load', timeout=20000)
-                        logger.info(f"【{self.cookie_id}】页面访问成功（降级策略）")
-                    except Exception as e2:
-                        logger.warning(f"【{self.cookie_id}】降级策略也失败，尝试最基本访问...")
-                        # 最后尝试：不等待任何加载完成
-                        await page.goto(target_url, timeout=25000)
-                        logger.info(f"【{self.cookie_id}】页面访问成功（最基本策略）")
-                else:
-                    raise e
+                    # 首先尝试较短超时
+                    await page.goto(target_url, wait_until='domcontentloaded', timeout=15000)
+                    logger.info(f"【{self.cookie_id}】页面访问成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{self.cookie_id}】页面访问超时，尝试降级策略...")
+                        try:
+                            # 降级策略：只等待基本加载
+                            await page.goto(target_url, wait_until='load', timeout=20000)
+                            logger.info(f"【{self.cookie_id}】页面访问成功（降级策略）")
+                        except Exception as e2:
+                            logger.warning(f"【{self.cookie_id}】降级策略也失败，尝试最基本访问...")
+                            # 最后尝试：不等待任何加载完成
+                            await page.goto(target_url, timeout=25000)
+                            logger.info(f"【{self.cookie_id}】页面访问成功（最基本策略）")
+                    else:
+                        raise e
 
-            # 等待页面完全加载并获取真实cookie
-            logger.info(f"【{self.cookie_id}】页面加载完成，等待获取真实cookie...")
-            await asyncio.sleep(2)
+                # 等待页面完全加载并获取真实cookie
+                logger.info(f"【{self.cookie_id}】页面加载完成，等待获取真实cookie...")
+                await asyncio.sleep(2)
 
-            # 执行一次刷新以确保获取最新的cookie
-            logger.info(f"【{self.cookie_id}】执行页面刷新获取最新cookie...")
-            try:
-                await page.reload(wait_until='domcontentloaded', timeout=12000)
-                logger.info(f"【{self.cookie_id}】页面刷新成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{self.cookie_id}】页面刷新超时，使用降级策略...")
-                    await page.reload(wait_until='load', timeout=15000)
-                    logger.info(f"【{self.cookie_id}】页面刷新成功（降级策略）")
-                else:
-                    raise e
-            await asyncio.sleep(1)
+                # 执行一次刷新以确保获取最新的cookie
+                logger.info(f"【{self.cookie_id}】执行页面刷新获取最新cookie...")
+                try:
+                    await page.reload(wait_until='domcontentloaded', timeout=12000)
+                    logger.info(f"【{self.cookie_id}】页面刷新成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{self.cookie_id}】页面刷新超时，使用降级策略...")
+                        await page.reload(wait_until='load', timeout=15000)
+                        logger.info(f"【{self.cookie_id}】页面刷新成功（降级策略）")
+                    else:
+                        raise e
+                await asyncio.sleep(1)
 
-            # 获取更新后的真实Cookie
-            logger.info(f"【{self.cookie_id}】获取真实Cookie...")
-            updated_cookies = await context.cookies()
+                # 获取更新后的真实Cookie
+                logger.info(f"【{self.cookie_id}】获取真实Cookie...")
+                updated_cookies = await context.cookies()
 
             # 构造新的Cookie字典
             real_cookies_dict = {}
@@ -7005,33 +5647,6 @@ class XianyuLive:
         except Exception as e:
             logger.error(f"【{self.cookie_id}】使用当前cookie访问指定页面获取真实cookie失败: {self._safe_str(e)}")
             return False
-        finally:
-            # 确保资源清理（增加进程强杀兜底）
-            try:
-                # 先关闭浏览器，再关闭Playwright（顺序很重要）
-                if browser:
-                    try:
-                        await asyncio.wait_for(browser.close(), timeout=5.0)
-                        logger.warning(f"【{self.cookie_id}】浏览器关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{self.cookie_id}】浏览器关闭超时（5秒），强制杀死进程")
-                        XianyuLive._kill_browser_process(browser)
-                    except Exception as e:
-                        logger.warning(f"【{self.cookie_id}】关闭浏览器时出错: {self._safe_str(e)}")
-                        XianyuLive._kill_browser_process(browser)
-                
-                # Playwright关闭：使用更短的超时，超时后立即放弃
-                if playwright:
-                    try:
-                        logger.warning(f"【{self.cookie_id}】正在关闭Playwright...")
-                        await asyncio.wait_for(playwright.stop(), timeout=2.0)
-                        logger.warning(f"【{self.cookie_id}】Playwright关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{self.cookie_id}】Playwright关闭超时（2秒），进程可能仍在运行")
-                    except Exception as e:
-                        logger.warning(f"【{self.cookie_id}】关闭Playwright时出错: {self._safe_str(e)}")
-            except Exception as cleanup_e:
-                logger.warning(f"【{self.cookie_id}】清理浏览器资源时出错: {self._safe_str(cleanup_e)}")
 
     def reset_qr_cookie_refresh_flag(self):
         """重置扫码登录Cookie刷新标志，允许立即执行_refresh_cookies_via_browser"""
@@ -7052,10 +5667,7 @@ class XianyuLive:
             triggered_by_refresh_token: 是否由refresh_token方法触发，如果是True则设置browser_cookie_refreshed标志
         """
 
-        playwright = None
-        browser = None
-
-        # 检查是否需要等待扫码登录Cookie刷新的冷却时间（在获取信号量前检查，避免不必要地占用信号量）
+        # 检查是否需要等待扫码登录Cookie刷新的冷却时间（在租用浏览器前检查，避免不必要地占用浏览器池）
         current_time = time.time()
         time_since_qr_refresh = current_time - self.last_qr_cookie_refresh_time
 
@@ -7068,435 +5680,166 @@ class XianyuLive:
             logger.info(f"【{self.cookie_id}】跳过本次浏览器Cookie刷新")
             return False
 
-        # 获取并发信号量，防止多账号同时启动浏览器耗尽内存
-        await XianyuLive._playwright_semaphore.acquire()
         try:
-            import asyncio
-            from playwright.async_api import async_playwright
+            from utils.browser_pool import get_browser_pool
 
             logger.info(f"【{self.cookie_id}】开始通过浏览器刷新Cookie...")
             logger.info(f"【{self.cookie_id}】刷新前Cookie长度: {len(self.cookies_str)}")
             logger.info(f"【{self.cookie_id}】刷新前Cookie字段数: {len(self.cookies)}")
 
-            # Docker环境下修复asyncio子进程问题
-            is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
-
-            if is_docker:
-                logger.warning(f"【{self.cookie_id}】检测到Docker环境，应用asyncio修复")
-
-                # 创建一个完整的虚拟子进程监视器
-                class DummyChildWatcher:
-                    def __enter__(self):
-                        return self
-                    def __exit__(self, *args):
-                        pass
-                    def is_active(self):
-                        return True
-                    def add_child_handler(self, *args, **kwargs):
-                        pass
-                    def remove_child_handler(self, *args, **kwargs):
-                        pass
-                    def attach_loop(self, *args, **kwargs):
-                        pass
-                    def close(self):
-                        pass
-                    def __del__(self):
-                        pass
+            # 从浏览器池租用页面（独立上下文，已设置当前Cookie）
+            async with get_browser_pool().lease(self.cookie_id, self.cookies_str, headless=True) as lease:
+                context, page = lease.context, lease.page
+                logger.info(f"【{self.cookie_id}】已租用浏览器页面（等待 {lease.wait_ms:.0f}ms）")
 
-                # 创建自定义事件循环策略
-                class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
-                    def get_child_watcher(self):
-                        return DummyChildWatcher()
+                # 等待页面准备
+                await asyncio.sleep(0.1)
 
-                # 临时设置策略
-                old_policy = asyncio.get_event_loop_policy()
-                asyncio.set_event_loop_policy(DockerEventLoopPolicy())
+                # 访问指定页面
+                target_url = "https://www.goofish.com/im"
+                logger.info(f"【{self.cookie_id}】访问页面: {target_url}")
 
+                # 使用更灵活的页面访问策略
                 try:
-                    # 添加超时机制，避免无限等待
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                    logger.warning(f"【{self.cookie_id}】Docker环境下Playwright启动成功")
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Docker环境下Playwright启动超时")
-                    return False
-                finally:
-                    # 恢复原策略
-                    asyncio.set_event_loop_policy(old_policy)
-            else:
-                # 非Docker环境，正常启动（也添加超时保护）
-                try:
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Playwright启动超时")
-                    return False
-
-            # 启动浏览器（参照商品搜索的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            # Cookie刷新模式使用无头浏览器
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context_options = {
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            }
-
-            # 使用标准窗口大小
-            context_options['viewport'] = {'width': 1920, 'height': 1080}
-
-            context = await browser.new_context(**context_options)
-
-            # 设置当前Cookie
-            cookies = []
-            for cookie_pair in self.cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
-            logger.info(f"【{self.cookie_id}】已设置 {len(cookies)} 个Cookie到浏览器")
-
-            # 创建页面
-            page = await context.new_page()
-
-            # 等待页面准备
-            await asyncio.sleep(0.1)
-
-            # 访问指定页面
-            target_url = "https://www.goofish.com/im"
-            logger.info(f"【{self.cookie_id}】访问页面: {target_url}")
-
-            # 使用更灵活的页面访问策略
-            try:
-                # 首先尝试较短超时
-                await page.goto(target_url, wait_until='domcontentloaded', timeout=15000)
-                logger.info(f"【{self.cookie_id}】页面访问成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{self.cookie_id}】页面访问超时，尝试降级策略...")
-                    try:
-                        # 降级策略：只等待基本加载
-                        await page.goto(target_url, wait_until='load', timeout=20000)
-                        logger.info(f"【{self.cookie_id}】页面访问成功（降级策略）")
-                    except Exception as e2:
-                        logger.warning(f"【{self.cookie_id}】降级策略也失败，尝试最基本访问...")
-                        # 最后尝试：不等待任何加载完成
-                        await page.goto(target_url, timeout=25000)
-                        logger.info(f"【{self.cookie_id}】页面访问成功（最基本策略）")
-                else:
-                    raise e
+                    # 首先尝试较短超时
+                    await page.goto(target_url, wait_until='domcontentloaded', timeout=15000)
+                    logger.info(f"【{self.cookie_id}】页面访问成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{self.cookie_id}】页面访问超时，尝试降级策略...")
+                        try:
+                            # 降级策略：只等待基本加载
+                            await page.goto(target_url, wait_until='load', timeout=20000)
+                            logger.info(f"【{self.cookie_id}】页面访问成功（降级策略）")
+                        except Exception as e2:
+                            logger.warning(f"【{self.cookie_id}】降级策略也失败，尝试最基本访问...")
+                            # 最后尝试：不等待任何加载完成
+                            await page.goto(target_url, timeout=25000)
+                            logger.info(f"【{self.cookie_id}】页面访问成功（最基本策略）")
+                    else:
+                        raise e
 
-            # Cookie刷新模式：执行两次刷新
-            logger.info(f"【{self.cookie_id}】页面加载完成，开始刷新...")
-            await asyncio.sleep(1)
+                # Cookie刷新模式：执行两次刷新
+                logger.info(f"【{self.cookie_id}】页面加载完成，开始刷新...")
+                await asyncio.sleep(1)
 
-            # 第一次刷新 - 带重试机制
-            logger.info(f"【{self.cookie_id}】执行第一次刷新...")
-            try:
-                await page.reload(wait_until='domcontentloaded', timeout=12000)
-                logger.info(f"【{self.cookie_id}】第一次刷新成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{self.cookie_id}】第一次刷新超时，使用降级策略...")
-                    await page.reload(wait_until='load', timeout=15000)
-                    logger.info(f"【{self.cookie_id}】第一次刷新成功（降级策略）")
-                else:
-                    raise e
-            await asyncio.sleep(1)
+                # 第一次刷新 - 带重试机制
+                logger.info(f"【{self.cookie_id}】执行第一次刷新...")
+                try:
+                    await page.reload(wait_until='domcontentloaded', timeout=12000)
+                    logger.info(f"【{self.cookie_id}】第一次刷新成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{self.cookie_id}】第一次刷新超时，使用降级策略...")
+                        await page.reload(wait_until='load', timeout=15000)
+                        logger.info(f"【{self.cookie_id}】第一次刷新成功（降级策略）")
+                    else:
+                        raise e
+                await asyncio.sleep(1)
 
-            # 第二次刷新 - 带重试机制
-            logger.info(f"【{self.cookie_id}】执行第二次刷新...")
-            try:
-                await page.reload(wait_until='domcontentloaded', timeout=12000)
-                logger.info(f"【{self.cookie_id}】第二次刷新成功")
-            except Exception as e:
-                if 'timeout' in str(e).lower():
-                    logger.warning(f"【{self.cookie_id}】第二次刷新超时，使用降级策略...")
-                    await page.reload(wait_until='load', timeout=15000)
-                    logger.info(f"【{self.cookie_id}】第二次刷新成功（降级策略）")
-                else:
-                    raise e
-            await asyncio.sleep(1)
+                # 第二次刷新 - 带重试机制
+                logger.info(f"【{self.cookie_id}】执行第二次刷新...")
+                try:
+                    await page.reload(wait_until='domcontentloaded', timeout=12000)
+                    logger.info(f"【{self.cookie_id}】第二次刷新成功")
+                except Exception as e:
+                    if 'timeout' in str(e).lower():
+                        logger.warning(f"【{self.cookie_id}】第二次刷新超时，使用降级策略...")
+                        await page.reload(wait_until='load', timeout=15000)
+                        logger.info(f"【{self.cookie_id}】第二次刷新成功（降级策略）")
+                    else:
+                        raise e
+                await asyncio.sleep(1)
 
-            # Cookie刷新模式：正常更新Cookie
-            logger.info(f"【{self.cookie_id}】获取更新后的Cookie...")
-            updated_cookies = await context.cookies()
+                # Cookie刷新模式：正常更新Cookie
+                logger.info(f"【{self.cookie_id}】获取更新后的Cookie...")
+                updated_cookies = await context.cookies()
             
-            # 获取并打印当前页面标题
-            page_title = await page.title()
-            logger.info(f"【{self.cookie_id}】当前页面标题: {page_title}")
-
-            # 构造新的Cookie字典
-            new_cookies_dict = {}
-            for cookie in updated_cookies:
-                new_cookies_dict[cookie['name']] = cookie['value']
-
-            # 检查Cookie变化
-            changed_cookies = []
-            new_cookies = []
-            for name, new_value in new_cookies_dict.items():
-                old_value = self.cookies.get(name)
-                if old_value is None:
-                    new_cookies.append(name)
-                elif old_value != new_value:
-                    changed_cookies.append(name)
-
-            # 更新self.cookies和cookies_str
-            self.cookies.update(new_cookies_dict)
-            self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
-
-            logger.info(f"【{self.cookie_id}】Cookie已更新，包含 {len(new_cookies_dict)} 个字段")
-
-            # 显示Cookie变化统计
-            if changed_cookies:
-                logger.info(f"【{self.cookie_id}】发生变化的Cookie字段 ({len(changed_cookies)}个): {', '.join(changed_cookies)}")
-            if new_cookies:
-                logger.info(f"【{self.cookie_id}】新增的Cookie字段 ({len(new_cookies)}个): {', '.join(new_cookies)}")
-            if not changed_cookies and not new_cookies:
-                logger.info(f"【{self.cookie_id}】Cookie无变化")
-
-            # 打印完整的更新后Cookie（可选择性启用）
-            logger.info(f"【{self.cookie_id}】更新后的完整Cookie: {self.cookies_str}")
-
-            # 打印主要的Cookie字段详情
-            important_cookies = ['_m_h5_tk', '_m_h5_tk_enc', 'cookie2', 't', 'sgcookie', 'unb', 'uc1', 'uc3', 'uc4']
-            logger.info(f"【{self.cookie_id}】重要Cookie字段详情:")
-            for cookie_name in important_cookies:
-                if cookie_name in new_cookies_dict:
-                    cookie_value = new_cookies_dict[cookie_name]
-                    # 对于敏感信息，只显示前后几位
-                    if len(cookie_value) > 20:
-                        display_value = f"{cookie_value[:8]}...{cookie_value[-8:]}"
-                    else:
-                        display_value = cookie_value
+                # 获取并打印当前页面标题
+                page_title = await page.title()
+                logger.info(f"【{self.cookie_id}】当前页面标题: {page_title}")
+
+                # 构造新的Cookie字典
+                new_cookies_dict = {}
+                for cookie in updated_cookies:
+                    new_cookies_dict[cookie['name']] = cookie['value']
+
+                # 检查Cookie变化
+                changed_cookies = []
+                new_cookies = []
+                for name, new_value in new_cookies_dict.items():
+                    old_value = self.cookies.get(name)
+                    if old_value is None:
+                        new_cookies.append(name)
+                    elif old_value != new_value:
+                        changed_cookies.append(name)
+
+                # 更新self.cookies和cookies_str
+                self.cookies.update(new_cookies_dict)
+                self.cookies_str = '; '.join([f"{k}={v}" for k, v in self.cookies.items()])
+
+                logger.info(f"【{self.cookie_id}】Cookie已更新，包含 {len(new_cookies_dict)} 个字段")
+
+                # 显示Cookie变化统计
+                if changed_cookies:
+                    logger.info(f"【{self.cookie_id}】发生变化的Cookie字段 ({len(changed_cookies)}个): {', '.join(changed_cookies)}")
+                if new_cookies:
+                    logger.info(f"【{self.cookie_id}】新增的Cookie字段 ({len(new_cookies)}个): {', '.join(new_cookies)}")
+                if not changed_cookies and not new_cookies:
+                    logger.info(f"【{self.cookie_id}】Cookie无变化")
+
+                # 打印完整的更新后Cookie（可选择性启用）
+                logger.info(f"【{self.cookie_id}】更新后的完整Cookie: {self.cookies_str}")
+
+                # 打印主要的Cookie字段详情
+                important_cookies = ['_m_h5_tk', '_m_h5_tk_enc', 'cookie2', 't', 'sgcookie', 'unb', 'uc1', 'uc3', 'uc4']
+                logger.info(f"【{self.cookie_id}】重要Cookie字段详情:")
+                for cookie_name in important_cookies:
+                    if cookie_name in new_cookies_dict:
+                        cookie_value = new_cookies_dict[cookie_name]
+                        # 对于敏感信息，只显示前后几位
+                        if len(cookie_value) > 20:
+                            display_value = f"{cookie_value[:8]}...{cookie_value[-8:]}"
+                        else:
+                            display_value = cookie_value
 
-                    # 标记是否发生了变化
-                    change_mark = " [已变化]" if cookie_name in changed_cookies else " [新增]" if cookie_name in new_cookies else ""
-                    logger.info(f"【{self.cookie_id}】  {cookie_name}: {display_value}{change_mark}")
+                        # 标记是否发生了变化
+                        change_mark = " [已变化]" if cookie_name in changed_cookies else " [新增]" if cookie_name in new_cookies else ""
+                        logger.info(f"【{self.cookie_id}】  {cookie_name}: {display_value}{change_mark}")
 
-            # 更新数据库中的Cookie
-            await self.update_config_cookies()
+                # 更新数据库中的Cookie
+                await self.update_config_cookies()
 
-            # 只有当由refresh_token触发时才设置浏览器Cookie刷新成功标志
-            if triggered_by_refresh_token:
-                self.browser_cookie_refreshed = True
-                logger.info(f"【{self.cookie_id}】由refresh_token触发，浏览器Cookie刷新成功标志已设置为True")
+                # 只有当由refresh_token触发时才设置浏览器Cookie刷新成功标志
+                if triggered_by_refresh_token:
+                    self.browser_cookie_refreshed = True
+                    logger.info(f"【{self.cookie_id}】由refresh_token触发，浏览器Cookie刷新成功标志已设置为True")
 
-                # 兜底：直接在此处触发实例重启，避免外层协程在返回后被取消导致未重启
-                try:
-                    # 标记"刷新流程内已触发重启"，供外层去重
-                    self.restarted_in_browser_refresh = True
+                    # 兜底：直接在此处触发实例重启，避免外层协程在返回后被取消导致未重启
+                    try:
+                        # 标记"刷新流程内已触发重启"，供外层去重
+                        self.restarted_in_browser_refresh = True
 
-                    logger.info(f"【{self.cookie_id}】Cookie刷新成功，准备重启实例...(via _refresh_cookies_via_browser)")
-                    await self._restart_instance()
+                        logger.info(f"【{self.cookie_id}】Cookie刷新成功，准备重启实例...(via _refresh_cookies_via_browser)")
+                        await self._restart_instance()
                     
-                    # ⚠️ _restart_instance() 已触发重启，当前任务即将被取消
-                    # 不要等待或执行耗时操作
-                    logger.info(f"【{self.cookie_id}】重启请求已触发(via _refresh_cookies_via_browser)")
+                        # ⚠️ _restart_instance() 已触发重启，当前任务即将被取消
+                        # 不要等待或执行耗时操作
+                        logger.info(f"【{self.cookie_id}】重启请求已触发(via _refresh_cookies_via_browser)")
                     
-                    # 标记重启标志（无需主动关闭WS，重启由管理器处理）
-                    self.connection_restart_flag = True
-                except Exception as e:
-                    logger.error(f"【{self.cookie_id}】兜底重启失败: {self._safe_str(e)}")
-            else:
-                logger.info(f"【{self.cookie_id}】由定时任务触发，不设置浏览器Cookie刷新成功标志")
+                        # 标记重启标志（无需主动关闭WS，重启由管理器处理）
+                        self.connection_restart_flag = True
+                    except Exception as e:
+                        logger.error(f"【{self.cookie_id}】兜底重启失败: {self._safe_str(e)}")
+                else:
+                    logger.info(f"【{self.cookie_id}】由定时任务触发，不设置浏览器Cookie刷新成功标志")
 
-            logger.info(f"【{self.cookie_id}】Cookie刷新完成")
-            return True
+                logger.info(f"【{self.cookie_id}】Cookie刷新完成")
+                return True
 
         except Exception as e:
             logger.error(f"【{self.cookie_id}】通过浏览器刷新Cookie失败: {self._safe_str(e)}")
             return False
-        finally:
-            # 异步关闭浏览器：创建清理任务并等待完成，确保资源正确释放
-            close_task = None
-            try:
-                if browser or playwright:
-                    # 创建关闭任务
-                    close_task = asyncio.create_task(
-                        self._async_close_browser(browser, playwright)
-                    )
-                    logger.info(f"【{self.cookie_id}】浏览器异步关闭任务已启动")
-                    
-                    # 等待关闭任务完成，但设置超时避免阻塞太久
-                    try:
-                        await asyncio.wait_for(close_task, timeout=15.0)
-                        logger.info(f"【{self.cookie_id}】浏览器关闭任务已完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{self.cookie_id}】浏览器关闭任务超时（15秒），强制继续")
-                        # 取消任务，避免资源泄漏
-                        if not close_task.done():
-                            close_task.cancel()
-                            try:
-                                await close_task
-                            except (asyncio.CancelledError, Exception):
-                                pass
-                    except Exception as wait_e:
-                        logger.warning(f"【{self.cookie_id}】等待浏览器关闭任务时出错: {self._safe_str(wait_e)}")
-                        # 确保任务被取消
-                        if close_task and not close_task.done():
-                            close_task.cancel()
-                            try:
-                                await close_task
-                            except (asyncio.CancelledError, Exception):
-                                pass
-            except Exception as cleanup_e:
-                logger.warning(f"【{self.cookie_id}】创建浏览器关闭任务时出错: {self._safe_str(cleanup_e)}")
-                # 如果创建任务失败，尝试直接关闭
-                if browser or playwright:
-                    try:
-                        await self._force_close_resources(browser, playwright)
-                    except Exception:
-                        pass
-            finally:
-                XianyuLive._playwright_semaphore.release()
-
-    async def _async_close_browser(self, browser, playwright):
-        """异步关闭：正常关闭，超时后强制关闭"""
-        try:
-            logger.info(f"【{self.cookie_id}】开始异步关闭浏览器...")  # 改为info级别
-            
-            # 正常关闭，设置超时
-            await asyncio.wait_for(
-                self._normal_close_resources(browser, playwright),
-                timeout=10.0
-            )
-            logger.info(f"【{self.cookie_id}】浏览器正常关闭完成")  # 改为info级别
-            
-        except asyncio.TimeoutError:
-            logger.warning(f"【{self.cookie_id}】正常关闭超时，开始强制关闭...")
-            await self._force_close_resources(browser, playwright)
-            
-        except Exception as e:
-            logger.warning(f"【{self.cookie_id}】异步关闭时出错，强制关闭: {self._safe_str(e)}")
-            await self._force_close_resources(browser, playwright)
-
-    async def _normal_close_resources(self, browser, playwright):
-        """正常关闭资源：浏览器+Playwright短超时关闭，超时则强杀进程"""
-        try:
-            # 先关闭浏览器，再关闭Playwright
-            if browser:
-                try:
-                    # 关闭浏览器，设置超时
-                    await asyncio.wait_for(browser.close(), timeout=5.0)
-                    logger.info(f"【{self.cookie_id}】浏览器关闭完成")
-                except asyncio.TimeoutError:
-                    logger.warning(f"【{self.cookie_id}】浏览器关闭超时，强制杀死进程")
-                    XianyuLive._kill_browser_process(browser)
-                except Exception as e:
-                    logger.warning(f"【{self.cookie_id}】关闭浏览器时出错: {e}")
-                    XianyuLive._kill_browser_process(browser)
-            
-            # 关闭Playwright：使用短超时，如果超时就放弃
-            if playwright:
-                try:
-                    logger.info(f"【{self.cookie_id}】正在关闭Playwright...")
-                    # 增加超时时间，确保Playwright有足够时间清理资源
-                    await asyncio.wait_for(playwright.stop(), timeout=5.0)
-                    logger.info(f"【{self.cookie_id}】Playwright关闭完成")
-                except asyncio.TimeoutError:
-                    logger.warning(f"【{self.cookie_id}】Playwright关闭超时，将自动清理")
-                    # 尝试强制清理Playwright的内部连接
-                    try:
-                        if hasattr(playwright, '_connection'):
-                            playwright._connection.dispose()
-                    except Exception:
-                        pass
-                except Exception as e:
-                    logger.warning(f"【{self.cookie_id}】关闭Playwright时出错: {e}")
-                
-        except Exception as e:
-            logger.error(f"【{self.cookie_id}】正常关闭时出现异常: {e}")
-            raise
-
-    
-    async def _force_close_resources(self, browser, playwright):
-        """强制关闭资源：强制关闭浏览器+Playwright超时等待"""
-        try:
-            logger.warning(f"【{self.cookie_id}】开始强制关闭资源...")
-            
-            # 强制关闭浏览器+Playwright，设置短超时
-            force_tasks = []
-            if browser:
-                force_tasks.append(asyncio.wait_for(browser.close(), timeout=3.0))
-            if playwright:
-                force_tasks.append(asyncio.wait_for(playwright.stop(), timeout=3.0))
-            
-            if force_tasks:
-                # 使用gather执行，所有失败都会被忽略
-                results = await asyncio.gather(*force_tasks, return_exceptions=True)
-                
-                # 检查是否有超时或异常，尝试强制清理
-                for i, result in enumerate(results):
-                    if isinstance(result, (asyncio.TimeoutError, Exception)):
-                        resource_name = "浏览器" if i == 0 and browser else "Playwright"
-                        logger.warning(f"【{self.cookie_id}】{resource_name}强制关闭失败，尝试直接清理连接")
-                        try:
-                            if i == 0 and browser and hasattr(browser, '_connection'):
-                                browser._connection.dispose()
-                            elif playwright and hasattr(playwright, '_connection'):
-                                playwright._connection.dispose()
-                        except Exception:
-                            pass
-                
-                logger.info(f"【{self.cookie_id}】强制关闭完成")
-            else:
-                logger.info(f"【{self.cookie_id}】没有需要强制关闭的资源")
-            
-        except Exception as e:
-            logger.warning(f"【{self.cookie_id}】强制关闭时出现异常（已忽略）: {e}")
 
     @staticmethod
     def _kill_browser_process(browser):
@@ -8015,7 +6358,7 @@ class XianyuLive:
                 old_task = self.message_debounce_tasks[chat_id].get('task')
                 if old_task and not old_task.done():
                     old_task.cancel()
-                    logger.warning(f"【{self.cookie_id}】取消chat_id {chat_id} 的旧防抖任务")
+                    hot_log("message", self.cookie_id, "WARNING", "【{}】取消chat_id {} 的旧防抖任务", self.cookie_id, chat_id)
             
             # 更新最后一条消息信息
             current_timer = time.time()
@@ -8048,7 +6391,7 @@ class XianyuLive:
                         debounce_info = self.message_debounce_tasks[chat_id]
                         # 检查时间戳是否匹配（确保这是最新的消息）
                         if saved_timer != debounce_info['timer']:
-                            logger.warning(f"【{self.cookie_id}】chat_id {chat_id} 在防抖期间有新消息，跳过旧消息处理")
+                            hot_log("message", self.cookie_id, "WARNING", "【{}】chat_id {} 在防抖期间有新消息，跳过旧消息处理", self.cookie_id, chat_id)
                             return
                         
                         # 获取最后一条消息
@@ -8058,7 +6401,8 @@ class XianyuLive:
                         del self.message_debounce_tasks[chat_id]
                     
                     # 处理最后一条消息
-                    logger.info(f"【{self.cookie_id}】防抖延迟结束，开始处理chat_id {chat_id} 的最后一条消息: {last_msg['send_message'][:30]}...")
+                    hot_log("message", self.cookie_id, "INFO", "【{}】防抖延迟结束，开始处理chat_id {} 的最后一条消息: {}...",
+                            self.cookie_id, chat_id, last_msg['send_message'][:30])
                     await self._process_chat_message_reply(
                         last_msg['message_data'],
                         last_msg['websocket'],
@@ -8082,7 +6426,7 @@ class XianyuLive:
             
             task = self._create_tracked_task(debounce_task())
             self.message_debounce_tasks[chat_id]['task'] = task
-            logger.warning(f"【{self.cookie_id}】为chat_id {chat_id} 创建防抖任务，延迟 {self.message_debounce_delay} 秒")
+            hot_log("message", self.cookie_id, "WARNING", "【{}】为chat_id {} 创建防抖任务，延迟 {} 秒", self.cookie_id, chat_id, self.message_debounce_delay)
 
     async def _process_chat_message_reply(self, message_data: dict, websocket, send_user_name: str,
                                          send_user_id: str, send_message: str, item_id: str,
@@ -8198,29 +6542,21 @@ class XianyuLive:
                                         if os.path.exists(local_image_path):
                                             logger.info(f"【{self.cookie_id}】准备上传默认回复本地图片到闲鱼CDN: {local_image_path}")
                                             
-                                            from utils.image_uploader import ImageUploader
-                                            uploader = ImageUploader(self.cookies_str)
-                                            
-                                            async with uploader:
-                                                cdn_url = await uploader.upload_image(local_image_path)
-                                                if cdn_url:
-                                                    logger.info(f"【{self.cookie_id}】默认回复图片上传成功，CDN URL: {cdn_url}")
-                                                    final_image_url = cdn_url
-                                                    
-                                                    # 更新数据库中的图片URL为CDN URL
-                                                    await self._update_default_reply_image_url(cdn_url)
-                                                    
-                                                    # 获取实际图片尺寸
-                                                    from utils.image_utils import image_manager
-                                                    try:
-                                                        actual_width, actual_height = image_manager.get_image_size(local_image_path)
-                                                        if actual_width and actual_height:
-                                                            image_width, image_height = actual_width, actual_height
-                                                    except Exception as e:
-                                                        logger.warning(f"【{self.cookie_id}】获取图片尺寸失败，使用默认尺寸: {e}")
-                                                else:
-                                                    logger.error(f"【{self.cookie_id}】默认回复图片上传失败: {local_image_path}")
-                                                    final_image_url = None
+                                            uploaded = await self._upload_local_image(local_image_path)
+                                            if uploaded:
+                                                cdn_url = uploaded['url']
+                                                logger.info(f"【{self.cookie_id}】默认回复图片上传成功，CDN URL: {cdn_url}")
+                                                final_image_url = cdn_url
+                                                
+                                                # 更新数据库中的图片URL为CDN URL
+                                                await self._update_default_reply_image_url(cdn_url)
+                                                
+                                                # 实际图片尺寸（上传时已解析）
+                                                if uploaded['width'] and uploaded['height']:
+                                                    image_width, image_height = uploaded['width'], uploaded['height']
+                                            else:
+                                                logger.error(f"【{self.cookie_id}】默认回复图片上传失败: {local_image_path}")
+                                                final_image_url = None
                                         else:
                                             logger.error(f"【{self.cookie_id}】默认回复本地图片文件不存在: {local_image_path}")
                                             final_image_url = None
@@ -8291,8 +6627,8 @@ class XianyuLive:
             # 非阻塞写入自动回复日志
             if _arlog_db:
                 try:
-                    _arlog_db.add_auto_reply_log(
-                        cookie_id=self.cookie_id,
+                    await _arlog_db.add_auto_reply_log_async(
+                        self.cookie_id,
                         chat_id=chat_id,
                         item_id=item_id,
                         sender_user_id=send_user_id,
@@ -8377,8 +6713,7 @@ class XianyuLive:
                         message = parsed_data
                 except Exception as e:
                     # 如果JSON解析失败，尝试解密
-                    decrypted_data = decrypt(data)
-                    message = json.loads(decrypted_data)
+                    message = decrypt_to_obj(data)
             except Exception as e:
                 logger.error(f"消息解密失败: {self._safe_str(e)}")
                 return
@@ -8396,7 +6731,7 @@ class XianyuLive:
 
             # 【消息接收标识】记录收到消息的时间，用于控制Cookie刷新
             self.last_message_received_time = time.time()
-            logger.warning(f"【{self.cookie_id}】收到消息，更新消息接收时间标识")
+            hot_log("message", self.cookie_id, "WARNING", "【{}】收到消息，更新消息接收时间标识", self.cookie_id)
 
             # 【消息过滤】检查消息是否被过滤规则屏蔽
             try:
@@ -8412,13 +6747,15 @@ class XianyuLive:
                 elif 'text' in message and isinstance(message['text'], str):
                     _filter_msg_text = message['text']
 
-                # 获取 user_id
-                from db_manager import db_manager as _filter_db
-                _filter_cookie_info = _filter_db.get_cookie_by_id(self.cookie_id)
-                _filter_user_id = _filter_cookie_info.get('user_id') if _filter_cookie_info else None
+                # 过滤规则按账号所属用户生效（user_id 只需查询一次）
+                if not self.user_id:
+                    _filter_cookie_info = await db_manager.get_cookie_details_async(self.cookie_id)
+                    if _filter_cookie_info and _filter_cookie_info.get('user_id'):
+                        self.user_id = _filter_cookie_info['user_id']
 
-                _is_filtered, _filter_reason = _filter_db.check_message_filtered(
-                    _filter_buyer_id, _filter_msg_text, _filter_item_id, _filter_user_id)
+                from utils.message_filter import message_filter_cache
+                _is_filtered, _filter_reason = await message_filter_cache.check(
+                    _filter_buyer_id, _filter_msg_text, _filter_item_id, self.user_id)
                 if _is_filtered:
                     logger.info(f"【{self.cookie_id}】消息已被过滤: {_filter_reason}，跳过处理")
                     return
@@ -8850,6 +7187,8 @@ class XianyuLive:
 
     async def main(self):
         """主程序入口"""
+        # 本协程及其创建的任务归属到该账号（事件循环阻塞检测按账号归因）
+        bind_cookie_id(self.cookie_id)
         try:
             logger.info(f"【{self.cookie_id}】开始启动XianyuLive主程序...")
             await self.create_session()  # 创建session
@@ -8931,7 +7270,7 @@ class XianyuLive:
                             logger.info(f"【{self.cookie_id}】准备进入消息循环...")
 
                             async for message in websocket:
-                                logger.info(f"【{self.cookie_id}】收到WebSocket消息: {len(message) if message else 0} 字节")
+                                hot_log("ws_frame", self.cookie_id, "INFO", "【{}】收到WebSocket消息: {} 字节", self.cookie_id, len(message) if message else 0)
                                 try:
                                     message_data = json.loads(message)
 
@@ -8940,7 +7279,8 @@ class XianyuLive:
                                     if hb_handled:
                                         continue
                                     # 修复4：记录非心跳消息，便于诊断
-                                    logger.info(f"【{self.cookie_id}】非心跳消息，进入业务处理: lwp={message_data.get('lwp')}, code={message_data.get('code')}, 大小={len(message)}字节")
+                                    hot_log("ws_frame", self.cookie_id, "INFO", "【{}】非心跳消息，进入业务处理: lwp={}, code={}, 大小={}字节",
+                                            self.cookie_id, message_data.get('lwp'), message_data.get('code'), len(message))
 
                                     # 处理其他消息
                                     # 使用追踪的异步任务处理消息，防止阻塞后续消息接收
@@ -9452,33 +7792,25 @@ class XianyuLive:
                 if os.path.exists(local_image_path):
                     logger.info(f"【{self.cookie_id}】准备上传本地图片到闲鱼CDN: {local_image_path}")
 
-                    # 使用图片上传器上传到闲鱼CDN
-                    from utils.image_uploader import ImageUploader
-                    uploader = ImageUploader(self.cookies_str)
-
-                    async with uploader:
-                        cdn_url = await uploader.upload_image(local_image_path)
-                        if cdn_url:
-                            logger.info(f"【{self.cookie_id}】图片上传成功，CDN URL: {cdn_url}")
-                            image_url = cdn_url
-
-                            # 如果是卡券图片，更新数据库中的图片URL
-                            if card_id is not None:
-                                await self._update_card_image_url(card_id, cdn_url)
-
-                            # 获取实际图片尺寸
-                            from utils.image_utils import image_manager
-                            try:
-                                actual_width, actual_height = image_manager.get_image_size(local_image_path)
-                                if actual_width and actual_height:
-                                    width, height = actual_width, actual_height
-                                    logger.info(f"【{self.cookie_id}】获取到实际图片尺寸: {width}x{height}")
-                            except Exception as e:
-                                logger.warning(f"【{self.cookie_id}】获取图片尺寸失败，使用默认尺寸: {e}")
-                        else:
-                            logger.error(f"【{self.cookie_id}】图片上传失败: {local_image_path}")
-                            logger.error(f"【{self.cookie_id}】❌ Cookie可能已失效！请检查配置并更新Cookie")
-                            raise Exception(f"图片上传失败（Cookie可能已失效）: {local_image_path}")
+                    # 上传到闲鱼CDN（同一图片只上传一次）
+                    uploaded = await self._upload_local_image(local_image_path)
+                    if uploaded:
+                        cdn_url = uploaded['url']
+                        logger.info(f"【{self.cookie_id}】图片上传成功，CDN URL: {cdn_url}")
+                        image_url = cdn_url
+
+                        # 如果是卡券图片，更新数据库中的图片URL
+                        if card_id is not None:
+                            await self._update_card_image_url(card_id, cdn_url)
+
+                        # 实际图片尺寸（上传时已解析）
+                        if uploaded['width'] and uploaded['height']:
+                            width, height = uploaded['width'], uploaded['height']
+                            logger.info(f"【{self.cookie_id}】获取到实际图片尺寸: {width}x{height}")
+                    else:
+                        logger.error(f"【{self.cookie_id}】图片上传失败: {local_image_path}")
+                        logger.error(f"【{self.cookie_id}】❌ Cookie可能已失效！请检查配置并更新Cookie")
+                        raise Exception(f"图片上传失败（Cookie可能已失效）: {local_image_path}")
                 else:
                     logger.error(f"【{self.cookie_id}】本地图片文件不存在: {local_image_path}")
                     raise Exception(f"本地图片文件不存在: {local_image_path}")
@@ -9566,21 +7898,13 @@ class XianyuLive:
             # 上传图片到闲鱼CDN
             logger.info(f"【{self.cookie_id}】开始上传图片: {image_path}")
 
-            from utils.image_uploader import ImageUploader
-            uploader = ImageUploader(self.cookies_str)
-
-            async with uploader:
-                image_url = await uploader.upload_image(image_path)
+            uploaded = await self._upload_local_image(image_path)
 
-            if image_url:
-                # 获取图片信息
-                from utils.image_utils import image_manager
-                try:
-                    from PIL import Image
-                    with Image.open(image_path) as img:
-                        width, height = img.size
-                except Exception as e:
-                    logger.warning(f"无法获取图片尺寸，使用默认值: {e}")
+            if uploaded:
+                image_url = uploaded['url']
+                width, height = uploaded['width'], uploaded['height']
+                if not (width and height):
+                    logger.warning("无法获取图片尺寸，使用默认值")
                     width, height = 800, 600
 
                 # 发送图片消息
@@ -12,14 +12,44 @@ AI回复引擎模块
 import os
 import json
 import time
+import calendar
 import asyncio
 import sqlite3
-import requests  # 确保已导入
 import threading
 from typing import List, Dict, Optional
 from loguru import logger
-from openai import OpenAI
-from db_manager import db_manager
+from db_manager import db_manager, register_hot_query
+from utils.ai_transport import ai_transport, AIRequestError
+
+
+# 每次AI回复都会执行的会话查询（登记到热点查询，由 idx_aic_chat_cookie_created 支撑）
+_CONTEXT_SQL = register_hot_query('ai_conversation_context', '''
+    SELECT role, content FROM ai_conversations
+    WHERE chat_id = ? AND cookie_id = ?
+    ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', ('chat', 'cookie', 20))
+
+_BARGAIN_COUNT_SQL = register_hot_query('ai_bargain_count', '''
+    SELECT COUNT(*) FROM ai_conversations
+    WHERE chat_id = ? AND cookie_id = ? AND intent = 'price' AND role = 'user'
+    ''', ('chat', 'cookie'))
+
+_LATEST_USER_MESSAGES_SQL = register_hot_query('ai_latest_user_messages', '''
+    SELECT content, created_at,
+           julianday('now') - julianday(created_at) as time_diff_days,
+           (julianday('now') - julianday(created_at)) * 86400.0 as time_diff_seconds
+    FROM ai_conversations
+    WHERE chat_id = ? AND cookie_id = ? AND role = 'user'
+    ORDER BY created_at DESC LIMIT 10
+    ''', ('chat', 'cookie'))
+
+# 时间条件写成 created_at > datetime('now', ...) 才能用索引做范围查找
+_RECENT_USER_MESSAGES_SQL = register_hot_query('ai_recent_user_messages', '''
+    SELECT content, created_at FROM ai_conversations
+    WHERE chat_id = ? AND cookie_id = ? AND role = 'user'
+    AND created_at > datetime('now', ?)
+    ORDER BY created_at ASC, id ASC
+    ''', ('chat', 'cookie', '-2 seconds'))
 
 
 class AIReplyEngine:
@@ -101,27 +131,6 @@ class AIReplyEngine:
 - 敷衍回复（如"嗯"、"好的"单独回复）'''
         }
     
-    def _create_openai_client(self, cookie_id: str) -> Optional[OpenAI]:
-        """
-        (原 get_client) 创建指定账号的OpenAI客户端
-        修复 P0-2: 移除了缓存逻辑，以支持多进程无状态部署
-        """
-        settings = db_manager.get_ai_reply_settings(cookie_id)
-        if not settings['ai_enabled'] or not settings['api_key']:
-            return None
-        
-        try:
-            logger.info(f"创建新的OpenAI客户端实例 {cookie_id}: base_url={settings['base_url']}, api_key={'***' + settings['api_key'][-4:] if settings['api_key'] else 'None'}")
-            client = OpenAI(
-                api_key=settings['api_key'].strip(),
-                base_url=settings['base_url'].strip()
-            )
-            logger.info(f"为账号 {cookie_id} 创建OpenAI客户端成功，实际base_url: {client.base_url}")
-            return client
-        except Exception as e:
-            logger.error(f"创建OpenAI客户端失败 {cookie_id}: {e}")
-            return None
-
     def _is_dashscope_api(self, settings: dict) -> bool:
         """判断是否为DashScope API - 只有选择自定义模型时才使用"""
         model_name = settings.get('model_name', '')
@@ -160,7 +169,7 @@ class AIReplyEngine:
             logger.info(f"模型名含gemini但base_url为第三方代理({base_url})，将使用OpenAI兼容API")
         return is_google
 
-    def _call_dashscope_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+    async def _call_dashscope_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
         """调用DashScope API"""
         base_url = settings['base_url']
         if '/apps/' in base_url:
@@ -199,13 +208,12 @@ class AIReplyEngine:
         logger.info(f"发送的prompt: {prompt[:100]}...") # 避免 prompt 过长
         logger.debug(f"请求数据: {json.dumps(data, ensure_ascii=False)}")
 
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-
-        if response.status_code != 200:
-            logger.error(f"DashScope API请求失败: {response.status_code} - {response.text}")
-            raise Exception(f"DashScope API请求失败: {response.status_code} - {response.text}")
+        try:
+            result = await ai_transport.post_json("dashscope", url, data, headers=headers)
+        except AIRequestError as e:
+            logger.error(f"DashScope API请求失败: {e.status_code} - {e.body}")
+            raise Exception(f"DashScope API请求失败: {e.status_code} - {e.body}")
 
-        result = response.json()
         logger.debug(f"DashScope API响应: {json.dumps(result, ensure_ascii=False)}")
 
         if 'output' in result and 'text' in result['output']:
@@ -213,7 +221,7 @@ class AIReplyEngine:
         else:
             raise Exception(f"DashScope API响应格式错误: {result}")
 
-    def _call_gemini_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+    async def _call_gemini_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
         """
         调用Google Gemini REST API (v1beta)
         """
@@ -266,13 +274,12 @@ class AIReplyEngine:
         logger.info(f"Calling Gemini REST API: {url.split('?')[0]}")
         logger.debug(f"Gemini Payload: {json.dumps(payload, ensure_ascii=False)}")
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        try:
+            result = await ai_transport.post_json("gemini", url, payload, headers=headers)
+        except AIRequestError as e:
+            logger.error(f"Gemini API 请求失败: {e.status_code} - {e.body}")
+            raise Exception(f"Gemini API 请求失败: {e.status_code} - {e.body}")
 
-        if response.status_code != 200:
-            logger.error(f"Gemini API 请求失败: {response.status_code} - {response.text}")
-            raise Exception(f"Gemini API 请求失败: {response.status_code} - {response.text}")
-            
-        result = response.json()
         logger.debug(f"Gemini API 响应: {json.dumps(result, ensure_ascii=False)}")
 
         try:
@@ -282,9 +289,8 @@ class AIReplyEngine:
             logger.error(f"Gemini API 响应格式错误: {result} - {e}")
             raise Exception(f"Gemini API 响应格式错误: {result}")
 
-    def _call_openai_api(self, client: OpenAI, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7, image_urls: list = None) -> str:
-        """调用OpenAI兼容API（支持多模态图片）"""
-        import os
+    async def _call_openai_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7, image_urls: list = None) -> str:
+        """调用OpenAI兼容API（支持多模态图片，客户端由 ai_transport 按 base_url + api_key 复用）"""
         try:
             if image_urls:
                 # ===== 有图片：切换到视觉模型 =====
@@ -298,13 +304,13 @@ class AIReplyEngine:
                     logger.warning("有图片但未配置视觉模型 API Key，降级到文本模型（不传图片）")
                     # 降级：用原配置的文本模型，不传图片
                     logger.info(f"调用OpenAI API: model={settings['model_name']}, base_url={settings.get('base_url', 'default')}")
-                    response = client.chat.completions.create(
+                    return await ai_transport.chat(
+                        "openai", settings['base_url'], settings['api_key'],
                         model=settings['model_name'],
                         messages=messages,
                         max_tokens=100,  # 降级到文本模型，100足够
                         temperature=temperature
                     )
-                    return response.choices[0].message.content.strip()
 
                 # 构建多模态 messages：把最后一条 user 消息的 content 改为多模态格式
                 multimodal_messages = []
@@ -317,27 +323,25 @@ class AIReplyEngine:
                     else:
                         multimodal_messages.append(msg)
 
-                # 创建 vision client，用视觉模型配置
-                vision_client = OpenAI(api_key=vision_api_key, base_url=vision_base_url)
+                # 用视觉模型配置调用（超时见 AI_TIMEOUT_VISION，默认25秒）
                 logger.info(f"调用视觉模型: model={vision_model}, base_url={vision_base_url}, image_count={len(image_urls)}")
-                response = vision_client.chat.completions.create(
+                return await ai_transport.chat(
+                    "vision", vision_base_url, vision_api_key,
                     model=vision_model,
                     messages=multimodal_messages,
                     max_tokens=max_tokens,  # 视觉模型：调用方传入1500（Thinking模型需要更多token）
-                    temperature=temperature,
-                    timeout=25  # 视觉模型需要更长超时
+                    temperature=temperature
                 )
-                return response.choices[0].message.content.strip()
             else:
                 # ===== 无图片：用原配置（火山方舟 deepseek-3.2 等）=====
                 logger.info(f"调用OpenAI API: model={settings['model_name']}, base_url={settings.get('base_url', 'default')}")
-                response = client.chat.completions.create(
+                return await ai_transport.chat(
+                    "openai", settings['base_url'], settings['api_key'],
                     model=settings['model_name'],
                     messages=messages,
                     max_tokens=max_tokens,
                     temperature=temperature
                 )
-                return response.choices[0].message.content.strip()
         except Exception as e:
             logger.error(f"OpenAI API调用失败: {e}")
             # 如果有详细的错误信息，打印出来
@@ -390,14 +394,14 @@ class AIReplyEngine:
             logger.error(f"本地意图检测失败 {cookie_id}: {e}")
             return 'default'
     
-    def _get_chat_lock(self, chat_id: str) -> threading.Lock:
+    def _get_chat_lock(self, chat_id: str) -> asyncio.Lock:
         """获取指定chat_id的锁，如果不存在则创建"""
         with self._chat_locks_lock:
             if chat_id not in self._chat_locks:
                 # 超过最大数量时，清理最旧的一半
                 if len(self._chat_locks) >= self._max_chat_locks:
                     self._cleanup_old_chat_locks()
-                self._chat_locks[chat_id] = threading.Lock()
+                self._chat_locks[chat_id] = asyncio.Lock()
             self._chat_lock_times[chat_id] = time.time()
             return self._chat_locks[chat_id]
             
@@ -415,10 +419,10 @@ class AIReplyEngine:
                 del self._chat_lock_times[chat_id]
         logger.info(f"清理了旧聊天锁，当前锁数量: {len(self._chat_locks)}")
     
-    def generate_reply(self, message: str, item_info: dict, chat_id: str,
-                      cookie_id: str, user_id: str, item_id: str,
-                      skip_wait: bool = False, image_urls: list = None) -> Optional[str]:
-        """生成AI回复"""
+    async def generate_reply(self, message: str, item_info: dict, chat_id: str,
+                             cookie_id: str, user_id: str, item_id: str,
+                             skip_wait: bool = False, image_urls: list = None) -> Optional[str]:
+        """生成AI回复（协程，直接在调用方事件循环中执行，AI接口调用见 ai_transport）"""
         if not self.is_ai_enabled(cookie_id):
             return None
         
@@ -434,7 +438,7 @@ class AIReplyEngine:
             if not skip_wait:
                 logger.info(f"【{cookie_id}】消息已保存，等待10秒收集后续消息: {message[:20]}... (时间:{message_created_at})")
                 # 固定等待10秒，等待可能的后续消息（在锁外延迟，避免阻塞其他消息保存）
-                time.sleep(10)
+                await asyncio.sleep(10)
             else:
                 logger.info(f"【{cookie_id}】消息已保存（外部防抖已启用，跳过内部等待）: {message[:20]}... (时间:{message_created_at})")
             
@@ -442,7 +446,7 @@ class AIReplyEngine:
             chat_lock = self._get_chat_lock(chat_id)
             
             # 使用锁确保同一chat_id的消息串行处理
-            with chat_lock:
+            async with chat_lock:
                 # 获取最近时间窗口内的所有用户消息
                 # 如果 skip_wait=True（外部防抖），查询窗口为6秒（1秒防抖 + 5秒缓冲）
                 # 如果 skip_wait=False（内部等待），查询窗口为25秒（10秒等待 + 10秒消息间隔 + 5秒缓冲）
@@ -610,22 +614,20 @@ class AIReplyEngine:
 
                 if self._is_dashscope_api(settings):
                     logger.info(f"使用DashScope API生成回复")
-                    reply = self._call_dashscope_api(settings, messages, max_tokens=100, temperature=0.7)
+                    reply = await self._call_dashscope_api(settings, messages, max_tokens=100, temperature=0.7)
                 
                 elif self._is_gemini_api(settings):
                     logger.info(f"使用Gemini API生成回复")
-                    reply = self._call_gemini_api(settings, messages, max_tokens=100, temperature=0.7)
+                    reply = await self._call_gemini_api(settings, messages, max_tokens=100, temperature=0.7)
                 
                 else:
                     logger.info(f"使用OpenAI兼容API生成回复")
-                    # 修复 P0-2: 调用已修改的无状态客户端创建方法
-                    client = self._create_openai_client(cookie_id)
-                    if not client:
+                    if not settings['api_key']:
                         return None
                     logger.info(f"messages:{messages}")
                     # 视觉模型需要更多max_tokens（Thinking模型有大量隐藏推理token，100会被截断为0-2字输出）
                     effective_max_tokens = 1500 if image_urls else 100
-                    reply = self._call_openai_api(client, settings, messages, max_tokens=effective_max_tokens, temperature=0.7, image_urls=image_urls)
+                    reply = await self._call_openai_api(settings, messages, max_tokens=effective_max_tokens, temperature=0.7, image_urls=image_urls)
 
                 # 11. 保存AI回复到对话记录
                 self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", reply, intent)
@@ -646,73 +648,43 @@ class AIReplyEngine:
                 logger.error(f"请求URL: {e.request.url}")
             return None
 
-    async def generate_reply_async(self, message: str, item_info: dict, chat_id: str,
-                                   cookie_id: str, user_id: str, item_id: str,
-                                   skip_wait: bool = False, image_urls: list = None) -> Optional[str]:
-        """
-        异步包装器：在独立线程池中执行同步的 `generate_reply`，并返回结果。
-        这样可以在异步代码中直接 await，而不阻塞事件循环。
-        """
-        try:
-            import asyncio as _asyncio
-            return await _asyncio.to_thread(self.generate_reply, message, item_info, chat_id, cookie_id, user_id, item_id, skip_wait, image_urls)
-        except Exception as e:
-            logger.error(f"异步生成回复失败: {e}")
-            return None
-    
     def get_conversation_context(self, chat_id: str, cookie_id: str, limit: int = 20) -> List[Dict]:
         """获取对话上下文"""
         try:
             with db_manager.lock:
                 cursor = db_manager.conn.cursor()
-                cursor.execute('''
-                SELECT role, content FROM ai_conversations 
-                WHERE chat_id = ? AND cookie_id = ? 
-                ORDER BY created_at DESC LIMIT ?
-                ''', (chat_id, cookie_id, limit))
+                cursor.execute(_CONTEXT_SQL, (chat_id, cookie_id, limit))
                 
                 results = cursor.fetchall()
                 context = [{"role": row[0], "content": row[1]} for row in reversed(results)]
-                return context
+                # 合并尚未落盘的对话记录（持锁期间队列与数据库不会重复）
+                pending = db_manager.pending_ai_conversations(cookie_id, chat_id)
+                context.extend({"role": row['role'], "content": row['content']} for row in pending)
+                return context[-limit:] if limit else context
         except Exception as e:
             logger.error(f"获取对话上下文失败: {e}")
             return []
     
     def save_conversation(self, chat_id: str, cookie_id: str, user_id: str, 
                          item_id: str, role: str, content: str, intent: str = None) -> Optional[str]:
-        """保存对话记录，返回创建时间"""
+        """保存对话记录（写入批量队列），返回创建时间"""
         try:
-            with db_manager.lock:
-                cursor = db_manager.conn.cursor()
-                cursor.execute('''
-                INSERT INTO ai_conversations 
-                (cookie_id, chat_id, user_id, item_id, role, content, intent)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (cookie_id, chat_id, user_id, item_id, role, content, intent))
-                db_manager.conn.commit()
-                
-                # 获取刚插入记录的created_at
-                cursor.execute('''
-                SELECT created_at FROM ai_conversations 
-                WHERE rowid = last_insert_rowid()
-                ''')
-                result = cursor.fetchone()
-                return result[0] if result else None
+            return db_manager.queue_ai_conversation(cookie_id, chat_id, user_id, item_id, role, content, intent)
         except Exception as e:
             logger.error(f"保存对话记录失败: {e}")
             return None
+
     def get_bargain_count(self, chat_id: str, cookie_id: str) -> int:
         """获取议价次数"""
         try:
             with db_manager.lock:
                 cursor = db_manager.conn.cursor()
-                cursor.execute('''
-                SELECT COUNT(*) FROM ai_conversations 
-                WHERE chat_id = ? AND cookie_id = ? AND intent = 'price' AND role = 'user'
-                ''', (chat_id, cookie_id))
+                cursor.execute(_BARGAIN_COUNT_SQL, (chat_id, cookie_id))
                 
                 result = cursor.fetchone()
-                return result[0] if result else 0
+                pending = db_manager.pending_ai_conversations(cookie_id, chat_id)
+                return (result[0] if result else 0) + sum(
+                    1 for row in pending if row['intent'] == 'price' and row['role'] == 'user')
         except Exception as e:
             logger.error(f"获取议价次数失败: {e}")
             return 0
@@ -723,28 +695,25 @@ class AIReplyEngine:
             with db_manager.lock:
                 cursor = db_manager.conn.cursor()
                 # 先查询所有该chat的user消息，用于调试
-                cursor.execute('''
-                SELECT content, created_at, 
-                       julianday('now') - julianday(created_at) as time_diff_days,
-                       (julianday('now') - julianday(created_at)) * 86400.0 as time_diff_seconds
-                FROM ai_conversations 
-                WHERE chat_id = ? AND cookie_id = ? AND role = 'user' 
-                ORDER BY created_at DESC LIMIT 10
-                ''', (chat_id, cookie_id))
+                cursor.execute(_LATEST_USER_MESSAGES_SQL, (chat_id, cookie_id))
                 
                 all_messages = cursor.fetchall()
                 logger.info(f"【调试】chat_id={chat_id} 最近10条user消息: {[(msg[0][:10], msg[1], f'{msg[3]:.2f}秒前') for msg in all_messages]}")
                 
                 # 正式查询
-                cursor.execute('''
-                SELECT content, created_at FROM ai_conversations 
-                WHERE chat_id = ? AND cookie_id = ? AND role = 'user' 
-                AND julianday('now') - julianday(created_at) < (? / 86400.0)
-                ORDER BY created_at ASC
-                ''', (chat_id, cookie_id, seconds))
+                cursor.execute(_RECENT_USER_MESSAGES_SQL, (chat_id, cookie_id, f'-{seconds} seconds'))
                 
                 results = cursor.fetchall()
-                return [{"content": row[0], "created_at": row[1]} for row in results]
+                messages = [{"content": row[0], "created_at": row[1]} for row in results]
+                # 合并尚未落盘的用户消息（created_at 为UTC时间，与 julianday('now') 一致）
+                now = time.time()
+                for row in db_manager.pending_ai_conversations(cookie_id, chat_id):
+                    if row['role'] != 'user':
+                        continue
+                    created = calendar.timegm(time.strptime(row['created_at'], '%Y-%m-%d %H:%M:%S'))
+                    if now - created < seconds:
+                        messages.append({"content": row['content'], "created_at": row['created_at']})
+                return messages
         except Exception as e:
             logger.error(f"获取最近用户消息列表失败: {e}")
             return []
@@ -958,11 +927,6 @@ class MemoryEvolutionService:
             if not settings['ai_enabled'] or not settings.get('api_key'):
                 return None
             
-            from openai import AsyncOpenAI
-            client = AsyncOpenAI(
-                api_key=settings['api_key'],
-                base_url=settings.get('base_url', '')
-            )
             
             system_prompt = """你是客服对话分析助手。分析以下客服对话，提取关键信息。
 请输出JSON格式（不要输出其他内容）：
@@ -990,7 +954,8 @@ class MemoryEvolutionService:
 - inquiry_only: 只问不买、收集信息、无购买意图
 注意：lessons最多3条，knowledge_suggestions最多2条。如果没有有价值的信息，返回空数组。"""
             
-            response = await client.chat.completions.create(
+            result_text = await ai_transport.chat(
+                "openai", settings.get('base_url', ''), settings['api_key'],
                 model=settings['model_name'],
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -1000,8 +965,6 @@ class MemoryEvolutionService:
                 temperature=0.3,
                 timeout=30
             )
-            
-            result_text = response.choices[0].message.content.strip()
             # 尝试解析JSON
             if result_text.startswith('```'):
                 result_text = result_text.split('```')[1]
@@ -0,0 +1 @@
+"""离线基准测试：本地假闲鱼 WebSocket 服务端与回放驱动"""
@@ -0,0 +1,5 @@
+import sys
+
+from benchmarks.replay import main
+
+sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+本地闲鱼 WebSocket 服务端（离线基准测试用）
+
+实现 XianyuLive.main 依赖的协议子集：
+- /reg 注册：按 headers.token 识别账号，返回带 sid/body 的注册应答
+- /r/SyncStatus/ackDiff、/! 心跳：返回 code=200 应答
+- /r/MessageSend/sendByReceiverScope：记录回复到达时间并应答
+- 客户端对同步包的 ACK（code=200）：计数
+
+服务端运行在独立线程的事件循环中（与真实服务端一样不占用被测事件循环），
+按给定速率把同步帧推送到各账号连接。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from benchmarks.frames import response_frame, sent_chat_id
+
+
+class FakeXianyuServer:
+    """单进程内的假闲鱼消息服务端"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        # token -> 连接
+        self.connections: Dict[str, Any] = {}
+        self._registered: Optional[asyncio.Condition] = None
+        # (会话ID, perf_counter) 列表：推送时间 / 收到回复时间
+        self.pushed: List[Tuple[str, float]] = []
+        self.replies: List[Tuple[str, float]] = []
+        self.stats = {"registrations": 0, "heartbeats": 0, "acks": 0, "sends": 0}
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    # -------------------- 生命周期 --------------------
+
+    def start(self) -> None:
+        """在后台线程启动服务端，返回时已开始监听"""
+        self._thread = threading.Thread(target=self._run, name="fake-xianyu-ws", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(10):
+            raise RuntimeError("假闲鱼服务端启动超时")
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._serve())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _serve(self) -> None:
+        import websockets
+        self._registered = asyncio.Condition()
+        self._server = await websockets.serve(self._handler, self.host, self.port, max_size=None)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self) -> None:
+        if self.loop is None:
+            return
+
+        async def _close():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(_close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(10)
+
+    def call(self, coro, timeout: Optional[float] = None):
+        """在服务端线程中执行协程并等待结果（供其他线程调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    # -------------------- 协议处理 --------------------
+
+    async def _handler(self, ws, path: str = None) -> None:
+        token = None
+        try:
+            async for raw in ws:
+                frame = json.loads(raw)
+                lwp = frame.get("lwp")
+                mid = (frame.get("headers") or {}).get("mid", "")
+                if lwp is None:
+                    # 客户端对推送的 ACK
+                    self.stats["acks"] += 1
+                elif lwp == "/!":
+                    self.stats["heartbeats"] += 1
+                    await ws.send(json.dumps(response_frame(mid)))
+                elif lwp == "/reg":
+                    token = frame["headers"].get("token")
+                    await ws.send(json.dumps(response_frame(mid, body={"unitName": "bench"}, sid=f"sid-{token}")))
+                    async with self._registered:
+                        self.connections[token] = ws
+                        self.stats["registrations"] += 1
+                        self._registered.notify_all()
+                elif lwp == "/r/MessageSend/sendByReceiverScope":
+                    self.replies.append((sent_chat_id(frame), time.perf_counter()))
+                    self.stats["sends"] += 1
+                    await ws.send(json.dumps(response_frame(mid, body={"reason": "success"})))
+                else:
+                    await ws.send(json.dumps(response_frame(mid)))
+        except Exception as e:
+            logger.debug(f"假服务端连接结束: {e}")
+        finally:
+            if token and self.connections.get(token) is ws:
+                del self.connections[token]
+
+    async def wait_registered(self, tokens: List[str], timeout: float) -> None:
+        """等待所有账号完成 /reg 注册"""
+        async def _wait():
+            async with self._registered:
+                await self._registered.wait_for(lambda: all(t in self.connections for t in tokens))
+        await asyncio.wait_for(_wait(), timeout)
+
+    async def replay(self, frames: List[Tuple[str, str, Dict[str, Any]]], rate: float) -> float:
+        """按速率推送同步帧
+
+        Args:
+            frames: (账号token, 会话ID, 帧) 列表
+            rate: 每秒推送帧数，<=0 表示不限速
+
+        Returns:
+            实际推送耗时（秒）
+        """
+        start = time.perf_counter()
+        for index, (token, chat_id, frame) in enumerate(frames):
+            if rate > 0:
+                delay = start + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            ws = self.connections.get(token)
+            if ws is None:
+                continue
+            data = json.dumps(frame)
+            self.pushed.append((chat_id, time.perf_counter()))
+            await ws.send(data)
+        return time.perf_counter() - start
@@ -0,0 +1,124 @@
+"""
+闲鱼 WebSocket 帧构造
+
+生成与线上一致的同步推送帧：聊天消息先按 MessagePack 编码（整数键），再 Base64，
+放入 body.syncPushPackage.data[0].data，XianyuLive.handle_message 会走 decrypt_to_obj 解码。
+"""
+from __future__ import annotations
+
+import base64
+import json
+import struct
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import msgpack  # 与 utils.xianyu_utils 一致：可选的C扩展
+except ImportError:
+    msgpack = None
+
+
+def _pack(value: Any) -> bytes:
+    """最小的 MessagePack 编码器（未安装 msgpack 时使用，只覆盖帧里出现的类型）"""
+    if value is None:
+        return b"\xc0"
+    if value is True:
+        return b"\xc3"
+    if value is False:
+        return b"\xc2"
+    if isinstance(value, int):
+        if 0 <= value < 0x80:
+            return struct.pack("B", value)
+        if -32 <= value < 0:
+            return struct.pack("b", value)
+        if 0 <= value < 2 ** 64:
+            return b"\xcf" + struct.pack(">Q", value)
+        return b"\xd3" + struct.pack(">q", value)
+    if isinstance(value, float):
+        return b"\xcb" + struct.pack(">d", value)
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        if len(data) < 32:
+            return struct.pack("B", 0xA0 | len(data)) + data
+        return b"\xdb" + struct.pack(">I", len(data)) + data
+    if isinstance(value, bytes):
+        return b"\xc6" + struct.pack(">I", len(value)) + value
+    if isinstance(value, (list, tuple)):
+        return b"\xdd" + struct.pack(">I", len(value)) + b"".join(_pack(v) for v in value)
+    if isinstance(value, dict):
+        return b"\xdf" + struct.pack(">I", len(value)) + b"".join(_pack(k) + _pack(v) for k, v in value.items())
+    raise TypeError(f"不支持的类型: {type(value)}")
+
+
+def encode_payload(message: Dict[Any, Any]) -> str:
+    """把消息对象编码为同步包中的 data 字段（MessagePack + Base64）"""
+    packed = msgpack.packb(message, use_bin_type=True) if msgpack is not None else _pack(message)
+    return base64.b64encode(packed).decode("ascii")
+
+
+def chat_message(chat_id: str, buyer_id: str, item_id: str, text: str, message_id: str,
+                 buyer_nick: str = "bench_buyer", create_time: Optional[int] = None) -> Dict[int, Any]:
+    """买家聊天消息（解码后的结构与线上一致，键为整数）"""
+    content = json.dumps({"contentType": 1, "text": {"text": text}}, ensure_ascii=False)
+    return {
+        1: {
+            2: f"{chat_id}@goofish",
+            5: create_time or int(time.time() * 1000),
+            6: {3: {4: 1, 5: content}},
+            10: {
+                "reminderContent": text,
+                "reminderTitle": buyer_nick,
+                "senderNick": buyer_nick,
+                "senderUserId": buyer_id,
+                "sessionType": "1",
+                "reminderUrl": f"fleamarket://message_chat?itemId={item_id}&peerUserId={buyer_id}&sid={chat_id}",
+                "bizTag": json.dumps({"sourceId": "S:1", "messageId": message_id}),
+            },
+        },
+    }
+
+
+def sync_frame(payload: str, mid: str) -> Dict[str, Any]:
+    """服务端同步推送帧（/s/para），headers.mid 用于客户端回 ACK"""
+    now = int(time.time() * 1000)
+    return {
+        "lwp": "/s/para",
+        "headers": {"mid": mid, "sid": "bench-sid", "dt": "j", "app-key": "bench"},
+        "body": {
+            "syncPushPackage": {
+                "data": [{
+                    "bizType": 40,
+                    "data": payload,
+                    "objectType": 40000,
+                    "streamId": "bench",
+                    "pts": now * 1000,
+                    "seq": 0,
+                }],
+                "hasMore": 0,
+                "maxHighPts": 0,
+                "maxPts": now * 1000,
+                "minCreateTime": now,
+                "timestamp": now,
+                "topic": "sync",
+            },
+        },
+    }
+
+
+def response_frame(mid: str, body: Optional[Dict[str, Any]] = None, sid: Optional[str] = None) -> Dict[str, Any]:
+    """服务端应答帧；注册应答需带 body/sid，否则客户端会当作心跳应答"""
+    frame: Dict[str, Any] = {"code": 200, "headers": {"mid": mid}}
+    if sid:
+        frame["headers"]["sid"] = sid
+    if body is not None:
+        frame["body"] = body
+    return frame
+
+
+def sent_chat_id(frame: Dict[str, Any]) -> Optional[str]:
+    """从客户端发送消息帧中取出会话ID（不含 @goofish）"""
+    try:
+        cid = frame["body"][0]["cid"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return cid.split("@")[0]
@@ -0,0 +1,301 @@
+"""
+离线端到端延迟基准
+
+启动本地假闲鱼服务端和 N 个真实的 XianyuLive 实例（完整的 main() 连接/注册/心跳/收消息流程），
+按给定速率推送合成或录制的聊天帧，统计：
+
+- handle_message 开始 → send_msg 发出回复 的延迟（p50/p95/p99）
+- 服务端推送 → 服务端收到回复 的往返延迟
+- 回复吞吐量
+
+使用临时数据库和日志目录，不访问 goofish.com。示例：
+
+    python -m benchmarks.replay --accounts 4 --messages 2000 --rate 200
+    python -m benchmarks.replay --frames recorded.jsonl --json result.json --max-p95-ms 50
+
+录制帧文件为 JSONL，每行可以是：
+- 线上抓到的完整同步帧（含 body.syncPushPackage）
+- {"message": 解码后的消息对象}
+可选字段 "account" 指定推送到第几个账号（默认轮流分配）。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from loguru import logger
+
+from benchmarks.fake_server import FakeXianyuServer
+from benchmarks.frames import chat_message, encode_payload, sync_frame
+
+# 合成消息命中的关键词及回复
+KEYWORD = "你好"
+KEYWORD_REPLY = "在的，亲，有什么可以帮您？"
+# 合成账号的用户ID前缀（Cookie 中的 unb）
+ACCOUNT_UID_BASE = 2200000000
+
+
+def _token(account: int) -> str:
+    return f"bench-token-{account}"
+
+
+# -------------------- 帧准备 --------------------
+
+def synthetic_frames(accounts: int, messages: int, chats: int = 0) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """生成合成聊天帧；chats>0 时每个账号只使用 chats 个会话（会触发防抖合并）"""
+    frames = []
+    for seq in range(messages):
+        account = seq % accounts
+        chat_id = f"a{account}c{(seq // accounts) % chats}" if chats > 0 else f"bench{seq}"
+        buyer_id = str(1000000 + seq % 50000)
+        message = chat_message(chat_id, buyer_id, item_id=str(900000000000 + account),
+                               text=f"{KEYWORD}，还在吗 #{seq}", message_id=f"bench-msg-{seq}")
+        frames.append((_token(account), chat_id, sync_frame(encode_payload(message), mid=f"{seq}bench 0")))
+    return frames
+
+
+def load_frames(path: str, accounts: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """读取录制的帧文件（JSONL）"""
+    from utils.xianyu_utils import decrypt_to_obj
+
+    frames = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            seq = len(frames)
+            account = int(record.get("account", seq)) % accounts
+            mid = f"{seq}bench 0"
+            if "message" in record:
+                message = record["message"]
+                frame = sync_frame(encode_payload(message), mid=mid)
+            else:
+                frame = record.get("frame", record)
+                frame.setdefault("headers", {})["mid"] = mid
+                message = decrypt_to_obj(frame["body"]["syncPushPackage"]["data"][0]["data"])
+            chat_raw = str(message["1"]["2"] if "1" in message else message[1][2])
+            frames.append((_token(account), chat_raw.split("@")[0], frame))
+    return frames
+
+
+# -------------------- 统计 --------------------
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(v * 1000 for v in latencies)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def match_replies(requests: List[Tuple[str, float]], replies: List[Tuple[str, float]]) -> Tuple[List[float], int, int]:
+    """按会话把回复与请求配对
+
+    防抖会把同一会话的连续消息合并为一次回复，因此每条回复对应该会话此前最近一条未回复的消息，
+    更早的未回复消息计为被合并。
+
+    Returns:
+        (延迟列表, 被合并的消息数, 未收到回复的消息数)
+    """
+    events = sorted([(t, 0, chat) for chat, t in requests] + [(t, 1, chat) for chat, t in replies])
+    pending: Dict[str, List[float]] = defaultdict(list)
+    latencies: List[float] = []
+    coalesced = 0
+    for t, kind, chat in events:
+        if kind == 0:
+            pending[chat].append(t)
+        elif pending.get(chat):
+            waiting = pending.pop(chat)
+            latencies.append(t - waiting[-1])
+            coalesced += len(waiting) - 1
+    unanswered = sum(len(v) for v in pending.values())
+    return latencies, coalesced, unanswered
+
+
+# -------------------- 运行 --------------------
+
+def _instrument(live, chat_by_mid: Dict[str, str], started: List[Tuple[str, float]],
+                sent: List[Tuple[str, float]]) -> None:
+    """在实例上包一层计时（只替换实例属性，不改动类）"""
+    handle_message = live.handle_message
+    send_msg = live.send_msg
+
+    async def timed_handle_message(message_data, websocket):
+        chat_id = chat_by_mid.get((message_data.get("headers") or {}).get("mid"))
+        if chat_id is not None:
+            started.append((chat_id, time.perf_counter()))
+        await handle_message(message_data, websocket)
+
+    async def timed_send_msg(ws, cid, toid, text):
+        await send_msg(ws, cid, toid, text)
+        sent.append((cid, time.perf_counter()))
+
+    live.handle_message = timed_handle_message
+    live.send_msg = timed_send_msg
+
+
+async def run_benchmark(accounts: int, frames: List[Tuple[str, str, Dict[str, Any]]], rate: float,
+                        debounce: float, drain_timeout: float) -> Dict[str, Any]:
+    from db_manager import db_manager
+    from XianyuAutoAsync import XianyuLive
+
+    server = FakeXianyuServer()
+    server.start()
+    chat_by_mid = {frame["headers"]["mid"]: chat_id for _, chat_id, frame in frames}
+    started: List[Tuple[str, float]] = []
+    sent: List[Tuple[str, float]] = []
+    tasks = []
+    try:
+        for account in range(accounts):
+            cookie_id = f"bench{account}"
+            cookies_str = f"unb={ACCOUNT_UID_BASE + account}; cookie2=bench; _m_h5_tk=bench_0"
+            db_manager.save_cookie(cookie_id, cookies_str)
+            db_manager.save_keywords(cookie_id, [(KEYWORD, KEYWORD_REPLY)])
+
+            live = XianyuLive(cookies_str, cookie_id=cookie_id)
+            live.base_url = server.url
+            # 预置 token 并关闭 Cookie 刷新，main() 不会访问闲鱼接口
+            live.current_token = _token(account)
+            live.last_token_refresh_time = time.time()
+            live.cookie_refresh_enabled = False
+            live.message_debounce_delay = debounce
+            _instrument(live, chat_by_mid, started, sent)
+            tasks.append(asyncio.create_task(live.main()))
+
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            server.wait_registered([_token(a) for a in range(accounts)], timeout=30), server.loop))
+
+        push_seconds = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            server.replay(frames, rate), server.loop))
+
+        # 等待回复：全部到达或 drain_timeout 内没有新回复
+        last_count, idle_since = -1, time.perf_counter()
+        while len(server.replies) < len(frames):
+            await asyncio.sleep(0.05)
+            if len(server.replies) != last_count:
+                last_count, idle_since = len(server.replies), time.perf_counter()
+            elif time.perf_counter() - idle_since > drain_timeout:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.stop()
+        db_manager.close()
+
+    hot_path, coalesced, unanswered = match_replies(started, sent)
+    wire, _, _ = match_replies(server.pushed, server.replies)
+    duration = (server.replies[-1][1] - server.pushed[0][1]) if server.replies and server.pushed else 0.0
+    return {
+        "accounts": accounts,
+        "messages": len(frames),
+        "rate": rate,
+        "debounce": debounce,
+        "push_seconds": round(push_seconds, 3),
+        "replies": len(server.replies),
+        "coalesced": coalesced,
+        "unanswered": unanswered,
+        "duration_seconds": round(duration, 3),
+        "throughput_per_second": round(len(server.replies) / duration, 2) if duration > 0 else 0.0,
+        "handle_to_send_ms": summarize(hot_path),
+        "wire_round_trip_ms": summarize(wire),
+        "server": dict(server.stats),
+    }
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    def row(name, stats):
+        return (f"n={stats['count']:<6} p50={stats['p50']:>9.3f}ms  p95={stats['p95']:>9.3f}ms  "
+                f"p99={stats['p99']:>9.3f}ms  max={stats['max']:>9.3f}ms  {name}")
+
+    return "\n".join([
+        f"账号 {result['accounts']}，消息 {result['messages']}，推送速率 {result['rate'] or '不限'}/s，"
+        f"防抖 {result['debounce']}s",
+        f"回复 {result['replies']}，合并 {result['coalesced']}，未回复 {result['unanswered']}，"
+        f"吞吐 {result['throughput_per_second']} 条/s（{result['duration_seconds']}s）",
+        row("handle_message→send_msg", result["handle_to_send_ms"]),
+        row("推送→收到回复", result["wire_round_trip_ms"]),
+    ])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="闲鱼自动回复离线延迟基准（本地假 WebSocket 服务端）")
+    parser.add_argument("--accounts", type=int, default=2, help="账号数量")
+    parser.add_argument("--messages", type=int, default=500, help="合成消息数量（指定 --frames 时忽略）")
+    parser.add_argument("--rate", type=float, default=100, help="每秒推送消息数，0 表示不限速")
+    parser.add_argument("--chats", type=int, default=0, help="每个账号的会话数，0 表示每条消息一个会话")
+    parser.add_argument("--debounce", type=float, default=0, help="回复防抖延迟（秒），线上默认 1")
+    parser.add_argument("--frames", help="录制帧文件（JSONL）")
+    parser.add_argument("--drain-timeout", type=float, default=5, help="推送结束后无新回复的最长等待（秒）")
+    parser.add_argument("--log-level", default="WARNING", help="写入临时目录 bench.log 的日志级别，OFF 关闭")
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    parser.add_argument("--max-p95-ms", type=float, help="handle_message→send_msg 的 p95 超过该值时返回 1")
+    parser.add_argument("--min-throughput", type=float, help="吞吐量低于该值时返回 1")
+    args = parser.parse_args(argv)
+    # 下面会切换到临时目录，命令行中的相对路径先按原工作目录解析
+    if args.frames:
+        args.frames = os.path.abspath(args.frames)
+    if args.json_path:
+        args.json_path = os.path.abspath(args.json_path)
+
+    # 临时数据库与日志目录：必须在导入 db_manager / XianyuAutoAsync 之前设置
+    workdir = tempfile.mkdtemp(prefix="xianyu-bench-")
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.chdir(workdir)
+
+    # db_manager 导入时即初始化数据库，先关闭默认输出；XianyuAutoAsync 导入时添加的日志输出随后替换
+    logger.remove()
+    import db_manager  # noqa: F401
+    import XianyuAutoAsync  # noqa: F401
+    logger.remove()
+    if args.log_level.upper() != "OFF":
+        logger.add(os.path.join(workdir, "bench.log"), level=args.log_level.upper(), enqueue=True)
+
+    frames = (load_frames(args.frames, args.accounts) if args.frames
+              else synthetic_frames(args.accounts, args.messages, args.chats))
+    result = asyncio.run(run_benchmark(args.accounts, frames, args.rate, args.debounce, args.drain_timeout))
+    result["workdir"] = workdir
+
+    print(format_report(result))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failed = result["replies"] == 0
+    if args.max_p95_ms is not None and result["handle_to_send_ms"]["p95"] > args.max_p95_ms:
+        print(f"p95 {result['handle_to_send_ms']['p95']}ms 超过阈值 {args.max_p95_ms}ms")
+        failed = True
+    if args.min_throughput is not None and result["throughput_per_second"] < args.min_throughput:
+        print(f"吞吐 {result['throughput_per_second']} 条/s 低于阈值 {args.min_throughput}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
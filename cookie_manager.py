@@ -3,6 +3,8 @@ import asyncio
 from typing import Dict, List, Tuple, Optional
 from loguru import logger
 from db_manager import db_manager
+from utils.keyword_matcher import keyword_matcher_cache
+from utils.message_filter import message_filter_cache
 
 __all__ = ["CookieManager", "manager"]
 
@@ -49,6 +51,8 @@ class CookieManager:
 
         # 重新加载数据
         self._load_from_db()
+        keyword_matcher_cache.invalidate()
+        message_filter_cache.invalidate()
 
         new_cookies_count = len(self.cookies)
         new_keywords_count = len(self.keywords)
@@ -178,38 +182,45 @@ class CookieManager:
             self._task_locks.pop(cookie_id, None)
             # 从数据库删除
             db_manager.delete_cookie(cookie_id)
+            keyword_matcher_cache.invalidate(cookie_id)
             logger.info(f"已移除账号: {cookie_id}")
 
     # ------------------------ 对外线程安全接口 ------------------------
-    def add_cookie(self, cookie_id: str, cookie_value: str, kw_list: Optional[List[Tuple[str, str]]] = None, user_id: int = None):
-        """线程安全新增 Cookie 并启动任务"""
-        if kw_list is not None:
-            self.keywords[cookie_id] = kw_list
-        else:
-            self.keywords.setdefault(cookie_id, [])
+    def _dispatch(self, coro):
+        """在账号事件循环中执行协程
+
+        - 在账号事件循环中调用：创建任务并返回
+        - 在其他正在运行的事件循环中调用（如API服务的协程）：提交后立即返回，不阻塞调用方事件循环
+        - 在普通线程中调用：阻塞等待执行完成
+        """
         try:
             current_loop = asyncio.get_running_loop()
         except RuntimeError:
             current_loop = None
 
         if current_loop and current_loop == self.loop:
-            # 同一事件循环中，直接调度
-            return self.loop.create_task(self._add_cookie_async(cookie_id, cookie_value, user_id))
-        else:
-            fut = asyncio.run_coroutine_threadsafe(self._add_cookie_async(cookie_id, cookie_value, user_id), self.loop)
+            return self.loop.create_task(coro)
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if current_loop is None:
             return fut.result()
+        fut.add_done_callback(self._log_dispatch_error)
+        return fut
 
-    def remove_cookie(self, cookie_id: str):
-        try:
-            current_loop = asyncio.get_running_loop()
-        except RuntimeError:
-            current_loop = None
+    @staticmethod
+    def _log_dispatch_error(fut):
+        if not fut.cancelled() and fut.exception() is not None:
+            logger.error(f"账号任务操作失败: {fut.exception()}")
 
-        if current_loop and current_loop == self.loop:
-            return self.loop.create_task(self._remove_cookie_async(cookie_id))
+    def add_cookie(self, cookie_id: str, cookie_value: str, kw_list: Optional[List[Tuple[str, str]]] = None, user_id: int = None):
+        """线程安全新增 Cookie 并启动任务"""
+        if kw_list is not None:
+            self.keywords[cookie_id] = kw_list
         else:
-            fut = asyncio.run_coroutine_threadsafe(self._remove_cookie_async(cookie_id), self.loop)
-            return fut.result()
+            self.keywords.setdefault(cookie_id, [])
+        return self._dispatch(self._add_cookie_async(cookie_id, cookie_value, user_id))
+
+    def remove_cookie(self, cookie_id: str):
+        return self._dispatch(self._remove_cookie_async(cookie_id))
 
     # 更新 Cookie 值
     def update_cookie(self, cookie_id: str, new_value: str, save_to_db: bool = True):
@@ -276,22 +287,14 @@ class CookieManager:
 
                 logger.info(f"已更新Cookie并重启任务: {cookie_id} (用户ID: {original_user_id}, 关键词: {len(original_keywords)}条)")
 
-        try:
-            current_loop = asyncio.get_running_loop()
-        except RuntimeError:
-            current_loop = None
-
-        if current_loop and current_loop == self.loop:
-            return self.loop.create_task(_update())
-        else:
-            fut = asyncio.run_coroutine_threadsafe(_update(), self.loop)
-            return fut.result()
+        return self._dispatch(_update())
 
     def update_keywords(self, cookie_id: str, kw_list: List[Tuple[str, str]]):
         """线程安全更新关键字"""
         self.keywords[cookie_id] = kw_list
         # 保存到数据库
         db_manager.save_keywords(cookie_id, kw_list)
+        keyword_matcher_cache.invalidate(cookie_id)
         logger.info(f"更新关键字: {cookie_id} -> {len(kw_list)} 条")
 
     # 查询接口
@@ -1,5 +1,7 @@
 import sqlite3
 import os
+import asyncio
+import functools
 import threading
 import hashlib
 import time
@@ -11,7 +13,27 @@ import io
 import base64
 from PIL import Image, ImageDraw, ImageFont
 from typing import List, Tuple, Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from loguru import logger
+from utils.db_pool import SQLiteReadPool, apply_connection_pragmas, enable_wal
+from utils.log_control import log_sampler
+from utils.db_write_behind import WriteBehindQueue, utc_timestamp
+
+# SQLite 3.35+ 支持 UPDATE ... RETURNING（卡密原子领取）
+_SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+# 不支持 RETURNING 时，领取卡密遇到并发冲突的最大重试次数
+_CLAIM_RETRIES = 5
+
+# 热点查询登记表：名称 -> (SQL, 示例参数)，供 /admin/db/explain 检查查询计划是否走索引
+HOT_QUERIES: Dict[str, Tuple[str, tuple]] = {}
+
+
+def register_hot_query(name: str, sql: str, params: tuple = ()) -> str:
+    """登记热点查询（示例参数只用于 EXPLAIN QUERY PLAN），返回原SQL便于直接赋值使用"""
+    HOT_QUERIES[name] = (sql, tuple(params))
+    return sql
+
 
 # 允许的表名白名单（SQL注入防护）
 ALLOWED_TABLES = frozenset([
@@ -19,12 +41,19 @@ ALLOWED_TABLES = frozenset([
     'notification_channels', 'default_replies', 'item_info',
     'orders', 'chat_logs', 'users', 'system_settings',
     'email_verifications', 'captcha_codes', 'message_notifications',
-    'user_settings', 'risk_control_logs', 'default_reply_records', 'card_item_relations',
+    'user_settings', 'risk_control_logs', 'default_reply_records', 'card_item_relations', 'card_stock',
     'message_filters', 'quick_phrases', 'auto_reply_message_logs',
     'item_replay', 'old_notification_channels', 'legacy_delivery_rules',
     'old_keywords', 'backup_cookies'
 ])
 
+_RECENT_CONVERSATIONS_SQL = register_hot_query('recent_conversations', '''
+    SELECT id, cookie_id, chat_id, user_id, item_id, role, content, intent, created_at
+    FROM ai_conversations
+    WHERE created_at > ?
+    ORDER BY created_at ASC LIMIT ?
+    ''', ('2024-01-01 00:00:00', 100))
+
 class DBManager:
     """SQLite数据库管理，持久化存储Cookie和关键字"""
     
@@ -60,7 +89,16 @@ class DBManager:
         self.db_path = db_path
         logger.info(f"数据库路径: {self.db_path}")
         self.conn = None
-        self.lock = threading.RLock()  # 使用可重入锁保护数据库操作
+        self.lock = threading.RLock()  # 使用可重入锁保护数据库操作（写连接串行化）
+        self.read_pool: Optional[SQLiteReadPool] = None  # 只读连接池（WAL模式下读写并行）
+        self._write_executor: Optional[ThreadPoolExecutor] = None  # 单线程写执行器，供异步方法使用
+        # 自动回复日志/AI对话记录的批量延迟写入（DB_WRITE_BEHIND_ENABLED=false 时同步写入）
+        self.write_behind = WriteBehindQueue(
+            self.lock, self._write_behind_batch,
+            retryable=(sqlite3.OperationalError,),
+            enabled=os.getenv('DB_WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+        )
+        self.wal_enabled = False
 
         # SQL日志配置 - 默认启用
         self.sql_log_enabled = True  # 默认启用SQL日志
@@ -80,6 +118,9 @@ class DBManager:
         """初始化数据库表结构"""
         try:
             self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            apply_connection_pragmas(self.conn)
+            self.wal_enabled = enable_wal(self.conn)
+            logger.info(f"数据库日志模式: {'WAL' if self.wal_enabled else '默认'}")
             cursor = self.conn.cursor()
             
             # 创建用户表
@@ -357,6 +398,22 @@ class DBManager:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_cir_item_id ON card_item_relations(item_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_cir_card_id ON card_item_relations(card_id)')
 
+            # 创建卡密库存表（批量数据卡券每条卡密一行，按 id 顺序领取）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS card_stock (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                card_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                order_id TEXT,
+                claimed_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (card_id) REFERENCES cards(id) ON DELETE CASCADE
+            )
+            ''')
+            # (card_id, claimed_at) 索引内同键按 rowid 有序：领取时直接定位该卡券最小的未领取 id，统计库存也走覆盖索引
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_card_stock_claim ON card_stock(card_id, claimed_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_card_stock_order ON card_stock(order_id)')
+
             # 创建自动回复消息日志表
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS auto_reply_message_logs (
@@ -436,6 +493,9 @@ class DBManager:
                 self._execute_sql(cursor, "ALTER TABLE orders ADD COLUMN is_bargain INTEGER DEFAULT 0")
                 logger.info("orders 表 is_bargain 列添加完成")
 
+            # 订单列表按账号+创建时间分页（键集分页游标为 created_at, order_id）
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_cookie_created ON orders(cookie_id, created_at, order_id)')
+
             # 检查并添加 user_id 列（用于数据库迁移）
             try:
                 self._execute_sql(cursor, "SELECT user_id FROM cards LIMIT 1")
@@ -667,6 +727,31 @@ class DBManager:
             )
             ''')
 
+            # 创建后台登录会话表（token 只保存 SHA-256 摘要，多个API进程共用）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS session_tokens (
+                token_hash TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                is_admin BOOLEAN DEFAULT FALSE,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_session_tokens_expires ON session_tokens(expires_at)')
+
+            # 创建图片上传缓存表（本地图片内容摘要 -> 闲鱼CDN链接及尺寸，同一图片只上传一次）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_upload_cache (
+                content_hash TEXT PRIMARY KEY,
+                cdn_url TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_upload_cache_url ON image_upload_cache(cdn_url)')
+
             # 插入默认系统设置（不包括管理员密码，由reply_server.py初始化）
             cursor.execute('''
             INSERT OR IGNORE INTO system_settings (key, value, description) VALUES
@@ -689,9 +774,15 @@ class DBManager:
             INSERT OR IGNORE INTO scheduled_tasks (task_code, task_name, interval_seconds, enabled, description) VALUES
             ('token_renewal', 'Token 续期', 3600, 1, 'Token 自动续期（默认1小时）'),
             ('cookie_refresh', 'Cookie 刷新', 3600, 1, 'Cookie 自动刷新（默认1小时）'),
-            ('cleanup', '清理任务', 300, 1, '清理过期锁/缓存/日志（默认5分钟）'),
+            ('cleanup', '清理任务', 300, 1, '清理账号实例的过期锁/缓存（默认5分钟）'),
             ('db_backup', '数据库备份', 86400, 1, 'SQLite 数据库备份（默认24小时）'),
-            ('delivery_timeout', '发货超时检测', 600, 1, '检测超时未发货订单（默认10分钟）')
+            ('delivery_timeout', '发货超时检测', 600, 1, '检测超时未发货订单（默认10分钟）'),
+            ('pause_cleanup', '暂停记录清理', 300, 1, '清理过期的自动回复暂停记录（默认5分钟）'),
+            ('item_cache_cleanup', '商品详情缓存清理', 300, 1, '清理过期的商品详情缓存（默认5分钟）'),
+            ('qr_session_cleanup', '扫码会话清理', 300, 1, '清理过期的扫码登录会话（默认5分钟）'),
+            ('playwright_cache_cleanup', '浏览器缓存清理', 300, 1, '清理Playwright临时文件和缓存（默认5分钟）'),
+            ('log_cleanup', '日志清理', 300, 1, '清理7天前的日志文件（默认5分钟）'),
+            ('data_cleanup', '历史数据清理', 86400, 1, '清理90天前的数据库历史数据（默认24小时）')
             ''')
 
             # 检查并升级数据库
@@ -701,6 +792,10 @@ class DBManager:
             self._migrate_database(cursor)
 
             self.conn.commit()
+
+            # 只读连接池仅在WAL模式下启用（非WAL模式下读写会互相阻塞，回退到主连接）
+            if self.read_pool is None and self.wal_enabled:
+                self.read_pool = SQLiteReadPool(self.db_path)
             logger.info("数据库初始化完成")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
@@ -869,6 +964,20 @@ class DBManager:
                 self.set_system_setting("db_version", "1.6", "数据库版本号")
                 logger.info("数据库升级到版本1.6完成")
 
+            # 升级到版本1.7 - 批量数据卡券迁移到 card_stock 行级库存表
+            if current_version < "1.7":
+                logger.info("开始升级数据库到版本1.7...")
+                self.upgrade_db_to_v1_7(cursor)
+                self.set_system_setting("db_version", "1.7", "数据库版本号")
+                logger.info("数据库升级到版本1.7完成")
+
+            # 升级到版本1.8 - ai_conversations 热点查询索引
+            if current_version < "1.8":
+                logger.info("开始升级数据库到版本1.8...")
+                self.upgrade_db_to_v1_8(cursor)
+                self.set_system_setting("db_version", "1.8", "数据库版本号")
+                logger.info("数据库升级到版本1.8完成")
+
             # 迁移遗留数据（在所有版本升级完成后执行）
             self.migrate_legacy_data(cursor)
 
@@ -1259,6 +1368,36 @@ class DBManager:
             logger.error(f"升级数据库到版本1.6失败: {e}")
             raise
 
+    def upgrade_db_to_v1_7(self, cursor):
+        """升级数据库到版本1.7 - 把批量数据卡券的 data_content 拆分到 card_stock 表"""
+        try:
+            cursor.execute("SELECT id, data_content FROM cards WHERE type = 'data' AND data_content IS NOT NULL AND data_content != ''")
+            rows = cursor.fetchall()
+            total = 0
+            for card_id, data_content in rows:
+                total += self._insert_card_stock(cursor, card_id, data_content.split('\n'))
+                cursor.execute("UPDATE cards SET data_content = NULL WHERE id = ?", (card_id,))
+            if rows:
+                logger.info(f"已迁移 {len(rows)} 张批量数据卡券，共 {total} 条卡密")
+        except Exception as e:
+            logger.error(f"升级数据库到版本1.7失败: {e}")
+            raise
+
+    def upgrade_db_to_v1_8(self, cursor):
+        """升级数据库到版本1.8 - 为 ai_conversations 添加索引
+
+        每次AI回复都会按会话查询上下文、议价次数和防抖窗口内的消息（chat_id, cookie_id, created_at），
+        记忆进化任务按 created_at 增量拉取，原先均为全表扫描。
+        """
+        try:
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_aic_chat_cookie_created ON ai_conversations(chat_id, cookie_id, created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_aic_created ON ai_conversations(created_at)')
+            # 更新统计信息，让查询规划器在大表上选择新索引
+            cursor.execute('ANALYZE ai_conversations')
+        except Exception as e:
+            logger.error(f"升级数据库到版本1.8失败: {e}")
+            raise
+
     def migrate_legacy_data(self, cursor):
         """迁移遗留数据到新表结构"""
         try:
@@ -1397,7 +1536,16 @@ class DBManager:
             raise
 
     def close(self):
-        """关闭数据库连接"""
+        """关闭数据库连接（包括只读连接池和写执行器）"""
+        if self.conn:
+            # 写入批量队列中剩余的数据
+            self.write_behind.stop()
+        if self.read_pool:
+            self.read_pool.close()
+            self.read_pool = None
+        if self._write_executor:
+            self._write_executor.shutdown(wait=True)
+            self._write_executor = None
         if self.conn:
             self.conn.close()
             self.conn = None
@@ -1406,12 +1554,44 @@ class DBManager:
         """获取数据库连接，如果已关闭则重新连接"""
         if self.conn is None:
             self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            apply_connection_pragmas(self.conn)
         return self.conn
 
+    @contextmanager
+    def _read_cursor(self):
+        """获取只读游标：优先使用只读连接池（无需持有全局锁），不可用时回退到主连接"""
+        conn = self.read_pool.get_connection() if self.read_pool else None
+        if conn is None:
+            with self.lock:
+                yield self.conn.cursor()
+            return
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    async def _run_read(self, func, *args, **kwargs):
+        """在读线程池中执行只读方法（事件循环不阻塞）"""
+        if self.read_pool is None:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return await self.read_pool.run(func, *args, **kwargs)
+
+    async def _run_write(self, func, *args, **kwargs):
+        """在单线程写执行器中执行写方法（写操作串行，事件循环不阻塞）"""
+        if self._write_executor is None:
+            self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_executor, functools.partial(func, *args, **kwargs))
+
     def _log_sql(self, sql: str, params: tuple = None, operation: str = "EXECUTE"):
-        """记录SQL执行日志"""
+        """记录SQL执行日志（按 sql 类别限速，被丢弃的语句不做格式化）"""
         if not self.sql_log_enabled:
             return
+        decision = log_sampler.acquire("sql")
+        if decision is None:
+            return
+        override_level, suppressed = decision
 
         # 格式化参数
         params_str = ""
@@ -1432,15 +1612,11 @@ class DBManager:
 
         # 根据配置的日志级别输出
         log_message = f"🗄️ SQL {operation}: {formatted_sql}{params_str}"
+        if suppressed:
+            log_message += f"（此前已抑制 {suppressed} 条）"
 
-        if self.sql_log_level == 'DEBUG':
-            logger.debug(log_message)
-        elif self.sql_log_level == 'INFO':
-            logger.info(log_message)
-        elif self.sql_log_level == 'WARNING':
-            logger.warning(log_message)
-        else:
-            logger.debug(log_message)
+        level = self.sql_log_level if self.sql_log_level in ('DEBUG', 'INFO', 'WARNING') else 'DEBUG'
+        logger.log(override_level or level, log_message)
 
     def _execute_sql(self, cursor, sql: str, params: tuple = None):
         """执行SQL并记录日志"""
@@ -1454,6 +1630,61 @@ class DBManager:
         """批量执行SQL并记录日志"""
         self._log_sql(sql, f"批量执行 {len(params_list)} 条记录", "EXECUTEMANY")
         return cursor.executemany(sql, params_list)
+
+    # -------------------- 异步访问接口（消息热路径） --------------------
+    # 供 XianyuLive 协程调用：读操作进入只读线程池并行执行，写操作进入单写线程，
+    # 事件循环不再因磁盘IO或全局锁等待而阻塞。
+
+    async def get_cookie_by_id_async(self, cookie_id: str) -> Optional[Dict[str, str]]:
+        """get_cookie_by_id 的异步版本"""
+        return await self._run_read(self.get_cookie_by_id, cookie_id)
+
+    async def get_cookie_details_async(self, cookie_id: str) -> Optional[Dict[str, any]]:
+        """get_cookie_details 的异步版本"""
+        return await self._run_read(self.get_cookie_details, cookie_id)
+
+    async def get_keywords_with_type_async(self, cookie_id: str, raise_errors: bool = False) -> List[Dict[str, any]]:
+        """get_keywords_with_type 的异步版本"""
+        return await self._run_read(self.get_keywords_with_type, cookie_id, raise_errors)
+
+    async def get_default_reply_async(self, cookie_id: str) -> Optional[Dict[str, any]]:
+        """get_default_reply 的异步版本"""
+        return await self._run_read(self.get_default_reply, cookie_id)
+
+    async def check_message_filtered_async(self, buyer_id: str, message_text: str, item_id: str,
+                                           user_id: int = None) -> tuple:
+        """check_message_filtered 的异步版本"""
+        return await self._run_read(self.check_message_filtered, buyer_id, message_text, item_id, user_id)
+
+    async def get_message_filters_async(self, user_id: int = None, filter_type: str = None,
+                                        raise_errors: bool = False) -> List[Dict]:
+        """get_message_filters 的异步版本"""
+        return await self._run_read(self.get_message_filters, user_id, filter_type, raise_errors)
+
+    async def get_enabled_delivery_rules_async(self, user_id: int = None, raise_errors: bool = False) -> List[Dict]:
+        """get_enabled_delivery_rules 的异步版本"""
+        return await self._run_read(self.get_enabled_delivery_rules, user_id, raise_errors)
+
+    async def get_delivery_times_async(self, rule_ids: List[int]) -> Dict[int, int]:
+        """get_delivery_times 的异步版本"""
+        return await self._run_read(self.get_delivery_times, rule_ids)
+
+    async def get_image_upload_async(self, content_hash: str = None, cdn_url: str = None) -> Optional[Dict[str, Any]]:
+        """get_image_upload 的异步版本"""
+        return await self._run_read(self.get_image_upload, content_hash, cdn_url)
+
+    async def save_image_upload_async(self, content_hash: str, cdn_url: str, width: int = None,
+                                      height: int = None) -> bool:
+        """save_image_upload 的异步版本"""
+        return await self._run_write(self.save_image_upload, content_hash, cdn_url, width, height)
+
+    async def sync_item_basic_info_async(self, cookie_id: str, items_data: list) -> Dict[str, Any]:
+        """sync_item_basic_info 的异步版本"""
+        return await self._run_write(self.sync_item_basic_info, cookie_id, items_data)
+
+    async def add_auto_reply_log_async(self, cookie_id: str, **kwargs) -> None:
+        """add_auto_reply_log 的异步版本（参数同 add_auto_reply_log，写入批量队列，不返回日志ID）"""
+        self.queue_auto_reply_log(cookie_id, **kwargs)
     
     # -------------------- Cookie操作 --------------------
     def save_cookie(self, cookie_id: str, cookie_value: str, user_id: int = None) -> bool:
@@ -1550,9 +1781,8 @@ class DBManager:
         Returns:
             Dict包含cookie信息，包括cookies_str字段，如果不存在返回None
         """
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
+        try:
+            with self._read_cursor() as cursor:
                 self._execute_sql(cursor, "SELECT id, value, created_at FROM cookies WHERE id = ?", (cookie_id,))
                 result = cursor.fetchone()
                 if result:
@@ -1563,9 +1793,9 @@ class DBManager:
                         'created_at': result[2]
                     }
                 return None
-            except Exception as e:
-                logger.error(f"根据ID获取Cookie失败: {e}")
-                return None
+        except Exception as e:
+            logger.error(f"根据ID获取Cookie失败: {e}")
+            return None
 
     def get_cookie_details(self, cookie_id: str) -> Optional[Dict[str, any]]:
         """获取Cookie的详细信息，包括user_id、auto_confirm、remark、pause_duration、username、password和show_browser"""
@@ -1918,11 +2148,10 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
-    def get_keywords_with_type(self, cookie_id: str) -> List[Dict[str, any]]:
-        """获取指定Cookie的关键字列表（包含类型信息）"""
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
+    def get_keywords_with_type(self, cookie_id: str, raise_errors: bool = False) -> List[Dict[str, any]]:
+        """获取指定Cookie的关键字列表（包含类型信息，raise_errors=True 时查询失败抛出异常，而不是返回空列表）"""
+        try:
+            with self._read_cursor() as cursor:
                 self._execute_sql(cursor,
                     "SELECT keyword, reply, item_id, type, image_url, fuzzy_match FROM keywords WHERE cookie_id = ?",
                     (cookie_id,))
@@ -1940,9 +2169,11 @@ class DBManager:
                     results.append(keyword_data)
 
                 return results
-            except Exception as e:
-                logger.error(f"获取关键字失败: {e}")
-                return []
+        except Exception as e:
+            logger.error(f"获取关键字失败: {e}")
+            if raise_errors:
+                raise
+            return []
 
     def update_keyword_image_url(self, cookie_id: str, keyword: str, new_image_url: str) -> bool:
         """更新关键词的图片URL"""
@@ -2311,9 +2542,8 @@ class DBManager:
 
     def get_default_reply(self, cookie_id: str) -> Optional[Dict[str, any]]:
         """获取指定账号的默认回复设置"""
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
+        try:
+            with self._read_cursor() as cursor:
                 cursor.execute('''
                 SELECT enabled, reply_content, reply_once, reply_image_url FROM default_replies WHERE cookie_id = ?
                 ''', (cookie_id,))
@@ -2327,9 +2557,9 @@ class DBManager:
                         'reply_image_url': reply_image_url or ''
                     }
                 return None
-            except Exception as e:
-                logger.error(f"获取默认回复设置失败: {e}")
-                return None
+        except Exception as e:
+            logger.error(f"获取默认回复设置失败: {e}")
+            return None
 
     def get_all_default_replies(self) -> Dict[str, Dict[str, any]]:
         """获取所有账号的默认回复设置"""
@@ -2647,6 +2877,7 @@ class DBManager:
     def export_backup(self, user_id: int = None) -> Dict[str, any]:
         """导出系统备份数据（支持用户隔离）"""
         with self.lock:
+            self.write_behind.flush()
             try:
                 cursor = self.conn.cursor()
                 backup_data = {
@@ -2715,10 +2946,33 @@ class DBManager:
                                 'columns': [],
                                 'rows': []
                             }
+
+                    # 批量数据卡券的卡密只保存在 card_stock 中（cards.data_content 为空），按卡券所属用户备份
+                    cursor.execute(
+                        "SELECT cs.* FROM card_stock cs JOIN cards c ON cs.card_id = c.id WHERE c.user_id = ? ORDER BY cs.id",
+                        (user_id,))
+                    columns = [description[0] for description in cursor.description]
+                    rows = cursor.fetchall()
+                    backup_data['data']['card_stock'] = {
+                        'columns': columns,
+                        'rows': [list(row) for row in rows]
+                    }
+                    logger.info(f"已备份 card_stock 表的 {len(rows)} 条记录")
+
+                    # 卡券-商品关联随卡券一起备份
+                    cursor.execute(
+                        "SELECT cir.* FROM card_item_relations cir JOIN cards c ON cir.card_id = c.id WHERE c.user_id = ? ORDER BY cir.id",
+                        (user_id,))
+                    columns = [description[0] for description in cursor.description]
+                    rows = cursor.fetchall()
+                    backup_data['data']['card_item_relations'] = {
+                        'columns': columns,
+                        'rows': [list(row) for row in rows]
+                    }
                 else:
                     # 系统级备份：备份所有数据
                     tables = [
-                        'cookies', 'keywords', 'cookie_status', 'cards',
+                        'cookies', 'keywords', 'cookie_status', 'cards', 'card_stock', 'card_item_relations',
                         'delivery_rules', 'default_replies', 'notification_channels',
                         'message_notifications', 'system_settings', 'item_info',
                         'ai_reply_settings', 'ai_conversations', 'ai_item_cache'
@@ -2749,6 +3003,9 @@ class DBManager:
                 if not isinstance(backup_data, dict) or 'data' not in backup_data:
                     raise ValueError("备份数据格式无效")
 
+                card_tables = ('cards', 'card_stock', 'delivery_rules', 'card_item_relations')
+                restore_cards = 'cards' in backup_data['data']
+
                 # 开始事务
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "BEGIN TRANSACTION")
@@ -2771,11 +3028,22 @@ class DBManager:
 
                         # 删除用户的cookies
                         self._execute_sql(cursor, "DELETE FROM cookies WHERE user_id = ?", (user_id,))
+
+                    # 卡券及依赖卡券ID的表（卡密库存、发货规则、卡券-商品关联）作为一组删除和导入：
+                    # 备份中包含卡券时整组替换，否则整组保留（备份中的依赖数据也不导入，避免指向不存在的卡券）
+                    # （旧版本备份没有 card_stock，卡密会在导入后从 data_content 拆分）
+                    if restore_cards:
+                        for table in ('card_stock', 'card_item_relations'):
+                            self._execute_sql(cursor, f"DELETE FROM {table} WHERE card_id IN (SELECT id FROM cards WHERE user_id = ?)", (user_id,))
+                        self._execute_sql(cursor, "DELETE FROM delivery_rules WHERE user_id = ?", (user_id,))
+                        self._execute_sql(cursor, "DELETE FROM cards WHERE user_id = ?", (user_id,))
+                    if 'notification_channels' in backup_data['data']:
+                        self._execute_sql(cursor, "DELETE FROM notification_channels WHERE user_id = ?", (user_id,))
                 else:
                     # 系统级导入：清空所有数据（除了用户和管理员密码）
                     tables = [
                         'message_notifications', 'notification_channels', 'default_replies',
-                        'delivery_rules', 'cards', 'item_info', 'cookie_status', 'keywords',
+                        'delivery_rules', 'card_stock', 'card_item_relations', 'cards', 'item_info', 'cookie_status', 'keywords',
                         'ai_conversations', 'ai_reply_settings', 'ai_item_cache', 'cookies'
                     ]
 
@@ -2788,11 +3056,14 @@ class DBManager:
                 # 导入数据
                 data = backup_data['data']
                 for table_name, table_data in data.items():
-                    if table_name not in ['cookies', 'keywords', 'cookie_status', 'cards',
-                                        'delivery_rules', 'default_replies', 'notification_channels',
+                    if table_name not in ['cookies', 'keywords', 'cookie_status', 'cards', 'card_stock',
+                                        'card_item_relations', 'delivery_rules', 'default_replies', 'notification_channels',
                                         'message_notifications', 'system_settings', 'item_info',
                                         'ai_reply_settings', 'ai_conversations', 'ai_item_cache', 'user_settings']:
                         continue
+                    if table_name in card_tables and not restore_cards:
+                        logger.warning(f"备份中没有卡券数据，跳过依赖卡券的 {table_name} 表")
+                        continue
 
                     columns = table_data['columns']
                     rows = table_data['rows']
@@ -2801,7 +3072,8 @@ class DBManager:
                         continue
 
                     # 定义包含 user_id 字段的表
-                    tables_with_user_id = ['cookies', 'cards', 'notification_channels', 'delivery_rules', 'user_settings']
+                    tables_with_user_id = ['cookies', 'cards', 'notification_channels', 'delivery_rules',
+                                           'card_item_relations', 'user_settings']
 
                     # 如果是用户级导入，需要确保所有包含 user_id 的表都更新为当前用户ID
                     if user_id is not None and table_name in tables_with_user_id:
@@ -2827,6 +3099,9 @@ class DBManager:
                     else:
                         cursor.executemany(f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({placeholders})", rows)
 
+                # 旧版本备份中批量数据卡券的卡密仍在 data_content 中，导入后拆分到库存表
+                self.upgrade_db_to_v1_7(cursor)
+
                 # 提交事务
                 self.conn.commit()
                 logger.info("导入备份成功")
@@ -2975,6 +3250,112 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    # ==================== 图片上传缓存操作 ====================
+
+    def save_image_upload(self, content_hash: str, cdn_url: str, width: int = None, height: int = None) -> bool:
+        """保存图片上传结果（内容摘要 -> CDN链接及尺寸）"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                INSERT OR REPLACE INTO image_upload_cache (content_hash, cdn_url, width, height)
+                VALUES (?, ?, ?, ?)
+                ''', (content_hash, cdn_url, width, height))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"保存图片上传缓存失败: {e}")
+                self.conn.rollback()
+                return False
+
+    def get_image_upload(self, content_hash: str = None, cdn_url: str = None) -> Optional[Dict[str, Any]]:
+        """按内容摘要或CDN链接查询图片上传缓存"""
+        if content_hash is None and cdn_url is None:
+            return None
+        try:
+            with self._read_cursor() as cursor:
+                if content_hash is not None:
+                    cursor.execute("SELECT content_hash, cdn_url, width, height FROM image_upload_cache "
+                                   "WHERE content_hash = ?", (content_hash,))
+                else:
+                    cursor.execute("SELECT content_hash, cdn_url, width, height FROM image_upload_cache "
+                                   "WHERE cdn_url = ? LIMIT 1", (cdn_url,))
+                row = cursor.fetchone()
+        except Exception as e:
+            logger.error(f"查询图片上传缓存失败: {e}")
+            return None
+        if not row:
+            return None
+        return {'content_hash': row[0], 'cdn_url': row[1], 'width': row[2], 'height': row[3]}
+
+    # ==================== 后台登录会话操作 ====================
+
+    def save_session_token(self, token_hash: str, user_id: int, username: str, is_admin: bool,
+                           created_at: float, expires_at: float) -> bool:
+        """保存登录会话"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                INSERT OR REPLACE INTO session_tokens (token_hash, user_id, username, is_admin, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', (token_hash, user_id, username, bool(is_admin), created_at, expires_at))
+                self.conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"保存登录会话失败: {e}")
+                self.conn.rollback()
+                return False
+
+    def get_session_token(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        """获取未过期的登录会话（只读连接，不占用全局锁）"""
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute(
+                    "SELECT user_id, username, is_admin, created_at, expires_at FROM session_tokens "
+                    "WHERE token_hash = ? AND expires_at > ?",
+                    (token_hash, time.time()),
+                )
+                row = cursor.fetchone()
+        except Exception as e:
+            logger.error(f"获取登录会话失败: {e}")
+            return None
+        if not row:
+            return None
+        return {'user_id': row[0], 'username': row[1], 'is_admin': bool(row[2]),
+                'created_at': row[3], 'expires_at': row[4]}
+
+    def delete_session_token(self, token_hash: str = None, user_id: int = None) -> int:
+        """删除登录会话（按 token 或按用户），返回删除的数量"""
+        if token_hash is None and user_id is None:
+            return 0
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                if token_hash is not None:
+                    self._execute_sql(cursor, "DELETE FROM session_tokens WHERE token_hash = ?", (token_hash,))
+                else:
+                    self._execute_sql(cursor, "DELETE FROM session_tokens WHERE user_id = ?", (user_id,))
+                self.conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                logger.error(f"删除登录会话失败: {e}")
+                self.conn.rollback()
+                return 0
+
+    def purge_expired_session_tokens(self) -> int:
+        """清理过期的登录会话，返回清理数量"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, "DELETE FROM session_tokens WHERE expires_at <= ?", (time.time(),))
+                self.conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                logger.error(f"清理过期登录会话失败: {e}")
+                self.conn.rollback()
+                return 0
+
     # ==================== 自动回复日志操作 ====================
 
     def add_auto_reply_log(self, cookie_id: str, user_id: int = 1, chat_id: str = None,
@@ -3001,6 +3382,83 @@ class DBManager:
             logger.debug(f"添加自动回复日志失败（不影响主流程）: {e}")
             return None
 
+    def queue_auto_reply_log(self, cookie_id: str, user_id: int = 1, chat_id: str = None,
+                             item_id: str = None, sender_user_id: str = None, sender_user_name: str = None,
+                             message_text: str = None, reply_strategy: str = 'none',
+                             matched_keyword: str = None, reply_text: str = None,
+                             reply_image_url: str = None, send_status: str = 'unknown',
+                             error_message: str = None) -> None:
+        """添加自动回复日志到批量写入队列（立即返回，随下一批次提交）"""
+        self.write_behind.add('auto_reply_message_logs', {
+            'cookie_id': cookie_id, 'user_id': user_id, 'chat_id': chat_id, 'item_id': item_id,
+            'sender_user_id': sender_user_id, 'sender_user_name': sender_user_name,
+            'message_text': message_text, 'reply_strategy': reply_strategy,
+            'matched_keyword': matched_keyword, 'reply_text': reply_text,
+            'reply_image_url': reply_image_url, 'send_status': send_status,
+            'error_message': error_message, 'created_at': utc_timestamp(),
+        })
+
+    def queue_ai_conversation(self, cookie_id: str, chat_id: str, user_id: str, item_id: str,
+                              role: str, content: str, intent: str = None) -> str:
+        """添加AI对话记录到批量写入队列，返回记录的 created_at（与 CURRENT_TIMESTAMP 格式一致）"""
+        created_at = utc_timestamp()
+        self.write_behind.add('ai_conversations', {
+            'cookie_id': cookie_id, 'chat_id': chat_id, 'user_id': user_id, 'item_id': item_id,
+            'role': role, 'content': content, 'intent': intent, 'created_at': created_at,
+        })
+        return created_at
+
+    def pending_ai_conversations(self, cookie_id: str, chat_id: str) -> List[Dict[str, Any]]:
+        """尚未落盘的AI对话记录（调用方需持有 self.lock 后再与查询结果合并）"""
+        return self.write_behind.pending(
+            'ai_conversations', lambda row: row['chat_id'] == chat_id and row['cookie_id'] == cookie_id)
+
+    def _write_behind_batch(self, rows: List[Tuple[str, Dict[str, Any]]]):
+        """批量写入队列中的行（由 WriteBehindQueue 在持有 self.lock 时调用）
+
+        整批在一个事务中提交。OperationalError（如 database is locked）回滚后原样抛出，
+        由队列保留整批稍后重试；IntegrityError 时改为逐行写入，跳过违反约束的行（如账号已删除）。
+        """
+        grouped: Dict[Tuple[str, Tuple[str, ...]], List[tuple]] = {}
+        for table, row in rows:
+            if table not in ('auto_reply_message_logs', 'ai_conversations'):
+                raise ValueError(f"不支持批量写入的表: {table}")
+            grouped.setdefault((table, tuple(row)), []).append(tuple(row.values()))
+
+        statements = []
+        for (table, columns), values in grouped.items():
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            statements.append((table, sql, values))
+
+        cursor = self.conn.cursor()
+        try:
+            for _, sql, values in statements:
+                self._executemany_sql(cursor, sql, values)
+            self.conn.commit()
+            return
+        except sqlite3.IntegrityError as e:
+            self.conn.rollback()
+            logger.warning(f"批量写入违反约束，改为逐行写入: {e}")
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        failed = 0
+        try:
+            for table, sql, values in statements:
+                for value in values:
+                    try:
+                        cursor.execute(sql, value)
+                    except sqlite3.IntegrityError as e:
+                        failed += 1
+                        logger.warning(f"写入 {table} 失败，丢弃该行: {e}, 数据={str(value)[:200]}")
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        if failed:
+            logger.warning(f"批量写入完成，丢弃 {failed} 行违反约束的数据")
+
     def update_auto_reply_log_status(self, log_id: int, send_status: str, error_message: str = None) -> bool:
         """更新日志发送状态"""
         try:
@@ -3141,11 +3599,11 @@ class DBManager:
 
     # ==================== 消息过滤规则操作 ====================
 
-    def get_message_filters(self, user_id: int = None, filter_type: str = None) -> List[Dict]:
-        """获取消息过滤规则"""
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
+    def get_message_filters(self, user_id: int = None, filter_type: str = None,
+                            raise_errors: bool = False) -> List[Dict]:
+        """获取消息过滤规则（raise_errors=True 时查询失败抛出异常，而不是返回空列表）"""
+        try:
+            with self._read_cursor() as cursor:
                 conditions = []
                 params = []
                 if user_id is not None:
@@ -3159,9 +3617,11 @@ class DBManager:
                     FROM message_filters{where_clause} ORDER BY created_at DESC""", tuple(params))
                 cols = ['id', 'filter_type', 'filter_value', 'user_id', 'enabled', 'description', 'created_at']
                 return [dict(zip(cols, row)) for row in cursor.fetchall()]
-            except Exception as e:
-                logger.error(f"获取消息过滤规则失败: {e}")
-                return []
+        except Exception as e:
+            logger.error(f"获取消息过滤规则失败: {e}")
+            if raise_errors:
+                raise
+            return []
 
     def add_message_filter(self, filter_type: str, filter_value: str, user_id: int = 1, description: str = None) -> Optional[int]:
         """添加消息过滤规则"""
@@ -3208,9 +3668,8 @@ class DBManager:
 
     def check_message_filtered(self, buyer_id: str, message_text: str, item_id: str, user_id: int = None) -> tuple:
         """检查消息是否被过滤，返回 (is_filtered, reason)"""
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
+        try:
+            with self._read_cursor() as cursor:
                 user_cond = " AND user_id = ?" if user_id is not None else ""
                 params = []
                 if user_id is not None:
@@ -3226,9 +3685,9 @@ class DBManager:
                     if f_type == 'item_id' and item_id and item_id == f_value:
                         return (True, f"商品ID {item_id} 在过滤列表中")
                 return (False, None)
-            except Exception as e:
-                logger.error(f"检查消息过滤失败: {e}")
-                return (False, None)
+        except Exception as e:
+            logger.error(f"检查消息过滤失败: {e}")
+            return (False, None)
 
     # ==================== 快捷短语操作 ====================
 
@@ -3790,12 +4249,7 @@ class DBManager:
         with self.lock:
             try:
                 cursor = self.conn.cursor()
-                cursor.execute('''
-                SELECT id, cookie_id, chat_id, user_id, item_id, role, content, intent, created_at
-                FROM ai_conversations
-                WHERE created_at > ?
-                ORDER BY created_at ASC LIMIT ?
-                ''', (since_timestamp, limit))
+                cursor.execute(_RECENT_CONVERSATIONS_SQL, (since_timestamp, limit))
                 return [{'id': r[0], 'cookie_id': r[1], 'chat_id': r[2], 'user_id': r[3],
                          'item_id': r[4], 'role': r[5], 'content': r[6], 'intent': r[7],
                          'created_at': r[8]} for r in cursor.fetchall()]
@@ -4240,6 +4694,11 @@ class DBManager:
                     else:
                         api_config_str = str(api_config)
 
+                # 批量数据卡券的卡密写入 card_stock，cards.data_content 不再保存全文
+                stock_content = data_content if card_type == 'data' else None
+                if stock_content is not None:
+                    data_content = None
+
                 cursor.execute('''
                 INSERT INTO cards (name, type, api_config, text_content, data_content, image_url,
                                  description, enabled, delay_seconds, is_multi_spec,
@@ -4248,8 +4707,10 @@ class DBManager:
                 ''', (name, card_type, api_config_str, text_content, data_content, image_url,
                       description, enabled, delay_seconds, is_multi_spec,
                       spec_name, spec_value, user_id))
-                self.conn.commit()
                 card_id = cursor.lastrowid
+                if stock_content:
+                    self._insert_card_stock(cursor, card_id, stock_content.split('\n'))
+                self.conn.commit()
 
                 if is_multi_spec:
                     logger.info(f"创建多规格卡券成功: {name} - {spec_name}:{spec_value} (ID: {card_id})")
@@ -4258,6 +4719,7 @@ class DBManager:
                 return card_id
             except Exception as e:
                 logger.error(f"创建卡券失败: {e}")
+                self.conn.rollback()
                 raise
 
     def get_all_cards(self, user_id: int = None):
@@ -4283,8 +4745,11 @@ class DBManager:
                     ORDER BY created_at DESC
                     ''')
 
+                rows = cursor.fetchall()
+                stock_map = self._get_card_stock_counts(cursor, [row[0] for row in rows if row[2] == 'data'])
+
                 cards = []
-                for row in cursor.fetchall():
+                for row in rows:
                     # 解析api_config JSON字符串
                     api_config = row[3]
                     if api_config:
@@ -4310,7 +4775,8 @@ class DBManager:
                         'spec_name': row[11],
                         'spec_value': row[12],
                         'created_at': row[13],
-                        'updated_at': row[14]
+                        'updated_at': row[14],
+                        'stock': stock_map.get(row[0]) if row[2] == 'data' else None
                     })
 
                 return cards
@@ -4350,13 +4816,23 @@ class DBManager:
                             # 如果解析失败，保持原始字符串
                             pass
 
+                    data_content = row[5]
+                    stock = None
+                    if row[2] == 'data':
+                        # 详情中的 data_content 为未领取的卡密（每行一条），供编辑使用
+                        stock = self._get_card_stock_counts(cursor, [row[0]]).get(row[0])
+                        cursor.execute(
+                            "SELECT content FROM card_stock WHERE card_id = ? AND claimed_at IS NULL ORDER BY id",
+                            (row[0],))
+                        data_content = '\n'.join(r[0] for r in cursor.fetchall())
+
                     return {
                         'id': row[0],
                         'name': row[1],
                         'type': row[2],
                         'api_config': api_config,
                         'text_content': row[4],
-                        'data_content': row[5],
+                        'data_content': data_content,
                         'image_url': row[6],
                         'description': row[7],
                         'enabled': bool(row[8]),
@@ -4365,13 +4841,25 @@ class DBManager:
                         'spec_name': row[11],
                         'spec_value': row[12],
                         'created_at': row[13],
-                        'updated_at': row[14]
+                        'updated_at': row[14],
+                        'stock': stock
                     }
                 return None
             except Exception as e:
                 logger.error(f"获取卡券失败: {e}")
                 return None
 
+    def get_card_type(self, card_id: int, user_id: int) -> Optional[str]:
+        """获取用户卡券的类型（只查卡券表，用于归属校验），不存在时返回None"""
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute("SELECT type FROM cards WHERE id = ? AND user_id = ?", (card_id, user_id))
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.error(f"获取卡券类型失败: {e}")
+            return None
+
     def update_card(self, card_id: int, name: str = None, card_type: str = None,
                    api_config=None, text_content: str = None, data_content: str = None,
                    image_url: str = None, description: str = None, enabled: bool = None,
@@ -4408,8 +4896,18 @@ class DBManager:
                     update_fields.append("text_content = ?")
                     params.append(text_content)
                 if data_content is not None:
-                    update_fields.append("data_content = ?")
-                    params.append(data_content)
+                    target_type = card_type
+                    if target_type is None:
+                        self._execute_sql(cursor, "SELECT type FROM cards WHERE id = ?", (card_id,))
+                        type_row = cursor.fetchone()
+                        target_type = type_row[0] if type_row else None
+                    if target_type == 'data':
+                        # 批量数据卡券：用提交的内容替换未领取的库存
+                        self._replace_card_stock(cursor, card_id, data_content)
+                        update_fields.append("data_content = NULL")
+                    else:
+                        update_fields.append("data_content = ?")
+                        params.append(data_content)
                 if image_url is not None:
                     update_fields.append("image_url = ?")
                     params.append(image_url)
@@ -4446,6 +4944,7 @@ class DBManager:
                     logger.info(f"更新卡券成功: ID {card_id}")
                     return True
                 else:
+                    self.conn.rollback()
                     return False  # 没有找到对应的记录
 
             except Exception as e:
@@ -4737,6 +5236,19 @@ class DBManager:
             except Exception as e:
                 logger.error(f"更新发货次数失败: {e}")
 
+    def get_delivery_times(self, rule_ids: List[int]) -> Dict[int, int]:
+        """批量获取发货规则的当前发货次数 {rule_id: delivery_times}"""
+        if not rule_ids:
+            return {}
+        try:
+            with self._read_cursor() as cursor:
+                placeholders = ','.join('?' for _ in rule_ids)
+                cursor.execute(f"SELECT id, delivery_times FROM delivery_rules WHERE id IN ({placeholders})", list(rule_ids))
+                return {row[0]: row[1] or 0 for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"获取发货次数失败: {e}")
+            return {}
+
     def get_delivery_rules_by_keyword_and_spec(self, keyword: str, spec_name: str = None, spec_value: str = None, user_id: int = None):
         """根据关键字和规格信息获取匹配的发货规则（支持多规格）"""
         with self.lock:
@@ -4875,6 +5387,68 @@ class DBManager:
                 logger.error(f"获取发货规则失败: {e}")
                 return []
 
+    def get_enabled_delivery_rules(self, user_id: int = None, raise_errors: bool = False) -> List[Dict]:
+        """获取所有启用的发货规则（含卡券信息，仅卡券也启用的规则），供内存匹配器编译
+
+        raise_errors=True 时查询失败抛出异常，而不是返回空列表
+        """
+        try:
+            with self._read_cursor() as cursor:
+                params = []
+                user_condition = ""
+                if user_id is not None:
+                    user_condition = " AND dr.user_id = ? "
+                    params.append(user_id)
+                cursor.execute(f'''
+                SELECT dr.id, dr.keyword, dr.card_id, dr.delivery_count, dr.enabled,
+                       dr.description, dr.delivery_times,
+                       c.name as card_name, c.type as card_type, c.api_config,
+                       c.text_content, c.data_content, c.image_url, c.enabled as card_enabled,
+                       c.description as card_description, c.delay_seconds as card_delay_seconds,
+                       c.is_multi_spec, c.spec_name, c.spec_value
+                FROM delivery_rules dr
+                JOIN cards c ON dr.card_id = c.id
+                WHERE dr.enabled = 1 AND c.enabled = 1 {user_condition}
+                ORDER BY dr.id
+                ''', tuple(params))
+
+                rules = []
+                for row in cursor.fetchall():
+                    api_config = row[9]
+                    if api_config:
+                        try:
+                            api_config = json.loads(api_config)
+                        except (json.JSONDecodeError, TypeError):
+                            pass
+
+                    rules.append({
+                        'id': row[0],
+                        'keyword': row[1],
+                        'card_id': row[2],
+                        'delivery_count': row[3],
+                        'enabled': bool(row[4]),
+                        'description': row[5],
+                        'delivery_times': row[6] or 0,
+                        'card_name': row[7],
+                        'card_type': row[8],
+                        'api_config': api_config,
+                        'text_content': row[10],
+                        'data_content': row[11],
+                        'image_url': row[12],
+                        'card_enabled': bool(row[13]),
+                        'card_description': row[14],
+                        'card_delay_seconds': row[15] or 0,
+                        'is_multi_spec': bool(row[16]) if row[16] is not None else False,
+                        'spec_name': row[17],
+                        'spec_value': row[18]
+                    })
+                return rules
+        except Exception as e:
+            logger.error(f"获取启用的发货规则失败: {e}")
+            if raise_errors:
+                raise
+            return []
+
     def delete_card(self, card_id: int):
         """删除卡券"""
         with self.lock:
@@ -4883,6 +5457,8 @@ class DBManager:
                 self._execute_sql(cursor, "DELETE FROM cards WHERE id = ?", (card_id,))
 
                 if cursor.rowcount > 0:
+                    # 连接未开启外键约束，手动级联删除卡密库存
+                    self._execute_sql(cursor, "DELETE FROM card_stock WHERE card_id = ?", (card_id,))
                     self.conn.commit()
                     logger.info(f"删除卡券成功: ID {card_id}")
                     return True
@@ -4916,50 +5492,168 @@ class DBManager:
                 self.conn.rollback()
                 raise
 
-    def consume_batch_data(self, card_id: int):
-        """消费批量数据的第一条记录（线程安全）"""
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
-
-                # 获取卡券的批量数据
-                self._execute_sql(cursor, "SELECT data_content FROM cards WHERE id = ? AND type = 'data'", (card_id,))
-                result = cursor.fetchone()
-
-                if not result or not result[0]:
-                    logger.warning(f"卡券 {card_id} 没有批量数据")
-                    return None
-
-                data_content = result[0]
-                lines = [line.strip() for line in data_content.split('\n') if line.strip()]
+    def consume_batch_data(self, card_id: int, order_id: str = None):
+        """消费批量数据的下一条卡密（线程安全，兼容旧接口，等同于 claim_card_stock）"""
+        return self.claim_card_stock(card_id, order_id)
 
-                if not lines:
-                    logger.warning(f"卡券 {card_id} 批量数据为空")
-                    return None
+    # ==================== 卡密库存管理 ====================
+    # 批量数据卡券的卡密按行存放在 card_stock 表中：领取时通过索引 idx_card_stock_claim
+    # 定位该卡券最小的未领取行并原子标记，无需读写整段文本。
 
-                # 获取第一条数据
-                first_line = lines[0]
+    def _insert_card_stock(self, cursor, card_id: int, lines) -> int:
+        """写入卡密（忽略空行，不提交事务），返回写入条数"""
+        rows = [(card_id, line.strip()) for line in lines if line and line.strip()]
+        if rows:
+            self._executemany_sql(cursor, "INSERT INTO card_stock (card_id, content) VALUES (?, ?)", rows)
+        return len(rows)
 
-                # 移除第一条数据，更新数据库
-                remaining_lines = lines[1:]
-                new_data_content = '\n'.join(remaining_lines)
+    def _replace_card_stock(self, cursor, card_id: int, data_content: str) -> int:
+        """用编辑后的文本替换未领取的卡密（不提交事务）
 
-                cursor.execute('''
-                UPDATE cards
-                SET data_content = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                ''', (new_data_content, card_id))
+        已领取过的卡密即使仍出现在提交内容中也不会重新入库，避免编辑期间被领取的卡密重复发放。
+        """
+        self._execute_sql(cursor, "DELETE FROM card_stock WHERE card_id = ? AND claimed_at IS NULL", (card_id,))
+        self._execute_sql(cursor, "SELECT content FROM card_stock WHERE card_id = ?", (card_id,))
+        claimed = {row[0] for row in cursor.fetchall()}
+        lines = [line.strip() for line in (data_content or '').split('\n')]
+        return self._insert_card_stock(cursor, card_id, [line for line in lines if line not in claimed])
+
+    def _get_card_stock_counts(self, cursor, card_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """批量统计卡券库存：{card_id: {total, available, claimed, last_claimed_at}}"""
+        if not card_ids:
+            return {}
+        stats = {card_id: {'total': 0, 'available': 0, 'claimed': 0, 'last_claimed_at': None}
+                 for card_id in card_ids}
+        placeholders = ','.join('?' for _ in card_ids)
+        cursor.execute(f'''
+        SELECT card_id, COUNT(*), COUNT(claimed_at), MAX(claimed_at)
+        FROM card_stock WHERE card_id IN ({placeholders})
+        GROUP BY card_id
+        ''', tuple(card_ids))
+        for card_id, total, claimed, last_claimed_at in cursor.fetchall():
+            stats[card_id] = {
+                'total': total,
+                'available': total - claimed,
+                'claimed': claimed,
+                'last_claimed_at': last_claimed_at,
+            }
+        return stats
+
+    def add_card_stock(self, card_id: int, lines) -> int:
+        """追加卡密（lines 为字符串列表），返回写入条数"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                count = self._insert_card_stock(cursor, card_id, lines)
+                self.conn.commit()
+                return count
+            except Exception as e:
+                logger.error(f"追加卡密失败: {e}")
+                self.conn.rollback()
+                raise
 
+    def claim_card_stock(self, card_id: int, order_id: str = None) -> Optional[str]:
+        """原子领取卡券的下一条卡密并标记订单号，库存为空时返回None"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                if _SQLITE_RETURNING:
+                    self._execute_sql(cursor, '''
+                    UPDATE card_stock SET order_id = ?, claimed_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT id FROM card_stock
+                        WHERE card_id = ? AND claimed_at IS NULL
+                        ORDER BY id LIMIT 1
+                    )
+                    RETURNING id, content
+                    ''', (order_id, card_id))
+                    rows = cursor.fetchall()
+                    row = rows[0] if rows else None
+                else:
+                    # SQLite < 3.35 不支持 RETURNING：先查后改。全局锁只串行化本进程，
+                    # 分片进程可能同时领取同一条，带条件的 UPDATE 未更新到行时换下一条重试
+                    row = None
+                    for _ in range(_CLAIM_RETRIES):
+                        self._execute_sql(cursor, '''
+                        SELECT id, content FROM card_stock
+                        WHERE card_id = ? AND claimed_at IS NULL
+                        ORDER BY id LIMIT 1
+                        ''', (card_id,))
+                        candidate = cursor.fetchone()
+                        if not candidate:
+                            break
+                        self._execute_sql(cursor,
+                            "UPDATE card_stock SET order_id = ?, claimed_at = CURRENT_TIMESTAMP WHERE id = ? AND claimed_at IS NULL",
+                            (order_id, candidate[0]))
+                        if cursor.rowcount == 1:
+                            row = candidate
+                            break
+                    else:
+                        logger.warning(f"卡券 {card_id} 领取卡密冲突重试 {_CLAIM_RETRIES} 次仍未成功")
                 self.conn.commit()
 
-                logger.info(f"消费批量数据成功: 卡券ID={card_id}, 剩余={len(remaining_lines)}条")
-                return first_line
+                if not row:
+                    logger.warning(f"卡券 {card_id} 没有可用卡密")
+                    return None
+
+                logger.info(f"领取卡密成功: 卡券ID={card_id}, 库存ID={row[0]}, 订单={order_id or '-'}")
+                return row[1]
 
             except Exception as e:
-                logger.error(f"消费批量数据失败: {e}")
+                logger.error(f"领取卡密失败: {e}")
                 self.conn.rollback()
                 return None
 
+    async def claim_card_stock_async(self, card_id: int, order_id: str = None) -> Optional[str]:
+        """claim_card_stock 的异步版本"""
+        return await self._run_write(self.claim_card_stock, card_id, order_id)
+
+    def get_card_stock_stats(self, card_id: int) -> Dict[str, Any]:
+        """获取单张卡券的库存统计"""
+        try:
+            with self._read_cursor() as cursor:
+                return self._get_card_stock_counts(cursor, [card_id])[card_id]
+        except Exception as e:
+            logger.error(f"获取卡密库存统计失败: {e}")
+            return {'total': 0, 'available': 0, 'claimed': 0, 'last_claimed_at': None}
+
+    def get_card_stock_claims(self, user_id: int = None, card_id: int = None,
+                              order_id: str = None, limit: int = 100) -> List[Dict]:
+        """查询已领取的卡密记录（按领取时间倒序，用于按订单追溯发货内容）"""
+        try:
+            with self._read_cursor() as cursor:
+                conditions = ["s.claimed_at IS NOT NULL"]
+                params = []
+                if user_id is not None:
+                    conditions.append("c.user_id = ?")
+                    params.append(user_id)
+                if card_id is not None:
+                    conditions.append("s.card_id = ?")
+                    params.append(card_id)
+                if order_id:
+                    conditions.append("s.order_id = ?")
+                    params.append(order_id)
+                params.append(max(1, min(int(limit), 1000)))
+                cursor.execute(f'''
+                SELECT s.id, s.card_id, c.name, s.content, s.order_id, s.claimed_at
+                FROM card_stock s
+                JOIN cards c ON c.id = s.card_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY s.claimed_at DESC, s.id DESC
+                LIMIT ?
+                ''', tuple(params))
+                return [{
+                    'id': row[0],
+                    'card_id': row[1],
+                    'card_name': row[2],
+                    'content': row[3],
+                    'order_id': row[4],
+                    'claimed_at': row[5],
+                } for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"查询卡密领取记录失败: {e}")
+            return []
+
     # ==================== 商品信息管理 ====================
 
     def save_item_basic_info(self, cookie_id: str, item_id: str, item_title: str = None,
@@ -5420,90 +6114,86 @@ class DBManager:
             self.conn.rollback()
             return False
 
-    def batch_save_item_basic_info(self, items_data: list) -> int:
-        """批量保存商品基本信息（并发安全）
+    def sync_item_basic_info(self, cookie_id: str, items_data: list) -> Dict[str, Any]:
+        """批量同步账号的商品基本信息（并发安全）
+
+        先用一次查询取出账号已有商品与本次列表比对，再在一个事务内用 executemany 批量 upsert。
+        与 save_item_basic_info 一致，已有记录只填充为空的字段，不覆盖现有数据。
 
         Args:
-            items_data: 商品数据列表，每个元素包含 cookie_id, item_id, item_title 等字段
+            cookie_id: Cookie ID
+            items_data: 商品数据列表，每个元素包含 item_id, item_title, item_description,
+                        item_category, item_price, item_detail
 
         Returns:
-            int: 成功保存的商品数量
+            Dict: {'saved': 保存数量, 'new': 新商品ID列表, 'changed': 补全了字段的商品ID列表,
+                   'need_detail': 仍缺少详情的商品ID列表}
         """
-        if not items_data:
-            return 0
+        result = {'saved': 0, 'new': [], 'changed': [], 'need_detail': []}
+
+        rows = {}
+        for item_data in items_data:
+            item_id = item_data.get('item_id')
+            if not item_id:
+                continue
+            # 验证：如果没有商品标题，则跳过保存
+            if not (item_data.get('item_title') or '').strip():
+                logger.debug(f"跳过批量保存商品信息：缺少商品标题 - {item_id}")
+                continue
+            rows[item_id] = (
+                item_data.get('item_title') or '',
+                item_data.get('item_description') or '',
+                item_data.get('item_category') or '',
+                item_data.get('item_price') or '',
+                item_data.get('item_detail') or '',
+            )
+        if not rows:
+            return result
 
-        success_count = 0
-        try:
-            with self.lock:
+        with self.lock:
+            try:
                 cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT item_id, item_title, item_description, item_category, item_price, item_detail
+                FROM item_info WHERE cookie_id = ?
+                ''', (cookie_id,))
+                existing = {row[0]: row[1:] for row in cursor.fetchall()}
 
-                # 使用事务批量处理
-                cursor.execute('BEGIN TRANSACTION')
-
-                for item_data in items_data:
-                    try:
-                        cookie_id = item_data.get('cookie_id')
-                        item_id = item_data.get('item_id')
-                        item_title = item_data.get('item_title', '')
-                        item_description = item_data.get('item_description', '')
-                        item_category = item_data.get('item_category', '')
-                        item_price = item_data.get('item_price', '')
-                        item_detail = item_data.get('item_detail', '')
-
-                        if not cookie_id or not item_id:
-                            continue
-
-                        # 验证：如果没有商品标题，则跳过保存
-                        if not item_title or not item_title.strip():
-                            logger.debug(f"跳过批量保存商品信息：缺少商品标题 - {item_id}")
-                            continue
-
-                        # 使用 INSERT OR IGNORE + UPDATE 模式
-                        cursor.execute('''
-                        INSERT OR IGNORE INTO item_info (cookie_id, item_id, item_title, item_description,
-                                                       item_category, item_price, item_detail, created_at, updated_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                        ''', (cookie_id, item_id, item_title, item_description,
-                              item_category, item_price, item_detail))
-
-                        if cursor.rowcount == 0:
-                            # 记录已存在，进行条件更新
-                            update_sql = '''
-                            UPDATE item_info SET
-                                item_title = CASE WHEN (item_title IS NULL OR item_title = '') AND ? != '' THEN ? ELSE item_title END,
-                                item_description = CASE WHEN (item_description IS NULL OR item_description = '') AND ? != '' THEN ? ELSE item_description END,
-                                item_category = CASE WHEN (item_category IS NULL OR item_category = '') AND ? != '' THEN ? ELSE item_category END,
-                                item_price = CASE WHEN (item_price IS NULL OR item_price = '') AND ? != '' THEN ? ELSE item_price END,
-                                item_detail = CASE WHEN (item_detail IS NULL OR item_detail = '' OR TRIM(item_detail) = '') AND ? != '' THEN ? ELSE item_detail END,
-                                updated_at = CURRENT_TIMESTAMP
-                            WHERE cookie_id = ? AND item_id = ?
-                            '''
-                            self._execute_sql(cursor, update_sql, (
-                                item_title, item_title,
-                                item_description, item_description,
-                                item_category, item_category,
-                                item_price, item_price,
-                                item_detail, item_detail,
-                                cookie_id, item_id
-                            ))
-
-                        success_count += 1
-
-                    except Exception as item_e:
-                        logger.warning(f"批量保存单个商品失败 {item_data.get('item_id', 'unknown')}: {item_e}")
+                for item_id, values in rows.items():
+                    stored = existing.get(item_id)
+                    if stored is None:
+                        result['new'].append(item_id)
+                        result['need_detail'].append(item_id)
                         continue
+                    # 已有记录只有在空字段被本次列表补全时才算变更
+                    if any(not (old or '').strip() and new for old, new in zip(stored, values)):
+                        result['changed'].append(item_id)
+                    if not (stored[4] or '').strip():
+                        result['need_detail'].append(item_id)
+
+                # 未变更的记录同样刷新 updated_at（商品列表按 updated_at 排序）
+                self._executemany_sql(cursor, '''
+                INSERT INTO item_info (cookie_id, item_id, item_title, item_description,
+                                       item_category, item_price, item_detail, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT(cookie_id, item_id) DO UPDATE SET
+                    item_title = CASE WHEN (item_title IS NULL OR item_title = '') AND excluded.item_title != '' THEN excluded.item_title ELSE item_title END,
+                    item_description = CASE WHEN (item_description IS NULL OR item_description = '') AND excluded.item_description != '' THEN excluded.item_description ELSE item_description END,
+                    item_category = CASE WHEN (item_category IS NULL OR item_category = '') AND excluded.item_category != '' THEN excluded.item_category ELSE item_category END,
+                    item_price = CASE WHEN (item_price IS NULL OR item_price = '') AND excluded.item_price != '' THEN excluded.item_price ELSE item_price END,
+                    item_detail = CASE WHEN (item_detail IS NULL OR item_detail = '' OR TRIM(item_detail) = '') AND excluded.item_detail != '' THEN excluded.item_detail ELSE item_detail END,
+                    updated_at = CURRENT_TIMESTAMP
+                ''', [(cookie_id, item_id) + values for item_id, values in rows.items()])
 
-                cursor.execute('COMMIT')
-                logger.info(f"批量保存商品信息完成: {success_count}/{len(items_data)} 个商品")
-                return success_count
-
-        except Exception as e:
-            logger.error(f"批量保存商品信息失败: {e}")
-            try:
-                cursor.execute('ROLLBACK')
-            except:
-                pass
-            return success_count
+                self.conn.commit()
+                result['saved'] = len(rows)
+                logger.info(f"批量同步商品信息完成: {cookie_id} 共 {len(rows)} 个商品，"
+                            f"新增 {len(result['new'])}，补全 {len(result['changed'])}")
+                return result
+            except Exception as e:
+                logger.error(f"批量同步商品信息失败: {e}")
+                self.conn.rollback()
+                return {'saved': 0, 'new': [], 'changed': [], 'need_detail': []}
 
     def delete_item_info(self, cookie_id: str, item_id: str) -> bool:
         """删除商品信息
@@ -5757,6 +6447,34 @@ class DBManager:
                 logger.error(f"删除用户及相关数据失败: {e}")
                 return False
 
+    def explain_hot_queries(self) -> List[Dict[str, Any]]:
+        """对登记的热点查询执行 EXPLAIN QUERY PLAN，标记回退为全表/全索引扫描（SCAN）的查询"""
+        results = []
+        # 使用新连接：已有连接缓存的表结构在其他连接增删索引后不会刷新，EXPLAIN 会给出过期的计划
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            cursor = conn.cursor()
+            for name, (sql, params) in sorted(HOT_QUERIES.items()):
+                item = {'name': name, 'sql': ' '.join(sql.split()), 'plan': [], 'scans': [], 'temp_btree': False}
+                try:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                    for row in cursor.fetchall():
+                        detail = row[-1]
+                        item['plan'].append(detail)
+                        if detail.startswith('SCAN') and detail != 'SCAN CONSTANT ROW':
+                            item['scans'].append(detail)
+                        elif detail.startswith('USE TEMP B-TREE'):
+                            item['temp_btree'] = True
+                except sqlite3.Error as e:
+                    item['error'] = str(e)
+                item['ok'] = not item['scans'] and 'error' not in item
+                if not item['ok']:
+                    logger.warning(f"热点查询 {name} 未使用索引: {item['scans'] or item.get('error')}")
+                results.append(item)
+        finally:
+            conn.close()
+        return results
+
     def get_table_data(self, table_name: str):
         """获取指定表的所有数据"""
         with self.lock:
@@ -6114,6 +6832,150 @@ class DBManager:
                 logger.error(f"获取所有订单列表失败: {e}")
                 return []
 
+    def get_user_dashboard_counts(self, user_id: int) -> List[Dict[str, Any]]:
+        """仪表盘账号统计：每个账号的启用状态、关键词数和订单数（GROUP BY 聚合，不加载明细）"""
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute('''
+                SELECT c.id, COALESCE(cs.enabled, 1), c.created_at, cs.updated_at,
+                       COALESCE(k.cnt, 0), COALESCE(o.cnt, 0)
+                FROM cookies c
+                LEFT JOIN cookie_status cs ON cs.cookie_id = c.id
+                LEFT JOIN (SELECT cookie_id, COUNT(*) AS cnt FROM keywords
+                           WHERE cookie_id IN (SELECT id FROM cookies WHERE user_id = ?)
+                           GROUP BY cookie_id) k ON k.cookie_id = c.id
+                LEFT JOIN (SELECT cookie_id, COUNT(*) AS cnt FROM orders
+                           WHERE cookie_id IN (SELECT id FROM cookies WHERE user_id = ?)
+                           GROUP BY cookie_id) o ON o.cookie_id = c.id
+                WHERE c.user_id = ?
+                ORDER BY c.created_at, c.id
+                ''', (user_id, user_id, user_id))
+                return [{
+                    'id': row[0],
+                    'enabled': bool(row[1]),
+                    'created_at': row[2],
+                    'updated_at': row[3],
+                    'keyword_count': row[4],
+                    'order_count': row[5],
+                } for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取仪表盘账号统计失败: {e}")
+            return []
+
+    def get_system_counts(self) -> Dict[str, int]:
+        """系统全局计数（管理员统计）"""
+        try:
+            with self._read_cursor() as cursor:
+                cursor.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM users),
+                    (SELECT COUNT(*) FROM cookies),
+                    (SELECT COUNT(*) FROM cookies c
+                     LEFT JOIN cookie_status cs ON cs.cookie_id = c.id
+                     WHERE COALESCE(cs.enabled, 1) = 1),
+                    (SELECT COUNT(*) FROM cards),
+                    (SELECT COUNT(*) FROM keywords),
+                    (SELECT COUNT(*) FROM orders)
+                ''')
+                row = cursor.fetchone()
+                return {
+                    "total_users": row[0],
+                    "total_cookies": row[1],
+                    "active_cookies": row[2],
+                    "total_cards": row[3],
+                    "total_keywords": row[4],
+                    "total_orders": row[5],
+                }
+        except Exception as e:
+            logger.error(f"获取系统统计失败: {e}")
+            raise
+
+    def get_user_orders_page(self, user_id: int = None, cookie_id: str = None, status: str = None,
+                             item_id: str = None, buyer_id: str = None, keyword: str = None,
+                             cursor: Tuple[str, str] = None, limit: int = 50,
+                             with_total: bool = False) -> Dict[str, Any]:
+        """按创建时间倒序分页查询用户订单（键集分页）
+
+        Args:
+            cursor: 上一页最后一条订单的 (created_at, order_id)，为空时从最新订单开始
+            with_total: 是否统计满足过滤条件的订单总数（额外一次 COUNT 查询）
+
+        Returns:
+            {'orders': [...], 'next_cursor': (created_at, order_id) 或 None, 'total': int 或 None}
+        """
+        limit = max(1, min(int(limit), 500))
+        conditions = []
+        params: List[Any] = []
+        if user_id is not None:
+            conditions.append("o.cookie_id IN (SELECT id FROM cookies WHERE user_id = ?)")
+            params.append(user_id)
+        if cookie_id:
+            conditions.append("o.cookie_id = ?")
+            params.append(cookie_id)
+        if status:
+            conditions.append("o.order_status = ?")
+            params.append(status)
+        if item_id:
+            conditions.append("o.item_id = ?")
+            params.append(item_id)
+        if buyer_id:
+            conditions.append("o.buyer_id = ?")
+            params.append(buyer_id)
+        if keyword:
+            # 与原 LIKE 一致：不区分 ASCII 大小写；instr 不需要转义 % 和 _
+            conditions.append("(instr(lower(o.order_id), lower(?)) > 0 OR instr(lower(o.item_id), lower(?)) > 0 "
+                              "OR instr(lower(o.buyer_id), lower(?)) > 0)")
+            params.extend([keyword, keyword, keyword])
+        filter_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        filter_params = list(params)
+
+        if cursor:
+            # 行值比较可直接用于索引范围查找
+            conditions.append("(o.created_at, o.order_id) < (?, ?)")
+            params.extend([cursor[0], cursor[1]])
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            with self._read_cursor() as cur:
+                cur.execute(f'''
+                SELECT o.order_id, o.item_id, o.buyer_id, o.spec_name, o.spec_value,
+                       o.quantity, o.amount, o.order_status, o.cookie_id, o.is_bargain,
+                       o.created_at, o.updated_at
+                FROM orders o
+                {where_sql}
+                ORDER BY o.created_at DESC, o.order_id DESC
+                LIMIT ?
+                ''', tuple(params + [limit + 1]))
+                rows = cur.fetchall()
+
+                total = None
+                if with_total:
+                    cur.execute(f"SELECT COUNT(*) FROM orders o {filter_sql}", tuple(filter_params))
+                    total = cur.fetchone()[0]
+        except Exception as e:
+            logger.error(f"分页查询订单失败: {e}")
+            return {'orders': [], 'next_cursor': None, 'total': 0 if with_total else None}
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        orders = [{
+            'id': row[0],
+            'order_id': row[0],
+            'item_id': row[1],
+            'buyer_id': row[2],
+            'spec_name': row[3],
+            'spec_value': row[4],
+            'quantity': row[5],
+            'amount': row[6],
+            'status': row[7],
+            'cookie_id': row[8],
+            'is_bargain': bool(row[9]) if row[9] is not None else False,
+            'created_at': row[10],
+            'updated_at': row[11]
+        } for row in rows]
+        next_cursor = (rows[-1][10], rows[-1][0]) if has_more and rows else None
+        return {'orders': orders, 'next_cursor': next_cursor, 'total': total}
+
     def delete_table_record(self, table_name: str, record_id: str):
         """删除指定表的指定记录"""
         with self.lock:
@@ -6583,6 +7445,7 @@ class DBManager:
         """
         try:
             with self.lock:
+                self.write_behind.flush()
                 cursor = self.conn.cursor()
                 stats = {}
                 
@@ -27,6 +27,26 @@ export interface CardData {
   created_at?: string
   updated_at?: string
   user_id?: number
+  // 批量数据卡券的库存统计
+  stock?: CardStock | null
+}
+
+// 批量数据卡券库存统计
+export interface CardStock {
+  total: number
+  available: number
+  claimed: number
+  last_claimed_at?: string | null
+}
+
+// 已发放卡密记录
+export interface CardStockClaim {
+  id: number
+  card_id: number
+  card_name: string
+  content: string
+  order_id?: string | null
+  claimed_at: string
 }
 
 // 获取卡券列表
@@ -57,6 +77,30 @@ export const deleteCard = (cardId: string): Promise<ApiResponse> => {
   return del(`/cards/${cardId}`)
 }
 
+// 获取批量数据卡券库存统计
+export const getCardStock = (cardId: number): Promise<CardStock> => {
+  return get(`/cards/${cardId}/stock`)
+}
+
+// 导入卡密文件（每行一条，服务端流式写入）
+export const importCardStock = (cardId: number, file: File): Promise<{ message: string; imported: number; stock: CardStock }> => {
+  const formData = new FormData()
+  formData.append('file', file)
+  return post(`/cards/${cardId}/stock/import`, formData, {
+    headers: { 'Content-Type': 'multipart/form-data' },
+  })
+}
+
+// 查询已发放卡密（按订单号/卡券过滤）
+export const getCardStockClaims = (params: { order_id?: string; card_id?: number; limit?: number } = {}): Promise<{ claims: CardStockClaim[]; count: number }> => {
+  const query = new URLSearchParams()
+  if (params.order_id) query.set('order_id', params.order_id)
+  if (params.card_id) query.set('card_id', String(params.card_id))
+  if (params.limit) query.set('limit', String(params.limit))
+  const qs = query.toString()
+  return get(`/cards/stock/claims${qs ? `?${qs}` : ''}`)
+}
+
 // 批量删除卡券
 export const batchDeleteCards = (cardIds: number[]): Promise<ApiResponse> => {
   return post('/cards/batch-delete', { ids: cardIds })
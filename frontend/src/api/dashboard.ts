@@ -0,0 +1,29 @@
+import { get } from '@/utils/request'
+import type { AdminStats } from './admin'
+
+// 仪表盘账号统计
+export interface DashboardAccount {
+  id: string
+  enabled: boolean
+  keyword_count: number
+  order_count: number
+  created_at?: string
+  updated_at?: string | null
+}
+
+// 仪表盘汇总数据（一次请求返回全部计数）
+export interface DashboardSummary {
+  stats: {
+    total_accounts: number
+    active_accounts: number
+    total_keywords: number
+    total_orders: number
+  }
+  accounts: DashboardAccount[]
+  admin?: AdminStats | null
+}
+
+// 获取仪表盘汇总
+export const getDashboardSummary = (): Promise<DashboardSummary> => {
+  return get('/dashboard/summary')
+}
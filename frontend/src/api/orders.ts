@@ -7,31 +7,50 @@ export interface OrderDetail extends Order {
   spec_value?: string
 }
 
-// 获取订单列表（支持分页）
-export const getOrders = async (
-  cookieId?: string,
-  status?: string,
-  page: number = 1,
-  pageSize: number = 20
-): Promise<{ success: boolean; data: Order[]; total?: number; total_pages?: number }> => {
+// 订单列表查询参数
+export interface OrderQuery {
+  cookieId?: string
+  status?: string
+  itemId?: string
+  buyerId?: string
+  keyword?: string
+  cursor?: string | null
+  limit?: number
+  withTotal?: boolean
+}
+
+// 订单列表分页结果（键集分页，nextCursor 为空表示没有更多）
+export interface OrderPage {
+  success: boolean
+  data: Order[]
+  nextCursor: string | null
+  hasMore: boolean
+  total?: number | null
+}
+
+// 获取订单列表（按创建时间倒序，传入上一页的 nextCursor 获取下一页）
+export const getOrders = async (query: OrderQuery = {}): Promise<OrderPage> => {
   const params = new URLSearchParams()
-  if (cookieId) params.append('cookie_id', cookieId)
-  if (status) params.append('status', status)
-  params.append('page', String(page))
-  params.append('page_size', String(pageSize))
-  const queryString = params.toString()
-  
+  if (query.cookieId) params.append('cookie_id', query.cookieId)
+  if (query.status) params.append('status', query.status)
+  if (query.itemId) params.append('item_id', query.itemId)
+  if (query.buyerId) params.append('buyer_id', query.buyerId)
+  if (query.keyword) params.append('keyword', query.keyword)
+  if (query.cursor) params.append('cursor', query.cursor)
+  params.append('limit', String(query.limit || 50))
+  if (query.withTotal) params.append('with_total', 'true')
+
   try {
-    const result = await get<{ orders?: Order[]; data?: Order[]; total?: number; total_pages?: number }>(`/api/orders?${queryString}`)
-    const orders = result.orders || result.data || []
+    const result = await get<{ data?: Order[]; next_cursor?: string | null; has_more?: boolean; total?: number | null }>(`/api/orders?${params.toString()}`)
     return {
       success: true,
-      data: orders,
-      total: result.total || orders.length,
-      total_pages: result.total_pages || Math.ceil((result.total || orders.length) / pageSize)
+      data: result.data || [],
+      nextCursor: result.next_cursor || null,
+      hasMore: !!result.has_more,
+      total: result.total,
     }
   } catch {
-    return { success: false, data: [], total: 0, total_pages: 0 }
+    return { success: false, data: [], nextCursor: null, hasMore: false, total: 0 }
   }
 }
 
@@ -4,6 +4,14 @@
 import { get, put, post } from '@/utils/request'
 import type { ApiResponse } from '@/types'
 
+export interface ScheduledTaskStats {
+  run_count: number
+  skip_count: number
+  error_count: number
+  last_result: string | null
+  last_duration_ms: number | null
+}
+
 export interface ScheduledTask {
   id: number
   task_code: string
@@ -14,6 +22,8 @@ export interface ScheduledTask {
   last_run_at: string | null
   created_at: string | null
   updated_at: string | null
+  scope: 'global' | 'account'
+  stats: ScheduledTaskStats | null
 }
 
 export interface ScheduledTaskUpdate {
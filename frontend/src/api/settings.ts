@@ -155,12 +155,26 @@ export const testEmailSend = async (email: string): Promise<ApiResponse> => {
 }
 
 // 修改密码（普通用户）
-export const changePassword = async (data: { current_password: string; new_password: string }): Promise<ApiResponse> => {
+// 修改成功后旧会话全部失效，返回的 token 为当前会话的新 token
+export const changePassword = async (data: { current_password: string; new_password: string }): Promise<ApiResponse & { token?: string }> => {
   return post('/change-password', data)
 }
 
 // 获取备份文件列表（管理员）
-export const getBackupList = async (): Promise<{ backups: Array<{ filename: string; size: number; size_mb: number; modified_time: string }>; total: number }> => {
+export interface BackupFileInfo {
+  filename: string
+  size: number
+  size_mb: number
+  modified_time: string
+  type: 'restore_point' | 'scheduled'
+  duration_ms?: number | null
+  pages?: number | null
+  pages_per_sec?: number | null
+  compressed?: boolean | null
+  sha256?: string | null
+}
+
+export const getBackupList = async (): Promise<{ backups: BackupFileInfo[]; total: number }> => {
   return get('/admin/backup/list')
 }
 
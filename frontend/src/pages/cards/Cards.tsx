@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react'
 import type { FormEvent, ChangeEvent } from 'react'
-import { Ticket, RefreshCw, Plus, Trash2, X, Loader2, Power, PowerOff, Edit2, Image, Search } from 'lucide-react'
-import { getCards, deleteCard, createCard, updateCard, type CardData } from '@/api/cards'
+import { Ticket, RefreshCw, Plus, Trash2, X, Loader2, Power, PowerOff, Edit2, Image, Search, Upload } from 'lucide-react'
+import { getCards, getCard, deleteCard, createCard, updateCard, importCardStock, type CardData } from '@/api/cards'
 import { useUIStore } from '@/store/uiStore'
 import { PageLoading } from '@/components/common/Loading'
 import { useAuthStore } from '@/store/authStore'
@@ -110,6 +110,8 @@ export function Cards() {
   const [submitting, setSubmitting] = useState(false)
   const [imagePreview, setImagePreview] = useState<string | null>(null)
   const fileInputRef = useRef<HTMLInputElement>(null)
+  const stockFileInputRef = useRef<HTMLInputElement>(null)
+  const [stockImportCardId, setStockImportCardId] = useState<number | null>(null)
   
   // 图片预览弹窗状态
   const [isImagePreviewOpen, setIsImagePreviewOpen] = useState(false)
@@ -169,7 +171,16 @@ export function Cards() {
     }
   }
 
-  const handleEdit = (card: CardData) => {
+  const handleEdit = async (card: CardData) => {
+    if (card.type === 'data' && card.id) {
+      // 列表不返回卡密全文，编辑批量数据卡券时加载未发放的卡密
+      try {
+        card = await getCard(String(card.id))
+      } catch {
+        addToast({ type: 'error', message: '加载卡密失败' })
+        return
+      }
+    }
     setEditingCardId(card.id ?? null)
     setFormData({
       name: card.name || '',
@@ -199,6 +210,27 @@ export function Cards() {
     }
   }
 
+  // 导入卡密文件
+  const handleStockImportClick = (cardId: number) => {
+    setStockImportCardId(cardId)
+    stockFileInputRef.current?.click()
+  }
+
+  const handleStockFileChange = async (e: ChangeEvent<HTMLInputElement>) => {
+    const file = e.target.files?.[0]
+    e.target.value = ''
+    if (!file || !stockImportCardId) return
+    try {
+      const result = await importCardStock(stockImportCardId, file)
+      addToast({ type: 'success', message: result.message || '导入成功' })
+      loadCards()
+    } catch {
+      addToast({ type: 'error', message: '导入卡密失败' })
+    } finally {
+      setStockImportCardId(null)
+    }
+  }
+
   const closeModal = () => {
     setActiveModal(null)
     setEditingCardId(null)
@@ -459,6 +491,13 @@ export function Cards() {
 
   return (
     <div className="space-y-4">
+      <input
+        ref={stockFileInputRef}
+        type="file"
+        accept=".txt,.csv,text/plain"
+        onChange={handleStockFileChange}
+        className="hidden"
+      />
       {/* Header */}
       <div className="page-header flex-between flex-wrap gap-4">
         <div>
@@ -556,7 +595,7 @@ export function Cards() {
                       ) : (
                         <code className="text-xs bg-gray-100 dark:bg-gray-800 px-2 py-1 rounded max-w-[200px] truncate block">
                           {card.type === 'text' && (card.text_content || '-')}
-                          {card.type === 'data' && (card.data_content ? `剩余 ${card.data_content.split('\n').filter((line: string) => line.trim()).length} 条` : '-')}
+                          {card.type === 'data' && (card.stock ? `剩余 ${card.stock.available} 条 / 已发 ${card.stock.claimed} 条` : '-')}
                           {card.type === 'api' && (card.api_config?.url || '-')}
                           {!['text', 'data', 'api', 'image'].includes(card.type) && '-'}
                         </code>
@@ -586,6 +625,15 @@ export function Cards() {
                         >
                           <Edit2 className="w-4 h-4 text-blue-500" />
                         </button>
+                        {card.type === 'data' && (
+                          <button
+                            onClick={() => card.id && handleStockImportClick(card.id)}
+                            className="p-2 rounded-lg hover:bg-gray-100 dark:hover:bg-gray-800 transition-colors"
+                            title="导入卡密"
+                          >
+                            <Upload className="w-4 h-4 text-emerald-500" />
+                          </button>
+                        )}
                         <button
                           onClick={() => handleToggleEnabled(card)}
                           className="p-2 rounded-lg hover:bg-gray-100 dark:hover:bg-gray-800 transition-colors"
@@ -1,14 +1,11 @@
 import { useEffect, useState } from 'react'
 import { motion } from 'framer-motion'
 import { Activity, MessageSquare, RefreshCw, Shield, ShoppingCart, Users } from 'lucide-react'
-import { getAccountDetails } from '@/api/accounts'
-import { getKeywords } from '@/api/keywords'
-import { getOrders } from '@/api/orders'
-import { type AdminStats, getAdminStats } from '@/api/admin'
+import type { AdminStats } from '@/api/admin'
+import { getDashboardSummary, type DashboardAccount } from '@/api/dashboard'
 import { useUIStore } from '@/store/uiStore'
 import { useAuthStore } from '@/store/authStore'
 import { PageLoading } from '@/components/common/Loading'
-import type { AccountDetail } from '@/types'
 
 interface DashboardStats {
   totalAccounts: number
@@ -28,7 +25,7 @@ export function Dashboard() {
     activeAccounts: 0,
     totalOrders: 0,
   })
-  const [accounts, setAccounts] = useState<AccountDetail[]>([])
+  const [accounts, setAccounts] = useState<DashboardAccount[]>([])
   const [adminStats, setAdminStats] = useState<AdminStats | null>(null)
 
   const loadDashboard = async () => {
@@ -36,68 +33,18 @@ export function Dashboard() {
     try {
       setLoading(true)
 
-      // 获取账号详情
-      const accountsData = await getAccountDetails()
-
-      // 为每个账号获取关键词数量
-      const accountsWithKeywords = await Promise.all(
-        accountsData.map(async (account) => {
-          try {
-            const keywords = await getKeywords(account.id)
-            return {
-              ...account,
-              keywordCount: keywords.length,
-            }
-          } catch {
-            return { ...account, keywordCount: 0 }
-          }
-        }),
-      )
-
-      // 计算统计数据
-      let totalKeywords = 0
-      let activeAccounts = 0
-
-      accountsWithKeywords.forEach((account) => {
-        const isEnabled = account.enabled !== false
-        if (isEnabled) {
-          activeAccounts++
-          totalKeywords += account.keywordCount || 0
-        }
-      })
-
-      // 获取订单数量
-      let ordersCount = 0
-      try {
-        const ordersResult = await getOrders()
-        if (ordersResult.success) {
-          ordersCount = ordersResult.data?.length || 0
-        }
-      } catch {
-        // ignore
-      }
-
+      // 一次请求获取全部统计（服务端聚合计数）
+      const summary = await getDashboardSummary()
 
       setStats({
-        totalAccounts: accountsWithKeywords.length,
-        totalKeywords,
-        activeAccounts,
-        totalOrders: ordersCount,
+        totalAccounts: summary.stats.total_accounts,
+        totalKeywords: summary.stats.total_keywords,
+        activeAccounts: summary.stats.active_accounts,
+        totalOrders: summary.stats.total_orders,
       })
 
-      setAccounts(accountsWithKeywords)
-
-      // 管理员获取全局统计
-      if (user?.is_admin) {
-        try {
-          const adminResult = await getAdminStats()
-          if (adminResult.success && adminResult.data) {
-            setAdminStats(adminResult.data)
-          }
-        } catch {
-          // ignore
-        }
-      }
+      setAccounts(summary.accounts)
+      setAdminStats(user?.is_admin ? summary.admin || null : null)
     } catch {
       addToast({ type: 'error', message: '加载仪表盘数据失败' })
     } finally {
@@ -265,7 +212,7 @@ export function Dashboard() {
               ) : (
                 accounts.map((account) => {
                   const isEnabled = account.enabled !== false
-                  const keywordCount = account.keywordCount || 0
+                  const keywordCount = account.keyword_count || 0
 
                   return (
                     <tr key={account.id}>
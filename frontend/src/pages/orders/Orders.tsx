@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { motion } from 'framer-motion'
-import { ShoppingCart, RefreshCw, Search, Trash2, Eye, X, ChevronLeft, ChevronRight } from 'lucide-react'
+import { ShoppingCart, RefreshCw, Search, Trash2, Eye, X, Loader2 } from 'lucide-react'
 import { getOrders, deleteOrder, getOrderDetail, type OrderDetail } from '@/api/orders'
 import { getAccounts } from '@/api/accounts'
 import { useUIStore } from '@/store/uiStore'
@@ -33,27 +33,58 @@ export function Orders() {
   const [detailModalOpen, setDetailModalOpen] = useState(false)
   const [orderDetail, setOrderDetail] = useState<OrderDetail | null>(null)
   const [loadingDetail, setLoadingDetail] = useState(false)
-  // 分页状态
-  const [currentPage, setCurrentPage] = useState(1)
-  const [pageSize] = useState(20)
+  // 键集分页状态：滚动到底部时按游标加载下一页并追加
+  const pageSize = 50
   const [total, setTotal] = useState(0)
-  const [totalPages, setTotalPages] = useState(0)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [debouncedKeyword, setDebouncedKeyword] = useState('')
+  const queryVersion = useRef(0)
+  const sentinelRef = useRef<HTMLDivElement>(null)
 
-  const loadOrders = async (page: number = currentPage) => {
+  const buildQuery = () => ({
+    cookieId: selectedAccount || undefined,
+    status: selectedStatus || undefined,
+    keyword: debouncedKeyword || undefined,
+    limit: pageSize,
+  })
+
+  // 重新加载第一页（筛选条件变化或刷新）
+  const loadOrders = async () => {
     if (!_hasHydrated || !isAuthenticated || !token) return
+    const version = ++queryVersion.current
     try {
       setLoading(true)
-      const result = await getOrders(selectedAccount || undefined, selectedStatus || undefined, page, pageSize)
+      const result = await getOrders({ ...buildQuery(), withTotal: true })
+      if (version !== queryVersion.current) return
       if (result.success) {
-        setOrders(result.data || [])
+        setOrders(result.data)
+        setNextCursor(result.nextCursor)
         setTotal(result.total || 0)
-        setTotalPages(result.total_pages || 0)
-        setCurrentPage(page)
+      } else {
+        addToast({ type: 'error', message: '加载订单列表失败' })
+      }
+    } finally {
+      if (version === queryVersion.current) setLoading(false)
+    }
+  }
+
+  // 加载下一页
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore || loading) return
+    const version = queryVersion.current
+    try {
+      setLoadingMore(true)
+      const result = await getOrders({ ...buildQuery(), cursor: nextCursor })
+      if (version !== queryVersion.current) return
+      if (result.success) {
+        setOrders((prev) => [...prev, ...result.data])
+        setNextCursor(result.nextCursor)
+      } else {
+        addToast({ type: 'error', message: '加载更多订单失败' })
       }
-    } catch {
-      addToast({ type: 'error', message: '加载订单列表失败' })
     } finally {
-      setLoading(false)
+      setLoadingMore(false)
     }
   }
 
@@ -70,14 +101,29 @@ export function Orders() {
   useEffect(() => {
     if (!_hasHydrated || !isAuthenticated || !token) return
     loadAccounts()
-    loadOrders(1)
   }, [_hasHydrated, isAuthenticated, token])
 
+  // 搜索关键词防抖后再查询
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedKeyword(searchKeyword.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [searchKeyword])
+
   useEffect(() => {
     if (!_hasHydrated || !isAuthenticated || !token) return
-    setCurrentPage(1)
-    loadOrders(1)
-  }, [_hasHydrated, isAuthenticated, token, selectedAccount, selectedStatus])
+    loadOrders()
+  }, [_hasHydrated, isAuthenticated, token, selectedAccount, selectedStatus, debouncedKeyword])
+
+  // 列表底部进入可视区域时自动加载下一页
+  useEffect(() => {
+    const sentinel = sentinelRef.current
+    if (!sentinel || !nextCursor) return
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0]?.isIntersecting) loadMore()
+    }, { rootMargin: '200px' })
+    observer.observe(sentinel)
+    return () => observer.disconnect()
+  }, [nextCursor, loadingMore, loading])
 
   const handleDelete = async (id: string) => {
     if (!confirm('确定要删除这个订单吗？')) return
@@ -85,7 +131,8 @@ export function Orders() {
       const result = await deleteOrder(id)
       if (result.success) {
         addToast({ type: 'success', message: '删除成功' })
-        loadOrders()
+        setOrders((prev) => prev.filter((order) => order.id !== id))
+        setTotal((prev) => Math.max(0, prev - 1))
       } else {
         addToast({ type: 'error', message: result.message || '删除失败' })
       }
@@ -113,16 +160,6 @@ export function Orders() {
     }
   }
 
-  const filteredOrders = orders.filter((order) => {
-    if (!searchKeyword) return true
-    const keyword = searchKeyword.toLowerCase()
-    return (
-      order.order_id?.toLowerCase().includes(keyword) ||
-      order.item_id?.toLowerCase().includes(keyword) ||
-      order.buyer_id?.toLowerCase().includes(keyword)
-    )
-  })
-
   if (loading && orders.length === 0) {
     return <PageLoading />
   }
@@ -135,7 +172,7 @@ export function Orders() {
           <h1 className="page-title">订单管理</h1>
           <p className="page-description">查看和管理所有订单信息</p>
         </div>
-        <button onClick={() => loadOrders(currentPage)} className="btn-ios-secondary w-full sm:w-auto">
+        <button onClick={() => loadOrders()} className="btn-ios-secondary w-full sm:w-auto">
           <RefreshCw className="w-4 h-4" />
           刷新
         </button>
@@ -189,7 +226,7 @@ export function Orders() {
                   type="text"
                   value={searchKeyword}
                   onChange={(e) => setSearchKeyword(e.target.value)}
-                  placeholder="搜索订单ID或商品ID..."
+                  placeholder="搜索订单ID、商品ID或买家ID..."
                   className="input-ios pl-9"
                 />
               </div>
@@ -229,7 +266,7 @@ export function Orders() {
               </tr>
             </thead>
             <tbody>
-              {filteredOrders.length === 0 ? (
+              {orders.length === 0 ? (
                 <tr>
                   <td colSpan={10} className="text-center py-8 text-gray-500">
                     <div className="flex flex-col items-center gap-2">
@@ -239,7 +276,7 @@ export function Orders() {
                   </td>
                 </tr>
               ) : (
-                filteredOrders.map((order) => {
+                orders.map((order) => {
                   const status = statusMap[order.status] || statusMap.unknown
                   return (
                     <tr key={order.id}>
@@ -288,58 +325,20 @@ export function Orders() {
           </table>
         </div>
 
-        {/* 分页 */}
-        {totalPages > 0 && (
-          <div className="flex items-center justify-between px-4 py-3 border-t border-gray-200 dark:border-gray-700">
-            <div className="text-sm text-gray-500">
-              第 {currentPage} 页，共 {totalPages} 页，{total} 条记录
-            </div>
-            <div className="flex items-center gap-2">
-              <button
-                onClick={() => loadOrders(currentPage - 1)}
-                disabled={currentPage <= 1 || loading}
-                className="p-2 rounded-lg hover:bg-gray-100 dark:hover:bg-gray-800 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
-                title="上一页"
-              >
-                <ChevronLeft className="w-4 h-4" />
+        {/* 滚动加载 */}
+        {orders.length > 0 && (
+          <div
+            ref={sentinelRef}
+            className="flex items-center justify-center px-4 py-3 border-t border-gray-200 dark:border-gray-700 text-sm text-gray-500"
+          >
+            {nextCursor ? (
+              <button onClick={loadMore} disabled={loadingMore} className="btn-ios-secondary">
+                {loadingMore && <Loader2 className="w-4 h-4 animate-spin" />}
+                {loadingMore ? '加载中...' : `加载更多（已加载 ${orders.length} / ${total}）`}
               </button>
-              <div className="flex items-center gap-1">
-                {Array.from({ length: Math.min(5, totalPages) }, (_, i) => {
-                  let pageNum: number
-                  if (totalPages <= 5) {
-                    pageNum = i + 1
-                  } else if (currentPage <= 3) {
-                    pageNum = i + 1
-                  } else if (currentPage >= totalPages - 2) {
-                    pageNum = totalPages - 4 + i
-                  } else {
-                    pageNum = currentPage - 2 + i
-                  }
-                  return (
-                    <button
-                      key={pageNum}
-                      onClick={() => loadOrders(pageNum)}
-                      disabled={loading}
-                      className={`w-8 h-8 rounded-lg text-sm transition-colors ${
-                        currentPage === pageNum
-                          ? 'bg-blue-500 text-white'
-                          : 'hover:bg-gray-100 dark:hover:bg-gray-800'
-                      }`}
-                    >
-                      {pageNum}
-                    </button>
-                  )
-                })}
-              </div>
-              <button
-                onClick={() => loadOrders(currentPage + 1)}
-                disabled={currentPage >= totalPages || loading}
-                className="p-2 rounded-lg hover:bg-gray-100 dark:hover:bg-gray-800 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
-                title="下一页"
-              >
-                <ChevronRight className="w-4 h-4" />
-              </button>
-            </div>
+            ) : (
+              <span>已加载全部 {orders.length} 条记录</span>
+            )}
           </div>
         )}
       </motion.div>
@@ -140,6 +140,16 @@ export function ScheduledTasks() {
                     最后执行: {task.last_run_at}
                   </p>
                 )}
+                {task.stats && (
+                  <p
+                    className="text-xs text-slate-400 dark:text-slate-500 mt-0.5"
+                    title={task.stats.last_result || undefined}
+                  >
+                    本次启动: 执行 {task.stats.run_count} 次 · 跳过 {task.stats.skip_count} 次 · 失败{' '}
+                    {task.stats.error_count} 次
+                    {task.stats.last_duration_ms !== null && ` · 耗时 ${task.stats.last_duration_ms}ms`}
+                  </p>
+                )}
               </div>
 
               {/* 右侧：间隔输入 + 开关 + 触发按钮 */}
@@ -189,7 +199,7 @@ export function ScheduledTasks() {
                 </label>
 
                 {/* 手动触发 — 仅全局任务可触发 */}
-                {(['db_backup', 'delivery_timeout'] as const).includes(task.task_code as 'db_backup' | 'delivery_timeout') ? (
+                {task.scope === 'global' ? (
                   <button
                     onClick={() => void handleTrigger(task)}
                     disabled={triggering === task.task_code}
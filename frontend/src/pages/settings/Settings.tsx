@@ -12,7 +12,7 @@ import type { SystemSettings, Account } from '@/types'
 
 export function Settings() {
   const { addToast } = useUIStore()
-  const { isAuthenticated, token, _hasHydrated, user } = useAuthStore()
+  const { isAuthenticated, token, _hasHydrated, user, setAuth } = useAuthStore()
   const [loading, setLoading] = useState(true)
   const [saving, setSaving] = useState(false)
   const [settings, setSettings] = useState<SystemSettings | null>(null)
@@ -188,6 +188,9 @@ export function Settings() {
       setChangingPassword(true)
       const result = await changePassword({ current_password: currentPassword, new_password: newPassword })
       if (result.success) {
+        if (result.token && user) {
+          setAuth(result.token, user)
+        }
         addToast({ type: 'success', message: '密码修改成功' })
         setCurrentPassword('')
         setNewPassword('')
@@ -7,13 +7,14 @@ from typing import List, Tuple, Optional, Dict, Any
 from pathlib import Path
 from urllib.parse import unquote
 import hashlib
-import secrets
 import time
 import json
 import os
 import re
 import uvicorn
 import io
+import base64
+import threading
 import asyncio
 from collections import defaultdict
 
@@ -24,6 +25,12 @@ from ai_reply_engine import ai_reply_engine
 from utils.qr_login import qr_login_manager
 from utils.xianyu_utils import trans_cookies
 from utils.image_utils import image_manager
+from utils.keyword_matcher import keyword_matcher_cache
+from utils.message_filter import message_filter_cache
+from utils.delivery_rule_matcher import delivery_rule_cache
+from utils.notification_service import notification_service
+from utils.send_bus import send_bus
+from utils.session_store import session_store
 
 from loguru import logger
 
@@ -41,8 +48,6 @@ KEYWORDS_FILE = Path(__file__).parent / "回复关键字.txt"
 # 简单的用户认证配置
 ADMIN_USERNAME = "admin"
 DEFAULT_ADMIN_PASSWORD = "admin123"  # 系统初始化时的默认密码（用户应立即修改）
-SESSION_TOKENS = {}  # 存储会话token: {token: {'user_id': int, 'username': str, 'timestamp': float}}
-TOKEN_EXPIRE_TIME = 24 * 60 * 60  # token过期时间：24小时
 
 # HTTP Bearer认证
 security = HTTPBearer(auto_error=False)
@@ -199,11 +204,6 @@ class VerifyCaptchaResponse(BaseModel):
     message: str
 
 
-def generate_token() -> str:
-    """生成随机token"""
-    return secrets.token_urlsafe(32)
-
-
 def verify_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security), request: Request = None) -> Optional[Dict[str, Any]]:
     """验证token并返回用户信息
     
@@ -223,17 +223,8 @@ def verify_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(s
     if not token:
         return None
 
-    if token not in SESSION_TOKENS:
-        return None
-
-    token_data = SESSION_TOKENS[token]
-
-    # 检查token是否过期
-    if time.time() - token_data['timestamp'] > TOKEN_EXPIRE_TIME:
-        del SESSION_TOKENS[token]
-        return None
-
-    return token_data
+    # 会话保存在共享存储中（过期检查由存储完成），多个 worker 进程可校验同一 token
+    return session_store.get(token)
 
 
 def verify_admin_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security), request: Request = None) -> Dict[str, Any]:
@@ -374,6 +365,8 @@ async def _stop_memory_service():
     try:
         from ai_reply_engine import memory_evolution_service
         await memory_evolution_service.stop()
+        from utils.ai_transport import ai_transport
+        await ai_transport.aclose()
     except Exception:
         pass
 
@@ -635,13 +628,10 @@ async def login(request: LoginRequest, req: Request = None):
             user = db_manager.get_user_by_username(request.username)
             if user:
                 # 生成token
-                token = generate_token()
-                SESSION_TOKENS[token] = {
-                    'user_id': user['id'],
-                    'username': user['username'],
-                    'is_admin': user.get('is_admin', False) or user['username'] == ADMIN_USERNAME,
-                    'timestamp': time.time()
-                }
+                token = session_store.create(
+                    user['id'], user['username'],
+                    is_admin=user.get('is_admin', False) or user['username'] == ADMIN_USERNAME
+                )
 
                 # 区分管理员和普通用户的日志
                 if user['username'] == ADMIN_USERNAME:
@@ -682,13 +672,10 @@ async def login(request: LoginRequest, req: Request = None):
         user = db_manager.get_user_by_email(request.email)
         if user and db_manager.verify_user_password(user['username'], request.password):
             # 生成token
-            token = generate_token()
-            SESSION_TOKENS[token] = {
-                'user_id': user['id'],
-                'username': user['username'],
-                'is_admin': user.get('is_admin', False) or user['username'] == ADMIN_USERNAME,
-                'timestamp': time.time()
-            }
+            token = session_store.create(
+                user['id'], user['username'],
+                is_admin=user.get('is_admin', False) or user['username'] == ADMIN_USERNAME
+            )
 
             logger.info(f"【{user['username']}#{user['id']}】邮箱登录成功")
 
@@ -729,13 +716,10 @@ async def login(request: LoginRequest, req: Request = None):
             )
 
         # 生成token
-        token = generate_token()
-        SESSION_TOKENS[token] = {
-            'user_id': user['id'],
-            'username': user['username'],
-            'is_admin': user.get('is_admin', False) or user['username'] == ADMIN_USERNAME,
-            'timestamp': time.time()
-        }
+        token = session_store.create(
+            user['id'], user['username'],
+            is_admin=user.get('is_admin', False) or user['username'] == ADMIN_USERNAME
+        )
 
         logger.info(f"【{user['username']}#{user['id']}】验证码登录成功")
 
@@ -771,8 +755,8 @@ async def verify(user_info: Optional[Dict[str, Any]] = Depends(verify_token)):
 # 登出接口
 @app.post('/logout')
 async def logout(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
-    if credentials and credentials.credentials in SESSION_TOKENS:
-        del SESSION_TOKENS[credentials.credentials]
+    if credentials:
+        session_store.delete(credentials.credentials)
     return {"message": "已登出"}
 
 
@@ -791,7 +775,10 @@ async def change_admin_password(request: ChangePasswordRequest, admin_user: Dict
 
         if success:
             logger.info(f"【admin#{admin_user['user_id']}】管理员密码修改成功")
-            return {"success": True, "message": "密码修改成功"}
+            # 撤销该用户的全部已有会话，并为当前调用方签发新 token
+            session_store.delete_user(admin_user['user_id'])
+            token = session_store.create(admin_user['user_id'], admin_user.get('username') or 'admin', is_admin=True)
+            return {"success": True, "message": "密码修改成功", "token": token}
         else:
             return {"success": False, "message": "密码修改失败"}
 
@@ -821,7 +808,10 @@ async def change_user_password(request: ChangePasswordRequest, current_user: Dic
 
         if success:
             logger.info(f"【{username}#{user_id}】用户密码修改成功")
-            return {"success": True, "message": "密码修改成功"}
+            # 撤销该用户的全部已有会话，并为当前调用方签发新 token
+            session_store.delete_user(user_id)
+            token = session_store.create(user_id, username, is_admin=current_user.get('is_admin', False))
+            return {"success": True, "message": "密码修改成功", "token": token}
         else:
             return {"success": False, "message": "密码修改失败"}
 
@@ -1250,6 +1240,25 @@ class SendMessageResponse(BaseModel):
     message: str
 
 
+class BulkSendItem(BaseModel):
+    cookie_id: str
+    chat_id: str
+    to_user_id: str
+    message: str
+
+
+class BulkSendRequest(BaseModel):
+    api_key: str
+    messages: List[BulkSendItem]
+    wait: float = 0  # 最多等待发送结果的秒数，0 表示入队后立即返回
+
+
+# /send-message 等待发送结果的最长时间（秒），超时返回“已排队”
+SEND_API_TIMEOUT = 25
+# 单次批量发送的消息数上限
+BULK_SEND_LIMIT = 500
+
+
 def verify_api_key(api_key: str) -> bool:
     """验证API秘钥"""
     try:
@@ -1318,39 +1327,31 @@ async def send_message_api(request: SendMessageRequest):
                     message=f"参数 {param_name} 不能为空"
                 )
 
-        # 直接获取XianyuLive实例，跳过cookie_manager检查
-        from XianyuAutoAsync import XianyuLive
-        live_instance = XianyuLive.get_instance(cleaned_cookie_id)
-
-        if not live_instance:
-            logger.warning(f"账号实例不存在或未连接: {cleaned_cookie_id}")
-            return SendMessageResponse(
-                success=False,
-                message="账号实例不存在或未连接，请检查账号状态"
-            )
-
-        # 检查WebSocket连接状态
-        if not live_instance.ws or live_instance.ws.closed:
-            logger.warning(f"账号WebSocket连接已断开: {cleaned_cookie_id}")
-            return SendMessageResponse(
-                success=False,
-                message="账号WebSocket连接已断开，请等待重连"
-            )
-
-        # 发送消息（使用清理后的所有参数）
-        await live_instance.send_msg(
-            live_instance.ws,
-            cleaned_chat_id,
-            cleaned_to_user_id,
-            cleaned_message
-        )
+        # 多进程分片模式：账号实例在所属分片进程中，转发发送请求
+        from utils import sharding
+        if sharding.router is not None:
+            try:
+                result = await sharding.router.acall(
+                    cleaned_cookie_id, 'send_message',
+                    chat_id=cleaned_chat_id, to_user_id=cleaned_to_user_id, message=cleaned_message
+                )
+            except sharding.ShardError as e:
+                logger.error(f"转发发送消息到分片失败: {cleaned_cookie_id}, {e}")
+                return SendMessageResponse(success=False, message=f"账号所在分片不可用: {e}")
+            if result.get('success'):
+                logger.info(f"API成功发送消息: {cleaned_cookie_id} -> {cleaned_to_user_id}, 内容: {cleaned_message[:50]}{'...' if len(cleaned_message) > 50 else ''}")
+            return SendMessageResponse(**result)
+
+        # 由账号所属事件循环的发送队列发送（不在API事件循环中直接写账号的WebSocket）
+        result = await send_bus.send(cleaned_cookie_id, cleaned_chat_id, cleaned_to_user_id, cleaned_message,
+                                     timeout=SEND_API_TIMEOUT)
+        if not result.get('success'):
+            logger.warning(f"API发送消息失败: {cleaned_cookie_id}, {result.get('message')}")
+            return SendMessageResponse(**result)
 
         logger.info(f"API成功发送消息: {cleaned_cookie_id} -> {cleaned_to_user_id}, 内容: {cleaned_message[:50]}{'...' if len(cleaned_message) > 50 else ''}")
 
-        return SendMessageResponse(
-            success=True,
-            message="消息发送成功"
-        )
+        return SendMessageResponse(**result)
 
     except Exception as e:
         # 使用清理后的参数记录日志
@@ -1363,6 +1364,61 @@ async def send_message_api(request: SendMessageRequest):
         )
 
 
+@app.post('/send-messages/bulk')
+async def bulk_send_messages_api(request: BulkSendRequest):
+    """批量发送消息API接口（使用秘钥验证）
+
+    消息进入各账号的发送队列后立即返回批次ID和逐条状态（wait>0 时最多等待 wait 秒），
+    之后可通过 GET /send-messages/{batch_id} 查询。同一账号按限速顺序发送，积压时同一会话的消息会合并。
+    """
+    if not request.api_key or not verify_api_key(request.api_key.strip()):
+        logger.warning("批量发送消息：API秘钥验证失败")
+        return {"success": False, "message": "API秘钥验证失败"}
+    if not request.messages:
+        return {"success": False, "message": "messages 不能为空"}
+    if len(request.messages) > BULK_SEND_LIMIT:
+        return {"success": False, "message": f"单次最多发送 {BULK_SEND_LIMIT} 条消息"}
+    for index, item in enumerate(request.messages):
+        if not (item.cookie_id and item.chat_id and item.to_user_id and item.message):
+            return {"success": False, "message": f"第 {index} 条消息缺少必需参数"}
+
+    # 多进程分片模式：每个账号一次IPC在所属分片入队，逐条结果保存在分片中，状态按需查询
+    from utils import sharding
+    if sharding.router is not None:
+        batch_id = await sharding.router.submit_batch([item.dict() for item in request.messages])
+        results = await sharding.router.batch_status(batch_id)
+        deadline = time.monotonic() + min(request.wait, SEND_API_TIMEOUT)
+        while any(r["status"] == "pending" for r in results) and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            results = await sharding.router.batch_status(batch_id)
+        logger.info(f"API批量发送消息: {len(results)} 条，批次 {batch_id}（分片）")
+        return {"success": True, "batch_id": batch_id, "results": results}
+
+    futures = [send_bus.submit(item.cookie_id, item.chat_id, item.to_user_id, item.message)
+               for item in request.messages]
+    batch_id = send_bus.track_batch(futures)
+    if request.wait > 0:
+        await asyncio.wait([asyncio.wrap_future(f) for f in futures], timeout=min(request.wait, SEND_API_TIMEOUT))
+    logger.info(f"API批量发送消息: {len(futures)} 条，批次 {batch_id}")
+    return {"success": True, "batch_id": batch_id,
+            "results": [send_bus.describe(index, future) for index, future in enumerate(futures)]}
+
+
+@app.get('/send-messages/{batch_id}')
+async def get_bulk_send_status(batch_id: str, api_key: str):
+    """查询批量发送的逐条状态（pending / sent / failed / queued；分片模式下查询失败时为 unknown）"""
+    if not verify_api_key(api_key.strip()):
+        return {"success": False, "message": "API秘钥验证失败"}
+    from utils import sharding
+    if sharding.router is not None:
+        results = await sharding.router.batch_status(batch_id)
+    else:
+        results = send_bus.batch_status(batch_id)
+    if results is None:
+        return {"success": False, "message": "批次不存在或已过期"}
+    return {"success": True, "batch_id": batch_id, "results": results}
+
+
 @app.post("/xianyu/reply", response_model=ResponseModel)
 async def xianyu_reply(req: RequestModel):
     msg_template = match_reply(req.cookie_id, req.send_message)
@@ -1694,6 +1750,29 @@ def get_cookie_account_details(cid: str, current_user: Dict[str, Any] = Depends(
 
 # ========================= 账号密码登录相关接口 =========================
 
+def _send_account_token_notification(account_id: str, **kwargs) -> bool:
+    """通过账号实例发送Token/验证类通知（同步，在后台线程中调用）
+
+    多进程分片模式下账号实例在所属分片进程中，转发给分片发送；账号实例不存在时返回 False
+    """
+    from utils import sharding
+    if sharding.router is not None:
+        return sharding.router.call(account_id, 'send_token_refresh_notification', **kwargs)
+
+    from XianyuAutoAsync import XianyuLive
+    live_instance = XianyuLive.get_instance(account_id)
+    if not live_instance:
+        return False
+    # 创建新的事件循环来运行异步通知
+    new_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(new_loop)
+    try:
+        new_loop.run_until_complete(live_instance.send_token_refresh_notification(**kwargs))
+    finally:
+        new_loop.close()
+    return True
+
+
 async def _execute_password_login(session_id: str, account_id: str, account: str, password: str, show_browser: bool, user_id: int, current_user: Dict[str, Any]):
     """后台执行账号密码登录任务"""
     try:
@@ -1741,33 +1820,25 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                     def send_face_verification_notification():
                         """在后台线程中发送人脸验证通知"""
                         try:
-                            from XianyuAutoAsync import XianyuLive
                             log_with_user('info', f"开始尝试发送人脸验证通知: {account_id}", current_user)
                             
-                            # 尝试获取XianyuLive实例（如果账号已经存在）
-                            live_instance = XianyuLive.get_instance(account_id)
+                            # 通过账号实例发送（分片模式下转发到账号所属分片）
+                            try:
+                                sent = _send_account_token_notification(
+                                    account_id,
+                                    error_message=message,
+                                    notification_type="face_verification",
+                                    verification_url=None,
+                                    attachment_path=actual_screenshot_path
+                                )
+                            except Exception as notify_err:
+                                log_with_user('error', f"发送人脸验证通知失败: {str(notify_err)}", current_user)
+                                import traceback
+                                log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
+                                return
                             
-                            if live_instance:
-                                log_with_user('info', f"找到账号实例，准备发送通知: {account_id}", current_user)
-                                # 创建新的事件循环来运行异步通知
-                                new_loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(new_loop)
-                                try:
-                                    new_loop.run_until_complete(
-                                        live_instance.send_token_refresh_notification(
-                                            error_message=message,
-                                            notification_type="face_verification",
-                                            verification_url=None,
-                                            attachment_path=actual_screenshot_path
-                                        )
-                                    )
-                                    log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
-                                except Exception as notify_err:
-                                    log_with_user('error', f"发送人脸验证通知失败: {str(notify_err)}", current_user)
-                                    import traceback
-                                    log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
-                                finally:
-                                    new_loop.close()
+                            if sent:
+                                log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
                             else:
                                 # 如果账号实例不存在，记录警告并尝试从数据库获取通知配置
                                 log_with_user('warning', f"账号实例不存在: {account_id}，尝试从数据库获取通知配置", current_user)
@@ -1804,32 +1875,24 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                     def send_face_verification_notification():
                         """在后台线程中发送人脸验证通知"""
                         try:
-                            from XianyuAutoAsync import XianyuLive
                             log_with_user('info', f"开始尝试发送人脸验证通知: {account_id}", current_user)
                             
-                            # 尝试获取XianyuLive实例（如果账号已经存在）
-                            live_instance = XianyuLive.get_instance(account_id)
+                            # 通过账号实例发送（分片模式下转发到账号所属分片）
+                            try:
+                                sent = _send_account_token_notification(
+                                    account_id,
+                                    error_message=message,
+                                    notification_type="face_verification",
+                                    verification_url=verification_url
+                                )
+                            except Exception as notify_err:
+                                log_with_user('error', f"发送人脸验证通知失败: {str(notify_err)}", current_user)
+                                import traceback
+                                log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
+                                return
                             
-                            if live_instance:
-                                log_with_user('info', f"找到账号实例，准备发送通知: {account_id}", current_user)
-                                # 创建新的事件循环来运行异步通知
-                                new_loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(new_loop)
-                                try:
-                                    new_loop.run_until_complete(
-                                        live_instance.send_token_refresh_notification(
-                                            error_message=message,
-                                            notification_type="face_verification",
-                                            verification_url=verification_url
-                                        )
-                                    )
-                                    log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
-                                except Exception as notify_err:
-                                    log_with_user('error', f"发送人脸验证通知失败: {str(notify_err)}", current_user)
-                                    import traceback
-                                    log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
-                                finally:
-                                    new_loop.close()
+                            if sent:
+                                log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
                             else:
                                 # 如果账号实例不存在，记录警告并尝试从数据库获取通知配置
                                 log_with_user('warning', f"账号实例不存在: {account_id}，尝试从数据库获取通知配置", current_user)
@@ -1972,7 +2035,7 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                                     if refreshed_cookies:
                                         # 更新cookie_manager中的Cookie
                                         if cookie_manager.manager:
-                                            cookie_manager.manager.update_cookie(account_id, refreshed_cookies, save_to_db=False)
+                                            await asyncio.to_thread(cookie_manager.manager.update_cookie, account_id, refreshed_cookies, save_to_db=False)
                                         log_with_user('info', f"已更新刷新后的Cookie到cookie_manager: {account_id}", current_user)
                             else:
                                 log_with_user('warning', f"Cookie刷新失败或跳过: {account_id}", current_user)
@@ -2479,11 +2542,11 @@ async def process_qr_login_cookies(cookies: str, unb: str, current_user: Dict[st
                     # 第二步：将真实cookie添加到cookie_manager（如果是新账号）或更新现有账号
                     if cookie_manager.manager:
                         if is_new_account:
-                            cookie_manager.manager.add_cookie(account_id, real_cookies)
+                            await asyncio.to_thread(cookie_manager.manager.add_cookie, account_id, real_cookies)
                             log_with_user('info', f"已将真实cookie添加到cookie_manager: {account_id}", current_user)
                         else:
                             # refresh_cookies_from_qr_login 已经保存到数据库了，这里不需要再保存
-                            cookie_manager.manager.update_cookie(account_id, real_cookies, save_to_db=False)
+                            await asyncio.to_thread(cookie_manager.manager.update_cookie, account_id, real_cookies, save_to_db=False)
                             log_with_user('info', f"已更新cookie_manager中的真实cookie: {account_id}", current_user)
 
                     return {
@@ -2528,11 +2591,11 @@ async def _fallback_save_qr_cookie(account_id: str, cookies: str, user_id: int,
         # 添加到或更新cookie_manager
         if cookie_manager.manager:
             if is_new_account:
-                cookie_manager.manager.add_cookie(account_id, cookies)
+                await asyncio.to_thread(cookie_manager.manager.add_cookie, account_id, cookies)
                 log_with_user('info', f"降级处理 - 已将原始cookie添加到cookie_manager: {account_id}", current_user)
             else:
                 # update_cookie_account_info 已经保存到数据库了，这里不需要再保存
-                cookie_manager.manager.update_cookie(account_id, cookies, save_to_db=False)
+                await asyncio.to_thread(cookie_manager.manager.update_cookie, account_id, cookies, save_to_db=False)
                 log_with_user('info', f"降级处理 - 已更新cookie_manager中的原始cookie: {account_id}", current_user)
 
         return {
@@ -2592,7 +2655,7 @@ async def refresh_cookies_from_qr_login(
                 updated_cookie_info = db_manager.get_cookie_by_id(cookie_id)
                 if updated_cookie_info:
                     # refresh_cookies_from_qr_login 已经保存到数据库了，这里不需要再保存
-                    cookie_manager.manager.update_cookie(cookie_id, updated_cookie_info['cookies_str'], save_to_db=False)
+                    await asyncio.to_thread(cookie_manager.manager.update_cookie, cookie_id, updated_cookie_info['cookies_str'], save_to_db=False)
                     log_with_user('info', f"已更新cookie_manager中的cookie: {cookie_id}", current_user)
 
             return {
@@ -2875,6 +2938,7 @@ def create_notification_channel(channel_data: NotificationChannelIn, current_use
             channel_data.config,
             user_id
         )
+        notification_service.invalidate()
         return {'msg': 'notification channel created', 'id': channel_id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -2907,6 +2971,7 @@ def update_notification_channel(channel_id: int, channel_data: NotificationChann
             channel_data.enabled
         )
         if success:
+            notification_service.invalidate()
             return {'msg': 'notification channel updated'}
         else:
             raise HTTPException(status_code=404, detail='通知渠道不存在')
@@ -2923,6 +2988,7 @@ def delete_notification_channel(channel_id: int, _: None = Depends(require_auth)
     try:
         success = db_manager.delete_notification_channel(channel_id)
         if success:
+            notification_service.invalidate()
             return {'msg': 'notification channel deleted'}
         else:
             raise HTTPException(status_code=404, detail='通知渠道不存在')
@@ -2989,6 +3055,7 @@ def set_message_notification(cid: str, notification_data: MessageNotificationIn,
 
         success = db_manager.set_message_notification(cid, notification_data.channel_id, notification_data.enabled)
         if success:
+            notification_service.invalidate()
             return {'msg': 'message notification set'}
         else:
             raise HTTPException(status_code=400, detail='设置失败')
@@ -3005,6 +3072,7 @@ def delete_account_notifications(cid: str, _: None = Depends(require_auth)):
     try:
         success = db_manager.delete_account_notifications(cid)
         if success:
+            notification_service.invalidate()
             return {'msg': 'account notifications deleted'}
         else:
             raise HTTPException(status_code=404, detail='账号通知配置不存在')
@@ -3021,6 +3089,7 @@ def delete_message_notification(notification_id: int, _: None = Depends(require_
     try:
         success = db_manager.delete_message_notification(notification_id)
         if success:
+            notification_service.invalidate()
             return {'msg': 'message notification deleted'}
         else:
             raise HTTPException(status_code=404, detail='通知配置不存在')
@@ -3097,9 +3166,13 @@ def get_scheduled_tasks(_: None = Depends(require_auth)):
     """获取所有定时任务配置"""
     from db_manager import db_manager
     try:
+        from utils.scheduler.global_runner import global_task_runner
         tasks = db_manager.get_all_scheduled_tasks()
+        runtime_stats = global_task_runner.get_stats()
         for t in tasks:
             t['enabled'] = bool(t.get('enabled'))
+            t['scope'] = 'global' if global_task_runner.is_global_task(t['task_code']) else 'account'
+            t['stats'] = runtime_stats.get(t['task_code'])
         return {'tasks': tasks}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -3133,7 +3206,7 @@ async def trigger_scheduled_task(task_code: str, _: None = Depends(require_auth)
     """手动触发定时任务"""
     try:
         from utils.scheduler.global_runner import global_task_runner
-        if task_code in ('db_backup', 'delivery_timeout'):
+        if global_task_runner.is_global_task(task_code):
             result = await global_task_runner.trigger_task(task_code)
             return {'success': True, 'message': result}
         return {'success': False, 'message': f'任务 {task_code} 为实例级任务，无法手动触发'}
@@ -3230,6 +3303,7 @@ def create_message_filter(data: MessageFilterIn, current_user: Dict[str, Any] =
         user_id = current_user.get('user_id', 1)
         filter_id = db_manager.add_message_filter(data.filter_type, data.filter_value.strip(), user_id, data.description)
         if filter_id:
+            message_filter_cache.invalidate()
             return {"id": filter_id, "msg": "过滤规则已添加"}
         raise HTTPException(status_code=400, detail="添加失败")
     except HTTPException:
@@ -3246,6 +3320,7 @@ def update_message_filter_api(filter_id: int, data: dict, _: None = Depends(requ
         success = db_manager.update_message_filter(filter_id,
             enabled=data.get('enabled'), filter_value=data.get('filter_value'))
         if success:
+            message_filter_cache.invalidate()
             return {"msg": "更新成功"}
         raise HTTPException(status_code=400, detail="更新失败")
     except HTTPException:
@@ -3261,6 +3336,7 @@ def delete_message_filter_api(filter_id: int, _: None = Depends(require_auth)):
     try:
         success = db_manager.delete_message_filter(filter_id)
         if success:
+            message_filter_cache.invalidate()
             return {"msg": "删除成功"}
         raise HTTPException(status_code=400, detail="删除失败")
     except HTTPException:
@@ -3916,6 +3992,7 @@ def update_keywords_with_item_id(cid: str, body: KeywordWithItemIdIn, current_us
     # 保存关键词（只保存文本关键词，保留图片关键词）
     try:
         success = db_manager.save_text_keywords_only(cid, keywords_to_save)
+        keyword_matcher_cache.invalidate(cid)
         if not success:
             raise HTTPException(status_code=500, detail="保存关键词失败")
     except Exception as e:
@@ -4183,6 +4260,7 @@ async def import_keywords(cid: str, file: UploadFile = File(...), current_user:
 
         # 保存到数据库（只影响文本关键词，保留图片关键词）
         success = db_manager.save_text_keywords_only(cid, import_data)
+        keyword_matcher_cache.invalidate(cid)
         if not success:
             raise HTTPException(status_code=500, detail="保存关键词到数据库失败")
 
@@ -4266,6 +4344,7 @@ async def add_image_keyword(
             logger.error("数据库保存失败，删除已保存的图片")
             image_manager.delete_image(image_url)
             raise HTTPException(status_code=400, detail="图片关键词保存失败，请稍后重试")
+        keyword_matcher_cache.invalidate(cid)
 
         log_with_user('info', f"添加图片关键词成功: {cid}, 关键词: {keyword}", current_user)
 
@@ -4361,6 +4440,7 @@ def delete_keyword_by_index(cid: str, index: int, current_user: Dict[str, Any] =
             success = db_manager.delete_keyword_by_index(cid, index)
             if not success:
                 raise HTTPException(status_code=400, detail="删除关键词失败")
+            keyword_matcher_cache.invalidate(cid)
 
             # 如果是图片关键词，删除对应的图片文件
             if keyword_data.get('type') == 'image' and keyword_data.get('image_url'):
@@ -4501,6 +4581,7 @@ def update_card(card_id: int, card_data: dict, _: None = Depends(require_auth)):
             spec_value=card_data.get('spec_value')
         )
         if success:
+            delivery_rule_cache.invalidate()
             return {"message": "卡券更新成功"}
         else:
             raise HTTPException(status_code=404, detail="卡券不存在")
@@ -4564,6 +4645,7 @@ async def update_card_with_image(
         )
 
         if success:
+            delivery_rule_cache.invalidate()
             logger.info(f"卡券更新成功: {name} (ID: {card_id})")
             return {"message": "卡券更新成功", "image_url": image_url}
         else:
@@ -4605,6 +4687,7 @@ def create_delivery_rule(rule_data: dict, current_user: Dict[str, Any] = Depends
             description=rule_data.get('description'),
             user_id=user_id
         )
+        delivery_rule_cache.invalidate()
         return {"id": rule_id, "message": "发货规则创建成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -4641,6 +4724,7 @@ def update_delivery_rule(rule_id: int, rule_data: dict, current_user: Dict[str,
             user_id=user_id
         )
         if success:
+            delivery_rule_cache.invalidate()
             return {"message": "发货规则更新成功"}
         else:
             raise HTTPException(status_code=404, detail="发货规则不存在")
@@ -4655,6 +4739,7 @@ def delete_card(card_id: int, _: None = Depends(require_auth)):
         from db_manager import db_manager
         success = db_manager.delete_card(card_id)
         if success:
+            delivery_rule_cache.invalidate()
             return {"message": "卡券删除成功"}
         else:
             raise HTTPException(status_code=404, detail="卡券不存在")
@@ -4662,6 +4747,72 @@ def delete_card(card_id: int, _: None = Depends(require_auth)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# 卡密流式导入：每次读取的字节数与每批写入的条数
+CARD_STOCK_IMPORT_CHUNK = 256 * 1024
+CARD_STOCK_IMPORT_BATCH = 1000
+
+
+@app.get("/cards/stock/claims")
+def get_card_stock_claims(order_id: Optional[str] = None, card_id: Optional[int] = None, limit: int = 100,
+                          current_user: Dict[str, Any] = Depends(get_current_user)):
+    """查询已发放的卡密记录（可按订单号、卡券过滤）"""
+    from db_manager import db_manager
+    claims = db_manager.get_card_stock_claims(current_user['user_id'], card_id=card_id,
+                                              order_id=order_id, limit=limit)
+    return {"claims": claims, "count": len(claims)}
+
+
+@app.get("/cards/{card_id}/stock")
+def get_card_stock(card_id: int, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """获取批量数据卡券的库存统计"""
+    from db_manager import db_manager
+    card = db_manager.get_card_by_id(card_id, current_user['user_id'])
+    if not card:
+        raise HTTPException(status_code=404, detail="卡券不存在")
+    if card['type'] != 'data':
+        raise HTTPException(status_code=400, detail="仅批量数据类型卡券支持库存管理")
+    return db_manager.get_card_stock_stats(card_id)
+
+
+@app.post("/cards/{card_id}/stock/import")
+async def import_card_stock(card_id: int, file: UploadFile = File(...),
+                            current_user: Dict[str, Any] = Depends(get_current_user)):
+    """流式导入卡密（文本文件，每行一条），按批写入库存表"""
+    import codecs
+    from db_manager import db_manager
+
+    card_type = await asyncio.to_thread(db_manager.get_card_type, card_id, current_user['user_id'])
+    if not card_type:
+        raise HTTPException(status_code=404, detail="卡券不存在")
+    if card_type != 'data':
+        raise HTTPException(status_code=400, detail="仅批量数据类型卡券支持导入卡密")
+
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ''
+    batch = []
+    imported = 0
+    try:
+        while True:
+            chunk = await file.read(CARD_STOCK_IMPORT_CHUNK)
+            text = decoder.decode(chunk or b'', final=not chunk)
+            lines = (pending + text).split('\n')
+            # 最后一段可能是不完整的行，留到下一块
+            pending = lines.pop() if chunk else ''
+            batch.extend(line for line in lines if line.strip())
+            while len(batch) >= CARD_STOCK_IMPORT_BATCH or (batch and not chunk):
+                part, batch = batch[:CARD_STOCK_IMPORT_BATCH], batch[CARD_STOCK_IMPORT_BATCH:]
+                imported += await asyncio.to_thread(db_manager.add_card_stock, card_id, part)
+            if not chunk:
+                break
+    except Exception as e:
+        log_with_user('error', f"导入卡密失败: 卡券ID {card_id}，已导入 {imported} 条 - {e}", current_user)
+        raise HTTPException(status_code=500, detail=f"导入卡密失败（已导入 {imported} 条）: {e}")
+
+    log_with_user('info', f"导入卡密成功: 卡券ID {card_id}，共 {imported} 条", current_user)
+    stock = await asyncio.to_thread(db_manager.get_card_stock_stats, card_id)
+    return {"message": f"成功导入 {imported} 条卡密", "imported": imported, "stock": stock}
+
+
 @app.delete("/delivery-rules/{rule_id}")
 def delete_delivery_rule(rule_id: int, current_user: Dict[str, Any] = Depends(get_current_user)):
     """删除发货规则"""
@@ -4670,6 +4821,7 @@ def delete_delivery_rule(rule_id: int, current_user: Dict[str, Any] = Depends(ge
         user_id = current_user['user_id']
         success = db_manager.delete_delivery_rule(rule_id, user_id)
         if success:
+            delivery_rule_cache.invalidate()
             return {"message": "发货规则删除成功"}
         else:
             raise HTTPException(status_code=404, detail="发货规则不存在")
@@ -4723,6 +4875,8 @@ def import_backup(file: UploadFile = File(...), current_user: Dict[str, Any] = D
         success = db_manager.import_backup(backup_data, user_id)
 
         if success:
+            delivery_rule_cache.invalidate()
+            notification_service.invalidate()
             # 备份导入成功后，刷新 CookieManager 的内存缓存
             import cookie_manager
             if cookie_manager.manager:
@@ -5572,16 +5726,24 @@ def test_ai_reply(cookie_id: str, test_data: dict, _: None = Depends(require_aut
                 'desc': test_data.get('item_desc', '这是一个测试商品')
             }
 
-            # 生成测试回复（跳过等待时间）
-            reply = ai_reply_engine.generate_reply(
-                message=test_message,
-                item_info=test_item_info,
-                chat_id=f"test_{int(time.time())}",
-                cookie_id=cookie_id,
-                user_id="test_user",
-                item_id="test_item",
-                skip_wait=True  # 测试时跳过10秒等待
-            )
+            # 生成测试回复（跳过等待时间；本接口在线程池中执行，用独立事件循环运行协程）
+            async def _generate_test_reply():
+                from utils.ai_transport import ai_transport
+                try:
+                    return await ai_reply_engine.generate_reply(
+                        message=test_message,
+                        item_info=test_item_info,
+                        chat_id=f"test_{int(time.time())}",
+                        cookie_id=cookie_id,
+                        user_id="test_user",
+                        item_id="test_item",
+                        skip_wait=True  # 测试时跳过10秒等待
+                    )
+                finally:
+                    # 临时事件循环结束前关闭其缓存的AI客户端，避免每次测试泄漏连接池
+                    await ai_transport.aclose()
+
+            reply = asyncio.run(_generate_test_reply())
 
             if reply:
                 logger.info(f"【已保存配置测试】成功，回复: {reply[:50]}...")
@@ -5606,16 +5768,37 @@ def test_ai_reply(cookie_id: str, test_data: dict, _: None = Depends(require_aut
 # ==================== 日志管理API ====================
 
 @app.get("/logs")
-async def get_logs(lines: int = 200, level: str = None, source: str = None, _: None = Depends(require_auth)):
-    """获取实时系统日志"""
+async def get_logs(lines: int = 200, level: str = None, source: str = None, after: int = None,
+                   _: None = Depends(require_auth)):
+    """获取实时系统日志（从日志文件末尾读取；after 为上次返回的 next_offset 时只返回新增日志）"""
     try:
+        from utils import log_reader
+
         # 获取文件日志收集器
         collector = get_file_log_collector()
+        if not collector.log_file or not os.path.exists(collector.log_file):
+            return {"success": True, "logs": [], "next_offset": 0}
+
+        file_id = log_reader.file_id(collector.log_file)
+        min_offset = collector.get_clear_offset(file_id)
+        predicate = None
+        if source:
+            source_lower = source.lower()
+            predicate = lambda record: source_lower in log_reader.parse_record(record)["source"].lower()
+
+        lines = max(1, min(lines, 2000))
+        if after is not None:
+            result = await asyncio.to_thread(
+                log_reader.read_forward, collector.log_file, max(after, min_offset), lines, level,
+                predicate=predicate)
+            next_offset = result["next_offset"]
+        else:
+            result = await asyncio.to_thread(
+                log_reader.tail, collector.log_file, lines, level, min_offset=min_offset, predicate=predicate)
+            next_offset = result["end_offset"]
 
-        # 获取日志
-        logs = collector.get_logs(lines=lines, level_filter=level, source_filter=source)
-
-        return {"success": True, "logs": logs}
+        logs = [log_reader.parse_record(record) for record in result["records"]]
+        return {"success": True, "logs": logs, "next_offset": next_offset}
 
     except Exception as e:
         return {"success": False, "message": f"获取日志失败: {str(e)}", "logs": []}
@@ -5926,6 +6109,7 @@ def delete_user(user_id: int, admin_user: Dict[str, Any] = Depends(require_admin
         success = db_manager.delete_user_and_data(user_id)
 
         if success:
+            session_store.delete_user(user_id)
             log_with_user('info', f"用户删除成功: {user_to_delete['username']} (ID: {user_id})", admin_user)
             return {"message": f"用户 {user_to_delete['username']} 删除成功"}
         else:
@@ -6019,59 +6203,68 @@ def get_admin_cookies(admin_user: Dict[str, Any] = Depends(require_admin)):
 @app.get('/admin/logs')
 def get_system_logs(admin_user: Dict[str, Any] = Depends(require_admin),
                    lines: int = 100,
-                   level: str = None):
-    """获取系统日志（管理员专用）"""
+                   level: str = None,
+                   file: str = None,
+                   before: int = None,
+                   after: int = None,
+                   since: str = None,
+                   until: str = None):
+    """获取系统日志（管理员专用）
+
+    默认从文件末尾反向读取最后 lines 条记录；before 为上次返回的 start_offset 时继续向前翻页，
+    after 为上次返回的 end_offset 时只返回之后新增的日志（增量跟随），
+    since/until 按时间范围查询（通过旁路索引定位，不扫描整个文件）。
+    """
     import os
     import glob
-    from datetime import datetime
+    from utils import log_reader
 
     try:
         log_with_user('info', f"查询系统日志，行数: {lines}, 级别: {level}", admin_user)
+        lines = max(1, min(lines, 5000))
+
+        if file:
+            safe_name = os.path.basename(file)
+            log_dir = os.path.abspath("logs")
+            target_path = os.path.abspath(os.path.join(log_dir, safe_name))
+            # 防止目录遍历
+            if not target_path.startswith(log_dir) or not os.path.exists(target_path):
+                return {"logs": [], "message": "日志文件不存在", "success": False}
+            log_file = os.path.join("logs", safe_name)
+        else:
+            # 获取最新的日志文件
+            log_files = glob.glob("logs/xianyu_*.log")
+            if not log_files:
+                logger.warning("未找到日志文件")
+                return {"logs": [], "message": "未找到日志文件", "success": False}
+            log_file = max(log_files, key=os.path.getctime)
 
-        # 查找日志文件
-        log_files = glob.glob("logs/xianyu_*.log")
-        logger.info(f"找到日志文件: {log_files}")
-
-        if not log_files:
-            logger.warning("未找到日志文件")
-            return {"logs": [], "message": "未找到日志文件", "success": False}
-
-        # 获取最新的日志文件
-        latest_log_file = max(log_files, key=os.path.getctime)
-        logger.info(f"使用最新日志文件: {latest_log_file}")
-
-        logs = []
         try:
-            with open(latest_log_file, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                logger.info(f"读取到 {len(all_lines)} 行日志")
-
-                # 如果指定了日志级别，进行过滤
-                if level:
-                    filtered_lines = [line for line in all_lines if f"| {level.upper()} |" in line]
-                    logger.info(f"按级别 {level} 过滤后剩余 {len(filtered_lines)} 行")
-                else:
-                    filtered_lines = all_lines
-
-                # 获取最后N行
-                recent_lines = filtered_lines[-lines:] if len(filtered_lines) > lines else filtered_lines
-                logger.info(f"取最后 {len(recent_lines)} 行日志")
-
-                for line in recent_lines:
-                    logs.append(line.strip())
-
+            if after is not None:
+                result = log_reader.read_forward(log_file, after=after, limit=lines, level=level)
+                result["start_offset"] = after
+                result["end_offset"] = result["next_offset"]
+            elif since or until:
+                result = log_reader.read_range(log_file, since=since, until=until, limit=lines, level=level)
+                result["end_offset"] = result["next_offset"]
+                result["start_offset"] = result["records"][0]["offset"] if result["records"] else result["next_offset"]
+            else:
+                result = log_reader.tail(log_file, limit=lines, level=level, before=before)
         except Exception as e:
             logger.error(f"读取日志文件失败: {str(e)}")
             log_with_user('error', f"读取日志文件失败: {str(e)}", admin_user)
             return {"logs": [], "message": f"读取日志文件失败: {str(e)}", "success": False}
 
-        log_with_user('info', f"返回日志记录 {len(logs)} 条", admin_user)
-        logger.info(f"成功返回 {len(logs)} 条日志记录")
-
+        logs = [record["text"] for record in result["records"]]
         return {
             "logs": logs,
-            "log_file": latest_log_file,
+            "log_file": log_file,
             "total_lines": len(logs),
+            "start_offset": result["start_offset"],
+            "end_offset": result["end_offset"],
+            "has_more": result["has_more"],
+            "reset": result.get("reset", False),
+            "file_size": result["file_size"],
             "success": True
         }
 
@@ -6080,6 +6273,102 @@ def get_system_logs(admin_user: Dict[str, Any] = Depends(require_admin),
         log_with_user('error', f"获取系统日志失败: {str(e)}", admin_user)
         return {"logs": [], "message": f"获取系统日志失败: {str(e)}", "success": False}
 
+@app.get('/admin/loop-watchdog')
+def get_loop_watchdog_stats(admin_user: Dict[str, Any] = Depends(require_admin), limit: int = 20):
+    """获取账号事件循环的阻塞监控数据（延迟分位数、阻塞来源和调用栈，管理员专用）"""
+    from utils.loop_watchdog import loop_watchdog
+    return {"success": True, "data": loop_watchdog.snapshot(limit=max(1, min(limit, 100)))}
+
+
+@app.post('/admin/loop-watchdog/reset')
+def reset_loop_watchdog_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """清空事件循环阻塞监控数据（管理员专用）"""
+    from utils.loop_watchdog import loop_watchdog
+    loop_watchdog.reset()
+    log_with_user('info', "清空事件循环阻塞监控数据", admin_user)
+    return {"success": True, "message": "监控数据已清空"}
+
+
+@app.get('/admin/log-sampling')
+def get_log_sampling(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取热路径日志采样配置和各类别的抑制计数（管理员专用）"""
+    from utils.log_control import log_sampler, CATEGORIES
+    return {"success": True, "data": {**log_sampler.snapshot(), "categories": list(CATEGORIES)}}
+
+
+@app.put('/admin/log-sampling')
+def update_log_sampling(config: Dict[str, Any], admin_user: Dict[str, Any] = Depends(require_admin)):
+    """更新热路径日志采样配置（管理员专用）
+
+    格式: {"defaults": {类别: 策略}, "accounts": {账号ID: {类别: 策略}}}，
+    策略字段: enabled, level, rate（条/秒，0为不限速）, burst
+    """
+    from utils.log_control import log_sampler
+    try:
+        log_sampler.configure(config)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_with_user('info', "更新日志采样配置", admin_user)
+    return {"success": True, "data": log_sampler.get_config()}
+
+
+@app.get('/admin/notifications/stats')
+def get_notification_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取通知服务队列与发送统计（管理员专用）"""
+    return {"success": True, "data": notification_service.stats()}
+
+
+@app.get('/admin/send-queue')
+def get_send_queue_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取各账号外发消息队列的发送、合并与积压统计（管理员专用）"""
+    from utils import sharding
+    if sharding.router is None:
+        return {"success": True, "data": send_bus.stats()}
+    shards = sharding.router.broadcast("send_stats", connect_wait=0)
+    return {"success": True, "data": {index: (result if isinstance(result, dict) else {"error": str(result)})
+                                      for index, result in shards.items()}}
+
+
+@app.get('/admin/ai/transport')
+def get_ai_transport_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取AI接口各服务商的并发、超时配置与请求统计（管理员专用）"""
+    from utils.ai_transport import ai_transport
+    return {"success": True, "data": ai_transport.stats()}
+
+
+@app.get('/admin/db/explain')
+def explain_hot_queries(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """对登记的热点查询执行 EXPLAIN QUERY PLAN，标记未使用索引（SCAN）的查询（管理员专用）"""
+    queries = db_manager.explain_hot_queries()
+    flagged = [q['name'] for q in queries if not q['ok']]
+    return {"success": True, "data": {"queries": queries, "flagged": flagged}}
+
+
+@app.get('/admin/db/write-behind')
+def get_write_behind_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取日志批量写入队列统计（管理员专用）"""
+    return {"success": True, "data": db_manager.write_behind.stats()}
+
+
+@app.get('/admin/shards')
+def get_shard_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取多进程分片状态（进程存活、重启次数、账号分配，管理员专用）"""
+    from utils import sharding
+    if sharding.router is None:
+        return {"success": True, "data": {"enabled": False, "shards": []}}
+    shards = {s["shard"]: s for s in sharding.supervisor.status()} if sharding.supervisor else {}
+    for entry in cookie_manager.manager.shard_status():
+        shards.setdefault(entry["shard"], {}).update(entry)
+    return {"success": True, "data": {"enabled": True, "shards": [shards[i] for i in sorted(shards)]}}
+
+
+@app.get('/admin/browser-pool')
+def get_browser_pool_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取 Playwright 浏览器池指标（租约等待、利用率、回收次数，管理员专用）"""
+    from utils.browser_pool import browser_pool_stats
+    return {"success": True, "data": browser_pool_stats()}
+
+
 @app.get('/admin/log-files')
 def list_log_files(admin_user: Dict[str, Any] = Depends(require_admin)):
     """列出所有可用的系统日志文件"""
@@ -6173,53 +6462,55 @@ def export_log_file(file: str, admin_user: Dict[str, Any] = Depends(require_admi
         log_with_user('error', f"导出日志文件失败: {str(e)}", admin_user)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get('/admin/stats')
-def get_system_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
-    """获取系统统计信息（管理员专用）"""
-    from db_manager import db_manager
-    try:
-        log_with_user('info', "查询系统统计信息", admin_user)
+# 仪表盘统计缓存（秒，可通过环境变量 DASHBOARD_CACHE_TTL 覆盖）
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', 5))
+_dashboard_cache: Dict[Any, Tuple[float, Any]] = {}
+_dashboard_cache_lock = threading.Lock()
 
-        # 用户统计
-        all_users = db_manager.get_all_users()
-        total_users = len(all_users)
 
-        # Cookie统计
-        all_cookies = db_manager.get_all_cookies()
-        total_cookies = len(all_cookies)
-        
-        # 活跃账号统计（启用状态的账号）
-        active_cookies = 0
-        for cookie_id in all_cookies.keys():
-            status = db_manager.get_cookie_status(cookie_id)
-            if status:
-                active_cookies += 1
-
-        # 卡券统计
-        all_cards = db_manager.get_all_cards()
-        total_cards = len(all_cards) if all_cards else 0
-
-        # 关键词统计
-        all_keywords = db_manager.get_all_keywords()
-        total_keywords = sum(len(kw_list) for kw_list in all_keywords.values())
-
-        # 订单统计
-        total_orders = 0
-        try:
-            orders = db_manager.get_all_orders()
-            total_orders = len(orders) if orders else 0
-        except:
-            pass
+def _cached_dashboard_value(key, loader):
+    """短时缓存聚合统计，避免频繁刷新仪表盘时重复执行计数查询"""
+    now = time.monotonic()
+    with _dashboard_cache_lock:
+        entry = _dashboard_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+    value = loader()
+    with _dashboard_cache_lock:
+        _dashboard_cache[key] = (now + DASHBOARD_CACHE_TTL, value)
+    return value
+
 
+@app.get('/dashboard/summary')
+def get_dashboard_summary(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """仪表盘汇总：账号列表（含关键词数/订单数）、用户计数，管理员附带全局计数"""
+    from db_manager import db_manager
+    try:
+        user_id = current_user['user_id']
+        accounts = _cached_dashboard_value(('user', user_id), lambda: db_manager.get_user_dashboard_counts(user_id))
+        enabled_accounts = [a for a in accounts if a['enabled']]
         stats = {
-            "total_users": total_users,
-            "total_cookies": total_cookies,
-            "active_cookies": active_cookies,
-            "total_cards": total_cards,
-            "total_keywords": total_keywords,
-            "total_orders": total_orders
+            "total_accounts": len(accounts),
+            "active_accounts": len(enabled_accounts),
+            # 与原仪表盘一致：关键词数只统计启用的账号
+            "total_keywords": sum(a['keyword_count'] for a in enabled_accounts),
+            "total_orders": sum(a['order_count'] for a in accounts),
         }
+        admin_stats = None
+        if current_user.get('username') == 'admin':
+            admin_stats = _cached_dashboard_value('system', db_manager.get_system_counts)
+        return {"stats": stats, "accounts": accounts, "admin": admin_stats}
+    except Exception as e:
+        log_with_user('error', f"获取仪表盘汇总失败: {str(e)}", current_user)
+        raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get('/admin/stats')
+def get_system_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取系统统计信息（管理员专用）"""
+    from db_manager import db_manager
+    try:
+        stats = _cached_dashboard_value('system', db_manager.get_system_counts)
         log_with_user('info', f"系统统计信息查询完成: {stats}", admin_user)
         return stats
 
@@ -6403,12 +6694,28 @@ def download_database_backup(admin_user: Dict[str, Any] = Depends(require_admin)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         download_filename = f"xianyu_backup_{timestamp}.db"
 
+        # WAL 模式下最近的提交可能还在 -wal 文件中，直接复制 .db 会丢数据；
+        # 用在线备份生成一致的快照，响应发送完毕后删除
+        import tempfile
+        import shutil
+        from starlette.background import BackgroundTask
+        from utils.db_backup import online_backup
+
+        snapshot_dir = tempfile.mkdtemp(prefix="xianyu_download_")
+        snapshot_path = os.path.join(snapshot_dir, download_filename)
+        try:
+            online_backup(db_file_path, snapshot_path, compress=False)
+        except Exception:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            raise
+
         log_with_user('info', f"开始下载数据库备份: {download_filename}", admin_user)
 
         return FileResponse(
-            path=db_file_path,
+            path=snapshot_path,
             filename=download_filename,
-            media_type='application/octet-stream'
+            media_type='application/octet-stream',
+            background=BackgroundTask(shutil.rmtree, snapshot_dir, ignore_errors=True)
         )
 
     except HTTPException:
@@ -6417,12 +6724,19 @@ def download_database_backup(admin_user: Dict[str, Any] = Depends(require_admin)
         log_with_user('error', f"下载数据库备份失败: {str(e)}", admin_user)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _invalidate_db_caches():
+    """数据库文件被替换后，清空基于数据库内容的内存缓存（分片模式下同步到各分片）"""
+    keyword_matcher_cache.invalidate()
+    message_filter_cache.invalidate()
+    delivery_rule_cache.invalidate()
+    notification_service.invalidate()
+
+
 @app.post('/admin/backup/upload')
 async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_admin),
                                 backup_file: UploadFile = File(...)):
     """上传并恢复数据库备份文件（管理员专用）"""
     import os
-    import shutil
     import sqlite3
     from datetime import datetime
 
@@ -6482,21 +6796,30 @@ async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_ad
         backup_current_path = os.path.join(db_dir, backup_filename)
 
         if os.path.exists(current_db_path):
-            shutil.copy2(current_db_path, backup_current_path)
+            # 在线备份（包含 -wal 中尚未检查点的提交）
+            from utils.db_backup import online_backup
+            await asyncio.to_thread(online_backup, current_db_path, backup_current_path, compress=False)
             log_with_user('info', f"当前数据库已备份为: {backup_current_path}", admin_user)
 
-        # 关闭当前数据库连接
-        if hasattr(db_manager, 'conn') and db_manager.conn:
-            db_manager.conn.close()
-            log_with_user('info', "已关闭当前数据库连接", admin_user)
+        from utils.db_backup import restore_into
+
+        # 先在临时文件上执行表结构迁移（旧版本备份可能缺少新增的表/字段）
+        from db_manager import DBManager
+        await asyncio.to_thread(lambda: DBManager(temp_file_path).close())
 
-        # 替换数据库文件
-        shutil.move(temp_file_path, current_db_path)
-        log_with_user('info', f"数据库文件已替换: {current_db_path}", admin_user)
+        def _restore(source_path: str) -> int:
+            # 持有写锁把备份内容写入正在使用的数据库：不替换文件，WAL/SHM 与分片进程的连接保持有效
+            with db_manager.lock:
+                db_manager.conn.commit()
+                return restore_into(db_manager.conn, source_path)
 
-        # 重新初始化数据库连接（使用原有的db_path）
-        db_manager.__init__(db_manager.db_path)
-        log_with_user('info', "数据库连接已重新初始化", admin_user)
+        try:
+            pages = await asyncio.to_thread(_restore, temp_file_path)
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(temp_file_path + suffix):
+                    os.remove(temp_file_path + suffix)
+        log_with_user('info', f"数据库已在线恢复: {current_db_path}（{pages} 页）", admin_user)
 
         # 验证新数据库
         try:
@@ -6506,11 +6829,14 @@ async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_ad
             log_with_user('error', f"数据库恢复后验证失败: {str(e)}", admin_user)
             # 如果验证失败，尝试恢复原数据库
             if os.path.exists(backup_current_path):
-                shutil.copy2(backup_current_path, current_db_path)
-                db_manager.__init__()
+                await asyncio.to_thread(_restore, backup_current_path)
                 log_with_user('info', "已恢复原数据库", admin_user)
+            _invalidate_db_caches()
             raise HTTPException(status_code=500, detail="数据库恢复失败，已回滚到原数据库")
 
+        # 数据库已整体替换，内存中的匹配器/索引全部失效
+        _invalidate_db_caches()
+
         return {
             "success": True,
             "message": "数据库恢复成功",
@@ -6554,6 +6880,17 @@ def list_backup_files(admin_user: Dict[str, Any] = Depends(require_admin)):
             except Exception as e:
                 log_with_user('warning', f"读取备份文件信息失败: {file_path} - {str(e)}", admin_user)
 
+        for item in backup_list:
+            item['type'] = 'restore_point'
+
+        # 定时在线备份（含耗时、页数、速度和校验和等元数据）
+        from utils.db_backup import list_backups
+        from utils.scheduler.task_executors import BACKUP_DIR
+        for item in list_backups(BACKUP_DIR):
+            item['size_mb'] = round(item['size'] / (1024 * 1024), 2)
+            item['type'] = 'scheduled'
+            backup_list.append(item)
+
         # 按修改时间倒序排列
         backup_list.sort(key=lambda x: x['modified_time'], reverse=True)
 
@@ -6755,33 +7092,57 @@ def update_item_multi_quantity_delivery(cookie_id: str, item_id: str, delivery_d
 
 # ==================== 订单管理接口 ====================
 
-@app.get('/api/orders')
-def get_user_orders(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """获取当前用户的订单信息"""
-    try:
-        from db_manager import db_manager
+def _encode_order_cursor(cursor) -> Optional[str]:
+    """把 (created_at, order_id) 编码为不透明的分页游标"""
+    if not cursor:
+        return None
+    raw = json.dumps(list(cursor), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
 
-        user_id = current_user['user_id']
-        log_with_user('info', "查询用户订单信息", current_user)
 
-        # 获取用户的所有Cookie
-        user_cookies = db_manager.get_all_cookies(user_id)
+def _decode_order_cursor(token: Optional[str]):
+    if not token:
+        return None
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        return str(created_at), str(order_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
 
-        # 获取所有订单数据
-        all_orders = []
-        for cookie_id in user_cookies.keys():
-            orders = db_manager.get_orders_by_cookie(cookie_id, limit=1000)  # 增加限制数量
-            # 为每个订单添加cookie_id信息
-            for order in orders:
-                order['cookie_id'] = cookie_id
-                all_orders.append(order)
 
-        # 按创建时间倒序排列
-        all_orders.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+@app.get('/api/orders')
+def get_user_orders(cookie_id: Optional[str] = None, status: Optional[str] = None,
+                    item_id: Optional[str] = None, buyer_id: Optional[str] = None,
+                    keyword: Optional[str] = None, cursor: Optional[str] = None,
+                    limit: int = 50, with_total: bool = False,
+                    current_user: Dict[str, Any] = Depends(get_current_user)):
+    """分页获取当前用户的订单（按创建时间倒序，cursor 为上一页返回的 next_cursor）"""
+    try:
+        from db_manager import db_manager
 
-        log_with_user('info', f"用户订单查询成功，共 {len(all_orders)} 条记录", current_user)
-        return {"success": True, "data": all_orders, "total": len(all_orders)}
+        user_id = current_user['user_id']
+        page = db_manager.get_user_orders_page(
+            user_id=user_id,
+            cookie_id=cookie_id or None,
+            status=status or None,
+            item_id=item_id or None,
+            buyer_id=buyer_id or None,
+            keyword=(keyword or '').strip() or None,
+            cursor=_decode_order_cursor(cursor),
+            limit=limit,
+            with_total=with_total,
+        )
+        next_cursor = _encode_order_cursor(page['next_cursor'])
+        return {
+            "success": True,
+            "data": page['orders'],
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+            "total": page['total'],
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         log_with_user('error', f"查询用户订单失败: {str(e)}", current_user)
         raise HTTPException(status_code=500, detail=f"查询订单失败: {str(e)}")
@@ -6799,12 +7160,11 @@ def get_order_detail(order_id: str, current_user: Dict[str, Any] = Depends(get_c
         # 获取用户的所有Cookie
         user_cookies = db_manager.get_all_cookies(user_id)
 
-        # 在用户的订单中查找
-        for cookie_id in user_cookies.keys():
-            order = db_manager.get_order_by_id(order_id)
-            if order and order.get('cookie_id') == cookie_id:
-                log_with_user('info', f"订单详情查询成功: {order_id}", current_user)
-                return {"success": True, "data": order}
+        # 订单须属于用户的账号
+        order = db_manager.get_order_by_id(order_id)
+        if order and order.get('cookie_id') in user_cookies:
+            log_with_user('info', f"订单详情查询成功: {order_id}", current_user)
+            return {"success": True, "data": order}
 
         log_with_user('warning', f"订单不存在或无权访问: {order_id}", current_user)
         raise HTTPException(status_code=404, detail="订单不存在或无权访问")
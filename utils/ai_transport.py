@@ -0,0 +1,171 @@
+"""
+AI接口异步传输层
+
+原先每条消息都在线程池中执行同步的 generate_reply，并为每次调用新建 OpenAI 客户端（新的连接池和
+TLS 握手），DashScope/Gemini 使用同步 requests。LLM 调用动辄数秒，长期占用默认线程池，
+数据库等其他 to_thread 调用只能排队。本模块提供：
+
+- 按 (base_url, api_key) 缓存的 AsyncOpenAI 客户端（保持长连接，LRU 上限 MAX_CLIENTS）
+- 共用的 httpx.AsyncClient，供 DashScope/Gemini 原生接口使用
+- 按服务商的并发上限（AI_CONCURRENCY_<PROVIDER>）和超时（AI_TIMEOUT_<PROVIDER>，秒）
+
+httpx/asyncio 对象绑定事件循环，客户端按事件循环分别缓存；事件循环关闭后对应缓存自动丢弃。
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Tuple
+
+from loguru import logger
+
+
+# 服务商：openai=OpenAI兼容文本模型，vision=视觉模型，dashscope/gemini=原生REST接口
+PROVIDERS = ("openai", "vision", "dashscope", "gemini")
+_DEFAULT_CONCURRENCY = {"openai": 16, "vision": 4, "dashscope": 8, "gemini": 8}
+_DEFAULT_TIMEOUT = {"openai": 30.0, "vision": 25.0, "dashscope": 30.0, "gemini": 30.0}
+# 每个事件循环最多缓存的 OpenAI 客户端数（每个 base_url + api_key 组合一个）
+MAX_CLIENTS = int(os.getenv("AI_MAX_CLIENTS", 64))
+
+
+def _provider_setting(prefix: str, provider: str, defaults: Dict[str, Any], cast):
+    value = os.getenv(f"{prefix}_{provider.upper()}")
+    try:
+        return cast(value) if value else defaults[provider]
+    except ValueError:
+        logger.warning(f"环境变量 {prefix}_{provider.upper()} 无效，使用默认值 {defaults[provider]}")
+        return defaults[provider]
+
+
+CONCURRENCY = {p: max(1, _provider_setting("AI_CONCURRENCY", p, _DEFAULT_CONCURRENCY, int)) for p in PROVIDERS}
+TIMEOUTS = {p: _provider_setting("AI_TIMEOUT", p, _DEFAULT_TIMEOUT, float) for p in PROVIDERS}
+
+
+class AIRequestError(Exception):
+    """原生REST接口返回非200状态"""
+
+    def __init__(self, provider: str, status_code: int, body: str):
+        super().__init__(f"{provider} API请求失败: {status_code} - {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class _LoopState:
+    """单个事件循环内的客户端与并发控制"""
+
+    def __init__(self):
+        self.clients: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self.http = None
+        self.semaphores = {p: asyncio.Semaphore(CONCURRENCY[p]) for p in PROVIDERS}
+
+
+class AITransport:
+    """AI接口调用入口（全局单例 ai_transport）"""
+
+    def __init__(self):
+        self._states: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+        self._lock = threading.Lock()
+        self._stats = {p: {"requests": 0, "errors": 0, "in_flight": 0} for p in PROVIDERS}
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            with self._lock:
+                # 顺便丢弃已关闭事件循环的缓存（其中的连接已不可用）
+                for closed in [l for l in self._states if l.is_closed()]:
+                    del self._states[closed]
+                state = self._states.setdefault(loop, _LoopState())
+        return state
+
+    def _openai_client(self, state: _LoopState, base_url: str, api_key: str):
+        key = (base_url, hashlib.sha256(api_key.encode()).hexdigest())
+        client = state.clients.get(key)
+        if client is not None:
+            state.clients.move_to_end(key)
+            return client
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url or None)
+        logger.info(f"创建AI客户端: base_url={client.base_url}, api_key=***{api_key[-4:]}")
+        state.clients[key] = client
+        if len(state.clients) > MAX_CLIENTS:
+            # 被淘汰的客户端可能仍有进行中的请求，不主动关闭，连接随对象回收释放
+            state.clients.popitem(last=False)
+        return client
+
+    def _http_client(self, state: _LoopState):
+        if state.http is None:
+            import httpx
+            state.http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max(CONCURRENCY["dashscope"], CONCURRENCY["gemini"]) * 2,
+                                    max_keepalive_connections=8)
+            )
+        return state.http
+
+    async def chat(self, provider: str, base_url: str, api_key: str, model: str, messages: List[Dict[str, Any]],
+                   max_tokens: int = 100, temperature: float = 0.7, timeout: float = None) -> str:
+        """调用OpenAI兼容的 chat.completions 接口，返回回复文本"""
+        state = self._state()
+        client = self._openai_client(state, base_url.strip(), api_key.strip())
+        async with self._track(state, provider):
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=timeout or TIMEOUTS[provider],
+            )
+        return (response.choices[0].message.content or "").strip()
+
+    async def post_json(self, provider: str, url: str, payload: Dict[str, Any],
+                        headers: Dict[str, str] = None, timeout: float = None) -> Dict[str, Any]:
+        """POST JSON 到原生REST接口，非200状态抛出 AIRequestError"""
+        state = self._state()
+        http = self._http_client(state)
+        async with self._track(state, provider):
+            response = await http.post(url, json=payload, headers=headers, timeout=timeout or TIMEOUTS[provider])
+            if response.status_code != 200:
+                raise AIRequestError(provider, response.status_code, response.text)
+        return response.json()
+
+    @asynccontextmanager
+    async def _track(self, state: _LoopState, provider: str):
+        """并发上限 + 统计"""
+        stats = self._stats[provider]
+        async with state.semaphores[provider]:
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            try:
+                yield
+            except BaseException:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """各服务商的请求数、错误数、进行中请求数及配置"""
+        return {p: {**self._stats[p], "concurrency": CONCURRENCY[p], "timeout": TIMEOUTS[p]} for p in PROVIDERS}
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中缓存的客户端（进程退出时调用）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._states.pop(loop, None)
+        if state is None:
+            return
+        for client in state.clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.debug(f"关闭AI客户端失败: {e}")
+        if state.http is not None:
+            await state.http.aclose()
+
+
+# 全局单例
+ai_transport = AITransport()
@@ -0,0 +1,561 @@
+"""
+Playwright 浏览器池
+
+商品详情、订单详情、Cookie 刷新、扫码登录后获取真实 Cookie 原先每次都冷启动一个 Chromium，用完即关，
+启动耗时数秒、内存数百MB，并且全部通过 XianyuLive._playwright_semaphore 串行。
+浏览器池改为：
+
+- 常驻有限数量的浏览器（BROWSER_POOL_SIZE），每个浏览器同时最多承载
+  BROWSER_POOL_PAGES_PER_BROWSER 个租约
+- 每次租用创建独立的 BrowserContext（Cookie/存储按账号隔离），归还时关闭上下文
+- 有头/无头、是否限制 JS 堆内存（--max-old-space-size）不同的租用使用不同的浏览器
+- 等待租约有超时（BROWSER_POOL_ACQUIRE_TIMEOUT），持有租约超时（BROWSER_POOL_LEASE_TIMEOUT）
+  会强制关闭其上下文，避免卡死的页面长期占用浏览器
+- 浏览器累计使用 BROWSER_POOL_MAX_USES 次、内存超过 BROWSER_POOL_MAX_RSS_MB、
+  连接断开或空闲超过 BROWSER_POOL_IDLE_SECONDS 时回收
+- 统计等待时间、利用率、回收原因等指标，供 /admin/browser-pool 查看
+
+Playwright 对象绑定创建它的事件循环，因此每个事件循环一个池（get_browser_pool）。
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 1))
+BROWSER_POOL_PAGES_PER_BROWSER = int(os.getenv("BROWSER_POOL_PAGES_PER_BROWSER", 2))
+BROWSER_POOL_MAX_USES = int(os.getenv("BROWSER_POOL_MAX_USES", 50))
+BROWSER_POOL_MAX_RSS_MB = int(os.getenv("BROWSER_POOL_MAX_RSS_MB", 800))
+BROWSER_POOL_IDLE_SECONDS = int(os.getenv("BROWSER_POOL_IDLE_SECONDS", 300))
+BROWSER_POOL_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT", 120))
+BROWSER_POOL_LEASE_TIMEOUT = float(os.getenv("BROWSER_POOL_LEASE_TIMEOUT", 300))
+
+DEFAULT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36')
+DEFAULT_VIEWPORT = {'width': 1920, 'height': 1080}
+
+# 空闲回收检查间隔（秒）
+_REAP_INTERVAL = 30
+# 保留最近的等待耗时样本数
+_WAIT_WINDOW = 500
+
+
+class LeaseTimeout(Exception):
+    """等待浏览器租约超时"""
+
+
+def browser_args(include_memory_limit: bool = True) -> List[str]:
+    """统一的 Chromium 启动参数"""
+    args = [
+        '--no-sandbox',
+        '--disable-setuid-sandbox',
+        '--disable-dev-shm-usage',
+        '--disable-accelerated-2d-canvas',
+        '--no-first-run',
+        '--no-zygote',
+        '--disable-gpu',
+        '--disable-background-timer-throttling',
+        '--disable-backgrounding-occluded-windows',
+        '--disable-renderer-backgrounding',
+        '--disable-features=TranslateUI',
+        '--disable-ipc-flooding-protection',
+        '--disable-extensions',
+        '--disable-default-apps',
+        '--disable-sync',
+        '--disable-translate',
+        '--hide-scrollbars',
+        '--mute-audio',
+        '--no-default-browser-check',
+        '--no-pings'
+    ]
+
+    if include_memory_limit:
+        args.insert(0, '--js-flags=--max-old-space-size=128')
+
+    # Docker 环境额外参数
+    if os.getenv('DOCKER_ENV'):
+        args.extend([
+            '--disable-background-networking',
+            '--disable-client-side-phishing-detection',
+            '--disable-hang-monitor',
+            '--disable-popup-blocking',
+            '--disable-prompt-on-repost',
+            '--disable-web-resources',
+            '--metrics-recording-only',
+            '--safebrowsing-disable-auto-update',
+            '--enable-automation',
+            '--password-store=basic',
+            '--use-mock-keychain'
+        ])
+    return args
+
+
+async def start_playwright(label: str = "浏览器池"):
+    """启动 Playwright，Docker 环境下应用 asyncio 子进程修复；失败返回 None"""
+    from playwright.async_api import async_playwright
+
+    is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
+    old_policy = None
+    if is_docker:
+        logger.info(f"【{label}】检测到Docker环境，应用asyncio修复")
+
+        class DummyChildWatcher:
+            def __enter__(self): return self
+            def __exit__(self, *args): pass
+            def is_active(self): return True
+            def add_child_handler(self, *args, **kwargs): pass
+            def remove_child_handler(self, *args, **kwargs): pass
+            def attach_loop(self, *args, **kwargs): pass
+            def close(self): pass
+            def __del__(self): pass
+
+        class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+            def get_child_watcher(self):
+                return DummyChildWatcher()
+
+        old_policy = asyncio.get_event_loop_policy()
+        asyncio.set_event_loop_policy(DockerEventLoopPolicy())
+
+    try:
+        return await asyncio.wait_for(async_playwright().start(), timeout=30.0)
+    except asyncio.TimeoutError:
+        logger.error(f"【{label}】Playwright启动超时")
+        return None
+    finally:
+        if old_policy is not None:
+            asyncio.set_event_loop_policy(old_policy)
+
+
+def cookies_for_context(cookies_str: str, domain: str = '.goofish.com') -> List[Dict]:
+    """把 'a=1; b=2' 形式的 Cookie 字符串转换为 context.add_cookies 的参数"""
+    cookies = []
+    for cookie_pair in (cookies_str or '').split('; '):
+        if '=' in cookie_pair:
+            name, value = cookie_pair.split('=', 1)
+            cookies.append({
+                'name': name.strip(),
+                'value': value.strip(),
+                'domain': domain,
+                'path': '/'
+            })
+    return cookies
+
+
+def _browser_pids() -> set:
+    """当前进程下的所有子进程 PID（用于定位新启动的浏览器进程）"""
+    try:
+        import psutil
+        return {p.pid for p in psutil.Process().children(recursive=True)}
+    except Exception:
+        return set()
+
+
+def _process_tree_rss_mb(pid: int) -> Optional[float]:
+    try:
+        import psutil
+        proc = psutil.Process(pid)
+        total = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except Exception:
+                pass
+        return total / 1024 / 1024
+    except Exception:
+        return None
+
+
+def _kill_process_tree(pid: Optional[int]) -> None:
+    if not pid:
+        return
+    try:
+        import psutil
+        proc = psutil.Process(pid)
+        for child in proc.children(recursive=True):
+            try:
+                child.kill()
+            except Exception:
+                pass
+        proc.kill()
+        logger.warning(f"【浏览器池】已强制杀死浏览器进程 PID={pid}")
+    except Exception as e:
+        logger.debug(f"【浏览器池】强制杀死浏览器进程失败 PID={pid}: {e}")
+
+
+class _PooledBrowser:
+    _next_id = 1
+
+    def __init__(self, browser, headless: bool, memory_limit: bool, pid: Optional[int]):
+        self.id = _PooledBrowser._next_id
+        _PooledBrowser._next_id += 1
+        self.browser = browser
+        self.headless = headless
+        self.memory_limit = memory_limit
+        self.pid = pid
+        self.launched_at = time.monotonic()
+        self.last_used = self.launched_at
+        self.uses = 0
+        self.active = 0
+        self.retire_reason: Optional[str] = None
+
+    def usable(self) -> bool:
+        return self.retire_reason is None and self.browser.is_connected()
+
+    def matches(self, headless: bool, memory_limit: bool) -> bool:
+        return self.headless == headless and self.memory_limit == memory_limit
+
+
+class BrowserLease:
+    """一次浏览器租用：独立的上下文和页面"""
+
+    def __init__(self, cookie_id: str, pooled: _PooledBrowser, wait_ms: float):
+        self.cookie_id = cookie_id
+        self.browser = pooled.browser
+        self.context = None
+        self.page = None
+        self.wait_ms = wait_ms
+        self.expired = False
+        self._pooled = pooled
+        self._acquired_at = time.monotonic()
+
+
+class BrowserPool:
+    """浏览器池（每个事件循环一个实例，通过 get_browser_pool 获取）"""
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE,
+                 pages_per_browser: int = BROWSER_POOL_PAGES_PER_BROWSER,
+                 max_uses: int = BROWSER_POOL_MAX_USES,
+                 max_rss_mb: int = BROWSER_POOL_MAX_RSS_MB,
+                 idle_seconds: int = BROWSER_POOL_IDLE_SECONDS):
+        self.size = max(1, size)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.max_uses = max(1, max_uses)
+        self.max_rss_mb = max_rss_mb
+        self.idle_seconds = idle_seconds
+        self._playwright = None
+        self._browsers: List[_PooledBrowser] = []
+        self._launching = 0
+        self._waiting = 0
+        self._cond = asyncio.Condition()
+        self._launch_lock = asyncio.Lock()
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._created_at = time.monotonic()
+        self._busy_seconds = 0.0
+        self._wait_ms = deque(maxlen=_WAIT_WINDOW)
+        self._stats = {"leases": 0, "lease_errors": 0, "acquire_timeouts": 0,
+                       "lease_expired": 0, "launches": 0, "launch_failures": 0}
+        self._recycled: Dict[str, int] = {}
+
+    # -------------------- 租用 --------------------
+
+    @asynccontextmanager
+    async def lease(self, cookie_id: str, cookies_str: str = None, *, headless: bool = True,
+                    memory_limit: bool = False, extra_headers: Dict[str, str] = None, context_options: Dict = None,
+                    acquire_timeout: float = BROWSER_POOL_ACQUIRE_TIMEOUT,
+                    lease_timeout: float = BROWSER_POOL_LEASE_TIMEOUT):
+        """租用一个页面：async with pool.lease(cookie_id, cookies_str) as lease: lease.page ...
+
+        memory_limit=True 时使用限制 JS 堆内存的浏览器（--max-old-space-size=128）
+        """
+        start = time.monotonic()
+        pooled = await self._acquire(headless, memory_limit, acquire_timeout)
+        wait_ms = (time.monotonic() - start) * 1000
+        self._wait_ms.append(wait_ms)
+        self._stats["leases"] += 1
+        if wait_ms > 1000:
+            logger.info(f"【{cookie_id}】等待浏览器租约 {wait_ms:.0f}ms")
+
+        lease = BrowserLease(cookie_id, pooled, wait_ms)
+        expire_handle = None
+        failed = False
+        try:
+            options = {'viewport': DEFAULT_VIEWPORT, 'user_agent': DEFAULT_USER_AGENT}
+            options.update(context_options or {})
+            lease.context = await pooled.browser.new_context(**options)
+            if extra_headers:
+                await lease.context.set_extra_http_headers(extra_headers)
+            if cookies_str:
+                await lease.context.add_cookies(cookies_for_context(cookies_str))
+            lease.page = await lease.context.new_page()
+            expire_handle = asyncio.get_running_loop().call_later(lease_timeout, self._expire, lease)
+            yield lease
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if expire_handle is not None:
+                expire_handle.cancel()
+            await self._release(lease, failed)
+
+    async def _acquire(self, headless: bool, memory_limit: bool, timeout: float) -> _PooledBrowser:
+        deadline = time.monotonic() + timeout
+        async with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    pooled = self._pick(headless, memory_limit)
+                    if pooled is not None:
+                        pooled.active += 1
+                        pooled.uses += 1
+                        return pooled
+                    if len(self._browsers) + self._launching < self.size:
+                        self._launching += 1
+                        break
+                    if not self._retire_idle_mismatch(headless, memory_limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["acquire_timeouts"] += 1
+                            raise LeaseTimeout(f"等待浏览器租约超时（{timeout:g}秒）")
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            pass
+            finally:
+                self._waiting -= 1
+
+        try:
+            pooled = await self._launch(headless, memory_limit)
+        except BaseException:
+            async with self._cond:
+                self._launching -= 1
+                self._cond.notify_all()
+            raise
+        async with self._cond:
+            self._launching -= 1
+            pooled.active = 1
+            pooled.uses = 1
+            self._browsers.append(pooled)
+        return pooled
+
+    def _pick(self, headless: bool, memory_limit: bool) -> Optional[_PooledBrowser]:
+        """选择负载最低的可用浏览器"""
+        candidates = [b for b in self._browsers
+                      if b.matches(headless, memory_limit) and b.active < self.pages_per_browser and b.usable()]
+        return min(candidates, key=lambda b: b.active) if candidates else None
+
+    def _retire_idle_mismatch(self, headless: bool, memory_limit: bool) -> bool:
+        """池已满且没有匹配模式的浏览器时，回收一个空闲的其他模式浏览器腾出名额"""
+        for pooled in self._browsers:
+            if pooled.active == 0 and not pooled.matches(headless, memory_limit):
+                self._browsers.remove(pooled)
+                self._recycle_count("mode_switch")
+                asyncio.get_running_loop().create_task(self._close_browser(pooled))
+                return True
+        return False
+
+    async def _release(self, lease: BrowserLease, failed: bool) -> None:
+        pooled = lease._pooled
+        if lease.context is not None:
+            try:
+                await asyncio.wait_for(lease.context.close(), timeout=10.0)
+            except Exception as e:
+                logger.debug(f"【{lease.cookie_id}】关闭浏览器上下文失败: {e}")
+
+        rss = None
+        if pooled.pid and self.max_rss_mb > 0:
+            rss = await asyncio.to_thread(_process_tree_rss_mb, pooled.pid)
+
+        close = False
+        async with self._cond:
+            pooled.active -= 1
+            pooled.last_used = time.monotonic()
+            self._busy_seconds += pooled.last_used - lease._acquired_at
+            if failed:
+                self._stats["lease_errors"] += 1
+            if pooled.retire_reason is None:
+                if not pooled.browser.is_connected():
+                    pooled.retire_reason = "disconnected"
+                elif pooled.uses >= self.max_uses:
+                    pooled.retire_reason = "max_uses"
+                elif rss is not None and rss > self.max_rss_mb:
+                    pooled.retire_reason = "memory"
+                    logger.info(f"【浏览器池】浏览器#{pooled.id} 内存 {rss:.0f}MB 超过阈值，回收")
+            if pooled.retire_reason is not None and pooled.active == 0 and pooled in self._browsers:
+                self._browsers.remove(pooled)
+                self._recycle_count(pooled.retire_reason)
+                close = True
+            self._cond.notify_all()
+        if close:
+            await self._close_browser(pooled)
+
+    def _expire(self, lease: BrowserLease) -> None:
+        """租约持有超时：关闭其上下文，持有者后续的页面操作会失败并归还租约"""
+        lease.expired = True
+        self._stats["lease_expired"] += 1
+        logger.warning(f"【{lease.cookie_id}】浏览器租约持有超时，强制关闭上下文")
+        if lease.context is not None:
+            asyncio.get_running_loop().create_task(self._close_quietly(lease.context))
+
+    @staticmethod
+    async def _close_quietly(context) -> None:
+        try:
+            await asyncio.wait_for(context.close(), timeout=10.0)
+        except Exception:
+            pass
+
+    def _recycle_count(self, reason: str) -> None:
+        self._recycled[reason] = self._recycled.get(reason, 0) + 1
+
+    # -------------------- 浏览器生命周期 --------------------
+
+    async def _launch(self, headless: bool, memory_limit: bool) -> _PooledBrowser:
+        async with self._launch_lock:
+            try:
+                if self._playwright is None:
+                    self._playwright = await start_playwright()
+                    if self._playwright is None:
+                        raise RuntimeError("Playwright启动失败")
+                before = _browser_pids()
+                start = time.monotonic()
+                browser = await self._playwright.chromium.launch(headless=headless, args=browser_args(memory_limit))
+                # 启动串行进行，新出现的进程中父进程不在新进程集合内的即为浏览器主进程
+                new_pids = _browser_pids() - before
+                pid = self._find_root_pid(new_pids)
+            except BaseException:
+                self._stats["launch_failures"] += 1
+                raise
+        pooled = _PooledBrowser(browser, headless, memory_limit, pid)
+        browser.on("disconnected", lambda _: self._on_disconnected(pooled))
+        self._stats["launches"] += 1
+        logger.info(f"【浏览器池】浏览器#{pooled.id} 已启动，耗时 {(time.monotonic() - start) * 1000:.0f}ms (PID {pid or '-'})")
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self._reap_idle())
+        return pooled
+
+    @staticmethod
+    def _find_root_pid(new_pids: set) -> Optional[int]:
+        if not new_pids:
+            return None
+        try:
+            import psutil
+            for pid in new_pids:
+                try:
+                    if psutil.Process(pid).ppid() not in new_pids:
+                        return pid
+                except Exception:
+                    continue
+        except ImportError:
+            pass
+        return None
+
+    def _on_disconnected(self, pooled: _PooledBrowser) -> None:
+        if pooled.retire_reason is None:
+            pooled.retire_reason = "disconnected"
+            logger.warning(f"【浏览器池】浏览器#{pooled.id} 连接断开，将被回收")
+
+    async def _close_browser(self, pooled: _PooledBrowser) -> None:
+        try:
+            await asyncio.wait_for(pooled.browser.close(), timeout=10.0)
+        except Exception as e:
+            logger.warning(f"【浏览器池】关闭浏览器#{pooled.id} 失败，强制结束进程: {e}")
+            _kill_process_tree(pooled.pid)
+        logger.info(f"【浏览器池】浏览器#{pooled.id} 已关闭（{pooled.retire_reason}，共使用 {pooled.uses} 次）")
+
+    async def _reap_idle(self) -> None:
+        """回收空闲浏览器，全部关闭后停止 Playwright"""
+        while True:
+            await asyncio.sleep(_REAP_INTERVAL)
+            idle = []
+            async with self._cond:
+                now = time.monotonic()
+                for pooled in list(self._browsers):
+                    if pooled.active == 0 and (pooled.retire_reason or now - pooled.last_used > self.idle_seconds):
+                        pooled.retire_reason = pooled.retire_reason or "idle"
+                        self._browsers.remove(pooled)
+                        self._recycle_count(pooled.retire_reason)
+                        idle.append(pooled)
+                stop = not self._browsers and not self._launching
+            for pooled in idle:
+                await self._close_browser(pooled)
+            # 关闭期间可能有新的启动，未能停止时继续回收（新浏览器的回收仍由本任务负责）
+            if stop and await self._stop_playwright():
+                return
+
+    async def _stop_playwright(self) -> bool:
+        """没有浏览器且没有进行中的启动时停止 Playwright，返回是否已停止"""
+        async with self._launch_lock:
+            # _launching 在新浏览器加入 _browsers 后才减少，启动完成但尚未登记的浏览器也会被计入
+            if self._browsers or self._launching:
+                return False
+            if self._playwright is not None:
+                try:
+                    await asyncio.wait_for(self._playwright.stop(), timeout=10.0)
+                except Exception as e:
+                    logger.warning(f"【浏览器池】停止Playwright失败: {e}")
+                self._playwright = None
+            return True
+
+    async def close(self) -> None:
+        """关闭所有浏览器（进程退出时调用）"""
+        async with self._cond:
+            browsers, self._browsers = self._browsers, []
+        for pooled in browsers:
+            pooled.retire_reason = pooled.retire_reason or "shutdown"
+            await self._close_browser(pooled)
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+        await self._stop_playwright()
+
+    # -------------------- 指标 --------------------
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        waits = sorted(self._wait_ms)
+        browsers = list(self._browsers)
+        busy = self._busy_seconds
+        capacity_seconds = self.size * self.pages_per_browser * max(1e-6, now - self._created_at)
+
+        def _pct(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 1)
+
+        return {
+            "size": self.size,
+            "pages_per_browser": self.pages_per_browser,
+            "max_uses": self.max_uses,
+            "max_rss_mb": self.max_rss_mb,
+            "browsers": [{
+                "id": b.id,
+                "headless": b.headless,
+                "memory_limit": b.memory_limit,
+                "pid": b.pid,
+                "uses": b.uses,
+                "active": b.active,
+                "age_seconds": int(now - b.launched_at),
+                "idle_seconds": int(now - b.last_used) if b.active == 0 else 0,
+                "retiring": b.retire_reason,
+            } for b in browsers],
+            "active_leases": sum(b.active for b in browsers),
+            "waiting": self._waiting,
+            "wait_ms": {"p50": _pct(0.5), "p95": _pct(0.95), "max": round(waits[-1], 1) if waits else None},
+            "utilization": round(busy / capacity_seconds, 4),
+            "recycled": dict(self._recycled),
+            **self._stats,
+        }
+
+
+# 事件循环 -> 浏览器池
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BrowserPool]" = weakref.WeakKeyDictionary()
+
+
+def get_browser_pool() -> BrowserPool:
+    """获取当前事件循环的浏览器池"""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = BrowserPool()
+    return pool
+
+
+def browser_pool_stats() -> List[dict]:
+    """所有浏览器池的指标（供管理接口使用）"""
+    return [pool.snapshot() for pool in list(_pools.values())]
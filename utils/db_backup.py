@@ -0,0 +1,200 @@
+"""
+SQLite 在线备份
+
+- 使用独立连接在工作线程中执行，不持有 DBManager 的全局锁，备份期间回复和接口不受影响
+- 按页分批复制（pages=N），每批之间短暂休眠，避免长时间占满磁盘IO
+- WAL 模式下备份连接先开启读事务固定快照：其他连接的写入不会导致备份从头重来，
+  备份结果与开始时刻的数据库一致
+- 可选 gzip 压缩，记录 SHA-256 校验和；备份元数据写入同名 .json 文件，供备份列表展示
+- restore_into：用 backup API 把备份文件写回正在使用的数据库（不替换文件）
+
+设计原则：纯标准库 sqlite3 + gzip + hashlib，不引入额外依赖。
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from utils.db_pool import DEFAULT_BUSY_TIMEOUT_MS
+
+
+# 每批复制的页数（可通过环境变量 DB_BACKUP_PAGES 覆盖；默认页大小4KB时约4MB/批）
+DEFAULT_BACKUP_PAGES = int(os.getenv("DB_BACKUP_PAGES", 1024))
+# 每批之间的休眠时间（秒，可通过环境变量 DB_BACKUP_STEP_SLEEP 覆盖）
+DEFAULT_STEP_SLEEP = float(os.getenv("DB_BACKUP_STEP_SLEEP", 0.01))
+# 是否生成压缩快照（可通过环境变量 DB_BACKUP_COMPRESS 开启）
+BACKUP_COMPRESS = os.getenv("DB_BACKUP_COMPRESS", "false").lower() in ("1", "true", "yes")
+
+META_SUFFIX = ".json"
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def online_backup(db_path: str, dest_path: str, *, pages: int = None,
+                  step_sleep: float = None, compress: bool = None) -> Dict:
+    """在线备份数据库到 dest_path（同步函数，应在工作线程中调用）
+
+    compress 为 True 时最终文件为 dest_path + '.gz'。返回备份元数据。
+    """
+    pages = max(1, pages if pages is not None else DEFAULT_BACKUP_PAGES)
+    step_sleep = DEFAULT_STEP_SLEEP if step_sleep is None else max(0.0, step_sleep)
+    compress = BACKUP_COMPRESS if compress is None else compress
+
+    start = time.monotonic()
+    steps = 0
+    total_pages = 0
+
+    def _progress(status, remaining, total):
+        nonlocal steps, total_pages
+        steps += 1
+        total_pages = total
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+
+    src = sqlite3.connect(db_path, isolation_level=None, timeout=DEFAULT_BUSY_TIMEOUT_MS / 1000)
+    dest = sqlite3.connect(dest_path)
+    try:
+        wal = str(src.execute("PRAGMA journal_mode").fetchone()[0]).lower() == "wal"
+        if wal:
+            # 固定读快照（WAL 下读事务不阻塞写入）
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dest, pages=pages, progress=_progress)
+        if wal:
+            src.execute("COMMIT")
+    except Exception:
+        dest.close()
+        src.close()
+        _remove_quietly(dest_path)
+        raise
+    dest.close()
+    src.close()
+
+    raw_size = os.path.getsize(dest_path)
+    final_path = dest_path
+    if compress:
+        final_path = dest_path + ".gz"
+        try:
+            with open(dest_path, "rb") as fin, gzip.open(final_path, "wb", compresslevel=6) as fout:
+                shutil.copyfileobj(fin, fout, _HASH_CHUNK)
+        except Exception:
+            _remove_quietly(final_path)
+            raise
+        finally:
+            _remove_quietly(dest_path)
+
+    duration = time.monotonic() - start
+    meta = {
+        "filename": os.path.basename(final_path),
+        "size": os.path.getsize(final_path),
+        "raw_size": raw_size,
+        "pages": total_pages,
+        "steps": steps,
+        "duration_ms": int(duration * 1000),
+        "pages_per_sec": round(total_pages / duration, 1) if duration > 0 else None,
+        "compressed": compress,
+        "sha256": file_sha256(final_path),
+        "snapshot": wal,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    try:
+        with open(final_path + META_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.warning(f"[数据库备份] 写入备份元数据失败: {e}")
+    return meta
+
+
+def restore_into(conn: sqlite3.Connection, source_path: str) -> int:
+    """把 source_path 的数据库整体复制到已打开的连接 conn（在线恢复，返回复制的页数）
+
+    通过 backup API 写入正在使用的数据库文件，不替换文件本身：WAL/SHM 文件保持一致，
+    其他连接（只读连接池、分片进程）在下一个事务即可读到恢复后的数据。
+    调用方需持有该连接的写锁，conn 上不能有未提交的事务。
+    """
+    src = sqlite3.connect(source_path)
+    try:
+        # WAL 模式的目标库要求页大小一致，不一致时先把源库转换为目标页大小
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        if src.execute("PRAGMA page_size").fetchone()[0] != page_size:
+            src.execute("PRAGMA journal_mode = DELETE")
+            src.execute(f"PRAGMA page_size = {int(page_size)}")
+            src.execute("VACUUM")
+        pages = src.execute("PRAGMA page_count").fetchone()[0]
+        src.backup(conn)
+        return pages
+    finally:
+        src.close()
+
+
+def read_backup_meta(backup_path: str) -> Optional[Dict]:
+    """读取备份文件的元数据（不存在时返回 None）"""
+    meta_path = backup_path + META_SUFFIX
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"[数据库备份] 读取备份元数据失败: {meta_path} - {e}")
+        return None
+
+
+def verify_backup(backup_path: str) -> bool:
+    """校验备份文件是否与记录的 SHA-256 一致（无元数据时返回 False）"""
+    meta = read_backup_meta(backup_path)
+    if not meta or not meta.get("sha256"):
+        return False
+    return file_sha256(backup_path) == meta["sha256"]
+
+
+def list_backups(backup_dir: str) -> List[Dict]:
+    """列出目录下的定时备份文件（.db / .db.gz）及其元数据"""
+    if not os.path.isdir(backup_dir):
+        return []
+    result = []
+    for fname in os.listdir(backup_dir):
+        if not fname.startswith("backup_") or not fname.endswith((".db", ".db.gz")):
+            continue
+        fpath = os.path.join(backup_dir, fname)
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            continue
+        entry = {
+            "filename": fname,
+            "size": stat.st_size,
+            "created_time": datetime.fromtimestamp(stat.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
+            "modified_time": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        meta = read_backup_meta(fpath)
+        if meta:
+            for key in ("duration_ms", "pages", "pages_per_sec", "compressed", "raw_size", "sha256"):
+                entry[key] = meta.get(key)
+        result.append(entry)
+    return result
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,126 @@
+"""
+SQLite 读连接池
+
+WAL 模式下读写互不阻塞：
+- 写操作仍由 DBManager 的主连接 + RLock 串行化（单写者）
+- 读操作使用每线程独立的只读连接，可以并行执行，不再排队等待全局锁；
+  线程退出后其连接在下次创建连接时关闭
+- 提供专用线程池，供协程通过 await 执行数据库调用，避免阻塞事件循环
+
+设计原则：不引入 aiosqlite 等额外依赖，纯标准库 sqlite3 + ThreadPoolExecutor。
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+
+# 默认读线程数（可通过环境变量 DB_READ_POOL_SIZE 覆盖）
+DEFAULT_READ_WORKERS = 4
+# 连接忙等待超时（毫秒）
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+
+
+def apply_connection_pragmas(conn: sqlite3.Connection, busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS) -> None:
+    """为连接设置通用 PRAGMA（读写连接共用）"""
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    # WAL 下 NORMAL 即可保证崩溃一致性，且避免每次提交都 fsync
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+
+def enable_wal(conn: sqlite3.Connection) -> bool:
+    """切换到 WAL 日志模式，返回是否成功（部分网络文件系统不支持 WAL）"""
+    try:
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()
+        return bool(mode) and str(mode[0]).lower() == "wal"
+    except sqlite3.Error as e:
+        logger.warning(f"[数据库] 启用WAL模式失败，继续使用默认日志模式: {e}")
+        return False
+
+
+class SQLiteReadPool:
+    """只读连接池：每个线程持有一个只读连接，配套专用线程池供协程调用"""
+
+    def __init__(self, db_path: str, max_workers: int = None,
+                 busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS):
+        if max_workers is None:
+            max_workers = int(os.getenv("DB_READ_POOL_SIZE", DEFAULT_READ_WORKERS))
+        self.db_path = db_path
+        self.max_workers = max(1, max_workers)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        # 线程ID -> (线程, 连接)：接口线程池 / asyncio.to_thread 的工作线程都可能创建连接
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._connections_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self._uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        apply_connection_pragmas(conn, self.busy_timeout_ms)
+        conn.execute("PRAGMA query_only = ON")
+        thread = threading.current_thread()
+        with self._connections_lock:
+            # 顺便清理已退出线程的连接（线程ID可能被复用，按线程对象判断）
+            dead = [ident for ident, (owner, _) in self._connections.items()
+                    if owner is not thread and not owner.is_alive()]
+            stale = [self._connections.pop(ident)[1] for ident in dead]
+            self._connections[thread.ident] = (thread, conn)
+        for old in stale:
+            try:
+                old.close()
+            except Exception:
+                pass
+        return conn
+
+    def get_connection(self) -> Optional[sqlite3.Connection]:
+        """获取当前线程的只读连接，失败时返回 None（调用方回退到主连接）"""
+        if self._closed:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = self._connect()
+            except sqlite3.Error as e:
+                logger.warning(f"[数据库] 创建只读连接失败，回退到主连接: {e}")
+                return None
+            self._local.conn = conn
+        return conn
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._connections_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="db-reader"
+                )
+            return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """在读线程池中执行同步数据库函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(func, *args, **kwargs)
+        )
+
+    def close(self) -> None:
+        """关闭所有只读连接和线程池"""
+        self._closed = True
+        with self._connections_lock:
+            executor, self._executor = self._executor, None
+            connections, self._connections = self._connections, {}
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for _, conn in connections.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,152 @@
+"""
+日志类数据的批量延迟写入
+
+每条自动回复都要写 auto_reply_message_logs，每轮AI对话要写两次 ai_conversations，原先每次都是
+单独的 INSERT + commit()，并且要排队获取全局数据库锁。这些数据只追加、允许短暂延迟落盘，这里改为：
+
+- 写入方只把行追加到内存队列，立即返回
+- 后台线程每 interval 毫秒或队列达到 max_rows 行时，把队列中的行合并成一个事务写入
+- 读取方在持有数据库锁时调用 pending() 合并尚未落盘的行（写后读一致）；
+  落盘与出队在同一次持锁内完成，读取方不会看到重复或遗漏
+- 可重试的错误（如 database is locked）保留整批，下次刷新时重试
+- 进程退出时（DBManager.close）写入剩余数据
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# 刷新间隔（毫秒）
+DEFAULT_INTERVAL_MS = int(os.getenv("DB_WRITE_BEHIND_INTERVAL_MS", 200))
+# 队列达到该行数时立即刷新
+DEFAULT_MAX_ROWS = int(os.getenv("DB_WRITE_BEHIND_MAX_ROWS", 200))
+# 队列上限，超过后写入方同步刷新（防止数据库长时间不可写时内存无限增长）
+MAX_PENDING_ROWS = 20000
+
+
+def utc_timestamp() -> str:
+    """与 SQLite CURRENT_TIMESTAMP 相同格式的当前UTC时间（入队时确定，不随落盘时间变化）"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+
+class WriteBehindQueue:
+    """批量延迟写入队列
+
+    flush_fn(rows) 在持有 db_lock 时被调用，rows 为 [(表名, 行字典), ...]，负责写入并提交。
+    flush_fn 抛出 retryable 中的异常时整批保留在队列中，下次刷新重试；其他异常丢弃本批。
+    """
+
+    def __init__(self, db_lock, flush_fn: Callable[[List[Tuple[str, Dict[str, Any]]]], None],
+                 interval_ms: int = DEFAULT_INTERVAL_MS, max_rows: int = DEFAULT_MAX_ROWS,
+                 enabled: bool = True, retryable: Tuple[type, ...] = ()):
+        self._db_lock = db_lock
+        self._flush_fn = flush_fn
+        self._retryable = tuple(retryable)
+        self.interval = max(10, interval_ms) / 1000
+        self.max_rows = max(1, max_rows)
+        self.enabled = enabled
+        self._rows: List[Tuple[str, Dict[str, Any]]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # 同一时间只有一个线程在刷新
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._backoff = False  # 上次刷新遇到暂时性错误，下次刷新前至少等待一个间隔
+        self._stats = {"rows": 0, "flushes": 0, "failed_rows": 0, "retries": 0}
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+            self._thread.start()
+
+    def add(self, table: str, row: Dict[str, Any]) -> None:
+        """追加一行（不阻塞，未启用或已停止时同步写入）"""
+        with self._cond:
+            self._rows.append((table, row))
+            size = len(self._rows)
+            if self.enabled and not self._stopped:
+                self._ensure_thread()
+                if size >= self.max_rows:
+                    self._cond.notify()
+        if not self.enabled or self._stopped or size >= MAX_PENDING_ROWS:
+            self.flush()
+
+    def pending(self, table: str, predicate: Callable[[Dict[str, Any]], bool] = None) -> List[Dict[str, Any]]:
+        """尚未落盘的行（按写入顺序）；需要与数据库查询结果合并时，调用方应持有数据库锁"""
+        with self._cond:
+            return [row for name, row in self._rows
+                    if name == table and (predicate is None or predicate(row))]
+
+    def flush(self) -> int:
+        """把当前队列写入数据库，返回写入的行数"""
+        # 加锁顺序固定为 数据库锁 -> 刷新锁，持有数据库锁的线程同步刷新时不会死锁
+        with self._db_lock, self._flush_lock:
+            with self._cond:
+                batch = list(self._rows)
+            if not batch:
+                return 0
+            try:
+                self._flush_fn(batch)
+            except self._retryable as e:
+                # 暂时性错误：整批留在队列中等待下次刷新；积压超过上限时丢弃最早的行
+                self._stats["retries"] += 1
+                self._backoff = True
+                logger.warning(f"批量写入暂时失败，{len(batch)} 行保留到下次重试: {e}")
+                with self._cond:
+                    overflow = len(self._rows) - MAX_PENDING_ROWS
+                    if overflow > 0:
+                        del self._rows[:overflow]
+                if overflow > 0:
+                    self._stats["failed_rows"] += overflow
+                    logger.error(f"批量写入积压超过 {MAX_PENDING_ROWS} 行，丢弃最早的 {overflow} 行")
+                return 0
+            except Exception as e:
+                self._backoff = False
+                # 非暂时性错误（flush_fn 已跳过违反约束的行）：丢弃本批，避免无限重试
+                self._stats["failed_rows"] += len(batch)
+                logger.error(f"批量写入失败，丢弃 {len(batch)} 行: {e}")
+            else:
+                self._backoff = False
+            # 与写入在同一次持锁内出队，持锁读取的线程不会同时看到数据库和队列中的同一行
+            with self._cond:
+                del self._rows[:len(batch)]
+            self._stats["rows"] += len(batch)
+            self._stats["flushes"] += 1
+            return len(batch)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if self._backoff or len(self._rows) < self.max_rows:
+                    self._cond.wait(self.interval)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"批量写入线程异常: {e}")
+
+    def stop(self) -> None:
+        """停止后台线程并写入剩余数据（之后的 add 同步写入）"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._cond:
+            lost = len(self._rows)
+        if lost:
+            logger.error(f"批量写入停止时仍有 {lost} 行无法写入数据库")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._rows)
+        return {**self._stats, "pending": pending, "enabled": self.enabled,
+                "interval_ms": int(self.interval * 1000), "max_rows": self.max_rows}
@@ -0,0 +1,166 @@
+"""
+发货规则匹配器
+
+自动发货时用“商品标题 + 商品详情”作为搜索文本匹配发货规则。原先每次发货都执行
+`文本 LIKE '%' || 关键字 || '%' OR 关键字 LIKE '%' || 文本 || '%'`，对 delivery_rules × cards
+全表扫描并在数KB文本上做子串匹配。这里按用户把启用的规则编译为内存索引：
+
+- 关键字包含于文本：每个规格分组一个 Aho-Corasick 自动机，一次扫描找出全部命中
+- 文本包含于关键字（反向包含）：按关键字长度排序，只检查长度不小于文本的关键字
+- 分组键：普通规则为 None，多规格规则为 (规格名称, 规格值)
+
+匹配与排序语义与原 SQL 一致：仅 ASCII 字母不区分大小写（同 SQLite LIKE）；
+得分 = 正向命中时关键字长度，否则长度/2（整除），得分高者在前，
+同分时多规格按 delivery_times（实时值）、普通规则按规则ID升序。
+规则或卡券变更时由接口调用 invalidate 失效。
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from utils.keyword_matcher import AhoCorasick
+
+
+# SQLite LIKE 只对 ASCII 字母做大小写折叠
+_ASCII_FOLD = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _fold(text: str) -> str:
+    return text.translate(_ASCII_FOLD)
+
+
+class _RuleGroup:
+    """同一规格分组内的规则"""
+
+    __slots__ = ("rules", "_automaton", "_folded", "_by_length", "_lengths")
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self._automaton = AhoCorasick()
+        self._folded = [_fold(rule.get('keyword') or '') for rule in rules]
+        for index, keyword in enumerate(self._folded):
+            self._automaton.add(keyword, index)
+        self._automaton.build()
+        self._by_length = sorted(range(len(rules)), key=lambda i: len(self._folded[i]))
+        self._lengths = [len(self._folded[i]) for i in self._by_length]
+
+    def match(self, text: str) -> Dict[int, int]:
+        """返回 {规则序号: 得分}"""
+        scores: Dict[int, int] = {}
+        for index in self._automaton.iter_values(text):
+            scores[index] = len(self._folded[index])
+        # 反向包含：只有长度不小于文本的关键字才可能包含文本
+        start = bisect.bisect_left(self._lengths, len(text))
+        for index in self._by_length[start:]:
+            if index not in scores and text in self._folded[index]:
+                scores[index] = len(self._folded[index]) // 2
+        return scores
+
+
+class DeliveryRuleMatcher:
+    """单个用户（或全部用户）的编译后发货规则"""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        grouped: Dict[Optional[Tuple[str, str]], List[Dict[str, Any]]] = {}
+        for rule in rules:
+            if rule.get('is_multi_spec'):
+                if not rule.get('spec_name') or not rule.get('spec_value'):
+                    continue
+                key = (rule['spec_name'], rule['spec_value'])
+            else:
+                key = None
+            grouped.setdefault(key, []).append(rule)
+        self._groups = {key: _RuleGroup(group_rules) for key, group_rules in grouped.items()}
+        self.rule_count = sum(len(group) for group in grouped.values())
+
+    def match(self, search_text: str, spec_name: str = None, spec_value: str = None) -> List[Dict[str, Any]]:
+        """匹配发货规则：提供规格时只匹配该规格的多规格规则，否则只匹配普通规则"""
+        return [rule for _, rule in self.match_scored(search_text, spec_name, spec_value)]
+
+    def match_scored(self, search_text: str, spec_name: str = None,
+                     spec_value: str = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """同 match，返回 [(得分, 规则副本)]"""
+        is_spec = bool(spec_name and spec_value)
+        group = self._groups.get((spec_name, spec_value) if is_spec else None)
+        if group is None or search_text is None:
+            return []
+        scores = group.match(_fold(search_text))
+        if is_spec:
+            order = lambda i: (-scores[i], group.rules[i].get('delivery_times') or 0)
+        else:
+            order = lambda i: (-scores[i], group.rules[i]['id'])
+        return [(scores[i], dict(group.rules[i])) for i in sorted(scores, key=order)]
+
+
+class DeliveryRuleMatcherCache:
+    """按用户缓存发货规则匹配器（user_id 为 None 表示全部用户的规则）"""
+
+    def __init__(self):
+        self._matchers: Dict[Optional[int], DeliveryRuleMatcher] = {}
+        self._generation = 0
+        self._lock = threading.Lock()  # 接口线程与账号事件循环并发访问
+        self._listeners: List[Callable[[], None]] = []
+
+    async def get(self, user_id: Optional[int]) -> DeliveryRuleMatcher:
+        """获取用户的匹配器，不存在时从数据库加载并编译"""
+        matcher = self._matchers.get(user_id)
+        if matcher is not None:
+            return matcher
+
+        with self._lock:
+            generation = self._generation
+
+        from db_manager import db_manager
+        try:
+            rules = await db_manager.get_enabled_delivery_rules_async(user_id=user_id, raise_errors=True)
+        except Exception:
+            # 查询失败时本次按无规则处理且不缓存，下次重新加载
+            return DeliveryRuleMatcher([])
+        matcher = DeliveryRuleMatcher(rules)
+
+        with self._lock:
+            # 编译期间规则被修改则不缓存，下次重新加载
+            if self._generation == generation:
+                self._matchers[user_id] = matcher
+        logger.debug(f"发货规则匹配器已编译: user_id={user_id}, 规则数={matcher.rule_count}")
+        return matcher
+
+    async def match(self, search_text: str, spec_name: str = None, spec_value: str = None,
+                    user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """匹配发货规则（结果为副本，可直接修改）
+
+        缓存中的 delivery_times 是编译时的快照，发货后不会更新；多规格规则同分时
+        按数据库中的实时发货次数重新排序，保证“发货次数少的优先”。
+        """
+        matcher = await self.get(user_id)
+        scored = matcher.match_scored(search_text, spec_name, spec_value)
+        if spec_name and spec_value and len({score for score, _ in scored}) < len(scored):
+            from db_manager import db_manager
+            live = await db_manager.get_delivery_times_async([rule['id'] for _, rule in scored])
+            for _, rule in scored:
+                rule['delivery_times'] = live.get(rule['id'], rule.get('delivery_times') or 0)
+            scored.sort(key=lambda item: (-item[0], item[1]['delivery_times'] or 0))
+        return [rule for _, rule in scored]
+
+    def invalidate(self) -> None:
+        """发货规则或卡券变更后使所有匹配器失效（卡券接口不一定知道所属用户）"""
+        with self._lock:
+            self._generation += 1
+            self._matchers.clear()
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.warning(f"发货规则缓存失效通知失败: {e}")
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """注册失效回调（多进程分片时用于把失效同步到账号所在进程）"""
+        self._listeners.append(listener)
+
+
+# 全局单例
+delivery_rule_cache = DeliveryRuleMatcherCache()
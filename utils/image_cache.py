@@ -0,0 +1,224 @@
+"""
+图片上传缓存
+
+发货、关键词、默认回复中的同一张本地图片原先每次发送都会重新压缩并上传到闲鱼CDN，
+CDN 图片为了取尺寸也要整张下载后交给 PIL 解析。本模块提供：
+
+- 按本地图片内容 SHA-256 缓存 CDN 链接及尺寸（image_upload_cache 表，跨账号、跨重启复用）
+- 只读取文件头解析 PNG / JPEG / GIF / WebP 尺寸（sniff_image_size）
+- 远程图片尺寸：先查上传缓存，再流式下载，解析出尺寸即停止读取；结果保存在进程内 LRU
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+
+# 进程内缓存的远程图片尺寸数量
+URL_CACHE_SIZE = int(os.getenv("IMAGE_SIZE_CACHE_SIZE", 2048))
+# 流式解析远程图片尺寸时最多读取的字节数（JPEG 的 EXIF 段可能较大）
+SNIFF_MAX_BYTES = 256 * 1024
+SNIFF_CHUNK_SIZE = 8 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG 帧起始标记（SOF0-SOF15，不含 DHT/JPG/DAC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    # 不接受AVIF格式，让CDN返回WEBP/JPEG等可解析的格式
+    'Accept': 'image/jpeg,image/png,image/gif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Referer': 'https://www.goofish.com/',
+}
+
+
+def is_sniffable(head: bytes) -> bool:
+    """文件头是否为 sniff_image_size 支持的格式（至少需要前12字节）"""
+    return (head.startswith(_PNG_SIGNATURE) or head.startswith(b"\xff\xd8")
+            or head[:6] in (b"GIF87a", b"GIF89a") or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"))
+
+
+def sniff_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """从图片文件头解析 (width, height)，格式不支持或数据不足时返回 None"""
+    try:
+        if data.startswith(_PNG_SIGNATURE):
+            if len(data) >= 24 and data[12:16] == b"IHDR":
+                return struct.unpack(">II", data[16:24])
+            return None
+
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            if len(data) >= 10:
+                return struct.unpack("<HH", data[6:10])
+            return None
+
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            chunk = data[12:16]
+            if chunk == b"VP8 " and len(data) >= 30 and data[23:26] == b"\x9d\x01\x2a":
+                width, height = struct.unpack("<HH", data[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L" and len(data) >= 25 and data[20] == 0x2F:
+                bits = struct.unpack("<I", data[21:25])[0]
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X" and len(data) >= 30:
+                width = int.from_bytes(data[24:27], "little") + 1
+                height = int.from_bytes(data[27:30], "little") + 1
+                return width, height
+            return None
+
+        if data.startswith(b"\xff\xd8"):
+            # 逐段跳过，直到帧起始标记
+            i = 2
+            while i + 9 <= len(data):
+                if data[i] != 0xFF:
+                    i += 1
+                    continue
+                marker = data[i + 1]
+                if marker == 0xFF:
+                    i += 1
+                    continue
+                if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                    i += 2
+                    continue
+                if marker in _JPEG_SOF_MARKERS:
+                    height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                    return width, height
+                segment_length = struct.unpack(">H", data[i + 2:i + 4])[0]
+                i += 2 + segment_length
+            return None
+    except struct.error:
+        return None
+    return None
+
+
+def _pil_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """文件头解析失败时交给 PIL（支持的格式更多）"""
+    try:
+        from PIL import Image
+        with Image.open(BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def _read_local_image(local_path: str) -> Tuple[str, Optional[Tuple[int, int]]]:
+    """读取本地图片，返回 (内容摘要, 尺寸)"""
+    with open(local_path, "rb") as f:
+        data = f.read()
+    size = sniff_image_size(data) or _pil_image_size(data)
+    return hashlib.sha256(data).hexdigest(), size
+
+
+class ImageCache:
+    """图片上传与尺寸缓存（全局单例 image_cache）"""
+
+    def __init__(self, max_urls: int = URL_CACHE_SIZE):
+        self.max_urls = max(1, max_urls)
+        self._sizes: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"upload_hits": 0, "uploads": 0, "size_hits": 0, "size_fetches": 0}
+
+    async def upload_local_image(self, local_path: str, cookies_str: str,
+                                 session=None) -> Optional[Dict[str, Any]]:
+        """上传本地图片到闲鱼CDN（内容相同的图片只上传一次）
+
+        Args:
+            local_path: 本地图片路径
+            cookies_str: 账号Cookie，缓存未命中时用于上传
+            session: 复用的 aiohttp 会话
+
+        Returns:
+            {'url', 'width', 'height'}，尺寸未知时为 None；上传失败返回 None
+        """
+        from db_manager import db_manager
+        from utils.image_uploader import ImageUploader, compressed_size
+
+        content_hash, size = await asyncio.to_thread(_read_local_image, local_path)
+        # 上传的是压缩后的图片，记录压缩后的尺寸
+        width, height = compressed_size(*size) if size else (None, None)
+
+        cached = await db_manager.get_image_upload_async(content_hash=content_hash)
+        if cached:
+            self.stats["upload_hits"] += 1
+            logger.info(f"图片上传缓存命中: {local_path} -> {cached['cdn_url']}")
+            # 按本地文件算出的尺寸优先（旧记录可能存的是压缩前的尺寸）
+            width, height = width or cached['width'], height or cached['height']
+            self._remember_size(cached['cdn_url'], width, height)
+            return {"url": cached['cdn_url'], "width": width, "height": height}
+
+        async with ImageUploader(cookies_str, session=session) as uploader:
+            cdn_url = await uploader.upload_image(local_path)
+        if not cdn_url:
+            return None
+        self.stats["uploads"] += 1
+        await db_manager.save_image_upload_async(content_hash, cdn_url, width, height)
+        self._remember_size(cdn_url, width, height)
+        return {"url": cdn_url, "width": width, "height": height}
+
+    async def get_remote_size(self, image_url: str, session) -> Tuple[Optional[int], Optional[int]]:
+        """获取远程图片尺寸，失败返回 (None, None)"""
+        with self._lock:
+            size = self._sizes.get(image_url)
+            if size is not None:
+                self._sizes.move_to_end(image_url)
+        if size is not None:
+            self.stats["size_hits"] += 1
+            return size
+
+        from db_manager import db_manager
+        cached = await db_manager.get_image_upload_async(cdn_url=image_url)
+        if cached and cached['width'] and cached['height']:
+            self.stats["size_hits"] += 1
+            self._remember_size(image_url, cached['width'], cached['height'])
+            return cached['width'], cached['height']
+
+        size = await self._fetch_remote_size(image_url, session)
+        if size is None:
+            return None, None
+        self.stats["size_fetches"] += 1
+        self._remember_size(image_url, *size)
+        return size
+
+    async def _fetch_remote_size(self, image_url: str, session) -> Optional[Tuple[int, int]]:
+        """流式下载图片，解析出尺寸即停止；不支持的格式读完整张交给 PIL"""
+        import aiohttp
+
+        async with session.get(image_url, headers=_HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status != 200:
+                logger.warning(f"下载图片失败，HTTP状态码: {response.status}")
+                return None
+            data = b""
+            async for chunk in response.content.iter_chunked(SNIFF_CHUNK_SIZE):
+                data += chunk
+                if len(data) < 12:
+                    continue
+                if not is_sniffable(data):
+                    data += await response.read()
+                    return _pil_image_size(data)
+                size = sniff_image_size(data)
+                if size:
+                    return size
+                if len(data) >= SNIFF_MAX_BYTES:
+                    break
+            return _pil_image_size(data)
+
+    def _remember_size(self, image_url: str, width: Optional[int], height: Optional[int]) -> None:
+        if not width or not height:
+            return
+        with self._lock:
+            self._sizes[image_url] = (width, height)
+            self._sizes.move_to_end(image_url)
+            while len(self._sizes) > self.max_urls:
+                self._sizes.popitem(last=False)
+
+
+# 全局单例
+image_cache = ImageCache()
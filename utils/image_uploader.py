@@ -12,13 +12,32 @@ from PIL import Image
 import io
 
 
+# 上传前压缩：长边超过该值时等比缩小
+MAX_DIMENSION = 1920
+
+
+def compressed_size(width: int, height: int) -> tuple:
+    """图片经 _compress_image 压缩后的尺寸"""
+    if width <= MAX_DIMENSION and height <= MAX_DIMENSION:
+        return width, height
+    if width > height:
+        return MAX_DIMENSION, int((height * MAX_DIMENSION) / width)
+    return int((width * MAX_DIMENSION) / height), MAX_DIMENSION
+
+
 class ImageUploader:
     """图片上传器 - 上传图片到闲鱼CDN"""
     
-    def __init__(self, cookies_str: str):
+    def __init__(self, cookies_str: str, session: Optional[aiohttp.ClientSession] = None):
+        """
+        Args:
+            cookies_str: 账号Cookie（每次上传请求都会携带）
+            session: 复用调用方已有的 aiohttp 会话（不会被本对象关闭），为空时自行创建
+        """
         self.cookies_str = cookies_str
         self.upload_url = "https://stream-upload.goofish.com/api/upload.api?floderId=0&appkey=xy_chat&_input_charset=utf-8"
-        self.session = None
+        self.session = session
+        self._owns_session = session is None
     
     async def create_session(self):
         """创建HTTP会话"""
@@ -34,8 +53,8 @@ class ImageUploader:
             )
     
     async def close_session(self):
-        """关闭HTTP会话"""
-        if self.session:
+        """关闭HTTP会话（外部传入的会话由调用方负责关闭）"""
+        if self.session and self._owns_session:
             await self.session.close()
             self.session = None
     
@@ -58,15 +77,8 @@ class ImageUploader:
                 original_width, original_height = img.size
                 
                 # 如果图片太大，调整尺寸
-                max_dimension = 1920
-                if original_width > max_dimension or original_height > max_dimension:
-                    if original_width > original_height:
-                        new_width = max_dimension
-                        new_height = int((original_height * max_dimension) / original_width)
-                    else:
-                        new_height = max_dimension
-                        new_width = int((original_width * max_dimension) / original_height)
-                    
+                new_width, new_height = compressed_size(original_width, original_height)
+                if (new_width, new_height) != (original_width, original_height):
                     img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
                     logger.info(f"图片尺寸调整: {original_width}x{original_height} -> {new_width}x{new_height}")
                 
@@ -100,8 +112,8 @@ class ImageUploader:
             if not self.session:
                 await self.create_session()
             
-            # 压缩图片
-            temp_path = self._compress_image(image_path)
+            # 压缩图片（PIL 解码/编码较耗时，放到线程中执行）
+            temp_path = await asyncio.to_thread(self._compress_image, image_path)
             if not temp_path:
                 logger.error("图片压缩失败")
                 return None
@@ -0,0 +1,193 @@
+"""
+关键词匹配器（Aho-Corasick 多模式匹配）
+
+每个账号的关键词只在变更时编译一次，收到消息时一次扫描即可找出所有命中的关键词，
+匹配代价与关键词数量无关（O(消息长度 + 命中数)），也不再需要每条消息查库。
+
+匹配语义与原先的逐条 `keyword.lower() in message.lower()` 完全一致：
+1. 有商品ID时，优先匹配该商品ID下的关键词
+2. 否则匹配通用关键词（无商品ID）
+3. 同一范围内多条命中时，取数据库中排在最前的一条
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+
+class AhoCorasick:
+    """纯 Python 实现的 Aho-Corasick 自动机，值为任意对象（此处为关键词序号）"""
+
+    __slots__ = ("_goto", "_fail", "_out", "_dict_link", "_built", "_empty_values")
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Any]] = [[]]
+        self._dict_link: List[int] = [0]  # 沿失败链最近的有输出节点（0 表示无）
+        self._built = False
+        self._empty_values: List[Any] = []  # 空模式：任何文本都命中
+
+    def add(self, pattern: str, value: Any) -> None:
+        """添加模式串（需在 build 之前调用）"""
+        if not pattern:
+            self._empty_values.append(value)
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._dict_link.append(0)
+            node = nxt
+        self._out[node].append(value)
+        self._built = False
+
+    def build(self) -> "AhoCorasick":
+        """构建失败链（BFS）"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                fail = self._fail[child]
+                self._dict_link[child] = fail if self._out[fail] else self._dict_link[fail]
+        self._built = True
+        return self
+
+    def iter_values(self, text: str) -> Iterator[Any]:
+        """遍历文本中所有命中模式的值（同一模式可能多次出现）"""
+        if not self._built:
+            self.build()
+        yield from self._empty_values
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield from out[node]
+            link = dict_link[node]
+            while link:
+                yield from out[link]
+                link = dict_link[link]
+
+    def min_value(self, text: str) -> Optional[Any]:
+        """返回命中模式中最小的值，无命中返回 None"""
+        best = None
+        for value in self.iter_values(text):
+            if best is None or value < best:
+                best = value
+        return best
+
+
+class KeywordMatcher:
+    """单个账号的编译后关键词集合"""
+
+    def __init__(self, keywords: List[Dict[str, Any]]):
+        self.keywords = keywords
+        self._generic = AhoCorasick()
+        self._by_item: Dict[str, AhoCorasick] = {}
+        for index, keyword_data in enumerate(keywords):
+            keyword = keyword_data.get('keyword')
+            if keyword is None:
+                continue
+            item_id = keyword_data.get('item_id')
+            if item_id:
+                automaton = self._by_item.get(item_id)
+                if automaton is None:
+                    automaton = self._by_item[item_id] = AhoCorasick()
+            else:
+                automaton = self._generic
+            automaton.add(keyword.lower(), index)
+        self._generic.build()
+        for automaton in self._by_item.values():
+            automaton.build()
+
+    def match(self, message: str, item_id: str = None) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """匹配消息，返回 (关键词数据, 是否为商品ID关键词)，无命中返回 None"""
+        text = message.lower()
+        if item_id:
+            automaton = self._by_item.get(item_id)
+            if automaton is not None:
+                index = automaton.min_value(text)
+                if index is not None:
+                    return self.keywords[index], True
+        index = self._generic.min_value(text)
+        if index is not None:
+            return self.keywords[index], False
+        return None
+
+
+class KeywordMatcherCache:
+    """按账号缓存编译后的匹配器，关键词变更时由接口调用 invalidate 失效"""
+
+    def __init__(self):
+        self._matchers: Dict[str, KeywordMatcher] = {}
+        self._versions: Dict[str, int] = {}
+        self._generation = 0  # 全量失效计数
+        self._lock = threading.Lock()  # 接口线程与账号事件循环并发访问
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+
+    async def get(self, cookie_id: str) -> KeywordMatcher:
+        """获取账号匹配器，不存在时从数据库加载并编译"""
+        matcher = self._matchers.get(cookie_id)
+        if matcher is not None:
+            return matcher
+
+        with self._lock:
+            version = (self._generation, self._versions.get(cookie_id, 0))
+
+        from db_manager import db_manager
+        try:
+            keywords = await db_manager.get_keywords_with_type_async(cookie_id, raise_errors=True)
+        except Exception:
+            # 查询失败时本次按无关键词处理且不缓存，下次重新加载
+            return KeywordMatcher([])
+        matcher = KeywordMatcher(keywords)
+
+        with self._lock:
+            # 编译期间如果关键词又被修改，则不缓存本次结果，下次重新加载（空列表同样缓存）
+            if (self._generation, self._versions.get(cookie_id, 0)) == version:
+                self._matchers[cookie_id] = matcher
+        logger.debug(f"【{cookie_id}】关键词匹配器已编译，共 {len(keywords)} 条关键词")
+        return matcher
+
+    def invalidate(self, cookie_id: str = None) -> None:
+        """使账号匹配器失效（cookie_id 为空时全部失效）"""
+        with self._lock:
+            if cookie_id is None:
+                self._generation += 1
+                self._matchers.clear()
+            else:
+                self._versions[cookie_id] = self._versions.get(cookie_id, 0) + 1
+                self._matchers.pop(cookie_id, None)
+        for listener in self._listeners:
+            try:
+                listener(cookie_id)
+            except Exception as e:
+                logger.warning(f"关键词缓存失效通知失败: {e}")
+
+    def add_listener(self, listener: Callable[[Optional[str]], None]) -> None:
+        """注册失效回调（多进程分片时用于把失效同步到账号所在进程）"""
+        self._listeners.append(listener)
+
+
+# 全局单例
+keyword_matcher_cache = KeywordMatcherCache()
@@ -0,0 +1,233 @@
+"""
+热路径日志控制
+
+账号消息循环每收到一帧都会打印若干行日志（收帧、心跳、防抖、SQL），高负载时日志格式化和写盘
+入队成为主要的CPU开销。本模块提供：
+
+- 延迟格式化：hot_log(类别, 账号, 级别, "模板 {}", 参数...) 先做采样判断，被丢弃的日志不做任何格式化
+- 按类别限速：每个 (类别, 账号) 一个令牌桶（rate 条/秒，burst 突发），被抑制的条数附加在下一条输出的日志后
+- 按账号配置：默认策略 + 账号覆盖，保存在系统设置 log_sampling（JSON），管理员接口 /admin/log-sampling 修改
+- JSON-lines 日志输出：每条日志一行 JSON（时间/级别/来源/消息/账号/异常），供 file_log_collector 直接解析
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# 日志类别：ws_frame=收到的WebSocket帧，heartbeat=心跳，message=消息处理/防抖，sql=SQL语句
+CATEGORIES = ("ws_frame", "heartbeat", "message", "sql")
+
+# 默认策略：rate 为每秒允许的条数（0 表示不限速），burst 为令牌桶容量，level 为空时使用调用处的级别
+DEFAULT_POLICIES: Dict[str, Dict[str, Any]] = {
+    "ws_frame": {"enabled": True, "level": None, "rate": 0.2, "burst": 5},
+    "heartbeat": {"enabled": True, "level": None, "rate": 1 / 60, "burst": 1},
+    "message": {"enabled": True, "level": None, "rate": 1.0, "burst": 10},
+    "sql": {"enabled": True, "level": None, "rate": 10.0, "burst": 50},
+}
+
+SETTING_KEY = "log_sampling"
+_LEVELS = ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")
+# 设置 LOG_SAMPLING_DISABLED=true 时关闭限速（排查问题时使用）
+_SAMPLING_DISABLED = os.getenv("LOG_SAMPLING_DISABLED", "false").lower() in ("1", "true", "yes")
+
+
+def _normalize_policy(policy: Dict[str, Any], base: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并合并策略字段，非法值抛出 ValueError"""
+    result = dict(base)
+    for key, value in (policy or {}).items():
+        if key == "enabled":
+            result[key] = bool(value)
+        elif key == "level":
+            if value in (None, ""):
+                result[key] = None
+            elif str(value).upper() in _LEVELS:
+                result[key] = str(value).upper()
+            else:
+                raise ValueError(f"无效的日志级别: {value}")
+        elif key in ("rate", "burst"):
+            number = float(value)
+            if number < 0:
+                raise ValueError(f"{key} 不能为负数")
+            result[key] = number if key == "rate" else max(1, int(number))
+        else:
+            raise ValueError(f"未知的策略字段: {key}")
+    return result
+
+
+class LogSampler:
+    """按 (类别, 账号) 限速的日志采样器"""
+
+    def __init__(self):
+        self._defaults: Dict[str, Dict[str, Any]] = {c: dict(p) for c, p in DEFAULT_POLICIES.items()}
+        self._accounts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._policies: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}  # 合并后的策略缓存
+        self._buckets: Dict[Tuple[str, Optional[str]], List[float]] = {}  # [令牌数, 上次补充时间, 已抑制条数]
+        self._lock = threading.Lock()  # SQL 日志来自多个线程
+        self._listeners: List[Callable[[], None]] = []
+
+    # -------------------- 配置 --------------------
+
+    def _apply(self, config: Dict[str, Any]) -> None:
+        defaults = {c: dict(p) for c, p in DEFAULT_POLICIES.items()}
+        for category, policy in (config.get("defaults") or {}).items():
+            if category not in CATEGORIES:
+                raise ValueError(f"未知的日志类别: {category}")
+            defaults[category] = _normalize_policy(policy, defaults[category])
+        accounts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for cookie_id, overrides in (config.get("accounts") or {}).items():
+            for category, policy in (overrides or {}).items():
+                if category not in CATEGORIES:
+                    raise ValueError(f"未知的日志类别: {category}")
+                accounts.setdefault(cookie_id, {})[category] = _normalize_policy(policy, {})
+        with self._lock:
+            self._defaults = defaults
+            self._accounts = accounts
+            self._policies.clear()
+            self._buckets.clear()
+
+    def load(self) -> None:
+        """从系统设置加载配置（启动时调用）"""
+        from db_manager import db_manager
+        raw = db_manager.get_system_setting(SETTING_KEY)
+        if not raw:
+            return
+        try:
+            self._apply(json.loads(raw))
+        except (ValueError, TypeError) as e:
+            logger.warning(f"日志采样配置无效，使用默认配置: {e}")
+
+    def reload(self) -> None:
+        """重新加载配置（分片进程收到失效通知时调用，不再向外通知）"""
+        self.load()
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """校验、应用并保存配置，非法配置抛出 ValueError"""
+        self._apply(config)
+        from db_manager import db_manager
+        db_manager.set_system_setting(SETTING_KEY, json.dumps(self.get_config(), ensure_ascii=False),
+                                      "热路径日志采样配置")
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.warning(f"日志采样配置变更通知失败: {e}")
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """注册配置变更回调（多进程分片时用于把配置同步到账号所在进程）"""
+        self._listeners.append(listener)
+
+    def get_config(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "defaults": {c: dict(p) for c, p in self._defaults.items()},
+                "accounts": {cid: {c: dict(p) for c, p in o.items()} for cid, o in self._accounts.items()},
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前配置与各类别的抑制计数"""
+        config = self.get_config()
+        suppressed: Dict[str, int] = {}
+        with self._lock:
+            for (category, _), bucket in self._buckets.items():
+                suppressed[category] = suppressed.get(category, 0) + int(bucket[2])
+        config["suppressed"] = suppressed
+        config["sampling_disabled"] = _SAMPLING_DISABLED
+        return config
+
+    # -------------------- 采样 --------------------
+
+    def _policy(self, key: Tuple[str, Optional[str]]) -> Dict[str, Any]:
+        policy = self._policies.get(key)
+        if policy is None:
+            category, cookie_id = key
+            policy = dict(self._defaults[category])
+            policy.update(self._accounts.get(cookie_id, {}).get(category, {}))
+            self._policies[key] = policy
+        return policy
+
+    def acquire(self, category: str, cookie_id: Optional[str] = None) -> Optional[Tuple[Optional[str], int]]:
+        """判断是否输出一条日志：丢弃时返回 None，否则返回 (覆盖级别, 此前被抑制的条数)"""
+        key = (category, cookie_id)
+        with self._lock:
+            policy = self._policy(key)
+            if not policy["enabled"]:
+                return None
+            rate = policy["rate"]
+            if rate <= 0 or _SAMPLING_DISABLED:
+                return policy["level"], 0
+            now = time.monotonic()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(policy["burst"]), now, 0]
+            else:
+                bucket[0] = min(float(policy["burst"]), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return None
+            bucket[0] -= 1
+            suppressed, bucket[2] = int(bucket[2]), 0
+            return policy["level"], suppressed
+
+    def log(self, category: str, cookie_id: Optional[str], level: str, message: str, *args, **kwargs) -> None:
+        """按采样策略输出日志，message 为 str.format 模板，只有在输出时才格式化"""
+        decision = self.acquire(category, cookie_id)
+        if decision is None:
+            return
+        override, suppressed = decision
+        if suppressed:
+            message = f"{message}（此前已抑制 {suppressed} 条）"
+        logger.opt(depth=1).log(override or level, message, *args, **kwargs)
+
+
+# 全局单例
+log_sampler = LogSampler()
+hot_log = log_sampler.log
+
+
+# -------------------- JSON-lines 输出 --------------------
+
+def _jsonl_format(record) -> str:
+    """loguru 格式化函数：把记录序列化为一行 JSON（ts 固定为第一个字段，便于按时间定位）"""
+    entry = {
+        "ts": record["time"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        "level": record["level"].name,
+        "source": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    cookie_id = record["extra"].get("cookie_id")
+    if cookie_id:
+        entry["cookie_id"] = cookie_id
+    if record["exception"] is not None:
+        exc_type, exc_value, exc_tb = record["exception"]
+        entry["exception"] = "".join(traceback.format_exception(exc_type, exc_value, exc_tb))
+    record["extra"]["_jsonl"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[_jsonl]}\n"
+
+
+def add_jsonl_sink(path: str, level: str = "INFO", **kwargs) -> int:
+    """添加 JSON-lines 文件输出，返回 loguru 的 sink ID
+
+    非法的 UTF-8 代理字符按 backslashreplace 写出，保证每条记录都是可解析的一行。
+    """
+    options = {"enqueue": True, "encoding": "utf-8", "errors": "backslashreplace"}
+    options.update(kwargs)
+    return logger.add(path, format=_jsonl_format, level=level, **options)
+
+
+def parse_jsonl(line: str) -> Optional[Dict[str, Any]]:
+    """解析一行 JSON 日志，失败返回 None"""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) and "ts" in entry else None
@@ -0,0 +1,396 @@
+"""
+日志文件尾部读取
+
+日志文件在繁忙实例上一天可达数百MB，管理接口不能再 readlines() 整个文件。本模块：
+
+- tail：从文件末尾按块反向读取，按记录（时间戳开头的行 + 其后的续行，如异常堆栈）
+  组装，找满 N 条即停止；支持级别/自定义过滤，before 偏移用于向前翻页
+- read_forward：从字节偏移 after 向后读取，用于增量跟随（客户端保存上次的 end_offset）
+- 同时支持 loguru 文本格式和 JSON-lines 格式（utils.log_control.add_jsonl_sink）
+- 时间范围：旁路索引文件（<日志>.idx）按固定字节间隔记录“偏移 -> 时间戳”，
+  构建时只在间隔点 seek 读取一小段，不扫描全文；查询时二分定位起始偏移
+
+只处理以换行结尾的完整行，正在写入的半行留到下次读取。
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# 反向读取的块大小
+BLOCK_SIZE = 64 * 1024
+# 单次请求最多扫描的字节数（过滤条件很少命中时避免读完整个文件，返回 has_more 由客户端继续翻页）
+MAX_SCAN_BYTES = int(os.getenv("LOG_READER_MAX_SCAN_MB", 64)) * 1024 * 1024
+# 旁路索引的采样间隔（字节）
+INDEX_STRIDE = int(os.getenv("LOG_INDEX_STRIDE_KB", 1024)) * 1024
+# 在采样点之后查找记录起始行的窗口
+_INDEX_PROBE = 64 * 1024
+INDEX_SUFFIX = ".idx"
+
+# loguru 格式: 2025-07-23 15:46:03.430 | INFO     | module:function:10 - 消息
+_HEADER_RE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.\d+)? \| (\w+)\s*\| ')
+# JSON-lines 日志（utils.log_control.add_jsonl_sink）以 {"ts": "..." 开头，每条记录一行
+_JSON_PREFIX = '{"ts": "'
+_HEADER_BYTES_RE = re.compile(rb'(?:\{"ts": ")?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+_DETAIL_RE = re.compile(r'^(\S+?):([^:]+):(\d+) - (.*)', re.S)
+
+
+def normalize_time(value: Optional[str], end: bool = False) -> Optional[str]:
+    """把 ISO/日期字符串规范为与日志一致的 'YYYY-MM-DD HH:MM:SS'（可直接按字符串比较）"""
+    if not value:
+        return None
+    value = value.strip().replace("T", " ")[:19]
+    if len(value) == 10:
+        value += " 23:59:59" if end else " 00:00:00"
+    return value
+
+
+def _is_header(line: str) -> bool:
+    return line.startswith(_JSON_PREFIX) or _HEADER_RE.match(line) is not None
+
+
+def _make_record(offset: int, end: int, lines: List[str]) -> Dict:
+    if lines[0].startswith(_JSON_PREFIX):
+        try:
+            data = json.loads(lines[0])
+            text = (f"{data['ts']} | {data.get('level', ''): <8} | "
+                    f"{data.get('source')}:{data.get('function')}:{data.get('line')} - {data.get('message', '')}")
+            if data.get("exception"):
+                text += "\n" + data["exception"].rstrip("\n")
+            return {
+                "offset": offset,
+                "end": end,
+                "timestamp": data["ts"][:19],
+                "level": data.get("level"),
+                "text": "\n".join([text] + lines[1:]),
+                "data": data,
+            }
+        except (ValueError, KeyError, TypeError):
+            pass
+    match = _HEADER_RE.match(lines[0])
+    return {
+        "offset": offset,
+        "end": end,
+        "timestamp": match.group(1) if match else None,
+        "level": match.group(2) if match else None,
+        "text": "\n".join(lines),
+    }
+
+
+def parse_record(record: Dict) -> Dict:
+    """把记录解析为 {timestamp, level, source, function, line, message}（兼容旧 /logs 格式）"""
+    data = record.get("data")
+    if data is not None:
+        return {
+            "timestamp": data["ts"].replace(" ", "T"),
+            "level": data.get("level") or "INFO",
+            "source": data.get("source") or "system",
+            "function": data.get("function") or "unknown",
+            "line": data.get("line") or 0,
+            "message": data.get("message", ""),
+            "offset": record["offset"],
+        }
+    text = record["text"]
+    match = _HEADER_RE.match(text)
+    body = text[match.end():] if match else text
+    detail = _DETAIL_RE.match(body)
+    timestamp = record.get("timestamp")
+    return {
+        "timestamp": timestamp.replace(" ", "T") if timestamp else None,
+        "level": record.get("level") or "INFO",
+        "source": detail.group(1) if detail else "system",
+        "function": detail.group(2) if detail else "unknown",
+        "line": int(detail.group(3)) if detail else 0,
+        "message": detail.group(4) if detail else body,
+        "offset": record["offset"],
+    }
+
+
+def _level_predicate(level: Optional[str]) -> Optional[Callable[[Dict], bool]]:
+    """level 支持单个级别或逗号分隔的多个级别（不区分大小写）"""
+    if not level:
+        return None
+    levels = {item.strip().upper() for item in level.split(",") if item.strip()}
+    return lambda record: (record["level"] or "").upper() in levels
+
+
+def _complete_end(f, size: int) -> int:
+    """最后一个换行符之后的偏移（忽略正在写入的半行）"""
+    pos = size
+    while pos > 0:
+        read = min(BLOCK_SIZE, pos)
+        f.seek(pos - read)
+        chunk = f.read(read)
+        idx = chunk.rfind(b"\n")
+        if idx >= 0:
+            return pos - read + idx + 1
+        pos -= read
+    return 0
+
+
+def _iter_lines_reverse(f, start: int, end: int):
+    """从 end 向前逐行产出 (行起始偏移, 行字节)，[start, end) 需以换行结尾"""
+    pos = end
+    buf = b""
+    while pos > start:
+        read = min(BLOCK_SIZE, pos - start)
+        pos -= read
+        f.seek(pos)
+        buf = f.read(read) + buf
+        lines = buf.split(b"\n")
+        # lines[0] 可能不完整（除非已到 start），留到下一轮
+        buf = lines[0]
+        offset = pos + len(buf) + 1
+        positions = []
+        for line in lines[1:]:
+            positions.append((offset, line))
+            offset += len(line) + 1
+        for item in reversed(positions):
+            # 末尾换行之后的空段不是一行
+            if item[0] < end:
+                yield item
+    if buf:
+        yield start, buf
+
+
+def _file_id(st) -> str:
+    return f"{st.st_dev}:{st.st_ino}"
+
+
+def file_id(path: str) -> str:
+    """文件标识（设备号:inode），用于判断日志文件是否已轮转"""
+    return _file_id(os.stat(path))
+
+
+def tail(path: str, limit: int = 100, level: str = None, before: int = None,
+         min_offset: int = 0, predicate: Callable[[Dict], bool] = None) -> Dict:
+    """读取文件末尾（或 before 偏移之前）的最后 limit 条记录
+
+    返回 {records(旧->新), start_offset, end_offset, has_more, file_size, file_id}：
+    start_offset 作为下一次的 before 向前翻页，end_offset 作为 read_forward 的 after 增量跟随。
+    """
+    limit = max(1, limit)
+    level_match = _level_predicate(level)
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        end = _complete_end(f, size)
+        if min_offset > end:
+            min_offset = 0  # 文件被截断
+        scan_end = end if before is None else max(min_offset, min(before, end))
+
+        records: List[Dict] = []
+        pending: List[Tuple[int, str]] = []  # 续行（反向收集）
+        record_end = scan_end
+        scanned_to = scan_end
+        has_more = False
+        for offset, raw in _iter_lines_reverse(f, min_offset, scan_end):
+            line = raw.decode("utf-8", errors="replace").rstrip("\r")
+            if _is_header(line) or offset == min_offset:
+                lines = [line] + [text for _, text in reversed(pending)]
+                record = _make_record(offset, record_end, lines)
+                pending = []
+                record_end = offset
+                scanned_to = offset
+                if (level_match is None or level_match(record)) and (predicate is None or predicate(record)):
+                    records.append(record)
+                    if len(records) >= limit:
+                        has_more = offset > min_offset
+                        break
+                if scan_end - offset > MAX_SCAN_BYTES:
+                    has_more = offset > min_offset
+                    break
+            else:
+                pending.append((offset, line))
+
+    records.reverse()
+    return {
+        "records": records,
+        "start_offset": scanned_to,
+        "end_offset": end,
+        "has_more": has_more,
+        "file_size": size,
+        "file_id": _file_id(st),
+    }
+
+
+def read_forward(path: str, after: int = 0, limit: int = 500, level: str = None,
+                 since: str = None, until: str = None,
+                 predicate: Callable[[Dict], bool] = None) -> Dict:
+    """从字节偏移 after 向后读取最多 limit 条记录（增量跟随 / 时间范围查询）
+
+    after 超过文件长度时视为文件已轮转，从头读取并返回 reset=True。
+    返回 {records, next_offset, has_more, reset, file_size, file_id}。
+    """
+    limit = max(1, limit)
+    level_match = _level_predicate(level)
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        reset = after > size
+        pos = 0 if reset else max(0, after)
+        f.seek(pos)
+
+        records: List[Dict] = []
+        current: Optional[Tuple[int, List[str]]] = None
+        next_offset = pos
+        has_more = False
+        done = False
+        start = pos
+
+        def _emit(end_offset: int) -> bool:
+            """结束当前记录，返回是否应停止读取"""
+            record = _make_record(current[0], end_offset, current[1])
+            ts = record["timestamp"]
+            if until and ts and ts > until:
+                return True
+            if since and ts and ts < since:
+                return False
+            if (level_match is None or level_match(record)) and (predicate is None or predicate(record)):
+                records.append(record)
+            return False
+
+        while not done:
+            raw = f.readline()
+            if not raw or not raw.endswith(b"\n"):
+                break  # 文件末尾或正在写入的半行
+            line_offset = pos
+            pos += len(raw)
+            line = raw.rstrip(b"\n").decode("utf-8", errors="replace").rstrip("\r")
+            if _is_header(line) or current is None:
+                if current is not None:
+                    if _emit(line_offset):
+                        done = True
+                        break
+                    next_offset = line_offset
+                    if len(records) >= limit:
+                        has_more = True
+                        break
+                    if line_offset - start > MAX_SCAN_BYTES:
+                        has_more = True
+                        break
+                current = (line_offset, [line])
+            else:
+                current[1].append(line)
+
+        if current is not None and not done and not has_more:
+            # 文件末尾的最后一条记录（其续行可能仍在写入，按已写入部分返回）
+            if not _emit(pos):
+                next_offset = pos
+
+    return {
+        "records": records,
+        "next_offset": next_offset,
+        "has_more": has_more,
+        "reset": reset,
+        "file_size": size,
+        "file_id": _file_id(st),
+    }
+
+
+# -------------------- 时间戳旁路索引 --------------------
+
+_index_cache: Dict[str, Dict] = {}
+_index_lock = threading.Lock()
+
+
+def _load_index(path: str, file_id: str) -> Dict:
+    cached = _index_cache.get(path)
+    if cached and cached["file_id"] == file_id and cached["stride"] == INDEX_STRIDE:
+        return cached
+    index = {"file_id": file_id, "stride": INDEX_STRIDE, "checked": 0, "offsets": [], "times": []}
+    try:
+        with open(path + INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("file_id") == file_id and header.get("stride") == INDEX_STRIDE:
+                index["checked"] = header.get("checked", 0)
+                for line in f:
+                    ts, offset = line.rstrip("\n").split("\t")
+                    index["times"].append(ts)
+                    index["offsets"].append(int(offset))
+    except (OSError, ValueError):
+        pass
+    _index_cache[path] = index
+    return index
+
+
+def _save_index(path: str, index: Dict) -> None:
+    tmp = path + INDEX_SUFFIX + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"file_id": index["file_id"], "stride": index["stride"],
+                                "checked": index["checked"]}) + "\n")
+            for ts, offset in zip(index["times"], index["offsets"]):
+                f.write(f"{ts}\t{offset}\n")
+        os.replace(tmp, path + INDEX_SUFFIX)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _probe_header(f, boundary: int) -> Optional[Tuple[str, int]]:
+    """在采样点之后找到第一条记录的起始行，返回 (时间戳, 偏移)"""
+    f.seek(boundary)
+    chunk = f.read(_INDEX_PROBE)
+    pos = 0
+    if boundary > 0:
+        # 采样点可能落在行中间，从下一行开始
+        pos = chunk.find(b"\n") + 1
+        if pos == 0:
+            return None
+    while pos < len(chunk):
+        nl = chunk.find(b"\n", pos)
+        if nl < 0:
+            return None
+        match = _HEADER_BYTES_RE.match(chunk, pos)
+        if match:
+            return match.group(1).decode("ascii"), boundary + pos
+        pos = nl + 1
+    return None
+
+
+def _ensure_index(path: str, f, st) -> Dict:
+    """把索引扩展到当前文件末尾（只在新增的采样点上 seek 读取）"""
+    index = _load_index(path, _file_id(st))
+    if index["checked"] > st.st_size:
+        # 文件被截断：重建
+        index.update(checked=0, offsets=[], times=[])
+    changed = False
+    boundary = index["checked"]
+    while boundary + _INDEX_PROBE <= st.st_size:
+        found = _probe_header(f, boundary)
+        if found and (not index["offsets"] or found[1] > index["offsets"][-1]):
+            index["times"].append(found[0])
+            index["offsets"].append(found[1])
+        boundary += index["stride"]
+        index["checked"] = boundary
+        changed = True
+    if changed:
+        _save_index(path, index)
+    return index
+
+
+def offset_for_time(path: str, since: str) -> int:
+    """返回不晚于 since 的最近采样偏移（从该处向后读即可覆盖 since 之后的记录）"""
+    with _index_lock:
+        with open(path, "rb") as f:
+            index = _ensure_index(path, f, os.fstat(f.fileno()))
+            pos = bisect.bisect_left(index["times"], since) - 1
+            return index["offsets"][pos] if pos >= 0 else 0
+
+
+def read_range(path: str, since: str = None, until: str = None, limit: int = 500,
+               level: str = None, predicate: Callable[[Dict], bool] = None) -> Dict:
+    """按时间范围读取记录（since/until 为 'YYYY-MM-DD HH:MM:SS'）"""
+    since = normalize_time(since)
+    until = normalize_time(until, end=True)
+    start = offset_for_time(path, since) if since else 0
+    return read_forward(path, after=start, limit=limit, level=level,
+                        since=since, until=until, predicate=predicate)
@@ -0,0 +1,293 @@
+"""
+事件循环阻塞检测
+
+所有账号共用 Start.main 创建的同一个事件循环，任何同步阻塞调用（sqlite、smtplib、PIL、
+psutil 等）都会让全部账号的回复一起延迟。本模块提供一个常驻的看门狗：
+
+- 心跳协程：在被监控的循环里定时 sleep，实际唤醒时间与预期之差即为循环延迟（lag）
+- 采样线程：心跳超过阈值未更新时判定循环被阻塞，对循环线程抓取调用栈样本
+  （只记录代码位置和行号，不读取栈帧局部变量），并按当前 Task 归因到协程和账号
+- 账号归因：XianyuLive 主协程调用 bind_cookie_id 设置 ContextVar，看门狗安装的任务工厂
+  在任务创建时按所在上下文记录 任务 -> cookie_id，采样时只查表
+- 统计结果通过管理员接口 /admin/loop-watchdog 查看
+
+开销：心跳每 100ms 一次，采样线程只读时间戳，阻塞时才抓取调用栈。
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+# 阻塞判定阈值（毫秒，可通过环境变量 LOOP_WATCHDOG_THRESHOLD_MS 覆盖）
+DEFAULT_THRESHOLD_MS = int(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", 200))
+# 心跳间隔（秒）
+HEARTBEAT_INTERVAL = 0.1
+# 阻塞期间的调用栈采样间隔（秒）
+SAMPLE_INTERVAL = 0.02
+# 单次阻塞最多保留的样本数
+MAX_SAMPLES_PER_STALL = 50
+# 保留最近的阻塞事件数
+MAX_EVENTS = 100
+# 保留最近的延迟数据点（约1分钟）
+LAG_WINDOW = 600
+# 调用栈保留的帧数
+STACK_LIMIT = 25
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(_ROOT_DIR):
+        return os.path.relpath(filename, _ROOT_DIR)
+    return filename
+
+
+def _format_stack(frame) -> List[str]:
+    """把栈帧格式化为 ["file:line func", ...]（外层在前）"""
+    return [f"{_short_path(fs.filename)}:{fs.lineno} {fs.name}"
+            for fs in traceback.extract_stack(frame, limit=STACK_LIMIT)]
+
+
+# 当前协程所属的账号（账号主协程中设置，其中创建的任务自动继承）
+current_cookie_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "loop_watchdog_cookie_id", default=None)
+# 任务 -> 账号ID（任务创建时记录，任务结束后自动移除）
+_task_accounts: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+
+def bind_cookie_id(cookie_id: str) -> None:
+    """把当前任务及其之后创建的任务归属到账号（在账号主协程开头调用）"""
+    current_cookie_id.set(cookie_id)
+    task = asyncio.current_task()
+    if task is not None:
+        _task_accounts[task] = cookie_id
+
+
+def _make_task_factory(previous):
+    """任务工厂：按创建任务时的上下文记录所属账号（保留原有任务工厂）"""
+    def factory(loop, coro, context=None):
+        if previous is not None:
+            task = previous(loop, coro) if context is None else previous(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        cookie_id = context.get(current_cookie_id) if context is not None else current_cookie_id.get()
+        if cookie_id:
+            _task_accounts[task] = cookie_id
+        return task
+    return factory
+
+
+def _describe_task(task: Optional[asyncio.Task]) -> Optional[str]:
+    if task is None:
+        return None
+    try:
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", None) or repr(coro)
+    except Exception:
+        return task.get_name()
+
+
+class LoopWatchdog:
+    """事件循环看门狗（每个被监控的循环一个实例）"""
+
+    def __init__(self, threshold_ms: int = DEFAULT_THRESHOLD_MS):
+        self.threshold = max(10, threshold_ms) / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._previous_task_factory = None
+        self._monitor_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = 0.0
+        self._started_at: Optional[float] = None
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._lags = deque(maxlen=LAG_WINDOW)  # 最近的循环延迟（毫秒）
+        self._max_lag_ms = 0.0
+        self._events = deque(maxlen=MAX_EVENTS)  # 最近的阻塞事件
+        self._by_source: Dict[tuple, dict] = {}  # (cookie_id, coroutine, 栈顶) -> 汇总
+        self._stall_count = 0
+        self._current_stall: Optional[dict] = None
+
+    # -------------------- 启停 --------------------
+
+    def start(self, loop: asyncio.AbstractEventLoop = None) -> None:
+        """在被监控循环所在线程中调用"""
+        if self._heartbeat_task is not None:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._started_at = time.time()
+        self._stop_event.clear()
+        self._previous_task_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(_make_task_factory(self._previous_task_factory))
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        self._monitor_thread = threading.Thread(
+            target=self._monitor, name="loop-watchdog", daemon=True
+        )
+        self._monitor_thread.start()
+        logger.info(f"[循环监控] 已启动，阻塞阈值 {int(self.threshold * 1000)}ms")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+            self._loop.set_task_factory(self._previous_task_factory)
+
+    def reset(self) -> None:
+        """清空统计数据"""
+        with self._lock:
+            self._reset_stats()
+
+    # -------------------- 心跳与采样 --------------------
+
+    async def _heartbeat(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                expected = time.monotonic() + HEARTBEAT_INTERVAL
+                await asyncio.sleep(HEARTBEAT_INTERVAL)
+                now = time.monotonic()
+                lag_ms = max(0.0, (now - expected) * 1000)
+                with self._lock:
+                    self._last_beat = now
+                    self._lags.append(lag_ms)
+                    if lag_ms > self._max_lag_ms:
+                        self._max_lag_ms = lag_ms
+        except asyncio.CancelledError:
+            pass
+
+    def _monitor(self) -> None:
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            try:
+                with self._lock:
+                    last_beat = self._last_beat
+                    stall = self._current_stall
+                blocked_for = time.monotonic() - last_beat
+                if blocked_for > self.threshold + HEARTBEAT_INTERVAL:
+                    self._sample(blocked_for)
+                elif stall is not None:
+                    self._finish_stall()
+            except Exception as e:
+                logger.debug(f"[循环监控] 采样异常: {e}")
+
+    def _sample(self, blocked_for: float) -> None:
+        """循环阻塞中：抓取循环线程的调用栈"""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = _format_stack(frame)
+        with self._lock:
+            stall = self._current_stall
+            if stall is None:
+                task = None
+                try:
+                    task = asyncio.current_task(self._loop)
+                except Exception:
+                    pass
+                stall = self._current_stall = {
+                    "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - blocked_for)),
+                    "cookie_id": _task_accounts.get(task) if task is not None else None,
+                    "coroutine": _describe_task(task),
+                    "samples": {},
+                    "sample_count": 0,
+                    "blocked_ms": 0,
+                }
+            stall["blocked_ms"] = int(blocked_for * 1000)
+            if stall["sample_count"] < MAX_SAMPLES_PER_STALL:
+                key = tuple(stack)
+                stall["samples"][key] = stall["samples"].get(key, 0) + 1
+                stall["sample_count"] += 1
+        del frame
+
+    def _finish_stall(self) -> None:
+        """循环恢复：结算本次阻塞事件"""
+        with self._lock:
+            stall, self._current_stall = self._current_stall, None
+            if stall is None:
+                return
+            # 出现次数最多的调用栈即为阻塞点
+            top_stack, hits = max(stall["samples"].items(), key=lambda kv: kv[1]) if stall["samples"] else ((), 0)
+            event = {
+                "started_at": stall["started_at"],
+                "duration_ms": stall["blocked_ms"],
+                "cookie_id": stall["cookie_id"],
+                "coroutine": stall["coroutine"],
+                "location": top_stack[-1] if top_stack else None,
+                "stack": list(top_stack),
+                "samples": stall["sample_count"],
+                "top_stack_hits": hits,
+            }
+            self._events.append(event)
+            self._stall_count += 1
+
+            key = (event["cookie_id"], event["coroutine"], event["location"])
+            source = self._by_source.get(key)
+            if source is None:
+                source = self._by_source[key] = {
+                    "cookie_id": event["cookie_id"],
+                    "coroutine": event["coroutine"],
+                    "location": event["location"],
+                    "count": 0,
+                    "total_ms": 0,
+                    "max_ms": 0,
+                }
+            source["count"] += 1
+            source["total_ms"] += event["duration_ms"]
+            source["max_ms"] = max(source["max_ms"], event["duration_ms"])
+
+        logger.warning(
+            f"[循环监控] 事件循环阻塞 {event['duration_ms']}ms"
+            f"（账号: {event['cookie_id'] or '-'}，协程: {event['coroutine'] or '-'}，位置: {event['location'] or '-'}）"
+        )
+
+    # -------------------- 查询 --------------------
+
+    def snapshot(self, limit: int = 20) -> dict:
+        """获取统计快照（供管理接口使用）"""
+        with self._lock:
+            lags = sorted(self._lags)
+            events = list(self._events)[-limit:][::-1]
+            sources = sorted(self._by_source.values(), key=lambda s: s["total_ms"], reverse=True)
+            stalled_now = self._current_stall["blocked_ms"] if self._current_stall else 0
+
+        def _pct(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))], 1)
+
+        return {
+            "running": self._heartbeat_task is not None,
+            "threshold_ms": int(self.threshold * 1000),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._started_at)) if self._started_at else None,
+            "lag_ms": {
+                "p50": _pct(0.5),
+                "p95": _pct(0.95),
+                "p99": _pct(0.99),
+                "max_window": round(lags[-1], 1) if lags else None,
+                "max": round(self._max_lag_ms, 1),
+                "window": len(lags),
+            },
+            "stall_count": self._stall_count,
+            "stalled_now_ms": stalled_now,
+            "top_sources": [dict(s) for s in sources[:limit]],
+            "recent_stalls": events,
+        }
+
+
+# 账号事件循环的看门狗（由 Start.main 启动）
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,118 @@
+"""
+消息过滤规则索引
+
+按用户把启用的过滤规则编译到内存：
+- buyer_id / item_id 规则使用哈希表，O(1) 判断
+- keyword 规则编译为一个 Aho-Corasick 自动机，一次扫描消息即可判断所有屏蔽词
+
+收到消息时过滤检查不再访问数据库；规则由 /message-filters 接口增删改后调用 invalidate 失效。
+判定语义与 DBManager.check_message_filtered 一致（关键词区分大小写、子串匹配）。
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from utils.keyword_matcher import AhoCorasick
+
+
+class MessageFilterIndex:
+    """单个用户的过滤规则索引"""
+
+    def __init__(self, filters: List[Dict]):
+        self.rule_count = 0
+        self._buyer_ids = set()
+        self._item_ids = set()
+        self._keywords: Dict[int, str] = {}  # 规则ID -> 关键词
+        self._keyword_automaton = AhoCorasick()
+        for f in filters:
+            if not f.get('enabled'):
+                continue
+            f_type, f_value = f.get('filter_type'), f.get('filter_value')
+            if f_value is None:
+                continue
+            if f_type == 'buyer_id':
+                self._buyer_ids.add(f_value)
+            elif f_type == 'item_id':
+                self._item_ids.add(f_value)
+            elif f_type == 'keyword':
+                self._keywords[f['id']] = f_value
+                self._keyword_automaton.add(f_value, f['id'])
+            else:
+                continue
+            self.rule_count += 1
+        self._keyword_automaton.build()
+
+    def check(self, buyer_id: str, message_text: str, item_id: str) -> Tuple[bool, Optional[str]]:
+        """检查消息是否被过滤，返回 (is_filtered, reason)"""
+        if buyer_id and buyer_id in self._buyer_ids:
+            return (True, f"买家ID {buyer_id} 在黑名单中")
+        if message_text and self._keywords:
+            # 多个屏蔽词同时命中时，取最早添加的规则作为原因
+            filter_id = self._keyword_automaton.min_value(message_text)
+            if filter_id is not None:
+                return (True, f"消息包含屏蔽关键词: {self._keywords[filter_id]}")
+        if item_id and item_id in self._item_ids:
+            return (True, f"商品ID {item_id} 在过滤列表中")
+        return (False, None)
+
+
+class MessageFilterCache:
+    """按用户缓存过滤规则索引（user_id 为 None 表示全部用户的规则）"""
+
+    def __init__(self):
+        self._indexes: Dict[Optional[int], MessageFilterIndex] = {}
+        self._generation = 0
+        self._lock = threading.Lock()  # 接口线程与账号事件循环并发访问
+        self._listeners: List[Callable[[], None]] = []
+
+    async def get(self, user_id: Optional[int]) -> MessageFilterIndex:
+        """获取用户的过滤规则索引，不存在时从数据库加载"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        with self._lock:
+            generation = self._generation
+
+        from db_manager import db_manager
+        try:
+            filters = await db_manager.get_message_filters_async(user_id=user_id, raise_errors=True)
+        except Exception:
+            # 查询失败时本次按无规则处理且不缓存，下次重新加载
+            return MessageFilterIndex([])
+        index = MessageFilterIndex(filters)
+
+        with self._lock:
+            # 加载期间规则被修改则不缓存，下次重新加载
+            if self._generation == generation:
+                self._indexes[user_id] = index
+        logger.debug(f"消息过滤规则索引已加载: user_id={user_id}, 规则数={index.rule_count}")
+        return index
+
+    async def check(self, buyer_id: str, message_text: str, item_id: str,
+                    user_id: Optional[int] = None) -> Tuple[bool, Optional[str]]:
+        """检查消息是否被过滤，返回 (is_filtered, reason)"""
+        index = await self.get(user_id)
+        return index.check(buyer_id, message_text, item_id)
+
+    def invalidate(self) -> None:
+        """过滤规则变更后使所有索引失效（规则接口不一定知道所属用户）"""
+        with self._lock:
+            self._generation += 1
+            self._indexes.clear()
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.warning(f"消息过滤缓存失效通知失败: {e}")
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """注册失效回调（多进程分片时用于把失效同步到账号所在进程）"""
+        self._listeners.append(listener)
+
+
+# 全局单例
+message_filter_cache = MessageFilterCache()
@@ -0,0 +1,654 @@
+"""
+消息通知服务
+
+原先每个 XianyuLive 实例在收到消息的协程里逐个渠道 await 发送通知，邮件用阻塞的 smtplib 直接跑在
+账号事件循环上，通知渠道配置每条消息都从数据库读取并重新解析 JSON。本模块提供进程级的通知服务：
+
+- 队列 + 固定数量的工作协程，运行在独立的后台线程事件循环中；账号热路径只做去重判断和入队
+- 同一条通知并发发送到各渠道，每个渠道独立重试（指数退避），只重试网络错误/5xx/429
+- 共享 aiohttp 会话（连接复用）；SMTP 连接按 (服务器, 端口, 账号) 池化，在线程池中发送
+- 按账号缓存解析后的渠道配置，通知渠道/账号通知设置变更时由接口调用 invalidate 失效
+- 通知冷却（防重复）状态进程内共享，键中带账号ID
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+
+# 工作协程数量
+WORKER_COUNT = int(os.getenv("NOTIFICATION_WORKERS", 4))
+# 队列容量（满时丢弃新通知，保证账号热路径不阻塞）
+QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", 1000))
+# 单个渠道最多尝试次数
+MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 3))
+# 重试退避基数（秒），第 n 次重试等待 base * 2^(n-1)
+RETRY_BACKOFF = float(os.getenv("NOTIFICATION_RETRY_BACKOFF", 2))
+# HTTP 请求超时（秒）
+HTTP_TIMEOUT = 10
+# 发送邮件的线程数
+SMTP_WORKERS = int(os.getenv("NOTIFICATION_SMTP_WORKERS", 4))
+# 每个 SMTP 账号保留的空闲连接数与空闲超时（秒）
+SMTP_MAX_IDLE = 2
+SMTP_IDLE_TIMEOUT = 60
+# 发送中的通知预占冷却的时长（秒），覆盖排队与重试耗时，发送完成后确认或释放
+PENDING_COOLDOWN = 120
+
+
+class NotificationError(Exception):
+    """通知发送失败（配置错误、认证失败、接口拒绝等，不重试）"""
+
+
+class RetryableNotificationError(NotificationError):
+    """临时性失败（网络错误、5xx、429），可重试"""
+
+
+def parse_channel_config(config: str) -> dict:
+    """解析通知渠道配置，兼容旧格式（直接字符串）"""
+    try:
+        data = json.loads(config)
+        return data if isinstance(data, dict) else {"config": config}
+    except (json.JSONDecodeError, TypeError):
+        return {"config": config}
+
+
+def _check_http_status(channel: str, status: int, ok=(200,)) -> None:
+    if status in ok:
+        return
+    if status == 429 or status >= 500:
+        raise RetryableNotificationError(f"{channel}: HTTP {status}")
+    raise NotificationError(f"{channel}: HTTP {status}")
+
+
+# -------------------- SMTP 连接池 --------------------
+
+class SmtpPool:
+    """SMTP 连接池（在线程池中使用，连接按服务器+账号复用）"""
+
+    def __init__(self, max_idle: int = SMTP_MAX_IDLE, idle_timeout: float = SMTP_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple, List[Tuple[smtplib.SMTP, float]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(config: dict) -> Tuple:
+        password_hash = hashlib.sha256(config['email_password'].encode('utf-8')).hexdigest()
+        return (config['smtp_server'], config['smtp_port'], config['email_user'], config['smtp_use_tls'], password_hash)
+
+    @staticmethod
+    def _connect(config: dict) -> smtplib.SMTP:
+        if config['smtp_port'] == 465:
+            # 使用SSL连接（端口465）
+            server = smtplib.SMTP_SSL(config['smtp_server'], config['smtp_port'], timeout=30)
+        else:
+            # 使用普通连接，然后升级到TLS（端口587）
+            server = smtplib.SMTP(config['smtp_server'], config['smtp_port'], timeout=30)
+            if config['smtp_use_tls']:
+                server.starttls()
+        try:
+            server.login(config['email_user'], config['email_password'])
+        except Exception:
+            _close_smtp(server)
+            raise
+        return server
+
+    def _acquire(self, key: Tuple, config: dict) -> Tuple[smtplib.SMTP, bool]:
+        now = time.time()
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                else:
+                    conn = candidate
+                    break
+        for server in expired:
+            _close_smtp(server)
+        if conn is not None:
+            return conn, True
+        return self._connect(config), False
+
+    def _release(self, key: Tuple, conn: smtplib.SMTP) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.time()))
+                return
+        _close_smtp(conn)
+
+    def send(self, config: dict, msg) -> None:
+        """发送邮件：优先复用空闲连接，复用的连接已被服务器断开时重新连接一次"""
+        key = self._key(config)
+        conn, reused = self._acquire(key, config)
+        try:
+            conn.send_message(msg)
+        except OSError:  # 含 SMTPServerDisconnected 等 SMTPException
+            _close_smtp(conn)
+            if not reused:
+                raise
+            # 空闲连接已被服务器断开，重新连接一次
+            conn = self._connect(config)
+            try:
+                conn.send_message(msg)
+            except Exception:
+                _close_smtp(conn)
+                raise
+        except Exception:
+            _close_smtp(conn)
+            raise
+        self._release(key, conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                _close_smtp(conn)
+
+
+def _close_smtp(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+# -------------------- 通知服务 --------------------
+
+class NotificationService:
+    """进程级通知服务（后台线程事件循环 + 队列 + 工作协程）"""
+
+    def __init__(self, workers: int = WORKER_COUNT, queue_size: int = QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._session = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._smtp_pool = SmtpPool()
+        self._smtp_executor: Optional[ThreadPoolExecutor] = None
+
+        # 通知冷却：键 -> 冷却到期时间（所有账号共享，键中带账号ID）
+        self._cooldowns: Dict[str, float] = {}
+        self._cooldown_lock = threading.Lock()
+        self._last_prune = 0.0
+
+        # 账号通知渠道缓存：cookie_id -> [已解析配置的渠道]
+        self._channels: Dict[str, List[Dict[str, Any]]] = {}
+        self._generation = 0
+        self._cache_lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+        self._stats = {"enqueued": 0, "dropped": 0, "sent": 0, "failed": 0, "retried": 0}
+
+    # -------------------- 启动 --------------------
+
+    def _ensure_started(self) -> None:
+        if self._ready.is_set():
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notification-service", daemon=True)
+                self._thread.start()
+        self._ready.wait()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._smtp_executor = ThreadPoolExecutor(max_workers=SMTP_WORKERS, thread_name_prefix="notify-smtp")
+        for index in range(self.workers):
+            loop.create_task(self._worker(index))
+        self._ready.set()
+        logger.info(f"📱 通知服务已启动，工作协程: {self.workers}，队列容量: {self.queue_size}")
+        loop.run_forever()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300),
+            )
+        return self._session
+
+    # -------------------- 去重 --------------------
+
+    def check_cooldown(self, key: str, cooldown: float) -> float:
+        """检查并登记冷却：在冷却期内返回剩余秒数（不登记），否则登记并返回 0"""
+        now = time.time()
+        with self._cooldown_lock:
+            expires = self._cooldowns.get(key)
+            if expires is not None and expires > now:
+                return expires - now
+            self._cooldowns[key] = now + cooldown
+            self._prune_cooldowns(now)
+        return 0
+
+    def reserve_cooldown(self, key: str) -> float:
+        """检查冷却并预占（用于只在发送成功后才进入冷却的通知）
+
+        在冷却期内或同键通知仍在发送中时返回剩余秒数；否则预占 PENDING_COOLDOWN 秒并返回 0，
+        发送结束后由 finish_cooldown 确认（成功）或释放（失败/无渠道）。
+        """
+        return self.check_cooldown(key, PENDING_COOLDOWN)
+
+    def finish_cooldown(self, key: str, cooldown: float, delivered: bool) -> None:
+        """发送成功时登记完整冷却，否则释放预占，下次异常可以立即再次通知"""
+        with self._cooldown_lock:
+            if delivered:
+                self._cooldowns[key] = time.time() + cooldown
+            else:
+                self._cooldowns.pop(key, None)
+
+    def _prune_cooldowns(self, now: float) -> None:
+        if now - self._last_prune > 60:
+            self._last_prune = now
+            for expired_key in [k for k, v in self._cooldowns.items() if v <= now]:
+                del self._cooldowns[expired_key]
+
+    @staticmethod
+    def message_key(cookie_id: str, *parts: Any) -> str:
+        """生成通知去重键（账号ID + 内容摘要）"""
+        digest = hashlib.md5("_".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+        return f"{cookie_id}:{digest}"
+
+    # -------------------- 渠道配置缓存 --------------------
+
+    async def _get_channels(self, cookie_id: str) -> List[Dict[str, Any]]:
+        channels = self._channels.get(cookie_id)
+        if channels is not None:
+            return channels
+
+        with self._cache_lock:
+            generation = self._generation
+
+        from db_manager import db_manager
+        rows = await asyncio.to_thread(db_manager.get_account_notifications, cookie_id)
+        channels = []
+        for row in rows:
+            channel = dict(row)
+            channel['config'] = parse_channel_config(row.get('channel_config'))
+            channels.append(channel)
+
+        with self._cache_lock:
+            # 加载期间配置被修改则不缓存，下次重新加载
+            if self._generation == generation:
+                self._channels[cookie_id] = channels
+        return channels
+
+    def invalidate(self) -> None:
+        """通知渠道或账号通知设置变更后使渠道缓存失效"""
+        with self._cache_lock:
+            self._generation += 1
+            self._channels.clear()
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.warning(f"通知渠道缓存失效通知失败: {e}")
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """注册失效回调（多进程分片时用于把失效同步到账号所在进程）"""
+        self._listeners.append(listener)
+
+    # -------------------- 入队 --------------------
+
+    def enqueue(self, cookie_id: str, message: str, title: str = "通知", attachment_path: str = None,
+                on_done: Callable[[bool], None] = None) -> None:
+        """提交通知（线程安全、不阻塞），由后台工作协程发送到账号的所有已启用渠道
+
+        on_done(delivered) 在发送结束后于通知线程中调用，delivered 表示至少一个渠道发送成功
+        （无启用渠道、全部失败、队列已满时为 False）。
+        """
+        self._ensure_started()
+        job = {
+            "cookie_id": cookie_id,
+            "message": message,
+            "title": title,
+            "attachment_path": attachment_path,
+            "on_done": on_done,
+            "created_at": time.time(),
+        }
+        self._loop.call_soon_threadsafe(self._put, job)
+
+    def _put(self, job: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(job)
+            self._stats["enqueued"] += 1
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            logger.warning(f"📱 通知队列已满，丢弃{job['title']} - 账号: {job['cookie_id']}")
+            self._finish(job, False)
+
+    @staticmethod
+    def _finish(job: Dict[str, Any], delivered: bool) -> None:
+        callback = job.get("on_done")
+        if callback is None:
+            return
+        try:
+            callback(delivered)
+        except Exception as e:
+            logger.warning(f"📱 通知完成回调失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": self._ready.is_set(),
+        }
+
+    # -------------------- 发送 --------------------
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            delivered = False
+            try:
+                delivered = await self._process(job)
+            except Exception as e:
+                logger.error(f"📱 处理{job['title']}失败 - 账号: {job['cookie_id']}: {e}")
+            finally:
+                self._finish(job, delivered)
+                self._queue.task_done()
+
+    async def _process(self, job: Dict[str, Any]) -> bool:
+        """发送到账号的所有已启用渠道，返回是否至少一个渠道成功"""
+        channels = [c for c in await self._get_channels(job["cookie_id"]) if c.get('enabled', True)]
+        if not channels:
+            logger.warning(f"📱 账号 {job['cookie_id']} 未配置消息通知，跳过{job['title']}")
+            return False
+        results = await asyncio.gather(*(self._deliver(channel, job) for channel in channels))
+        sent = sum(1 for ok in results if ok)
+        logger.info(f"📱 {job['title']}已发送 - 账号: {job['cookie_id']}, 成功渠道: {sent}/{len(channels)}")
+        return sent > 0
+
+    async def _deliver(self, channel: Dict[str, Any], job: Dict[str, Any]) -> bool:
+        """发送到单个渠道，临时性失败按指数退避重试"""
+        channel_type = channel.get('channel_type')
+        name = channel.get('channel_name', 'Unknown')
+        sender = _SENDERS.get(channel_type)
+        if sender is None:
+            logger.warning(f"📱 不支持的通知渠道类型: {channel_type}")
+            return False
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                await sender(self, channel['config'], job["message"], job)
+                self._stats["sent"] += 1
+                return True
+            except RetryableNotificationError as e:
+                error = e
+            except NotificationError as e:
+                logger.warning(f"📱 通知发送失败 ({name}/{channel_type}): {e}")
+                break
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                logger.error(f"📱 邮件发送被拒绝 ({name}): {e}")
+                break
+            except (asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+                error = e
+            except Exception as e:
+                logger.error(f"📱 通知发送异常 ({name}/{channel_type}): {e}")
+                break
+
+            if attempt < MAX_ATTEMPTS:
+                delay = RETRY_BACKOFF * (2 ** (attempt - 1))
+                self._stats["retried"] += 1
+                logger.warning(f"📱 通知发送失败 ({name}/{channel_type})，{delay:.0f}秒后第{attempt + 1}次尝试: {error}")
+                await asyncio.sleep(delay)
+            else:
+                logger.error(f"📱 通知发送失败 ({name}/{channel_type})，已重试{MAX_ATTEMPTS}次: {error}")
+
+        self._stats["failed"] += 1
+        return False
+
+
+# -------------------- 渠道实现 --------------------
+
+async def _send_dingtalk(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """钉钉机器人通知"""
+    webhook_url = config_data.get('webhook_url') or config_data.get('config', '')
+    secret = config_data.get('secret', '')
+    webhook_url = webhook_url.strip() if webhook_url else ''
+    if not webhook_url:
+        raise NotificationError("钉钉通知配置为空")
+
+    # 如果有加签密钥，生成签名（每次重试重新签名）
+    if secret:
+        timestamp = str(round(time.time() * 1000))
+        string_to_sign = f'{timestamp}\n{secret}'
+        hmac_code = hmac.new(secret.encode('utf-8'), string_to_sign.encode('utf-8'), digestmod=hashlib.sha256).digest()
+        sign = base64.b64encode(hmac_code).decode('utf-8')
+        webhook_url += f'&timestamp={timestamp}&sign={sign}'
+
+    data = {"msgtype": "markdown", "markdown": {"title": "闲鱼自动回复通知", "text": message}}
+    async with service._get_session().post(webhook_url, json=data) as response:
+        _check_http_status("钉钉通知", response.status)
+    logger.info("钉钉通知发送成功")
+
+
+async def _send_feishu(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """飞书机器人通知"""
+    webhook_url = config_data.get('webhook_url', '')
+    secret = config_data.get('secret', '')
+    if not webhook_url:
+        raise NotificationError("飞书通知 Webhook URL 配置为空")
+
+    timestamp = str(int(time.time()))
+    data = {"msg_type": "text", "content": {"text": message}, "timestamp": timestamp}
+    if secret:
+        string_to_sign = f'{timestamp}\n{secret}'
+        hmac_code = hmac.new(string_to_sign.encode('utf-8'), b'', digestmod=hashlib.sha256).digest()
+        data["sign"] = base64.b64encode(hmac_code).decode('utf-8')
+
+    async with service._get_session().post(webhook_url, json=data) as response:
+        response_text = await response.text()
+        _check_http_status("飞书通知", response.status)
+    try:
+        response_json = json.loads(response_text)
+    except json.JSONDecodeError:
+        logger.info("📱 飞书通知发送成功（响应格式异常）")
+        return
+    if response_json.get('code') != 0:
+        raise NotificationError(f"飞书通知发送失败: {response_json.get('msg', '未知错误')}")
+    logger.info("📱 飞书通知发送成功")
+
+
+async def _send_bark(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """Bark 推送"""
+    server_url = config_data.get('server_url', 'https://api.day.app').rstrip('/')
+    device_key = config_data.get('device_key', '')
+    if not device_key:
+        raise NotificationError("Bark通知设备密钥配置为空")
+
+    data = {
+        "device_key": device_key,
+        "title": config_data.get('title', '闲鱼自动回复通知'),
+        "body": message,
+        "sound": config_data.get('sound', 'default'),
+        "group": config_data.get('group', 'xianyu'),
+    }
+    if config_data.get('icon'):
+        data["icon"] = config_data['icon']
+    if config_data.get('url'):
+        data["url"] = config_data['url']
+
+    async with service._get_session().post(f"{server_url}/push", json=data) as response:
+        response_text = await response.text()
+        _check_http_status("Bark通知", response.status)
+    try:
+        response_json = json.loads(response_text)
+    except json.JSONDecodeError:
+        # 某些Bark服务器可能返回纯文本
+        if 'success' in response_text.lower() or 'ok' in response_text.lower():
+            logger.info("📱 Bark通知发送成功")
+            return
+        raise NotificationError(f"Bark通知响应格式异常: {response_text[:200]}")
+    if response_json.get('code') != 200:
+        raise NotificationError(f"Bark通知发送失败: {response_json.get('message', '未知错误')}")
+    logger.info("📱 Bark通知发送成功")
+
+
+def _build_email(config: dict, message: str, attachment_path: str = None):
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.image import MIMEImage
+    from email.mime.application import MIMEApplication
+
+    msg = MIMEMultipart()
+    msg['From'] = config['email_user']
+    msg['To'] = config['recipient_email']
+    msg['Subject'] = "闲鱼自动回复通知"
+    msg.attach(MIMEText(message, 'plain', 'utf-8'))
+
+    # 添加附件（如果有）
+    if attachment_path and os.path.exists(attachment_path):
+        try:
+            with open(attachment_path, 'rb') as f:
+                data = f.read()
+            filename = os.path.basename(attachment_path)
+            if attachment_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                part = MIMEImage(data)
+            else:
+                part = MIMEApplication(data)
+            part.add_header('Content-Disposition', 'attachment', filename=filename)
+            msg.attach(part)
+        except Exception as e:
+            logger.error(f"添加邮件附件失败: {e}")
+    return msg
+
+
+def _email_auth_suggestions(email_user: str, smtp_server: str) -> List[str]:
+    """SMTP 认证失败时的常见解决建议"""
+    email_user, smtp_server = email_user.lower(), smtp_server.lower()
+    if 'qq.com' in email_user or 'qq' in smtp_server:
+        return ["QQ邮箱需要使用授权码而不是登录密码",
+                "请到QQ邮箱设置 -> 账户 -> 开启SMTP服务 -> 生成授权码"]
+    if 'gmail.com' in email_user or 'gmail' in smtp_server:
+        return ["Gmail需要使用应用专用密码",
+                "请到Google账户 -> 安全性 -> 两步验证 -> 应用专用密码"]
+    if any(domain in email_user for domain in ('163.com', '126.com', 'yeah.net')):
+        return ["网易邮箱需要使用授权码",
+                "请到邮箱设置 -> POP3/SMTP/IMAP -> 开启SMTP服务 -> 生成授权码"]
+    return ["请检查邮箱密码/授权码是否正确",
+            "某些邮箱服务商需要使用授权码而不是登录密码"]
+
+
+async def _send_email(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """邮件通知（支持附件，连接池化，在线程池中发送）"""
+    smtp_port = int(config_data.get('smtp_port', 587))
+    config = {
+        'smtp_server': config_data.get('smtp_server', ''),
+        'smtp_port': smtp_port,
+        'email_user': config_data.get('email_user', ''),
+        'email_password': config_data.get('email_password', ''),
+        'recipient_email': config_data.get('recipient_email', ''),
+        'smtp_use_tls': bool(config_data.get('smtp_use_tls', smtp_port == 587)),
+    }
+    if not all([config['smtp_server'], config['email_user'], config['email_password'], config['recipient_email']]):
+        raise NotificationError("邮件通知配置不完整")
+
+    def _send():
+        msg = _build_email(config, message, job.get("attachment_path"))
+        service._smtp_pool.send(config, msg)
+
+    try:
+        await asyncio.get_running_loop().run_in_executor(service._smtp_executor, _send)
+    except smtplib.SMTPAuthenticationError as e:
+        logger.error(f"邮件SMTP认证失败 (错误码: {getattr(e, 'smtp_code', None)}), "
+                     f"邮箱: {config['email_user']}, 服务器: {config['smtp_server']}:{smtp_port}")
+        for i, suggestion in enumerate(_email_auth_suggestions(config['email_user'], config['smtp_server']), 1):
+            logger.error(f"  {i}. {suggestion}")
+        raise
+    logger.info(f"邮件通知发送成功: {config['recipient_email']}")
+
+
+async def _send_webhook(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """自定义 Webhook 通知"""
+    webhook_url = config_data.get('webhook_url', '')
+    http_method = config_data.get('http_method', 'POST').upper()
+    headers_str = config_data.get('headers', '{}')
+    if not webhook_url:
+        raise NotificationError("Webhook通知配置为空")
+    if http_method not in ('POST', 'PUT'):
+        raise NotificationError(f"不支持的HTTP方法: {http_method}")
+
+    # 解析自定义请求头
+    try:
+        custom_headers = json.loads(headers_str) if headers_str else {}
+    except json.JSONDecodeError:
+        custom_headers = {}
+    headers = {'Content-Type': 'application/json'}
+    headers.update(custom_headers)
+
+    data = {
+        'message': message,
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'source': 'xianyu-auto-reply'
+    }
+    async with service._get_session().request(http_method, webhook_url, json=data, headers=headers) as response:
+        _check_http_status("Webhook通知", response.status)
+    logger.info("Webhook通知发送成功")
+
+
+async def _send_wechat(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """企业微信机器人通知"""
+    webhook_url = config_data.get('webhook_url', '')
+    if not webhook_url:
+        raise NotificationError("微信通知配置为空")
+    data = {"msgtype": "text", "text": {"content": message}}
+    async with service._get_session().post(webhook_url, json=data) as response:
+        _check_http_status("微信通知", response.status)
+    logger.info("微信通知发送成功")
+
+
+async def _send_telegram(service: NotificationService, config_data: dict, message: str, job: dict) -> None:
+    """Telegram 机器人通知"""
+    bot_token = config_data.get('bot_token', '')
+    chat_id = config_data.get('chat_id', '')
+    if not all([bot_token, chat_id]):
+        raise NotificationError("Telegram通知配置不完整")
+    data = {'chat_id': chat_id, 'text': message, 'parse_mode': 'HTML'}
+    async with service._get_session().post(f"https://api.telegram.org/bot{bot_token}/sendMessage", json=data) as response:
+        _check_http_status("Telegram通知", response.status)
+    logger.info("Telegram通知发送成功")
+
+
+_SENDERS = {
+    'ding_talk': _send_dingtalk,
+    'dingtalk': _send_dingtalk,
+    'feishu': _send_feishu,
+    'lark': _send_feishu,
+    'bark': _send_bark,
+    'email': _send_email,
+    'webhook': _send_webhook,
+    'wechat': _send_wechat,
+    'telegram': _send_telegram,
+}
+
+
+# 全局单例
+notification_service = NotificationService()
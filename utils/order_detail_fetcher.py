@@ -1,6 +1,6 @@
 """
 闲鱼订单详情获取工具
-基于Playwright实现订单详情页面访问和数据提取
+基于Playwright实现订单详情页面访问和数据提取（页面从 utils.browser_pool 浏览器池租用）
 """
 
 import asyncio
@@ -8,7 +8,7 @@ import time
 import sys
 import os
 from typing import Optional, Dict, Any
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import Browser, BrowserContext, Page
 from loguru import logger
 import re
 import json
@@ -44,12 +44,13 @@ class OrderDetailFetcher:
     # 类级别的锁字典，为每个order_id维护一个锁
     _order_locks = defaultdict(lambda: asyncio.Lock())
 
-    def __init__(self, cookie_string: str = None, headless: bool = True):
+    def __init__(self, cookie_string: str = None, headless: bool = True, cookie_id: str = None):
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.playwright = None
+        self._lease_cm = None  # 浏览器池租约
         self.headless = headless  # 保存headless设置
+        self.cookie_id = cookie_id or "订单详情"
 
         # 请求头配置
         self.headers = {
@@ -72,136 +73,29 @@ class OrderDetailFetcher:
         self.cookie = cookie_string
 
     async def init_browser(self, headless: bool = None):
-        """初始化浏览器"""
+        """从浏览器池租用页面（独立上下文，已设置请求头和Cookie）"""
         try:
             # 如果没有传入headless参数，使用实例的设置
             if headless is None:
                 headless = self.headless
 
-            logger.info(f"开始初始化浏览器，headless模式: {headless}")
-
-            self.playwright = await async_playwright().start()
-
-            # 启动浏览器（Docker环境优化）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 移除--single-process参数，使用多进程模式提高稳定性
-            # if os.getenv('DOCKER_ENV'):
-            #     browser_args.append('--single-process')  # 注释掉，避免崩溃
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    '--disable-background-networking',
-                    '--disable-background-timer-throttling',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-default-apps',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-sync',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--no-first-run',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain',
-                    # 添加内存优化和稳定性参数
-                    '--memory-pressure-off',
-                    '--max_old_space_size=512',
-                    '--disable-ipc-flooding-protection',
-                    '--disable-component-extensions-with-background-pages',
-                    '--disable-features=TranslateUI,BlinkGenPropertyTrees',
-                    '--disable-logging',
-                    '--disable-permissions-api',
-                    '--disable-notifications',
-                    '--no-pings',
-                    '--no-zygote'
-                ])
-
-            logger.info(f"启动浏览器，参数: {browser_args}")
-            self.browser = await self.playwright.chromium.launch(
-                headless=headless,
-                args=browser_args
-            )
-
-            logger.info("浏览器启动成功，创建上下文...")
+            logger.info(f"开始租用浏览器页面，headless模式: {headless}")
 
-            # 创建浏览器上下文
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+            from utils.browser_pool import get_browser_pool
+            self._lease_cm = get_browser_pool().lease(
+                self.cookie_id, self.cookie, headless=headless, extra_headers=self.headers
             )
+            lease = await self._lease_cm.__aenter__()
+            self.browser, self.context, self.page = lease.browser, lease.context, lease.page
 
-            logger.info("浏览器上下文创建成功，设置HTTP头...")
-
-            # 设置额外的HTTP头
-            await self.context.set_extra_http_headers(self.headers)
-
-            logger.info("创建页面...")
-
-            # 创建页面
-            self.page = await self.context.new_page()
-
-            logger.info("页面创建成功，设置Cookie...")
-
-            # 设置Cookie
-            await self._set_cookies()
-
-            # 等待一段时间确保浏览器完全初始化
-            await asyncio.sleep(1)
-
-            logger.info("浏览器初始化成功")
+            logger.info(f"浏览器页面租用成功（等待 {lease.wait_ms:.0f}ms）")
             return True
-            
+
         except Exception as e:
+            self._lease_cm = None
             logger.error(f"浏览器初始化失败: {e}")
             return False
 
-    async def _set_cookies(self):
-        """设置Cookie"""
-        try:
-            # 解析Cookie字符串
-            cookies = []
-            for cookie_pair in self.cookie.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-            
-            # 添加Cookie到上下文
-            await self.context.add_cookies(cookies)
-            logger.info(f"已设置 {len(cookies)} 个Cookie")
-            
-        except Exception as e:
-            logger.error(f"设置Cookie失败: {e}")
-
     async def fetch_order_detail(self, order_id: str, timeout: int = 30) -> Optional[Dict[str, Any]]:
         """
         获取订单详情（带锁机制和数据库缓存）
@@ -607,83 +501,20 @@ class OrderDetailFetcher:
             return False
 
     async def _force_close_browser(self):
-        """强制关闭浏览器，忽略所有错误"""
+        """归还浏览器租约，忽略所有错误"""
+        lease_cm, self._lease_cm = self._lease_cm, None
+        self.browser = self.context = self.page = None
+        if lease_cm is None:
+            return
         try:
-            if self.page:
-                try:
-                    await self.page.close()
-                except:
-                    pass
-                self.page = None
-
-            if self.context:
-                try:
-                    await self.context.close()
-                except:
-                    pass
-                self.context = None
-
-            if self.browser:
-                try:
-                    await self.browser.close()
-                except:
-                    pass
-                self.browser = None
-
-            if self.playwright:
-                try:
-                    await self.playwright.stop()
-                except:
-                    pass
-                self.playwright = None
-
+            await lease_cm.__aexit__(None, None, None)
         except Exception as e:
-            logger.debug(f"强制关闭浏览器过程中的异常（可忽略）: {e}")
+            logger.debug(f"归还浏览器租约过程中的异常（可忽略）: {e}")
 
     async def close(self):
-        """关闭浏览器"""
-        try:
-            browser_to_kill = self.browser
-            
-            if self.page:
-                try:
-                    await asyncio.wait_for(self.page.close(), timeout=3.0)
-                except:
-                    pass
-            if self.context:
-                try:
-                    await asyncio.wait_for(self.context.close(), timeout=5.0)
-                except:
-                    pass
-            if self.browser:
-                try:
-                    await asyncio.wait_for(self.browser.close(), timeout=5.0)
-                except:
-                    pass
-                    
-            if self.playwright:
-                try:
-                    await asyncio.wait_for(self.playwright.stop(), timeout=5.0)
-                except Exception as e:
-                    logger.warning(f"停止playwright时出错或超时: {e}")
-                    # 强杀进程兜底
-                    try:
-                        import psutil
-                        process = getattr(browser_to_kill, '_process', None) or getattr(browser_to_kill, 'process', None)
-                        if process and getattr(process, 'pid', None):
-                            proc = psutil.Process(process.pid)
-                            for child in proc.children(recursive=True):
-                                try: child.kill()
-                                except: pass
-                            proc.kill()
-                    except: pass
-                self.playwright = None
-                
-            logger.info("浏览器已关闭")
-        except Exception as e:
-            logger.error(f"关闭浏览器失败: {e}")
-            # 如果正常关闭失败，尝试强制关闭
-            await self._force_close_browser()
+        """关闭页面并归还浏览器租约（浏览器本身由浏览器池管理）"""
+        await self._force_close_browser()
+        logger.info("浏览器页面已归还")
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -696,7 +527,8 @@ class OrderDetailFetcher:
 
 
 # 便捷函数
-async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, headless: bool = True) -> Optional[Dict[str, Any]]:
+async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, headless: bool = True,
+                                    cookie_id: str = None) -> Optional[Dict[str, Any]]:
     """
     简单的订单详情获取函数（优化版：先检查数据库，再初始化浏览器）
 
@@ -704,6 +536,7 @@ async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, he
         order_id: 订单ID
         cookie_string: Cookie字符串，如果不提供则使用默认值
         headless: 是否无头模式
+        cookie_id: 账号ID（用于浏览器池的租约归属和日志）
 
     Returns:
         订单详情字典，包含以下字段：
@@ -802,7 +635,7 @@ async def fetch_order_detail_simple(order_id: str, cookie_string: str = None, he
     logger.info(f"🌐 订单 {order_id} 需要浏览器获取，开始初始化浏览器...")
     print(f"🔍 订单 {order_id} 开始浏览器获取详情...")
 
-    fetcher = OrderDetailFetcher(cookie_string, headless)
+    fetcher = OrderDetailFetcher(cookie_string, headless, cookie_id=cookie_id)
     try:
         if await fetcher.init_browser(headless=headless):
             return await fetcher.fetch_order_detail(order_id)
@@ -1,28 +1,50 @@
 """
 全局定时任务运行器
 
-在 reply_server.py startup 时启动，负责执行全局任务（db_backup、delivery_timeout）。
-per-cookie 任务（token_renewal、cookie_refresh、cleanup）仍由 XianyuAutoAsync 实例自行循环。
+在 reply_server.py startup 时启动，负责执行全局任务（db_backup、delivery_timeout 及进程级维护任务）。
+per-cookie 任务（token_renewal、cookie_refresh、cleanup）仍由 XianyuAutoAsync 实例自行循环，
+其中 cleanup 只保留实例自身的锁和缓存清理。
 """
 from __future__ import annotations
 
 import asyncio
 import time
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
 from loguru import logger
 
 from utils.scheduler.scheduled_task_service import scheduled_task_service
-from utils.scheduler.task_executors import execute_db_backup, execute_delivery_timeout
+from utils.scheduler.task_executors import (
+    TaskSkipped,
+    execute_data_cleanup,
+    execute_db_backup,
+    execute_delivery_timeout,
+    execute_item_cache_cleanup,
+    execute_log_cleanup,
+    execute_pause_cleanup,
+    execute_playwright_cache_cleanup,
+    execute_qr_session_cleanup,
+)
 
 
 # 任务代码 -> 执行函数映射
 _TASK_EXECUTORS = {
     "db_backup": execute_db_backup,
     "delivery_timeout": execute_delivery_timeout,
+    "pause_cleanup": execute_pause_cleanup,
+    "item_cache_cleanup": execute_item_cache_cleanup,
+    "qr_session_cleanup": execute_qr_session_cleanup,
+    "playwright_cache_cleanup": execute_playwright_cache_cleanup,
+    "log_cleanup": execute_log_cleanup,
+    "data_cleanup": execute_data_cleanup,
 }
 
 
+def _empty_stats() -> dict:
+    return {"run_count": 0, "skip_count": 0, "error_count": 0,
+            "last_result": None, "last_duration_ms": None}
+
+
 class GlobalTaskRunner:
     """全局定时任务运行器 — 单例"""
 
@@ -32,6 +54,8 @@ class GlobalTaskRunner:
         self._task: Optional[asyncio.Task] = None
         self._running = False
         self._last_run: dict[str, float] = {}  # task_code -> last run timestamp
+        self._stats: Dict[str, dict] = {}  # task_code -> 执行统计（运行/跳过/失败次数）
+        self._task_codes = set(_TASK_EXECUTORS)  # 本进程负责执行的任务（多进程分片时按进程划分）
 
     @classmethod
     def get_instance(cls) -> "GlobalTaskRunner":
@@ -47,6 +71,10 @@ class GlobalTaskRunner:
         self._task = asyncio.create_task(self._run_loop())
         logger.info("[全局任务] 运行器已启动")
 
+    def set_task_codes(self, task_codes: Iterable[str]) -> None:
+        """限定本进程执行的任务（启动前调用）"""
+        self._task_codes = set(task_codes) & set(_TASK_EXECUTORS)
+
     async def stop(self) -> None:
         """停止全局任务循环"""
         self._running = False
@@ -63,6 +91,8 @@ class GlobalTaskRunner:
         while self._running:
             try:
                 for task_code, executor in _TASK_EXECUTORS.items():
+                    if task_code not in self._task_codes:
+                        continue
                     if not scheduled_task_service.is_enabled(task_code):
                         continue
 
@@ -72,14 +102,7 @@ class GlobalTaskRunner:
 
                     # 到期，执行任务
                     logger.info(f"[全局任务] 开始执行: {task_code}")
-                    try:
-                        result = await executor()
-                        logger.info(f"[全局任务] {task_code} 完成: {result}")
-                    except Exception as e:
-                        logger.error(f"[全局任务] {task_code} 执行异常: {e}")
-                    finally:
-                        self._last_run[task_code] = time.time()
-                        scheduled_task_service.record_run(task_code)
+                    await self._execute(task_code, executor)
 
                 # 30 秒检查一次
                 await asyncio.sleep(30)
@@ -89,20 +112,46 @@ class GlobalTaskRunner:
                 logger.error(f"[全局任务] 循环异常: {e}")
                 await asyncio.sleep(30)
 
+    async def _execute(self, task_code: str, executor) -> str:
+        """执行任务并记录统计，返回结果描述"""
+        stats = self._stats.setdefault(task_code, _empty_stats())
+        start = time.monotonic()
+        try:
+            result = await executor()
+            stats["run_count"] += 1
+            logger.info(f"[全局任务] {task_code} 完成: {result}")
+        except TaskSkipped as e:
+            stats["skip_count"] += 1
+            result = f"跳过: {e}"
+            logger.debug(f"[全局任务] {task_code} {result}")
+        except Exception as e:
+            stats["error_count"] += 1
+            result = f"执行失败: {e}"
+            logger.error(f"[全局任务] {task_code} 执行异常: {e}")
+        finally:
+            self._last_run[task_code] = time.time()
+            scheduled_task_service.record_run(task_code)
+        stats["last_result"] = result
+        stats["last_duration_ms"] = int((time.monotonic() - start) * 1000)
+        return result
+
+    def is_global_task(self, task_code: str) -> bool:
+        """是否为由本运行器执行的全局任务"""
+        return task_code in _TASK_EXECUTORS
+
+    def get_stats(self) -> Dict[str, dict]:
+        """获取各全局任务的执行统计（本进程启动以来）"""
+        return {code: dict(self._stats.get(code) or _empty_stats()) for code in _TASK_EXECUTORS}
+
     async def trigger_task(self, task_code: str) -> str:
         """手动触发单个全局任务"""
         executor = _TASK_EXECUTORS.get(task_code)
         if executor is None:
             return f"未知任务: {task_code}"
+        if task_code not in self._task_codes:
+            return "该任务由账号分片进程按计划执行，无法在此手动触发"
         logger.info(f"[全局任务] 手动触发: {task_code}")
-        try:
-            result = await executor()
-            self._last_run[task_code] = time.time()
-            scheduled_task_service.record_run(task_code)
-            return result
-        except Exception as e:
-            logger.error(f"[全局任务] 手动触发 {task_code} 失败: {e}")
-            return f"执行失败: {e}"
+        return await self._execute(task_code, executor)
 
 
 # 全局单例
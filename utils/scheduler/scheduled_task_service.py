@@ -26,6 +26,12 @@ DEFAULT_CONFIGS: Dict[str, dict] = {
     "cleanup": {"interval_seconds": 300, "enabled": True},
     "db_backup": {"interval_seconds": 86400, "enabled": True},
     "delivery_timeout": {"interval_seconds": 600, "enabled": True},
+    "pause_cleanup": {"interval_seconds": 300, "enabled": True},
+    "item_cache_cleanup": {"interval_seconds": 300, "enabled": True},
+    "qr_session_cleanup": {"interval_seconds": 300, "enabled": True},
+    "playwright_cache_cleanup": {"interval_seconds": 300, "enabled": True},
+    "log_cleanup": {"interval_seconds": 300, "enabled": True},
+    "data_cleanup": {"interval_seconds": 86400, "enabled": True},
 }
 
 
@@ -1,20 +1,30 @@
 """
 定时任务执行器（轻量版）
 
-- db_backup: SQLite 文件备份
+- db_backup: SQLite 在线备份（见 utils/db_backup.py）
 - delivery_timeout: 检测超时未发货订单
+- pause_cleanup / item_cache_cleanup / qr_session_cleanup /
+  playwright_cache_cleanup / log_cleanup / data_cleanup: 进程级维护任务
+  （原先由每个账号的 pause_cleanup_loop 重复执行，现在每个进程只执行一次）
 
 设计原则：不依赖 MySQL/Redis，纯 SQLite + 文件操作。
 """
 from __future__ import annotations
 
+import asyncio
+import glob
 import os
+import shutil
 import time
 from datetime import datetime, timedelta
 
 from loguru import logger
 
 
+class TaskSkipped(Exception):
+    """任务本次不满足执行条件（计入跳过次数而非失败次数）"""
+
+
 # ==================== 数据库备份 ====================
 
 BACKUP_DIR = os.path.join("data", "backups")
@@ -22,56 +32,52 @@ BACKUP_RETENTION_DAYS = 10
 
 
 async def execute_db_backup() -> str:
-    """SQLite 数据库文件备份（使用 SQLite backup API 确保一致性）"""
-    try:
-        from db_manager import db_manager
+    """SQLite 在线备份（独立连接 + 工作线程分批复制，不持有全局锁；失败时抛出异常计入失败次数）"""
+    from db_manager import db_manager
+    from utils.db_backup import online_backup
 
-        if db_manager.conn is None:
-            return "数据库未初始化，跳过备份"
+    if db_manager.conn is None:
+        raise TaskSkipped("数据库未初始化")
 
-        db_path = db_manager.db_path
-        if not os.path.exists(db_path):
-            return "数据库文件不存在，跳过备份"
+    db_path = db_manager.db_path
+    if not os.path.exists(db_path):
+        raise TaskSkipped("数据库文件不存在")
 
+    try:
         os.makedirs(BACKUP_DIR, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_file = os.path.join(BACKUP_DIR, f"backup_{timestamp}.db")
 
-        start = time.monotonic()
-        import sqlite3
-        dest_conn = sqlite3.connect(backup_file)
-        try:
-            with db_manager.lock:
-                db_manager.conn.backup(dest_conn)
-        finally:
-            dest_conn.close()
-
-        file_size = os.path.getsize(backup_file)
-        duration_ms = int((time.monotonic() - start) * 1000)
-        logger.info(f"[数据库备份] 完成: {backup_file}, {file_size} 字节, {duration_ms}ms")
+        meta = await asyncio.to_thread(online_backup, db_path, backup_file)
+        logger.info(
+            f"[数据库备份] 完成: {meta['filename']}, {meta['size']} 字节, {meta['pages']} 页, "
+            f"{meta['duration_ms']}ms ({meta['pages_per_sec']} 页/秒)"
+        )
 
         _cleanup_old_backups()
-        return f"备份成功: {os.path.basename(backup_file)} ({file_size} 字节)"
+        return f"备份成功: {meta['filename']} ({meta['size']} 字节, {meta['duration_ms']}ms)"
     except Exception as e:
         logger.error(f"[数据库备份] 失败: {e}")
-        return f"备份失败: {e}"
+        raise
 
 
 def _cleanup_old_backups() -> None:
-    """清理过期备份文件（保留最近 N 天）"""
+    """清理过期备份文件及其元数据（保留最近 N 天）"""
     try:
         if not os.path.isdir(BACKUP_DIR):
             return
         cutoff = time.time() - (BACKUP_RETENTION_DAYS * 86400)
         removed = 0
         for fname in os.listdir(BACKUP_DIR):
-            if not fname.startswith("backup_") or not fname.endswith(".db"):
+            if not fname.startswith("backup_") or not fname.endswith((".db", ".db.gz")):
                 continue
             fpath = os.path.join(BACKUP_DIR, fname)
             try:
                 if os.path.getmtime(fpath) < cutoff:
                     os.remove(fpath)
                     removed += 1
+                    if os.path.exists(fpath + ".json"):
+                        os.remove(fpath + ".json")
             except Exception:
                 pass
         if removed:
@@ -165,3 +171,169 @@ async def _check_orders_timeout() -> str:
     except Exception as e:
         logger.warning(f"[发货超时检测] orders 表检测失败: {e}")
         return f"检测失败: {e}"
+
+
+# ==================== 进程级维护任务 ====================
+
+LOG_DIR = "logs"
+LOG_RETENTION_DAYS = 7
+DATA_RETENTION_DAYS = 90
+
+
+async def _run_on_account_loop(coro_factory):
+    """在账号所在的事件循环中执行协程（账号侧的缓存/锁绑定在该循环上）"""
+    from cookie_manager import manager as cookie_manager
+    loop = getattr(cookie_manager, "loop", None) if cookie_manager else None
+    if loop is None or loop.is_closed() or not loop.is_running():
+        raise TaskSkipped("账号事件循环未运行")
+    try:
+        current = asyncio.get_running_loop()
+    except RuntimeError:
+        current = None
+    if current is loop:
+        return await coro_factory()
+    future = asyncio.run_coroutine_threadsafe(coro_factory(), loop)
+    return await asyncio.wrap_future(future)
+
+
+async def execute_pause_cleanup() -> str:
+    """清理已过期的自动回复暂停记录"""
+    from XianyuAutoAsync import pause_manager
+
+    async def _cleanup():
+        before = len(pause_manager.paused_chats)
+        pause_manager.cleanup_expired_pauses()
+        return before - len(pause_manager.paused_chats)
+
+    removed = await _run_on_account_loop(_cleanup)
+    return f"清理 {removed} 条过期暂停记录"
+
+
+async def execute_item_cache_cleanup() -> str:
+    """清理过期的商品详情缓存"""
+    from XianyuAutoAsync import XianyuLive
+
+    removed = await _run_on_account_loop(XianyuLive._cleanup_item_cache)
+    return f"清理 {removed} 个过期商品详情缓存"
+
+
+async def execute_qr_session_cleanup() -> str:
+    """清理过期的扫码登录会话（会话由接口线程维护，直接在当前循环执行）"""
+    from utils.qr_login import qr_login_manager
+
+    before = len(qr_login_manager.sessions)
+    qr_login_manager.cleanup_expired_sessions()
+    return f"清理 {before - len(qr_login_manager.sessions)} 个过期扫码会话"
+
+
+def _cleanup_playwright_cache() -> str:
+    """清理Playwright浏览器临时文件和缓存（Docker环境专用）"""
+    # 定义需要清理的临时目录路径
+    temp_paths = [
+        '/tmp/playwright-*',  # Playwright临时会话
+        '/tmp/chromium-*',    # Chromium临时文件
+        '/ms-playwright/chromium-*/Default/Cache',  # 浏览器缓存
+        '/ms-playwright/chromium-*/Default/Code Cache',  # 代码缓存
+        '/ms-playwright/chromium-*/Default/GPUCache',  # GPU缓存
+    ]
+
+    total_cleaned = 0
+    total_size_mb = 0
+
+    for pattern in temp_paths:
+        try:
+            for path in glob.glob(pattern):
+                try:
+                    if os.path.exists(path):
+                        # 计算大小
+                        if os.path.isdir(path):
+                            size = sum(
+                                os.path.getsize(os.path.join(dirpath, filename))
+                                for dirpath, _, filenames in os.walk(path)
+                                for filename in filenames
+                            )
+                            shutil.rmtree(path, ignore_errors=True)
+                        else:
+                            size = os.path.getsize(path)
+                            os.remove(path)
+
+                        total_size_mb += size / (1024 * 1024)
+                        total_cleaned += 1
+                except Exception as e:
+                    logger.warning(f"清理路径 {path} 时出错: {e}")
+        except Exception as e:
+            logger.warning(f"匹配路径 {pattern} 时出错: {e}")
+
+    if total_cleaned > 0:
+        logger.info(f"[维护任务] Playwright缓存清理完成: 删除了 {total_cleaned} 个文件/目录，释放 {total_size_mb:.2f} MB")
+    return f"删除 {total_cleaned} 个文件/目录，释放 {total_size_mb:.2f} MB"
+
+
+async def execute_playwright_cache_cleanup() -> str:
+    """清理Playwright临时文件（文件操作放到线程中执行）"""
+    return await asyncio.to_thread(_cleanup_playwright_cache)
+
+
+def _cleanup_old_logs(retention_days: int = LOG_RETENTION_DAYS) -> str:
+    """清理过期的日志文件（包括.log、.log.zip 和日志查看器的 .log.idx 索引）"""
+    from utils.log_reader import INDEX_SUFFIX
+
+    if not os.path.exists(LOG_DIR):
+        raise TaskSkipped(f"日志目录不存在: {LOG_DIR}")
+
+    # 计算过期时间点
+    cutoff_time = datetime.now() - timedelta(days=retention_days)
+
+    log_patterns = [
+        os.path.join(LOG_DIR, "xianyu_*.log"),
+        os.path.join(LOG_DIR, "xianyu_*.log.zip"),
+        os.path.join(LOG_DIR, "app_*.log"),
+        os.path.join(LOG_DIR, "app_*.log.zip"),
+        # 日志已被删除但残留的索引文件
+        os.path.join(LOG_DIR, "xianyu_*.log" + INDEX_SUFFIX),
+        os.path.join(LOG_DIR, "app_*.log" + INDEX_SUFFIX),
+    ]
+
+    total_cleaned = 0
+    total_size_mb = 0
+
+    for pattern in log_patterns:
+        for log_file in glob.glob(pattern):
+            try:
+                # 如果文件早于保留期限，则删除
+                file_mtime = datetime.fromtimestamp(os.path.getmtime(log_file))
+                if file_mtime < cutoff_time:
+                    file_size = os.path.getsize(log_file)
+                    os.remove(log_file)
+                    total_size_mb += file_size / (1024 * 1024)
+                    total_cleaned += 1
+                    logger.debug(f"[维护任务] 删除过期日志文件: {log_file} (修改时间: {file_mtime})")
+                    # 同时删除该日志的索引文件
+                    index_file = log_file + INDEX_SUFFIX
+                    if os.path.exists(index_file):
+                        os.remove(index_file)
+            except Exception as e:
+                logger.warning(f"[维护任务] 删除日志文件失败 {log_file}: {e}")
+
+    if total_cleaned > 0:
+        logger.info(f"[维护任务] 日志清理完成: 删除了 {total_cleaned} 个日志文件，释放 {total_size_mb:.2f} MB (保留 {retention_days} 天内的日志)")
+    return f"删除 {total_cleaned} 个日志文件，释放 {total_size_mb:.2f} MB"
+
+
+async def execute_log_cleanup() -> str:
+    """清理过期日志文件（文件操作放到线程中执行）"""
+    return await asyncio.to_thread(_cleanup_old_logs)
+
+
+async def execute_data_cleanup() -> str:
+    """清理数据库历史数据（保留90天）"""
+    from db_manager import db_manager
+
+    if db_manager.conn is None:
+        raise TaskSkipped("数据库未初始化")
+
+    # 数据库清理可能很耗时，使用线程池执行，避免阻塞事件循环
+    stats = await asyncio.to_thread(db_manager.cleanup_old_data, days=DATA_RETENTION_DAYS)
+    if 'error' in stats:
+        raise RuntimeError(stats['error'])
+    return f"数据库清理完成: {stats}"
@@ -0,0 +1,262 @@
+"""
+账号外发消息总线
+
+API 服务运行在独立线程的事件循环中，原先 /send-message 在 API 事件循环里直接调用
+XianyuLive.send_msg，写的却是主事件循环持有的 WebSocket：跨事件循环写同一个连接不安全，
+并发请求还会在同一连接上交错写入。本模块为每个账号提供一个线程安全的发送队列：
+
+- 任意线程/事件循环调用 submit() 入队，立即返回 concurrent.futures.Future（发送结果）
+- 队列由账号所属事件循环中的单个任务顺序发送，同一连接上不再有并发写
+- 令牌桶限速（SEND_RATE_PER_SECOND 条/秒，SEND_BURST 突发）
+- 积压时把同一会话的连续消息合并为一条（换行拼接，SEND_COALESCE=false 关闭）
+- 批量发送记录（batch）保存最近 MAX_BATCHES 批的逐条结果，供状态查询
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional
+
+from loguru import logger
+
+
+SEND_RATE = float(os.getenv("SEND_RATE_PER_SECOND", 1.0))
+SEND_BURST = max(1, int(os.getenv("SEND_BURST", 5)))
+COALESCE_ENABLED = os.getenv("SEND_COALESCE", "true").lower() == "true"
+# 合并后单条消息的上限
+COALESCE_MAX_MESSAGES = 10
+COALESCE_MAX_CHARS = 1500
+# 单个账号队列上限，超出时直接失败（避免账号断线时无限积压）
+MAX_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", 1000))
+# 保留的批量发送记录数
+MAX_BATCHES = 500
+
+
+class _SendCommand:
+    __slots__ = ("chat_id", "to_user_id", "message", "future")
+
+    def __init__(self, chat_id: str, to_user_id: str, message: str):
+        self.chat_id = chat_id
+        self.to_user_id = to_user_id
+        self.message = message
+        self.future: Future = Future()
+
+
+def _result(success: bool, message: str, **extra) -> Dict[str, Any]:
+    return {"success": success, "message": message, **extra}
+
+
+class AccountSendQueue:
+    """单个账号的发送队列（由账号所属事件循环消费）"""
+
+    def __init__(self, cookie_id: str, live, loop: asyncio.AbstractEventLoop):
+        self.cookie_id = cookie_id
+        self.live = live
+        self.loop = loop
+        self._pending: Deque[_SendCommand] = deque()
+        self._lock = threading.Lock()
+        self._draining = False
+        self._closed = False
+        self._tokens = float(SEND_BURST)
+        self._refilled = time.monotonic()
+        self.stats = {"sent": 0, "failed": 0, "coalesced": 0}
+
+    def submit(self, chat_id: str, to_user_id: str, message: str) -> Future:
+        command = _SendCommand(chat_id, to_user_id, message)
+        with self._lock:
+            if self._closed:
+                command.future.set_result(_result(False, "账号实例已停止"))
+                return command.future
+            if len(self._pending) >= MAX_QUEUE_SIZE:
+                command.future.set_result(_result(False, "发送队列已满，请稍后重试"))
+                return command.future
+            self._pending.append(command)
+            start = not self._draining
+            self._draining = True
+        if start:
+            try:
+                self.loop.call_soon_threadsafe(self._start_drain)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.close("账号事件循环已停止")
+        return command.future
+
+    def _start_drain(self) -> None:
+        self.loop.create_task(self._drain())
+
+    def _take_batch(self) -> List[_SendCommand]:
+        """取出队首消息；开启合并时连带取出队列中同一会话的后续消息"""
+        head = self._pending.popleft()
+        batch = [head]
+        if not COALESCE_ENABLED or not self._pending:
+            return batch
+        size = len(head.message)
+        rest: Deque[_SendCommand] = deque()
+        while self._pending:
+            command = self._pending.popleft()
+            if (command.chat_id == head.chat_id and command.to_user_id == head.to_user_id
+                    and len(batch) < COALESCE_MAX_MESSAGES
+                    and size + len(command.message) + 1 <= COALESCE_MAX_CHARS):
+                batch.append(command)
+                size += len(command.message) + 1
+            else:
+                rest.append(command)
+        self._pending = rest
+        return batch
+
+    async def _acquire_token(self) -> None:
+        if SEND_RATE <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(SEND_BURST), self._tokens + (now - self._refilled) * SEND_RATE)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / SEND_RATE)
+
+    async def _drain(self) -> None:
+        while True:
+            # 先等令牌再取消息，等待期间到达的同会话消息可以合并
+            await self._acquire_token()
+            with self._lock:
+                if not self._pending:
+                    self._draining = False
+                    # 未使用的令牌退回
+                    self._tokens = min(float(SEND_BURST), self._tokens + 1)
+                    return
+                batch = self._take_batch()
+            result = await self._send(batch)
+            for command in batch:
+                if not command.future.done():
+                    command.future.set_result(result)
+
+    async def _send(self, batch: List[_SendCommand]) -> Dict[str, Any]:
+        head = batch[0]
+        ws = self.live.ws
+        if not ws or ws.closed:
+            self.stats["failed"] += len(batch)
+            return _result(False, "账号WebSocket连接已断开，请等待重连")
+        text = "\n".join(command.message for command in batch)
+        try:
+            await self.live.send_msg(ws, head.chat_id, head.to_user_id, text)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.error(f"【{self.cookie_id}】消息发送失败: {e}")
+            return _result(False, f"发送消息失败: {e}")
+        self.stats["sent"] += len(batch)
+        if len(batch) > 1:
+            self.stats["coalesced"] += len(batch) - 1
+            logger.info(f"【{self.cookie_id}】已合并发送 {len(batch)} 条消息到会话 {head.chat_id}")
+            return _result(True, "消息发送成功", coalesced=len(batch))
+        return _result(True, "消息发送成功")
+
+    def close(self, reason: str) -> None:
+        """停止接收新消息，队列中未发送的消息以失败结束"""
+        with self._lock:
+            self._closed = True
+            pending, self._pending = list(self._pending), deque()
+        for command in pending:
+            if not command.future.done():
+                command.future.set_result(_result(False, reason))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {**self.stats, "pending": pending}
+
+
+class SendBus:
+    """按账号路由外发消息（全局单例 send_bus）"""
+
+    def __init__(self):
+        self._queues: Dict[str, AccountSendQueue] = {}
+        self._lock = threading.Lock()
+        self._batches: "OrderedDict[str, List[Future]]" = OrderedDict()
+
+    def register(self, cookie_id: str, live, loop: asyncio.AbstractEventLoop) -> None:
+        """账号实例启动时注册（在账号所属事件循环中调用）"""
+        with self._lock:
+            old = self._queues.get(cookie_id)
+            self._queues[cookie_id] = AccountSendQueue(cookie_id, live, loop)
+        if old is not None:
+            old.close("账号实例已重启")
+
+    def unregister(self, cookie_id: str, live=None) -> None:
+        """账号实例退出时注销；传入 live 时只注销该实例对应的队列"""
+        with self._lock:
+            queue = self._queues.get(cookie_id)
+            if queue is None or (live is not None and queue.live is not live):
+                return
+            del self._queues[cookie_id]
+        queue.close("账号实例已停止")
+
+    def submit(self, cookie_id: str, chat_id: str, to_user_id: str, message: str) -> Future:
+        """线程安全入队，返回发送结果的 Future（结果为 {'success', 'message'}）"""
+        queue = self._queues.get(cookie_id)
+        if queue is None:
+            future: Future = Future()
+            future.set_result(_result(False, "账号实例不存在或未连接，请检查账号状态"))
+            return future
+        return queue.submit(chat_id, to_user_id, message)
+
+    async def send(self, cookie_id: str, chat_id: str, to_user_id: str, message: str,
+                   timeout: float = None) -> Dict[str, Any]:
+        """入队并在当前事件循环中等待发送结果"""
+        future = asyncio.wrap_future(self.submit(cookie_id, chat_id, to_user_id, message))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return _result(False, "消息已排队，等待发送超时", queued=True)
+
+    # -------------------- 批量发送记录 --------------------
+
+    def track_batch(self, futures: List[Future]) -> str:
+        """登记一批发送 Future，返回批次ID"""
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._batches[batch_id] = list(futures)
+            while len(self._batches) > MAX_BATCHES:
+                self._batches.popitem(last=False)
+        return batch_id
+
+    def batch_status(self, batch_id: str) -> Optional[List[Dict[str, Any]]]:
+        """批次内逐条状态：pending / sent / failed / queued（已入队但等待结果超时）"""
+        with self._lock:
+            futures = self._batches.get(batch_id)
+        if futures is None:
+            return None
+        return [self.describe(index, future) for index, future in enumerate(futures)]
+
+    @staticmethod
+    def describe(index: int, future: Future) -> Dict[str, Any]:
+        if not future.done():
+            return {"index": index, "status": "pending"}
+        result = future.result()
+        if result.get("success"):
+            status = "sent"
+        else:
+            status = "queued" if result.get("queued") else "failed"
+        return {"index": index, "status": status, **result}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queues = dict(self._queues)
+            batches = len(self._batches)
+        return {
+            "rate_per_second": SEND_RATE,
+            "burst": SEND_BURST,
+            "coalesce": COALESCE_ENABLED,
+            "batches": batches,
+            "accounts": {cookie_id: queue.snapshot() for cookie_id, queue in queues.items()},
+        }
+
+
+# 全局单例
+send_bus = SendBus()
@@ -0,0 +1,184 @@
+"""
+后台登录会话存储
+
+原先会话 token 保存在 reply_server 进程内的字典中，API 只能以单进程运行（多个 uvicorn worker
+之间互不认识对方签发的 token，重启后全部失效）。本模块提供可替换的会话存储：
+
+- SQLiteSessionStore（默认）：会话保存在 session_tokens 表，只存 token 的 SHA-256 摘要；
+  进程内 LRU 读缓存（SESSION_CACHE_SIZE 条），缓存项最多复用 SESSION_CACHE_TTL 秒后回库校验，
+  其他进程登出/过期最迟在该时间后生效
+- MemorySessionStore：进程内字典（单进程部署或测试使用）
+
+通过环境变量 SESSION_STORE=sqlite|memory 选择。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+
+# 会话有效期（秒），与原 TOKEN_EXPIRE_TIME 一致
+SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", 24 * 60 * 60))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 1024))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 30))
+# 过期会话的清理间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionStore(ABC):
+    """会话存储接口：create / get / delete / delete_user"""
+
+    ttl = SESSION_TTL
+
+    @abstractmethod
+    def create(self, user_id: int, username: str, is_admin: bool = False) -> str:
+        """签发新 token"""
+
+    @abstractmethod
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """返回会话信息 {'user_id', 'username', 'is_admin', 'timestamp'}，不存在或已过期返回 None"""
+
+    @abstractmethod
+    def delete(self, token: str) -> None:
+        """使单个 token 失效（登出）"""
+
+    @abstractmethod
+    def delete_user(self, user_id: int) -> None:
+        """使指定用户的全部会话失效（修改密码、删除用户时调用）"""
+
+
+class MemorySessionStore(SessionStore):
+    """进程内会话存储"""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, username: str, is_admin: bool = False) -> str:
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = {'user_id': user_id, 'username': username,
+                                     'is_admin': bool(is_admin), 'timestamp': time.time()}
+        return token
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if time.time() - session['timestamp'] > self.ttl:
+                del self._sessions[token]
+                return None
+            return dict(session)
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def delete_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [t for t, s in self._sessions.items() if s['user_id'] == user_id]:
+                del self._sessions[token]
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite 会话存储 + 进程内 LRU 读缓存"""
+
+    def __init__(self, cache_size: int = SESSION_CACHE_SIZE, cache_ttl: float = SESSION_CACHE_TTL):
+        self.cache_size = max(1, cache_size)
+        self.cache_ttl = cache_ttl
+        # token 摘要 -> (会话信息, 缓存时间)
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _cache_put(self, token_hash: str, session: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[token_hash] = (session, time.monotonic())
+            self._cache.move_to_end(token_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def create(self, user_id: int, username: str, is_admin: bool = False) -> str:
+        from db_manager import db_manager
+        token = secrets.token_urlsafe(32)
+        token_hash = _hash_token(token)
+        now = time.time()
+        if not db_manager.save_session_token(token_hash, user_id, username, is_admin, now, now + self.ttl):
+            raise RuntimeError("保存登录会话失败")
+        self._cache_put(token_hash, {'user_id': user_id, 'username': username,
+                                     'is_admin': bool(is_admin), 'timestamp': now, 'expires_at': now + self.ttl})
+        if now - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = now
+            purged = db_manager.purge_expired_session_tokens()
+            if purged:
+                logger.info(f"已清理 {purged} 个过期登录会话")
+        return token
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        token_hash = _hash_token(token)
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(token_hash)
+            if cached is not None:
+                session, cached_at = cached
+                if session['expires_at'] <= now:
+                    del self._cache[token_hash]
+                    return None
+                if time.monotonic() - cached_at < self.cache_ttl:
+                    self._cache.move_to_end(token_hash)
+                    return self._public(session)
+
+        from db_manager import db_manager
+        row = db_manager.get_session_token(token_hash)
+        if row is None:
+            with self._lock:
+                self._cache.pop(token_hash, None)
+            return None
+        session = {'user_id': row['user_id'], 'username': row['username'], 'is_admin': row['is_admin'],
+                   'timestamp': row['created_at'], 'expires_at': row['expires_at']}
+        self._cache_put(token_hash, session)
+        return self._public(session)
+
+    @staticmethod
+    def _public(session: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: session[key] for key in ('user_id', 'username', 'is_admin', 'timestamp')}
+
+    def delete(self, token: str) -> None:
+        from db_manager import db_manager
+        token_hash = _hash_token(token)
+        with self._lock:
+            self._cache.pop(token_hash, None)
+        db_manager.delete_session_token(token_hash=token_hash)
+
+    def delete_user(self, user_id: int) -> None:
+        from db_manager import db_manager
+        with self._lock:
+            for token_hash in [h for h, (s, _) in self._cache.items() if s['user_id'] == user_id]:
+                del self._cache[token_hash]
+        db_manager.delete_session_token(user_id=user_id)
+
+
+def _create_store() -> SessionStore:
+    kind = os.getenv("SESSION_STORE", "sqlite").lower()
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind != "sqlite":
+        logger.warning(f"未知的会话存储类型 {kind}，使用 sqlite")
+    return SQLiteSessionStore()
+
+
+# 全局单例
+session_store = _create_store()
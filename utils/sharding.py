@@ -0,0 +1,750 @@
+"""
+多进程账号分片
+
+单进程模式下所有账号共用 Start.main 的一个事件循环，账号多时 CPU 密集的消息解析、
+同步阻塞调用会互相拖慢。设置环境变量 SHARD_WORKERS=N（N>1）后：
+
+- 主进程（API 进程）只运行 reply_server 和进程级定时任务，不再直接运行账号任务
+- 启动 N 个分片工作进程，每个进程有自己的事件循环，按 cookie_id 的一致性哈希认领账号
+  （增减分片时只有少量账号迁移）
+- 主进程中的 ShardSupervisor 监控工作进程，异常退出后按指数退避自动重启
+- 接口层的账号操作（发送消息、Cookie 更新/刷新、启用/禁用、自动确认发货等）
+  由 RoutedCookieManager / ShardRouter 通过本地 IPC（multiprocessing.connection，
+  127.0.0.1 + 随机 authkey）转发给账号所属的分片执行
+
+未设置或 SHARD_WORKERS<=1 时保持原有的单进程行为。
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import bisect
+import hashlib
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from cookie_manager import CookieManager
+
+
+# 分片工作进程数（<=1 表示单进程模式）
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", 0) or 0)
+# 分片 IPC 起始端口，第 i 个分片监听 SHARD_IPC_PORT + i
+SHARD_IPC_PORT = int(os.getenv("SHARD_IPC_PORT", 18780))
+# 一致性哈希每个分片的虚拟节点数
+SHARD_VNODES = 160
+# 单次 IPC 请求超时（秒）
+REQUEST_TIMEOUT = 30
+# 分片不可用（启动/重启中）时等待其恢复的最长时间（秒）
+CONNECT_WAIT = 15
+# 工作进程重启退避
+RESTART_BACKOFF_MIN = 1
+RESTART_BACKOFF_MAX = 60
+# 运行超过该时长（秒）后退出视为偶发故障，退避重新计算
+STABLE_RUNTIME = 60
+
+# 工作进程命令行参数：--shard-worker <index> <count>
+WORKER_FLAG = "--shard-worker"
+_AUTHKEY_ENV = "SHARD_IPC_AUTHKEY"
+# 主进程 PID，工作进程据此判断主进程是否已退出
+_PARENT_PID_ENV = "SHARD_PARENT_PID"
+# 工作进程检查主进程是否存活的间隔（秒）
+PARENT_CHECK_INTERVAL = 2
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 绑定账号事件循环、需要在分片进程中执行的定时任务
+SHARD_LOOP_TASKS = ("pause_cleanup", "item_cache_cleanup")
+
+
+class ShardError(RuntimeError):
+    """分片请求失败（分片不可用或执行出错）"""
+
+
+def sharding_enabled() -> bool:
+    return SHARD_WORKERS > 1
+
+
+def parse_worker_args(argv: List[str] = None) -> Optional[tuple]:
+    """解析工作进程参数，返回 (index, count)；非工作进程返回 None"""
+    argv = sys.argv if argv is None else argv
+    if WORKER_FLAG not in argv:
+        return None
+    pos = argv.index(WORKER_FLAG)
+    try:
+        return int(argv[pos + 1]), int(argv[pos + 2])
+    except (IndexError, ValueError):
+        raise SystemExit(f"用法: {WORKER_FLAG} <分片序号> <分片总数>")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """cookie_id -> 分片序号 的一致性哈希环"""
+
+    def __init__(self, shard_count: int, vnodes: int = SHARD_VNODES):
+        self.shard_count = max(1, shard_count)
+        points = sorted(
+            (_hash(f"shard-{shard}#{v}"), shard)
+            for shard in range(self.shard_count)
+            for v in range(vnodes)
+        )
+        self._keys = [p[0] for p in points]
+        self._shards = [p[1] for p in points]
+
+    def shard_for(self, cookie_id: str) -> int:
+        if self.shard_count == 1:
+            return 0
+        pos = bisect.bisect(self._keys, _hash(cookie_id)) % len(self._keys)
+        return self._shards[pos]
+
+
+def _address(index: int) -> tuple:
+    return ("127.0.0.1", SHARD_IPC_PORT + index)
+
+
+def _authkey() -> bytes:
+    key = os.environ.get(_AUTHKEY_ENV)
+    if not key:
+        # 由主进程生成，通过环境变量传给工作进程
+        key = os.environ[_AUTHKEY_ENV] = secrets.token_hex(16)
+    return key.encode("ascii")
+
+
+# ==================== 工作进程侧 ====================
+
+def _watch_parent(index: int) -> None:
+    """主进程退出（被杀死或崩溃）时结束工作进程
+
+    两种信号任一出现即退出：主进程持有的 stdin 管道写端关闭（读到 EOF），
+    或父进程 PID 发生变化（被 init/subreaper 收养）。否则工作进程会继续占用
+    IPC 端口并保持账号的 WebSocket 连接，下次启动时端口冲突、账号重复连接。
+    """
+    parent_pid = int(os.environ.get(_PARENT_PID_ENV) or 0)
+
+    def _exit(reason: str) -> None:
+        logger.warning(f"[分片{index}] {reason}，工作进程退出")
+        os._exit(0)
+
+    def _stdin_loop() -> None:
+        try:
+            while sys.stdin.buffer.read(1):
+                pass
+        except (OSError, ValueError, AttributeError):
+            return  # stdin 不可用时只依赖 PID 检查
+        _exit("主进程管道已关闭")
+
+    def _pid_loop() -> None:
+        while True:
+            time.sleep(PARENT_CHECK_INTERVAL)
+            if os.getppid() != parent_pid:
+                _exit(f"主进程 (PID {parent_pid}) 已退出")
+
+    if not parent_pid:
+        return  # 手动启动的工作进程（非 ShardSupervisor 创建）不做检测
+    if sys.stdin is not None:
+        threading.Thread(target=_stdin_loop, name=f"shard-{index}-parent-pipe", daemon=True).start()
+    threading.Thread(target=_pid_loop, name=f"shard-{index}-parent-pid", daemon=True).start()
+
+
+class ShardServer:
+    """分片工作进程的 IPC 服务端
+
+    每个连接处理一个请求：{'op': 名称, 'kwargs': {...}} -> {'ok': bool, 'result'/'error': ...}
+    协程处理函数调度到分片事件循环执行；普通函数在连接线程中执行
+    （CookieManager 的线程安全接口本身会把工作投递到事件循环）。
+    """
+
+    def __init__(self, index: int, loop: asyncio.AbstractEventLoop, handlers: Dict[str, Callable]):
+        self.index = index
+        self.loop = loop
+        self.handlers = handlers
+        self._listener: Optional[Listener] = None
+
+    def start(self) -> None:
+        self._listener = Listener(_address(self.index), authkey=_authkey())
+        threading.Thread(target=self._accept_loop, name=f"shard-{self.index}-ipc", daemon=True).start()
+        logger.info(f"[分片{self.index}] IPC 服务已启动: {_address(self.index)}")
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                # 认证失败等单个连接错误不影响服务
+                logger.warning(f"[分片{self.index}] 接受IPC连接失败: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn) -> None:
+        try:
+            request = conn.recv()
+            op = request.get("op")
+            handler = self.handlers.get(op)
+            if handler is None:
+                conn.send({"ok": False, "error": f"未知操作: {op}"})
+                return
+            try:
+                kwargs = request.get("kwargs") or {}
+                if asyncio.iscoroutinefunction(handler):
+                    fut = asyncio.run_coroutine_threadsafe(handler(**kwargs), self.loop)
+                    result = fut.result(timeout=REQUEST_TIMEOUT)
+                else:
+                    result = handler(**kwargs)
+                conn.send({"ok": True, "result": result})
+            except Exception as e:
+                logger.error(f"[分片{self.index}] 执行 {op} 失败: {e}")
+                conn.send({"ok": False, "error": str(e)})
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+
+def _build_handlers(index: int, manager: CookieManager, ring: ConsistentHashRing) -> Dict[str, Callable]:
+    from db_manager import db_manager
+    from utils.keyword_matcher import keyword_matcher_cache
+    from utils.message_filter import message_filter_cache
+    from utils.delivery_rule_matcher import delivery_rule_cache
+    from utils.log_control import log_sampler
+    from utils.notification_service import notification_service
+
+    loop = manager.loop
+
+    def _ensure_cookie(cookie_id: str) -> None:
+        """分片启动后由其他进程新增的账号，从数据库补齐内存数据"""
+        if cookie_id in manager.cookies:
+            return
+        cookie_info = db_manager.get_cookie_details(cookie_id)
+        if not cookie_info:
+            raise ValueError(f"Cookie ID {cookie_id} 不存在")
+        manager.cookies[cookie_id] = cookie_info.get("value")
+        manager.keywords.setdefault(cookie_id, [])
+        manager.cookie_status.setdefault(cookie_id, True)
+
+    def add_cookie(cookie_id, cookie_value, kw_list=None, user_id=None):
+        manager.add_cookie(cookie_id, cookie_value, kw_list, user_id=user_id)
+        return True
+
+    def remove_cookie(cookie_id):
+        manager.remove_cookie(cookie_id)
+        return True
+
+    def update_cookie(cookie_id, new_value, save_to_db=True):
+        _ensure_cookie(cookie_id)
+        manager.update_cookie(cookie_id, new_value, save_to_db=save_to_db)
+        return True
+
+    def update_cookie_status(cookie_id, enabled):
+        _ensure_cookie(cookie_id)
+        manager.update_cookie_status(cookie_id, enabled)
+        return True
+
+    def update_auto_confirm_setting(cookie_id, auto_confirm):
+        manager.update_auto_confirm_setting(cookie_id, auto_confirm)
+        return True
+
+    def update_keywords(cookie_id, kw_list):
+        # 数据库已由 API 进程保存，这里只刷新内存
+        manager.keywords[cookie_id] = kw_list
+        keyword_matcher_cache.invalidate(cookie_id)
+        return True
+
+    def reload_from_db():
+        return manager.reload_from_db()
+
+    def invalidate_cache(cache, cookie_id=None):
+        if cache == "keyword":
+            keyword_matcher_cache.invalidate(cookie_id)
+        elif cache == "message_filter":
+            message_filter_cache.invalidate()
+        elif cache == "delivery_rule":
+            delivery_rule_cache.invalidate()
+        elif cache == "log_sampling":
+            log_sampler.reload()
+        elif cache == "notification":
+            notification_service.invalidate()
+        return True
+
+    async def start_account(cookie_id, cookie_value, user_id=None):
+        """启动账号任务但不写数据库（对应单进程下直接调度 _run_xianyu 的场景）"""
+        manager.cookies[cookie_id] = cookie_value
+        manager.keywords.setdefault(cookie_id, [])
+        task = manager.tasks.get(cookie_id)
+        if task is not None and not task.done():
+            return False
+        manager.tasks[cookie_id] = loop.create_task(manager._run_xianyu(cookie_id, cookie_value, user_id))
+        return True
+
+    async def send_message(cookie_id, chat_id, to_user_id, message):
+        from utils.send_bus import send_bus
+        # 在IPC超时前返回（超时的消息仍在队列中，结果标记为 queued）
+        return await send_bus.send(cookie_id, chat_id, to_user_id, message, timeout=REQUEST_TIMEOUT - 5)
+
+    def send_messages(cookie_id, messages):
+        """批量入队同一账号的消息，messages 为 [{'chat_id', 'to_user_id', 'message'}, ...]
+
+        立即返回分片内的批次ID，发送结果由 batch_status 查询（不在IPC请求中等待发送完成）
+        """
+        from utils.send_bus import send_bus
+        futures = [send_bus.submit(cookie_id, m["chat_id"], m["to_user_id"], m["message"]) for m in messages]
+        return send_bus.track_batch(futures)
+
+    def batch_status(cookie_id, batch_id):
+        from utils.send_bus import send_bus
+        return send_bus.batch_status(batch_id)
+
+    def send_stats():
+        from utils.send_bus import send_bus
+        return send_bus.stats()
+
+    async def send_token_refresh_notification(cookie_id, **kwargs):
+        """通过账号实例发送Token/验证类通知（冷却去重在实例中），账号实例不存在时返回 False"""
+        from XianyuAutoAsync import XianyuLive
+        live_instance = XianyuLive.get_instance(cookie_id)
+        if not live_instance:
+            return False
+        await live_instance.send_token_refresh_notification(**kwargs)
+        return True
+
+    def status():
+        from utils.browser_pool import browser_pool_stats
+        from utils.loop_watchdog import loop_watchdog
+        running = [cid for cid, t in manager.tasks.items() if not t.done()]
+        watchdog = loop_watchdog.snapshot(limit=5)
+        return {
+            "shard": index,
+            "pid": os.getpid(),
+            "accounts": sorted(cid for cid in manager.cookies if ring.shard_for(cid) == index),
+            "running": sorted(running),
+            "loop_lag_ms": watchdog["lag_ms"],
+            "stall_count": watchdog["stall_count"],
+            "browser_pools": browser_pool_stats(),
+        }
+
+    return {
+        "add_cookie": add_cookie,
+        "remove_cookie": remove_cookie,
+        "update_cookie": update_cookie,
+        "update_cookie_status": update_cookie_status,
+        "update_auto_confirm_setting": update_auto_confirm_setting,
+        "update_keywords": update_keywords,
+        "reload_from_db": reload_from_db,
+        "invalidate_cache": invalidate_cache,
+        "start_account": start_account,
+        "send_message": send_message,
+        "send_messages": send_messages,
+        "batch_status": batch_status,
+        "send_stats": send_stats,
+        "send_token_refresh_notification": send_token_refresh_notification,
+        "status": status,
+    }
+
+
+async def shard_worker_main(index: int, count: int) -> None:
+    """分片工作进程入口：只运行一致性哈希分配给本分片的账号"""
+    import cookie_manager as cm
+    from db_manager import db_manager
+    from utils.scheduler.global_runner import global_task_runner
+    from utils.log_control import log_sampler
+
+    loop = asyncio.get_running_loop()
+    ring = ConsistentHashRing(count)
+    logger.info(f"[分片{index}] 工作进程启动 (PID {os.getpid()}, 共 {count} 个分片)")
+    _watch_parent(index)
+    log_sampler.load()
+
+    if os.getenv("LOOP_WATCHDOG_ENABLED", "true").lower() in ("1", "true", "yes"):
+        from utils.loop_watchdog import loop_watchdog
+        loop_watchdog.start(loop)
+
+    cm.manager = CookieManager(loop)
+    manager = cm.manager
+
+    # 本进程内的 CookieManager 仍持有全部账号数据（查询用），只启动本分片的账号
+    owned = [cid for cid in manager.cookies if ring.shard_for(cid) == index]
+    for cid in owned:
+        if not manager.get_cookie_status(cid):
+            logger.info(f"[分片{index}] 跳过禁用的 Cookie: {cid}")
+            continue
+        try:
+            cookie_info = db_manager.get_cookie_details(cid)
+            user_id = cookie_info.get("user_id") if cookie_info else None
+            manager.tasks[cid] = loop.create_task(manager._run_xianyu(cid, manager.cookies[cid], user_id))
+            logger.info(f"[分片{index}] 启动 Cookie 任务: {cid} (用户ID: {user_id})")
+        except Exception as e:
+            logger.error(f"[分片{index}] 启动 Cookie 任务失败: {cid}, {e}")
+    logger.info(f"[分片{index}] 认领 {len(owned)} 个账号，已启动 {len(manager.tasks)} 个任务")
+
+    ShardServer(index, loop, _build_handlers(index, manager, ring)).start()
+
+    # 账号循环绑定的清理任务在分片内执行，其余全局任务由主进程执行
+    global_task_runner.set_task_codes(SHARD_LOOP_TASKS)
+    await global_task_runner.start()
+
+    await asyncio.Event().wait()
+
+
+# ==================== 主进程侧 ====================
+
+class ShardRouter:
+    """按 cookie_id 把请求路由到所属分片"""
+
+    def __init__(self, shard_count: int):
+        self.ring = ConsistentHashRing(shard_count)
+        self.shard_count = self.ring.shard_count
+        # 缓存失效通知异步发送，不阻塞接口
+        self._notify_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-notify")
+        # 批量发送：API 批次ID -> 各账号在分片中的批次
+        self._batches: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._batch_lock = threading.Lock()
+
+    def shard_for(self, cookie_id: str) -> int:
+        return self.ring.shard_for(cookie_id)
+
+    def request(self, index: int, op: str, timeout: float = REQUEST_TIMEOUT,
+                connect_wait: float = CONNECT_WAIT, **kwargs) -> Any:
+        """向指定分片发送请求（同步，分片重启中时在 connect_wait 内重试连接）"""
+        deadline = time.monotonic() + connect_wait
+        while True:
+            try:
+                conn = Client(_address(index), authkey=_authkey())
+                break
+            except OSError as e:
+                if time.monotonic() >= deadline:
+                    raise ShardError(f"分片{index}不可用: {e}")
+                time.sleep(0.5)
+        try:
+            conn.send({"op": op, "kwargs": kwargs})
+            if not conn.poll(timeout):
+                raise ShardError(f"分片{index}执行 {op} 超时")
+            response = conn.recv()
+        except (EOFError, OSError) as e:
+            raise ShardError(f"分片{index}连接中断: {e}")
+        finally:
+            conn.close()
+        if not response.get("ok"):
+            raise ShardError(response.get("error") or f"分片{index}执行 {op} 失败")
+        return response.get("result")
+
+    def call(self, cookie_id: str, op: str, **kwargs) -> Any:
+        """在账号所属分片上执行操作"""
+        return self.request(self.shard_for(cookie_id), op, cookie_id=cookie_id, **kwargs)
+
+    async def acall(self, cookie_id: str, op: str, **kwargs) -> Any:
+        """call 的异步版本（在线程中等待IPC，不阻塞事件循环）"""
+        return await asyncio.to_thread(self.call, cookie_id, op, **kwargs)
+
+    def broadcast(self, op: str, connect_wait: float = CONNECT_WAIT, **kwargs) -> Dict[int, Any]:
+        """向所有分片发送请求，返回 分片序号 -> 结果（失败时为 ShardError）"""
+        results = {}
+        for index in range(self.shard_count):
+            try:
+                results[index] = self.request(index, op, connect_wait=connect_wait, **kwargs)
+            except ShardError as e:
+                logger.warning(f"[分片] 广播 {op} 到分片{index}失败: {e}")
+                results[index] = e
+        return results
+
+    async def submit_batch(self, messages: List[dict]) -> str:
+        """批量发送：按账号分组，各账号一次IPC在所属分片入队，返回批次ID
+
+        messages 为 [{'cookie_id', 'chat_id', 'to_user_id', 'message'}, ...]，
+        逐条结果保存在分片的发送记录中，通过 batch_status 查询
+        """
+        from utils.send_bus import MAX_BATCHES
+
+        groups: Dict[str, List[int]] = {}
+        for index, message in enumerate(messages):
+            groups.setdefault(message["cookie_id"], []).append(index)
+
+        async def _forward(cookie_id: str, indexes: List[int]) -> dict:
+            part = {"cookie_id": cookie_id, "indexes": indexes, "shard_batch": None, "error": None}
+            items = [{k: messages[i][k] for k in ("chat_id", "to_user_id", "message")} for i in indexes]
+            try:
+                part["shard_batch"] = await self.acall(cookie_id, "send_messages", messages=items)
+            except ShardError as e:
+                part["error"] = f"账号所在分片不可用: {e}"
+            return part
+
+        parts = await asyncio.gather(*(_forward(cid, indexes) for cid, indexes in groups.items()))
+        batch_id = uuid.uuid4().hex
+        with self._batch_lock:
+            self._batches[batch_id] = list(parts)
+            while len(self._batches) > MAX_BATCHES:
+                self._batches.popitem(last=False)
+        return batch_id
+
+    async def batch_status(self, batch_id: str) -> Optional[List[dict]]:
+        """批次内逐条状态（向各账号所属分片查询），批次不存在时返回 None"""
+        with self._batch_lock:
+            parts = self._batches.get(batch_id)
+        if parts is None:
+            return None
+
+        async def _query(part: dict) -> List[dict]:
+            indexes = part["indexes"]
+            if part["error"]:
+                return [{"index": i, "status": "failed", "success": False, "message": part["error"]} for i in indexes]
+            try:
+                results = await self.acall(part["cookie_id"], "batch_status", batch_id=part["shard_batch"])
+            except ShardError as e:
+                return [{"index": i, "status": "unknown", "message": f"查询分片失败: {e}"} for i in indexes]
+            if results is None:
+                # 分片重启后发送记录丢失
+                return [{"index": i, "status": "unknown", "message": "分片中的发送记录已丢失"} for i in indexes]
+            return [{**result, "index": i} for i, result in zip(indexes, results)]
+
+        merged = [entry for entries in await asyncio.gather(*(_query(p) for p in parts)) for entry in entries]
+        return sorted(merged, key=lambda entry: entry["index"])
+
+    def notify_invalidate(self, cache: str, cookie_id: str = None) -> None:
+        """把 API 进程中的缓存失效同步到分片（后台发送）"""
+        if cookie_id:
+            self._notify_executor.submit(self._safe_call, cookie_id, "invalidate_cache", cache=cache)
+        else:
+            self._notify_executor.submit(self.broadcast, "invalidate_cache", cache=cache)
+
+    def _safe_call(self, cookie_id: str, op: str, **kwargs) -> None:
+        try:
+            self.call(cookie_id, op, **kwargs)
+        except ShardError as e:
+            logger.warning(f"[分片] {op} 发送失败: {cookie_id}, {e}")
+
+
+class ShardSupervisor:
+    """启动并守护分片工作进程，异常退出后自动重启"""
+
+    def __init__(self, shard_count: int):
+        self.shard_count = shard_count
+        self._procs: Dict[int, Optional[subprocess.Popen]] = {}
+        self._info: Dict[int, dict] = {}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._previous_handlers: Dict[int, Any] = {}
+
+    @staticmethod
+    def _worker_command(index: int, count: int) -> List[str]:
+        args = [WORKER_FLAG, str(index), str(count)]
+        if getattr(sys, "frozen", False):
+            # 打包后的可执行文件直接带参数启动
+            return [sys.executable] + args
+        return [sys.executable, os.path.join(_ROOT_DIR, "Start.py")] + args
+
+    def start(self) -> None:
+        _authkey()  # 确保子进程继承同一个 authkey
+        for index in range(self.shard_count):
+            self._info[index] = {"restarts": 0, "backoff": RESTART_BACKOFF_MIN,
+                                 "started_at": None, "last_exit_code": None, "next_start": 0.0}
+            self._spawn(index)
+        threading.Thread(target=self._monitor, name="shard-supervisor", daemon=True).start()
+        self._register_exit_hooks()
+        logger.info(f"[分片] 已启动 {self.shard_count} 个分片工作进程")
+
+    def _register_exit_hooks(self) -> None:
+        """主进程正常退出或收到终止信号时停止所有工作进程"""
+        atexit.register(self.stop)
+        if threading.current_thread() is not threading.main_thread():
+            return  # 只能在主线程注册信号处理
+        for name in ("SIGTERM", "SIGINT", "SIGHUP"):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                self._previous_handlers[signum] = signal.signal(signum, self._handle_signal)
+            except (ValueError, OSError) as e:
+                logger.debug(f"[分片] 注册 {name} 处理失败: {e}")
+
+    def _handle_signal(self, signum, frame) -> None:
+        logger.info(f"[分片] 收到信号 {signum}，停止分片工作进程")
+        self.stop()
+        previous = self._previous_handlers.get(signum, signal.SIG_DFL)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # 恢复默认处理并重新发送信号，保持原有的退出方式
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    def _spawn(self, index: int) -> None:
+        info = self._info[index]
+        env = os.environ.copy()
+        env[_PARENT_PID_ENV] = str(os.getpid())
+        try:
+            # stdin 管道仅用于存活检测：主进程退出时写端关闭，工作进程读到 EOF 后退出
+            proc = subprocess.Popen(self._worker_command(index, self.shard_count),
+                                    cwd=_ROOT_DIR, env=env, stdin=subprocess.PIPE)
+        except Exception as e:
+            logger.error(f"[分片] 启动分片{index}失败: {e}")
+            proc = None
+            info["next_start"] = time.monotonic() + info["backoff"]
+        with self._lock:
+            self._procs[index] = proc
+            if proc is not None:
+                info["started_at"] = time.time()
+        if proc is not None:
+            logger.info(f"[分片] 分片{index}已启动 (PID {proc.pid})")
+
+    def _monitor(self) -> None:
+        while not self._stop_event.wait(1):
+            for index in range(self.shard_count):
+                try:
+                    self._check(index)
+                except Exception as e:
+                    logger.error(f"[分片] 检查分片{index}状态失败: {e}")
+
+    def _check(self, index: int) -> None:
+        if self._stop_event.is_set():
+            return
+        info = self._info[index]
+        proc = self._procs.get(index)
+        if proc is not None:
+            code = proc.poll()
+            if code is None:
+                return
+            runtime = time.time() - (info["started_at"] or time.time())
+            if runtime >= STABLE_RUNTIME:
+                info["backoff"] = RESTART_BACKOFF_MIN
+            info["last_exit_code"] = code
+            info["next_start"] = time.monotonic() + info["backoff"]
+            logger.error(f"[分片] 分片{index}已退出 (退出码 {code}，运行 {int(runtime)} 秒)，{info['backoff']} 秒后重启")
+            info["backoff"] = min(info["backoff"] * 2, RESTART_BACKOFF_MAX)
+            with self._lock:
+                self._procs[index] = None
+            return
+        if time.monotonic() >= info["next_start"]:
+            info["restarts"] += 1
+            self._spawn(index)
+
+    def stop(self) -> None:
+        """停止所有工作进程（可重复调用）"""
+        self._stop_event.set()
+        with self._lock:
+            procs = [p for p in self._procs.values() if p is not None]
+            self._procs = {index: None for index in self._procs}
+        for proc in procs:
+            if proc.stdin is not None:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def status(self) -> List[dict]:
+        result = []
+        with self._lock:
+            for index in range(self.shard_count):
+                proc = self._procs.get(index)
+                info = self._info.get(index, {})
+                started_at = info.get("started_at")
+                result.append({
+                    "shard": index,
+                    "pid": proc.pid if proc is not None else None,
+                    "alive": proc is not None and proc.poll() is None,
+                    "restarts": info.get("restarts", 0),
+                    "last_exit_code": info.get("last_exit_code"),
+                    "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)) if started_at else None,
+                })
+        return result
+
+
+class RoutedCookieManager(CookieManager):
+    """API 进程中的 CookieManager：维护内存中的账号数据供接口查询，
+    账号任务相关的操作转发给所属分片执行（数据库写入也由分片完成）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, router: ShardRouter):
+        self.router = router
+        super().__init__(loop)
+
+    def add_cookie(self, cookie_id: str, cookie_value: str, kw_list=None, user_id: int = None):
+        if kw_list is not None:
+            self.keywords[cookie_id] = kw_list
+        else:
+            self.keywords.setdefault(cookie_id, [])
+        self.router.call(cookie_id, "add_cookie", cookie_value=cookie_value, kw_list=kw_list, user_id=user_id)
+        self.cookies[cookie_id] = cookie_value
+        self.cookie_status.setdefault(cookie_id, True)
+
+    def remove_cookie(self, cookie_id: str):
+        self.router.call(cookie_id, "remove_cookie")
+        self.cookies.pop(cookie_id, None)
+        self.keywords.pop(cookie_id, None)
+        self.cookie_status.pop(cookie_id, None)
+
+    def update_cookie(self, cookie_id: str, new_value: str, save_to_db: bool = True):
+        self.router.call(cookie_id, "update_cookie", new_value=new_value, save_to_db=save_to_db)
+        self.cookies[cookie_id] = new_value
+
+    def update_keywords(self, cookie_id: str, kw_list):
+        super().update_keywords(cookie_id, kw_list)
+        try:
+            self.router.call(cookie_id, "update_keywords", kw_list=kw_list)
+        except ShardError as e:
+            logger.warning(f"同步关键字到分片失败: {cookie_id}, {e}")
+
+    def update_cookie_status(self, cookie_id: str, enabled: bool):
+        if cookie_id not in self.cookies:
+            raise ValueError(f"Cookie ID {cookie_id} 不存在")
+        self.router.call(cookie_id, "update_cookie_status", enabled=enabled)
+        self.cookie_status[cookie_id] = enabled
+
+    def update_auto_confirm_setting(self, cookie_id: str, auto_confirm: bool):
+        self.auto_confirm_settings[cookie_id] = auto_confirm
+        try:
+            self.router.call(cookie_id, "update_auto_confirm_setting", auto_confirm=auto_confirm)
+        except ShardError as e:
+            # 设置已写入数据库，分片中的实例会从数据库读取
+            logger.warning(f"同步自动确认发货设置到分片失败: {cookie_id}, {e}")
+
+    def reload_from_db(self):
+        result = super().reload_from_db()
+        self.router.broadcast("reload_from_db")
+        return result
+
+    async def _run_xianyu(self, cookie_id: str, cookie_value: str, user_id: int = None):
+        """账号任务在所属分片中运行"""
+        await self.router.acall(cookie_id, "start_account", cookie_value=cookie_value, user_id=user_id)
+
+    async def send_message(self, cookie_id: str, chat_id: str, to_user_id: str, message: str) -> dict:
+        return await self.router.acall(cookie_id, "send_message", chat_id=chat_id,
+                                       to_user_id=to_user_id, message=message)
+
+    def shard_status(self) -> List[dict]:
+        """各分片的账号分配与运行情况"""
+        live = self.router.broadcast("status", connect_wait=0)
+        result = []
+        for index in range(self.router.shard_count):
+            assigned = sorted(cid for cid in self.cookies if self.router.shard_for(cid) == index)
+            entry = {"shard": index, "assigned": assigned}
+            info = live.get(index)
+            if isinstance(info, dict):
+                for key in ("pid", "running", "loop_lag_ms", "stall_count", "browser_pools"):
+                    entry[key] = info.get(key)
+            else:
+                entry["error"] = str(info)
+            result.append(entry)
+        return result
+
+
+# 主进程中的分片组件（由 Start.main 在分片模式下创建）
+router: Optional[ShardRouter] = None
+supervisor: Optional[ShardSupervisor] = None
@@ -6,13 +6,18 @@ import time
 import hashlib
 import struct
 import os
+import threading
 from typing import Any, Dict, List
 
 import blackboxprotobuf
 from loguru import logger
 
+try:
+    import msgpack  # C加速解码器（可选），未安装时使用下方纯Python实现
+except ImportError:
+    msgpack = None
+
 subprocess.Popen = partial(subprocess.Popen, encoding="utf-8")
-import execjs
 
 def get_js_path():
     """获取JavaScript文件的路径"""
@@ -21,39 +26,60 @@ def get_js_path():
     js_path = os.path.join(root_dir, 'static', 'xianyu_js_version_2.js')
     return js_path
 
-try:
-    # 检查JavaScript运行时是否可用
-    available_runtimes = execjs.runtime_names
-    logger.info(f"可用的JavaScript运行时: {available_runtimes}")
-
-    # 尝试获取默认运行时
-    current_runtime = execjs.get()
-    logger.info(f"当前JavaScript运行时: {current_runtime.name}")
-
-    xianyu_js = execjs.compile(open(get_js_path(), 'r', encoding='utf-8').read())
-    logger.info("JavaScript文件加载成功")
-except Exception as e:
-    error_msg = str(e)
-    logger.error(f"JavaScript运行时错误: {error_msg}")
-
-    if "Could not find an available JavaScript runtime" in error_msg:
-        logger.error("解决方案:")
-        logger.error("1. 确保已安装Node.js: apt-get install nodejs")
-        logger.error("2. 或安装其他JS运行时: apt-get install nodejs npm")
-        logger.error("3. 检查PATH环境变量是否包含Node.js路径")
-
-        # 尝试检测系统中的JavaScript运行时
-        import subprocess
+
+_xianyu_js = None
+_xianyu_js_lock = threading.Lock()
+
+
+def get_xianyu_js():
+    """获取编译后的闲鱼JS上下文（首次调用时才探测运行时并编译，之后复用）
+
+    导入本模块不再启动 Node 进程；没有 JavaScript 运行时的环境只会在真正需要 JS 时报错。
+    """
+    global _xianyu_js
+    if _xianyu_js is not None:
+        return _xianyu_js
+
+    with _xianyu_js_lock:
+        if _xianyu_js is not None:
+            return _xianyu_js
         try:
-            result = subprocess.run(['node', '--version'], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info(f"检测到Node.js版本: {result.stdout.strip()}")
-            else:
-                logger.error("Node.js未正确安装或不在PATH中")
-        except FileNotFoundError:
-            logger.error("未找到Node.js可执行文件")
+            import execjs
+
+            # 检查JavaScript运行时是否可用
+            available_runtimes = execjs.runtime_names
+            logger.info(f"可用的JavaScript运行时: {available_runtimes}")
+
+            # 尝试获取默认运行时
+            current_runtime = execjs.get()
+            logger.info(f"当前JavaScript运行时: {current_runtime.name}")
+
+            with open(get_js_path(), 'r', encoding='utf-8') as f:
+                _xianyu_js = execjs.compile(f.read())
+            logger.info("JavaScript文件加载成功")
+            return _xianyu_js
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"JavaScript运行时错误: {error_msg}")
+
+            if "Could not find an available JavaScript runtime" in error_msg:
+                logger.error("解决方案:")
+                logger.error("1. 确保已安装Node.js: apt-get install nodejs")
+                logger.error("2. 或安装其他JS运行时: apt-get install nodejs npm")
+                logger.error("3. 检查PATH环境变量是否包含Node.js路径")
+
+                # 尝试检测系统中的JavaScript运行时
+                try:
+                    result = subprocess.run(['node', '--version'], capture_output=True, text=True)
+                    if result.returncode == 0:
+                        logger.info(f"检测到Node.js版本: {result.stdout.strip()}")
+                    else:
+                        logger.error("Node.js未正确安装或不在PATH中")
+                except FileNotFoundError:
+                    logger.error("未找到Node.js可执行文件")
+
+            raise RuntimeError(f"无法加载JavaScript文件: {error_msg}")
 
-    raise RuntimeError(f"无法加载JavaScript文件: {error_msg}")
 
 def trans_cookies(cookies_str: str) -> dict:
     """将cookies字符串转换为字典"""
@@ -325,36 +351,88 @@ class MessagePackDecoder:
         return self.decode_value()
 
 
-def decrypt(data: str) -> str:
-    """解密消息数据"""
-    import json as json_module  # 使用别名避免作用域冲突
+def _json_key(key: Any) -> str:
+    """按 json.dumps 的规则把字典键转换为字符串"""
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, bytes):
+        return key.decode('utf-8', errors='ignore')
+    if isinstance(key, float):
+        return repr(key)
+    return str(key)
+
+
+def _normalize_decoded(value: Any) -> Any:
+    """把解码结果规整为与 JSON 往返一致的结构（键转字符串、bytes 转字符串）"""
+    if isinstance(value, dict):
+        return {_json_key(k): _normalize_decoded(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_decoded(v) for v in value]
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    return value
+
+
+def _b64decode_payload(data: str) -> bytes:
+    """Base64解码消息数据（兼容非ASCII字符和缺失填充）"""
+    # 确保输入数据是字符串类型
+    if not isinstance(data, str):
+        data = str(data)
+
+    # 清理数据，移除可能的非ASCII字符
+    try:
+        # 尝试编码为ASCII，如果失败则使用UTF-8编码后再解码
+        data.encode('ascii')
+    except UnicodeEncodeError:
+        # 如果包含非ASCII字符，先编码为UTF-8字节，再解码为ASCII兼容的字符串
+        data = data.encode('utf-8', errors='ignore').decode('ascii', errors='ignore')
 
+    # Base64解码
+    try:
+        return base64.b64decode(data)
+    except Exception:
+        # 如果base64解码失败，尝试添加填充
+        missing_padding = len(data) % 4
+        if missing_padding:
+            data += '=' * (4 - missing_padding)
+        return base64.b64decode(data)
+
+
+def _unpack(decoded_data: bytes) -> Any:
+    """MessagePack解码：优先使用C扩展，未安装时使用纯Python解码器"""
+    if msgpack is not None:
+        # 闲鱼消息的字典键是整数，需要关闭 strict_map_key；只解码第一个对象，与纯Python解码器一致
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False, max_buffer_size=len(decoded_data) or 1)
+        unpacker.feed(decoded_data)
+        return unpacker.unpack()
+    return MessagePackDecoder(decoded_data).decode()
+
+
+def decrypt_to_obj(data: str) -> Any:
+    """解密消息数据并直接返回解码后的对象
+
+    字典结构与 json.loads(decrypt(data)) 一致（键为字符串、bytes 已解码），
+    但省去了 JSON 序列化再解析的往返开销。
+    """
     try:
-        # 确保输入数据是字符串类型
-        if not isinstance(data, str):
-            data = str(data)
+        return _normalize_decoded(_unpack(_b64decode_payload(data)))
+    except Exception as e:
+        raise Exception(f"解密失败: {str(e)}")
 
-        # 清理数据，移除可能的非ASCII字符
-        try:
-            # 尝试编码为ASCII，如果失败则使用UTF-8编码后再解码
-            data.encode('ascii')
-        except UnicodeEncodeError:
-            # 如果包含非ASCII字符，先编码为UTF-8字节，再解码为ASCII兼容的字符串
-            data = data.encode('utf-8', errors='ignore').decode('ascii', errors='ignore')
 
-        # Base64解码
-        try:
-            decoded_data = base64.b64decode(data)
-        except Exception as decode_error:
-            # 如果base64解码失败，尝试添加填充
-            missing_padding = len(data) % 4
-            if missing_padding:
-                data += '=' * (4 - missing_padding)
-            decoded_data = base64.b64decode(data)
+def decrypt(data: str) -> str:
+    """解密消息数据"""
+    import json as json_module  # 使用别名避免作用域冲突
 
+    try:
         # 使用MessagePack解码器解码数据
-        decoder = MessagePackDecoder(decoded_data)
-        decoded_value = decoder.decode()
+        decoded_value = _unpack(_b64decode_payload(data))
 
         # 如果解码后的值是字典，转换为JSON字符串
         if isinstance(decoded_value, dict):